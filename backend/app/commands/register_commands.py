@@ -1,10 +1,96 @@
-import click, random
+import asyncio, click, random, time
 from flask.cli import with_appcontext
 from datetime import datetime, timedelta
-from ..models import db, AttendanceRecords, Events
-from faker import Faker
+from ..models import db, db_create_all, AttendanceRecords, Events
+from ..services import auth0_sync, card_index, set_users_active
+from ..ingest import IngestServer, make_ssl_context, INGEST_HOST, INGEST_PORT, INGEST_INSECURE
+from ..reporting import attendance_statistics, attendance_archive, get_zone, ATTENDANCE_RETENTION_MONTHS
 
 def register_commands(app):
+    @app.cli.command("init_db")
+    def init_db():
+        """Create the missing tables and indexes, run once per deploy."""
+        db_create_all(app)
+        click.echo("Database schema is up to date")
+
+    @app.cli.command("sync_auth0_users")
+    @click.option('--full', is_flag=True, help='Fetch every user and drop the ones deleted from Auth0')
+    @click.option('--every', type=int, default=None, help='Sync again every this many seconds until stopped')
+    @with_appcontext
+    def sync_auth0_users(full, every):
+        """Copy the Auth0 users and role assignments to the mirror tables."""
+        while True:
+            try:
+                result = auth0_sync.sync(db.session, full=full)
+                click.echo(f"Synced {result['users']} users, {result['roles']} roles and {result['assignments']} role assignments")
+            except Exception as e:
+                if every is None:
+                    raise
+                # A failed run is retried at the next interval
+                db.session.rollback()
+                click.echo(f"Auth0 sync failed: {e}", err=True)
+            if every is None:
+                return
+            time.sleep(every)
+
+    @app.cli.command("compute_attendance_stats")
+    @click.option('--month', default=None, help='Month to compute as YYYY-MM, the current one by default')
+    @with_appcontext
+    def compute_attendance_stats(month):
+        """Compute the monthly attendance statistics per user and per department."""
+        month = month or datetime.now(get_zone()).strftime('%Y-%m')
+        results = attendance_statistics.compute(month)
+        click.echo(f"Computed {month}: {len(results['user'])} users, {len(results['department'])} departments")
+
+    @app.cli.command("archive_attendance")
+    @click.option('--month', default=None, help='Site month to archive as YYYY-MM, the closed months out of the retention window by default')
+    @click.option('--retention-months', default=ATTENDANCE_RETENTION_MONTHS, help='Months kept in the table, the current one included')
+    @with_appcontext
+    def archive_attendance(month, retention_months):
+        """Move the punches of old months from attendance_records to the archive files."""
+        months = [month] if month else attendance_archive.archivable_months(retention_months)
+        for archived_month in months:
+            try:
+                moved = attendance_archive.archive_month(archived_month, retention_months)
+            except ValueError as e:
+                raise click.BadParameter(str(e), param_hint='--month')
+            click.echo(f"Archived {archived_month}: {moved} punches")
+        if not months:
+            click.echo("No month to archive")
+
+    @app.cli.command("set_users_active")
+    @click.argument('user_ids', nargs=-1, type=int)
+    @click.option('--file', 'ids_file', type=click.File(), help='File with one user id per line')
+    @click.option('--inactive', is_flag=True, help='Deactivate the users (leavers), reactivate them otherwise')
+    @with_appcontext
+    def set_users_active_command(user_ids, ids_file, inactive):
+        """Deactivate or reactivate users in bulk with one statement."""
+        user_ids = list(user_ids)
+        if ids_file:
+            user_ids += [int(line) for line in ids_file if line.strip()]
+        if not user_ids:
+            raise click.UsageError('No user id given')
+
+        result = set_users_active(db.session, user_ids, not inactive)
+        db.session.commit()
+        click.echo(f"{'Deactivated' if inactive else 'Reactivated'} {len(result['updated'])} users, {len(result['unchanged'])} unchanged, {len(result['missing'])} not found")
+        if result['missing']:
+            click.echo(f"Not found: {', '.join(str(user_id) for user_id in result['missing'])}")
+
+    @app.cli.command("ingest_server")
+    @click.option('--host', default=INGEST_HOST, help='Address to listen on')
+    @click.option('--port', default=INGEST_PORT, help='TCP port of the punch ingest channel')
+    @click.option('--insecure', is_flag=True, default=INGEST_INSECURE, help='Serve plain TCP without INGEST_TLS_CERT, behind a TLS terminating proxy')
+    def ingest_server(host, port, insecure):
+        """Serve the binary punch ingest channel for card reader fleets."""
+        try:
+            ssl_context = make_ssl_context(insecure=insecure)
+        except RuntimeError as e:
+            raise click.UsageError(str(e))
+        card_index.warm()
+        click.echo(f"Ingest server listening on {host}:{port}{'' if ssl_context else ' without TLS'}")
+        asyncio.run(IngestServer(app, ssl_context=ssl_context).serve(host, port))
+
     @app.cli.command("seed_attendance_data")
     @click.option('--records', default=100, help='Len of the data')
     @with_appcontext
@@ -18,16 +104,18 @@ def register_commands(app):
         users = list(range(1, user_count + 1))
         created_records = []
         
-        # The day range is current day +- 30
+        # The day range is current day +- 30, in site time
+        zone = get_zone()
         for day in range(30):
-            date = datetime.now() - timedelta(days=day)
+            date = datetime.now(zone) - timedelta(days=day)
             
             for user_id in users:
                 if random.random() < 0.7:
                     # Work on time
                     clock_in = datetime.combine(
                         date.date(), 
-                        datetime.strptime(f"{random.randint(8, 9)}:{random.randint(0, 59):02d}", "%H:%M").time()
+                        datetime.strptime(f"{random.randint(8, 9)}:{random.randint(0, 59):02d}", "%H:%M").time(),
+                        tzinfo=zone
                     )
                     created_records.append(AttendanceRecords(
                         user_id=user_id,
@@ -37,7 +125,8 @@ def register_commands(app):
                     # Work off time
                     clock_out = datetime.combine(
                         date.date(),
-                        datetime.strptime(f"{random.randint(17, 18)}:{random.randint(0, 59):02d}", "%H:%M").time()
+                        datetime.strptime(f"{random.randint(17, 18)}:{random.randint(0, 59):02d}", "%H:%M").time(),
+                        tzinfo=zone
                     )
                     created_records.append(AttendanceRecords(
                         user_id=user_id,
@@ -55,6 +144,8 @@ def register_commands(app):
     @with_appcontext
     def seed_events_data(records):
         """Generate sample event data for testing."""
+        # Only needed by this command, keep it out of the app startup
+        from faker import Faker
         
         fake = Faker()
         
@@ -1,5 +1,5 @@
 from flask import Blueprint, jsonify
-from ..services import AuthError
+from ..services import AuthError, RateLimitError
 from jose.exceptions import JWTError
 
 errors = Blueprint('errors', __name__)
@@ -48,6 +48,14 @@ def handle_auth_error(ex):
     response.status_code = ex.status_code
     return response
 
+# 429 and 503, the client waits Retry-After seconds
+@errors.app_errorhandler(RateLimitError)
+def handle_rate_limit_error(ex):
+    response = jsonify(ex.error)
+    response.status_code = ex.status_code
+    response.headers['Retry-After'] = str(ex.retry_after)
+    return response
+
 @errors.app_errorhandler(JWTError)
 def handle_jwt_error(ex):
     response = jsonify({
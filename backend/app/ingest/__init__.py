@@ -0,0 +1,8 @@
+from .protocol import FrameDecoder, ProtocolError, encode_hello, encode_punch, decode_ack, STATUS_OK, STATUS_UNKNOWN_CARD, STATUS_UNKNOWN_USER, STATUS_INVALID, STATUS_ERROR
+from .server import IngestServer, make_ssl_context, write_punches, INGEST_HOST, INGEST_PORT, INGEST_INSECURE
+
+__all__ = [
+    'FrameDecoder', 'ProtocolError', 'encode_hello', 'encode_punch', 'decode_ack',
+    'STATUS_OK', 'STATUS_UNKNOWN_CARD', 'STATUS_UNKNOWN_USER', 'STATUS_INVALID', 'STATUS_ERROR',
+    'IngestServer', 'make_ssl_context', 'write_punches', 'INGEST_HOST', 'INGEST_PORT', 'INGEST_INSECURE',
+]
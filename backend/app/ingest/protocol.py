@@ -0,0 +1,100 @@
+import struct
+
+# Binary framing of the punch ingest channel, big endian.
+# Every frame is a type byte and a 2-byte payload length, then the payload.
+#
+#   HELLO    reader -> server  the JWT of the reader, utf-8, first frame of a connection
+#   WELCOME  server -> reader  empty, the reader may send punches
+#   PUNCH    reader -> server  reader_id u32, seq u32, timestamp i64 (UTC epoch
+#                              microseconds), card uid length u8, card uid (ascii)
+#   ACK      server -> reader  reader_id u32, seq u32, status u8, once the punch is committed
+#   ERROR    server -> reader  message, utf-8, the server closes the connection after it
+#
+# reader_id lets one connection carry several readers (a gateway), seq is
+# chosen by the reader to match the ACKs, which may come back out of order.
+# A punch resent after a reconnect keeps its reader_id, seq and timestamp,
+# the server stores it once and acknowledges every copy.
+HEADER = struct.Struct('!BH')
+PUNCH_HEAD = struct.Struct('!IIqB')
+ACK_BODY = struct.Struct('!IIB')
+
+HELLO = 0x01
+WELCOME = 0x02
+PUNCH = 0x10
+ACK = 0x11
+ERROR = 0x7F
+
+MAX_PAYLOAD = 0xFFFF
+MAX_CARD_UID = 0xFF
+
+# ACK status
+STATUS_OK = 0
+STATUS_UNKNOWN_CARD = 1
+STATUS_UNKNOWN_USER = 2
+STATUS_INVALID = 3
+STATUS_ERROR = 4
+
+# Raised on a frame that can't be read, the connection is closed
+class ProtocolError(Exception):
+    pass
+
+def encode_frame(kind, payload=b''):
+    if len(payload) > MAX_PAYLOAD:
+        raise ProtocolError(f'Payload of {len(payload)} bytes is over {MAX_PAYLOAD}')
+    return HEADER.pack(kind, len(payload)) + payload
+
+def encode_hello(token):
+    return encode_frame(HELLO, token.encode())
+
+def encode_welcome():
+    return encode_frame(WELCOME)
+
+def encode_error(message):
+    return encode_frame(ERROR, message.encode()[:MAX_PAYLOAD])
+
+def encode_punch(reader_id, seq, timestamp_us, card_uid):
+    card = card_uid.encode('ascii')
+    if len(card) > MAX_CARD_UID:
+        raise ProtocolError(f'Card uid of {len(card)} bytes is over {MAX_CARD_UID}')
+    return encode_frame(PUNCH, PUNCH_HEAD.pack(reader_id, seq, timestamp_us, len(card)) + card)
+
+# PUNCH payload -> (reader_id, seq, timestamp_us, card_uid)
+def decode_punch(payload):
+    if len(payload) < PUNCH_HEAD.size:
+        raise ProtocolError('Truncated punch')
+    reader_id, seq, timestamp_us, length = PUNCH_HEAD.unpack_from(payload)
+    card = payload[PUNCH_HEAD.size:]
+    if len(card) != length:
+        raise ProtocolError('Card uid length does not match the frame')
+    try:
+        return reader_id, seq, timestamp_us, card.decode('ascii')
+    except UnicodeDecodeError:
+        raise ProtocolError('Card uid is not ascii')
+
+def encode_ack(reader_id, seq, status):
+    return encode_frame(ACK, ACK_BODY.pack(reader_id, seq, status))
+
+# ACK payload -> (reader_id, seq, status)
+def decode_ack(payload):
+    if len(payload) != ACK_BODY.size:
+        raise ProtocolError('Invalid ack')
+    return ACK_BODY.unpack(payload)
+
+# Splits a byte stream into (type, payload) frames, whatever the chunks it arrives in
+class FrameDecoder:
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def feed(self, data):
+        self._buffer += data
+        frames = []
+        position = 0
+        while len(self._buffer) - position >= HEADER.size:
+            kind, length = HEADER.unpack_from(self._buffer, position)
+            end = position + HEADER.size + length
+            if end > len(self._buffer):
+                break
+            frames.append((kind, bytes(self._buffer[position + HEADER.size:end])))
+            position = end
+        del self._buffer[:position]
+        return frames
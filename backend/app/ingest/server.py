@@ -0,0 +1,216 @@
+import asyncio, logging, os, ssl
+
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import exc
+from sqlalchemy.dialects.postgresql import insert
+
+from ..models import AttendanceRecords, db
+from ..reporting.timezones import get_zone
+from ..services import AuthService, card_index, active_user_cache, live_feed
+from .protocol import (
+    FrameDecoder, ProtocolError, HELLO, PUNCH, decode_punch, encode_ack, encode_error, encode_welcome,
+    STATUS_OK, STATUS_UNKNOWN_CARD, STATUS_UNKNOWN_USER, STATUS_INVALID, STATUS_ERROR,
+)
+
+INGEST_HOST = os.getenv('INGEST_HOST', '0.0.0.0')
+INGEST_PORT = int(os.getenv('INGEST_PORT', 9100))
+# Punches written by one INSERT, and the longest a punch waits for its batch to fill
+INGEST_BATCH_SIZE = int(os.getenv('INGEST_BATCH_SIZE', 500))
+INGEST_BATCH_MS = float(os.getenv('INGEST_BATCH_MS', 20))
+# Punches waiting for the writer, the readers are slowed down past it
+INGEST_QUEUE_SIZE = int(os.getenv('INGEST_QUEUE_SIZE', 50000))
+# Connections waiting to be accepted, the whole fleet reconnects at once after a restart
+INGEST_BACKLOG = int(os.getenv('INGEST_BACKLOG', 4096))
+# Seconds a new connection has to send its HELLO
+INGEST_HELLO_TIMEOUT_SECONDS = float(os.getenv('INGEST_HELLO_TIMEOUT_SECONDS', 10))
+
+# PEM certificate chain and private key, readers send their token and punches over TLS
+INGEST_TLS_CERT = os.getenv('INGEST_TLS_CERT')
+INGEST_TLS_KEY = os.getenv('INGEST_TLS_KEY')
+# Serves plain TCP without a certificate, only behind a TLS terminating proxy or for development
+INGEST_INSECURE = os.getenv('INGEST_INSECURE', 'false').lower() == 'true'
+
+READ_CHUNK_SIZE = 64 * 1024
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+Punch = namedtuple('Punch', ['writer', 'reader_id', 'seq', 'timestamp', 'card_uid'])
+
+# JWT of a reader -> its payload, it needs the post:attendance permission like the HTTP route
+def authenticate(token):
+    auth_service = AuthService()
+    payload = auth_service.verify_decode_jwt(token)
+    auth_service.check_permissions('post:attendance', payload)
+    return payload
+
+# Server SSL context of the channel, None when serving plain TCP is allowed.
+# Raises RuntimeError without a certificate, the HELLO carries a bearer token.
+def make_ssl_context(cert=INGEST_TLS_CERT, key=INGEST_TLS_KEY, insecure=INGEST_INSECURE):
+    if cert:
+        context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        context.load_cert_chain(cert, key)
+        return context
+    if insecure:
+        return None
+    raise RuntimeError('INGEST_TLS_CERT and INGEST_TLS_KEY are not set, set INGEST_INSECURE=true to serve plain TCP')
+
+# Writes (reader_id, seq, timestamp, card_uid) punches with one INSERT, returns one
+# status per punch. Cards and users are resolved from the in-memory caches, like
+# POST /api/attendance. A punch resent after a lost ACK has the same
+# (reader_id, seq, timestamp) key, it is skipped and acknowledged again.
+def write_punches(punches):
+    zone = get_zone()
+    for attempt in range(2):
+        statuses = [STATUS_OK] * len(punches)
+        rows = []
+        for position, (reader_id, seq, timestamp, card_uid) in enumerate(punches):
+            # Card validity windows are naive site time
+            user_id = card_index.resolve(card_uid, timestamp.astimezone(zone).replace(tzinfo=None))
+            if user_id is None:
+                statuses[position] = STATUS_UNKNOWN_CARD
+            elif not active_user_cache.is_active(user_id):
+                statuses[position] = STATUS_UNKNOWN_USER
+            else:
+                rows.append({'user_id': user_id, 'timestamp': timestamp, 'reader_id': reader_id, 'reader_seq': seq})
+
+        if not rows:
+            return statuses
+
+        try:
+            records = db.session.execute(
+                insert(AttendanceRecords).values(rows).on_conflict_do_nothing(
+                    index_elements=['reader_id', 'reader_seq', 'timestamp'],
+                    index_where=AttendanceRecords.reader_id.isnot(None)
+                ).returning(
+                    AttendanceRecords.id, AttendanceRecords.user_id, AttendanceRecords.timestamp
+                )
+            ).all()
+            # Published in the same transaction, dashboards only see committed punches
+            live_feed.publish_punches(db.session, records)
+            db.session.commit()
+            return statuses
+        except exc.IntegrityError:
+            # A user was removed after it got cached, check them again in the db
+            db.session.rollback()
+            if attempt:
+                raise
+            active_user_cache.discard([row['user_id'] for row in rows])
+
+# Long-lived TLS channel for card reader fleets, see protocol.py.
+# A reader authenticates once per connection, then streams punches. They
+# are queued, written in batches by one thread and acknowledged once
+# committed, so a reader resends what wasn't acknowledged after a reconnect,
+# and a resent punch that was committed before is not stored twice.
+# authenticate and write_batch run on threads, they can be swapped by tests.
+class IngestServer:
+    def __init__(self, app, authenticate=authenticate, write_batch=write_punches,
+                 batch_size=INGEST_BATCH_SIZE, batch_ms=INGEST_BATCH_MS, queue_size=INGEST_QUEUE_SIZE, ssl_context=None):
+        self._app = app
+        self._ssl_context = ssl_context
+        self._authenticate = authenticate
+        self._write_batch = write_batch
+        self._batch_size = batch_size
+        self._batch_seconds = batch_ms / 1000
+        self._queue_size = queue_size
+        self._queue = None
+        self._writer_task = None
+        # One writer, the next batch fills up while the current one is written
+        self._db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ingest-writer')
+        self._auth_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='ingest-auth')
+        self.connections = 0
+        self.punches = 0
+        self.batches = 0
+
+    async def start(self, host=INGEST_HOST, port=INGEST_PORT):
+        self._queue = asyncio.Queue(maxsize=self._queue_size)
+        self._writer_task = asyncio.create_task(self._write_loop())
+        return await asyncio.start_server(self._handle, host, port, backlog=INGEST_BACKLOG, ssl=self._ssl_context)
+
+    async def serve(self, host=INGEST_HOST, port=INGEST_PORT):
+        server = await self.start(host, port)
+        logging.info(f"Ingest server listening on {host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+    async def _handle(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        decoder = FrameDecoder()
+        self.connections += 1
+        try:
+            frames = []
+            while not frames:
+                data = await asyncio.wait_for(reader.read(READ_CHUNK_SIZE), INGEST_HELLO_TIMEOUT_SECONDS)
+                if not data:
+                    return
+                frames = decoder.feed(data)
+
+            kind, token = frames.pop(0)
+            if kind != HELLO:
+                raise ProtocolError('The first frame must be a HELLO')
+            try:
+                await loop.run_in_executor(self._auth_executor, self._authenticate, token.decode())
+            except Exception as e:
+                writer.write(encode_error(f'Authentication failed: {getattr(e, "error", {}).get("description", e)}'))
+                return
+            writer.write(encode_welcome())
+
+            while True:
+                for kind, payload in frames:
+                    if kind != PUNCH:
+                        raise ProtocolError(f'Unexpected frame type {kind}')
+                    await self._queue_punch(writer, payload)
+
+                data = await reader.read(READ_CHUNK_SIZE)
+                if not data:
+                    return
+                frames = decoder.feed(data)
+        except ProtocolError as e:
+            writer.write(encode_error(str(e)))
+        except (asyncio.TimeoutError, ConnectionError, ssl.SSLError):
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    async def _queue_punch(self, writer, payload):
+        reader_id, seq, timestamp_us, card_uid = decode_punch(payload)
+        try:
+            timestamp = EPOCH + timedelta(microseconds=timestamp_us)
+        except OverflowError:
+            writer.write(encode_ack(reader_id, seq, STATUS_INVALID))
+            return
+        # Waits when the writer is behind, the reader's socket fills up and it slows down
+        await self._queue.put(Punch(writer, reader_id, seq, timestamp, card_uid.strip()))
+
+    async def _write_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            self._drain(batch)
+            if len(batch) < self._batch_size:
+                await asyncio.sleep(self._batch_seconds)
+                self._drain(batch)
+
+            try:
+                statuses = await loop.run_in_executor(self._db_executor, self._run_batch, [(punch.reader_id, punch.seq, punch.timestamp, punch.card_uid) for punch in batch])
+            except Exception as e:
+                logging.error(f"Failed to write {len(batch)} punches: {e}")
+                statuses = [STATUS_ERROR] * len(batch)
+
+            self.batches += 1
+            self.punches += len(batch)
+            for punch, status in zip(batch, statuses):
+                if not punch.writer.is_closing():
+                    punch.writer.write(encode_ack(punch.reader_id, punch.seq, status))
+
+    def _drain(self, batch):
+        while len(batch) < self._batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+
+    def _run_batch(self, punches):
+        with self._app.app_context():
+            try:
+                return self._write_batch(punches)
+            finally:
+                db.session.remove()
@@ -7,17 +7,31 @@ from werkzeug.exceptions import HTTPException
 from app.models import init_db
 from app.routes.api_routes import api
 from app.errors.handlers import errors
+from app.services import notify_hub, card_index, today_snapshot, replica_router, response_compressor
+from app.serializers import FastJSONProvider
 from app.commands import *
 
 def create_app(test_config=None):
     # Create and configure the app
     app = Flask(__name__)
+    # orjson backed when installed, datetimes are encoded as ISO 8601
+    app.json = FastJSONProvider(app)
 
     if test_config is None:
         init_db(app)
     else:
         database_path = test_config.get('SQLALCHEMY_DATABASE_URI')
-        init_db(app, database_path=database_path)
+        replica_path = test_config.get('SQLALCHEMY_REPLICA_URI')
+        init_db(app, database_path=database_path, replica_path=replica_path)
+
+    # LISTEN/NOTIFY fan-out across workers, the listener starts on first subscribe
+    notify_hub.init_app(app)
+    # Card uid -> user index for the ingest path, warmed by gunicorn's post_worker_init
+    card_index.init_app(app)
+    # Who punched in today, for the presence boards, warmed with the card index
+    today_snapshot.init_app(app)
+    # Keeps the callers of write requests on the primary for a while
+    replica_router.init_app(app)
 
     CORS(app, resources={r"/*": {"origins": "*"}})
 
@@ -31,6 +45,9 @@ def create_app(test_config=None):
             'Access-Control-Allow-Methods',
             'GET, POST, PATCH, DELETE')
         return response
+
+    # gzip/brotli response bodies over COMPRESS_MIN_SIZE
+    response_compressor.init_app(app)
     
     # Blue print register
     app.register_blueprint(api, url_prefix='/api')
@@ -42,7 +59,19 @@ def create_app(test_config=None):
     return app
 
 
-APP = create_app()
+# `app.main:APP` is built on first access, so importing this module stays cheap
+_app = None
+
+def __getattr__(name):
+    global _app
+    if name == 'APP':
+        if _app is None:
+            _app = create_app()
+        return _app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 if __name__ == '__main__':
-    APP.run(host='0.0.0.0', port=8080)
+    app = create_app()
+    card_index.warm()
+    today_snapshot.warm()
+    app.run(host='0.0.0.0', port=8080)
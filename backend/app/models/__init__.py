@@ -1,20 +1,11 @@
-from .model import Users, AttendanceRecords, Events
-from .database import db, setup_db, db_drop_and_create_all, database_path as default_path
+from .model import Users, AttendanceRecords, Events, EventExceptions, Cards, Shifts, ShiftAssignments, AttendanceStatistics, AttendanceArchives, Auth0Users, Auth0Roles, Auth0UserRoles, Auth0SyncState
+from .database import db, setup_db, db_create_all, SCHEMA_STATEMENTS, SITE_TIMEZONE, SEARCH_TEXT_CONFIG, RoutingSession, database_path as default_path, replica_path as default_replica_path
 
-def init_db(app, database_path=None):
-    # create_tables_if_needed(app, db, [Users, AttendanceRecords, Events])
-    try:
-        db = setup_db(app, database_path or default_path)
-        
-        with app.app_context():
-            db_drop_and_create_all(app)
-            # default_value()
-    except Exception as e:
-        print(f"Error initializing database: {e}")
-        import traceback
-        traceback.print_exc()
-    
-    return db
+# Only binds the engines, no connection is opened here.
+# The schema is created once per deploy with `flask init_db`.
+# replica_path None binds no replica, the env one is only the default.
+def init_db(app, database_path=None, replica_path=default_replica_path):
+    return setup_db(app, database_path or default_path, replica_path)
 
 # def default_value():
 #     try:
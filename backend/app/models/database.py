@@ -1,14 +1,25 @@
 import os
 
+from flask import g, has_app_context
 from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
+from flask_sqlalchemy.session import Session
 from dotenv import load_dotenv
-from sqlalchemy import inspect
+from sqlalchemy import text
 
 load_dotenv()
 
-db = SQLAlchemy()
-migrate = Migrate()
+# Session that sends the queries of replica-marked requests to the read replica.
+# Flushes always go to the primary, so a write can never land on the replica.
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_app_context() and g.get('use_replica'):
+            engine = self._db.engines.get('replica')
+            if engine is not None:
+                return engine
+
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 # Database path formatting
 database_path = 'postgresql://{}:{}@{}:{}/{}'.format(
@@ -19,31 +30,125 @@ database_path = 'postgresql://{}:{}@{}:{}/{}'.format(
     os.getenv('DB_NAME')
 )
 
+# Optional read replica, same credentials as the primary unless overridden
+replica_path = None
+if os.getenv('DB_REPLICA_HOST'):
+    replica_path = 'postgresql://{}:{}@{}:{}/{}'.format(
+        os.getenv('DB_REPLICA_USER', os.getenv('DB_USER')),
+        os.getenv('DB_REPLICA_PASSWORD', os.getenv('DB_PASSWORD')),
+        os.getenv('DB_REPLICA_HOST'),
+        os.getenv('DB_REPLICA_PORT', os.getenv('DB_PORT')),
+        os.getenv('DB_REPLICA_NAME', os.getenv('DB_NAME'))
+    )
+
+# Connections per engine and worker. With a gevent worker many requests run
+# at once, they queue for a connection past DB_POOL_SIZE + DB_MAX_OVERFLOW
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 10))
+
+# Timezone of the site, the days of the users without their own timezone
+# are bucketed in it. An IANA name like 'Europe/Paris'.
+SITE_TIMEZONE = os.getenv('SITE_TIMEZONE', 'UTC')
+
+# Text search configuration of the events search vector, 'simple' doesn't
+# stem so it suits any language. init_db doesn't rebuild the column when it changes.
+SEARCH_TEXT_CONFIG = os.getenv('SEARCH_TEXT_CONFIG', 'simple')
+
+# Weighted name (A) and description (B), kept up to date by Postgres
+EVENT_SEARCH_VECTOR = (
+    f"setweight(to_tsvector('{SEARCH_TEXT_CONFIG}'::regconfig, coalesce(name, '')), 'A') || "
+    f"setweight(to_tsvector('{SEARCH_TEXT_CONFIG}'::regconfig, coalesce(\"desc\", '')), 'B')"
+)
+
+# Extra DDL that create_all doesn't cover, like extensions and expression indexes.
+# Every statement must be idempotent, they run again on each `flask init_db`.
+SCHEMA_STATEMENTS = [
+    # Punches used to be naive local time, they are read as site time once
+    f"""
+    DO $$
+    BEGIN
+        IF EXISTS (
+            SELECT 1 FROM information_schema.columns
+            WHERE table_name = 'attendance_records' AND column_name = 'timestamp'
+            AND data_type = 'timestamp without time zone'
+        ) THEN
+            ALTER TABLE attendance_records ALTER COLUMN timestamp TYPE timestamptz
+            USING timestamp AT TIME ZONE '{SITE_TIMEZONE}';
+        END IF;
+    END $$
+    """,
+    "ALTER TABLE users ADD COLUMN IF NOT EXISTS timezone VARCHAR(64)",
+    # create_all only indexes the tables it creates
+    "CREATE INDEX IF NOT EXISTS ix_attendance_records_user_timestamp ON attendance_records (user_id, timestamp)",
+    # Keyset pagination of the raw punches
+    "CREATE INDEX IF NOT EXISTS ix_attendance_records_timestamp_id ON attendance_records (timestamp, id)",
+    # Idempotency key of the ingest channel, matches AttendanceRecords.__table_args__
+    "ALTER TABLE attendance_records ADD COLUMN IF NOT EXISTS reader_id BIGINT",
+    "ALTER TABLE attendance_records ADD COLUMN IF NOT EXISTS reader_seq BIGINT",
+    """
+    CREATE UNIQUE INDEX IF NOT EXISTS uq_attendance_records_reader_seq
+    ON attendance_records (reader_id, reader_seq, timestamp) WHERE reader_id IS NOT NULL
+    """,
+    # Recurring events
+    "ALTER TABLE events ADD COLUMN IF NOT EXISTS rrule VARCHAR(500)",
+    "ALTER TABLE events ADD COLUMN IF NOT EXISTS until TIMESTAMPTZ",
+    # Site day of a punch, the expression matches local_day(column, SITE_TIMEZONE).
+    # An index built for another SITE_TIMEZONE no longer serves local_day(),
+    # it is dropped and built again.
+    f"""
+    DO $$
+    BEGIN
+        IF to_regclass('ix_attendance_records_site_day') IS NOT NULL
+        AND position('''{SITE_TIMEZONE}''' IN pg_get_indexdef(to_regclass('ix_attendance_records_site_day'))) = 0 THEN
+            DROP INDEX ix_attendance_records_site_day;
+        END IF;
+    END $$
+    """,
+    f"""
+    CREATE INDEX IF NOT EXISTS ix_attendance_records_site_day
+    ON attendance_records (((timestamp AT TIME ZONE '{SITE_TIMEZONE}')::date), user_id)
+    """,
+    # Search, full text over the events and trigrams over the users
+    f"ALTER TABLE events ADD COLUMN IF NOT EXISTS search_vector TSVECTOR GENERATED ALWAYS AS ({EVENT_SEARCH_VECTOR}) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_events_search_vector ON events USING gin (search_vector)",
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_users_username_trgm ON users USING gin (username gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_users_email_trgm ON users USING gin (email gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_users_department_trgm ON users USING gin (department gin_trgm_ops)",
+    # Active users only, for the user listing, matches Users.__table_args__
+    "CREATE INDEX IF NOT EXISTS ix_users_active_username ON users (username) WHERE is_active",
+]
+
 # Database init
-def setup_db(app, database_path=database_path):
+def setup_db(app, database_path=database_path, replica_path=replica_path):
     app.config['SQLALCHEMY_DATABASE_URI'] = database_path
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {'pool_size': DB_POOL_SIZE, 'max_overflow': DB_MAX_OVERFLOW})
+    if replica_path:
+        # No model uses this bind key, create_all never touches the replica
+        app.config['SQLALCHEMY_BINDS'] = {'replica': replica_path}
     db.init_app(app)
-    # migrate.init_app(app, db)
 
     return db
 
-# Database create
-def db_drop_and_create_all(app):
+# Database create, run by the `flask init_db` command and not on app startup
+def db_create_all(app):
+    # SITE_TIMEZONE is written into the DDL as a literal
+    from ..reporting.timezones import is_valid_timezone
+    if not SITE_TIMEZONE or not is_valid_timezone(SITE_TIMEZONE):
+        raise ValueError(f"Invalid SITE_TIMEZONE '{SITE_TIMEZONE}', expected an IANA name like 'Europe/Paris'")
+
     with app.app_context():
-        inspector = inspect(db.engine)
-        existing_tables = inspector.get_table_names()
-
-        if not existing_tables:
-            print("Creating tables...")
-            try:
-                db.create_all()
-                print("Tables created successfully")
-                return True
-            except Exception as e:
-                print(f"Error creating tables: {e}")
-                db.session.rollback()
-                raise
-        else:
-            print("Tables already exist, skipping initialization")
-            return False
\ No newline at end of file
+        print("Creating missing tables...")
+        try:
+            # create_all skips the tables that already exist
+            db.create_all()
+            for statement in SCHEMA_STATEMENTS:
+                db.session.execute(text(statement))
+            db.session.commit()
+            print("Tables created successfully")
+            return True
+        except Exception as e:
+            print(f"Error creating tables: {e}")
+            db.session.rollback()
+            raise
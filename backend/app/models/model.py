@@ -1,17 +1,53 @@
-import jwt
-
 from datetime import datetime, timezone
 
-from .database import db
-from sqlalchemy import Column, String, Integer, DateTime, Boolean
+from .database import db, EVENT_SEARCH_VECTOR
+from sqlalchemy import Column, Computed, String, Integer, BigInteger, Date, DateTime, Time, Boolean, JSON, func, text
+from sqlalchemy.dialects.postgresql import TSVECTOR
+
+# Row tuple serializer, list endpoints select FORMAT_FIELDS as plain columns
+# and skip building full model objects, the output matches format()
+# COMPACT_FIELDS are the attributes the frontend uses, for compact=1 responses
+class RowFormatMixin:
+    FORMAT_FIELDS = ()
+    COMPACT_FIELDS = ()
+
+    @classmethod
+    def format_columns(cls):
+        return [getattr(cls, attr) for _, attr in cls.FORMAT_FIELDS]
+
+    @classmethod
+    def format_rows(cls, rows):
+        keys = tuple(key for key, _ in cls.FORMAT_FIELDS)
+        return [dict(zip(keys, row)) for row in rows]
+
+    @classmethod
+    def compact_columns(cls):
+        return [getattr(cls, attr) for attr in cls.COMPACT_FIELDS]
 
 # Attendance records, once the card reader read a id then store it to this table as raw data
-class AttendanceRecords(db.Model):
+class AttendanceRecords(RowFormatMixin, db.Model):
     __tablename__ = 'attendance_records'
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, db.ForeignKey('users.id'), nullable=False)
-    timestamp = Column(DateTime, default=datetime.now(timezone.utc))
+    # An instant, the local day is derived from the user's or the site timezone
+    timestamp = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    # Reader and sequence number of a punch from the ingest channel, NULL over HTTP
+    reader_id = Column(BigInteger, nullable=True)
+    reader_seq = Column(BigInteger, nullable=True)
+
+    FORMAT_FIELDS = (('id', 'id'), ('user_id', 'user_id'), ('timestamp', 'timestamp'))
+
+    # Range scans of one user's punches, the keyset pages of the raw history,
+    # and the idempotency key of the ingest channel, a resent punch is skipped
+    __table_args__ = (
+        db.Index('ix_attendance_records_user_timestamp', 'user_id', 'timestamp'),
+        db.Index('ix_attendance_records_timestamp_id', 'timestamp', 'id'),
+        db.Index(
+            'uq_attendance_records_reader_seq', 'reader_id', 'reader_seq', 'timestamp',
+            unique=True, postgresql_where=text('reader_id IS NOT NULL')
+        ),
+    )
 
     def __init__(self, user_id, timestamp):
         self.user_id = user_id
@@ -36,18 +72,35 @@ class AttendanceRecords(db.Model):
         })
     
 # Events, used to store event's info
-class Events(db.Model):
+class Events(RowFormatMixin, db.Model):
     __tablename__ = 'events'
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     name = Column(String(50), nullable=False)
     desc = Column(String(250), nullable=True)
     date = Column(DateTime(timezone=True), nullable=False)
+    # RRULE of a recurring event, date is its first occurrence
+    rrule = Column(String(500), nullable=True)
+    # Last occurrence of the series, resolved from COUNT or UNTIL, empty if endless
+    until = Column(DateTime(timezone=True), nullable=True)
+    # Full text of name and desc for /api/search, generated, never loaded with the event
+    search_vector = db.deferred(Column(TSVECTOR, Computed(EVENT_SEARCH_VECTOR, persisted=True)))
+
+    exceptions = db.relationship('EventExceptions', backref='event', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
 
-    def __init__(self, name, desc, date):
+    FORMAT_FIELDS = (('id', 'id'), ('name', 'name'), ('desc', 'desc'), ('date', 'date'), ('rrule', 'rrule'))
+    COMPACT_FIELDS = ('id', 'name', 'desc', 'date')
+
+    __table_args__ = (
+        db.Index('ix_events_search_vector', 'search_vector', postgresql_using='gin'),
+    )
+
+    def __init__(self, name, desc, date, rrule=None, until=None):
         self.name = name
         self.desc = desc
         self.date = date
+        self.rrule = rrule
+        self.until = until
 
     def insert(self):
         db.session.add(self)
@@ -65,11 +118,40 @@ class Events(db.Model):
             "id": self.id,
             "name": self.name,
             "desc": self.desc,
-            "date": self.date
+            "date": self.date,
+            "rrule": self.rrule
         }
+
+# Exceptions of a recurring event, one per changed occurrence
+# occurrence is the original date of the occurrence, date its new date if moved
+class EventExceptions(db.Model):
+    __tablename__ = 'event_exceptions'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    event_id = Column(Integer, db.ForeignKey('events.id', ondelete='CASCADE'), nullable=False)
+    occurrence = Column(DateTime(timezone=True), nullable=False)
+    cancelled = Column(Boolean, nullable=False, default=False)
+    name = Column(String(50), nullable=True)
+    desc = Column(String(250), nullable=True)
+    date = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        db.UniqueConstraint('event_id', 'occurrence', name='uq_event_exception_occurrence'),
+    )
+
+    def format(self):
+        return ({
+            'id': self.id,
+            'event_id': self.event_id,
+            'occurrence': self.occurrence,
+            'cancelled': self.cancelled,
+            'name': self.name,
+            'desc': self.desc,
+            'date': self.date,
+        })
         
 # Users modal, used to store some base info
-class Users(db.Model):
+class Users(RowFormatMixin, db.Model):
     __tablename__ = 'users'
 
     id = Column(Integer, primary_key=True, autoincrement=True)
@@ -79,9 +161,24 @@ class Users(db.Model):
     position = Column(String(100), nullable=False)
     department = Column(String(50))
     is_active = Column(Boolean, default=True) 
+    # IANA timezone of the user, the site timezone when empty
+    timezone = Column(String(64), nullable=True)
 
     attendance_records = db.relationship('AttendanceRecords', backref='user', lazy=True)
 
+    # The user listing only reads the active users, ordered by username,
+    # the deactivated ones don't grow the index it scans
+    __table_args__ = (
+        db.Index('ix_users_active_username', 'username', postgresql_where=text('is_active')),
+    )
+
+    FORMAT_FIELDS = (
+        ('id', 'id'), ('auth0_id', 'auth0_id'), ('username', 'username'), ('email', 'email'),
+        ('position', 'position'), ('department', 'department'), ('isActive', 'is_active'),
+        ('timezone', 'timezone'),
+    )
+    COMPACT_FIELDS = ('id', 'username', 'department', 'position')
+
     def __init__(self, auth0_id, username, email, position='', department=None, id=None, is_active=True):
         if id is not None:
             self.id = id
@@ -111,8 +208,235 @@ class Users(db.Model):
             'position': self.position,
             'department': self.department,
             'isActive': self.is_active,
+            'timezone': self.timezone,
+        })
+    
+# Cards, map the card uid read by the card reader to a user
+# A uid can be reassigned, so each row has its own validity window
+class Cards(db.Model):
+    __tablename__ = 'cards'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    card_uid = Column(String(64), nullable=False, index=True)
+    user_id = Column(Integer, db.ForeignKey('users.id'), nullable=False)
+    valid_from = Column(DateTime, nullable=True)
+    valid_until = Column(DateTime, nullable=True)
+    is_active = Column(Boolean, default=True)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), index=True)
+
+    user = db.relationship('Users', backref=db.backref('cards', lazy=True))
+
+    def __init__(self, card_uid, user_id, valid_from=None, valid_until=None, is_active=True):
+        self.card_uid = card_uid
+        self.user_id = user_id
+        self.valid_from = valid_from
+        self.valid_until = valid_until
+        self.is_active = is_active
+
+    def insert(self):
+        db.session.add(self)
+        db.session.commit()
+    
+    def update(self):
+        db.session.commit()
+    
+    def delete(self):
+        db.session.delete(self)
+        db.session.commit()
+
+    def format(self):
+        return ({
+            'id': self.id,
+            'card_uid': self.card_uid,
+            'user_id': self.user_id,
+            'valid_from': self.valid_from,
+            'valid_until': self.valid_until,
+            'isActive': self.is_active,
+        })
+    
+# Shifts, the working hours a punch is matched against
+# An end_time before the start_time ends on the next day (night shift)
+class Shifts(db.Model):
+    __tablename__ = 'shifts'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    name = Column(String(50), unique=True, nullable=False)
+    start_time = Column(Time, nullable=False)
+    end_time = Column(Time, nullable=False)
+    break_minutes = Column(Integer, nullable=False, default=0)
+    grace_minutes = Column(Integer, nullable=False, default=0)
+    # ISO weekday digits, '12345' is Monday to Friday
+    weekdays = Column(String(7), nullable=False, default='12345')
+
+    def __init__(self, name, start_time, end_time, break_minutes=0, grace_minutes=0, weekdays='12345'):
+        self.name = name
+        self.start_time = start_time
+        self.end_time = end_time
+        self.break_minutes = break_minutes
+        self.grace_minutes = grace_minutes
+        self.weekdays = weekdays
+
+    def insert(self):
+        db.session.add(self)
+        db.session.commit()
+    
+    def update(self):
+        db.session.commit()
+    
+    def delete(self):
+        db.session.delete(self)
+        db.session.commit()
+
+    def format(self):
+        return ({
+            'id': self.id,
+            'name': self.name,
+            'start_time': self.start_time.strftime('%H:%M'),
+            'end_time': self.end_time.strftime('%H:%M'),
+            'break_minutes': self.break_minutes,
+            'grace_minutes': self.grace_minutes,
+            'weekdays': self.weekdays,
         })
+
+# Shift assignments, to a user or to a whole department, from start_date to end_date (included)
+# A user assignment overrides the department ones, rotations are consecutive assignments
+class ShiftAssignments(db.Model):
+    __tablename__ = 'shift_assignments'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    shift_id = Column(Integer, db.ForeignKey('shifts.id', ondelete='CASCADE'), nullable=False)
+    user_id = Column(Integer, db.ForeignKey('users.id'), nullable=True, index=True)
+    department = Column(String(50), nullable=True, index=True)
+    start_date = Column(Date, nullable=False)
+    end_date = Column(Date, nullable=True)
+
+    shift = db.relationship('Shifts', backref=db.backref('assignments', lazy=True, passive_deletes=True))
+
+    __table_args__ = (
+        db.CheckConstraint('user_id IS NOT NULL OR department IS NOT NULL', name='ck_shift_assignment_target'),
+    )
+
+    def __init__(self, shift_id, start_date, end_date=None, user_id=None, department=None):
+        self.shift_id = shift_id
+        self.start_date = start_date
+        self.end_date = end_date
+        self.user_id = user_id
+        self.department = department
+
+    def insert(self):
+        db.session.add(self)
+        db.session.commit()
     
+    def delete(self):
+        db.session.delete(self)
+        db.session.commit()
+
+    def format(self):
+        return ({
+            'id': self.id,
+            'shift_id': self.shift_id,
+            'user_id': self.user_id,
+            'department': self.department,
+            'start_date': self.start_date.isoformat(),
+            'end_date': self.end_date.isoformat() if self.end_date else None,
+        })
+
+# Monthly attendance statistics, one row per (scope, month)
+# scope is 'user' or 'department', data the list of entries of that scope.
+# computed_at is naive site time, like the month bounds it is compared with
+class AttendanceStatistics(db.Model):
+    __tablename__ = 'attendance_statistics'
+
+    scope = Column(String(20), primary_key=True)
+    month = Column(String(7), primary_key=True)
+    data = Column(JSON, nullable=False)
+    computed_at = Column(DateTime, nullable=False)
+
+    def format(self):
+        return ({
+            'scope': self.scope,
+            'month': self.month,
+            'computedAt': self.computed_at,
+            'data': self.data,
+        })
+
+# Months of attendance_records moved to the archive by `flask archive_attendance`
+# path is the directory of the month's columns, a new one on every re-archive
+class AttendanceArchives(db.Model):
+    __tablename__ = 'attendance_archives'
+
+    month = Column(String(7), primary_key=True)
+    path = Column(String(255), nullable=False)
+    row_count = Column(Integer, nullable=False)
+    archived_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    def format(self):
+        return ({
+            'month': self.month,
+            'path': self.path,
+            'rowCount': self.row_count,
+            'archivedAt': self.archived_at,
+        })
+
+# Auth0 users mirror, filled by `flask sync_auth0_users`
+# The Auth0 timestamps are kept as the ISO strings Auth0 sends, they sort like the time
+class Auth0Users(db.Model):
+    __tablename__ = 'auth0_users'
+
+    auth0_id = Column(String(100), primary_key=True)
+    email = Column(String(255))
+    name = Column(String(255))
+    nickname = Column(String(255))
+    picture = Column(String(500))
+    created_at = Column(String(40))
+    last_login = Column(String(40))
+    logins_count = Column(Integer)
+    updated_at = Column(String(40), index=True)
+    synced_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+    def format(self):
+        return ({
+            'auth0_id': self.auth0_id,
+            'email': self.email,
+            'name': self.name,
+            'nickname': self.nickname,
+            'picture': self.picture,
+            'created_at': self.created_at,
+            'last_login': self.last_login,
+            'logins_count': self.logins_count,
+        })
+
+# Auth0 roles mirror
+class Auth0Roles(db.Model):
+    __tablename__ = 'auth0_roles'
+
+    id = Column(String(50), primary_key=True)
+    name = Column(String(100), nullable=False)
+    description = Column(String(255))
+
+    def format(self):
+        return ({
+            'id': self.id,
+            'name': self.name,
+            'description': self.description or '',
+        })
+
+# Auth0 role assignments mirror, no foreign keys since the roles
+# and the users are synced separately
+class Auth0UserRoles(db.Model):
+    __tablename__ = 'auth0_user_roles'
+
+    auth0_id = Column(String(100), primary_key=True)
+    role_id = Column(String(50), primary_key=True, index=True)
+
+# Sync state of the mirror tables, one row per sync job
+class Auth0SyncState(db.Model):
+    __tablename__ = 'auth0_sync_state'
+
+    name = Column(String(50), primary_key=True)
+    watermark = Column(String(40))
+    synced_at = Column(DateTime)
+
 # Group model, used to store group's data
 # class Groups(db.Model):
 #     __tablename__ = 'groups'
@@ -5,7 +5,8 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-API_ENDPOINT = os.getenv('API_ENDPOINT') + "/api/attendance"
+API_URL = os.getenv('API_ENDPOINT', 'http://localhost:8080')
+API_ENDPOINT = API_URL + "/api/attendance"
 ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
 
 running = True
@@ -16,47 +17,60 @@ def signal_handler(sig, frame):
     print("Stopping...")
     running = False
 
-# Once read a card, then send the id to db as raw data
-def handle_card_read(user_input):
-    current_time = datetime.now()
-    print("ID:", user_input, ", DateStamp:", current_time)
-    
+# Once read a card, then send the id to db as raw data.
+# Returns the response status code, None if the server couldn't be reached.
+# The simulator passes its own endpoint, token and session, and no output.
+def handle_card_read(user_input, endpoint=API_ENDPOINT, token=None, session=requests, verbose=True):
+    log = print if verbose else lambda *args: None
+
+    # With the local offset, the backend stores instants
+    current_time = datetime.now().astimezone()
+    log("ID:", user_input, ", DateStamp:", current_time)
+
     timestamp_str = current_time.isoformat()
-    
+
+    # The backend maps the card uid to a user through the cards table
     payload = json.dumps({
-        "user_id": user_input, 
+        "card_id": user_input,
         "timestamp": timestamp_str
     })
 
     headers = {
         'Content-Type': 'application/json',
-        'Authorization': f'Bearer {ADMIN_TOKEN}'
+        'Authorization': f'Bearer {token or ADMIN_TOKEN}'
     }
-    
+
     try:
-        response = requests.post(API_ENDPOINT, data=payload, headers=headers)
-        print(f"Response status: {response.status_code}")
-        print(f"Response content: {response.text}")
+        response = session.post(endpoint, data=payload, headers=headers)
+        log(f"Response status: {response.status_code}")
+        log(f"Response content: {response.text}")
         if response.status_code == 200 or response.status_code == 201:
-            print("Successfully")
+            log("Successfully")
         else:
-            print(f"Failed to send to server. Status code: {response.status_code}")
+            log(f"Failed to send to server. Status code: {response.status_code}")
+        return response.status_code
     except requests.exceptions.RequestException as e:
-        print(f"Error sending request: {e}")
+        log(f"Error sending request: {e}")
+        return None
 
 # Detect the user signal input, also "quit" is acceptable
-signal.signal(signal.SIGINT, signal_handler)
-try:
-    while running:
-        user_input = input("ID Card: ")
-        if user_input.lower() == 'quit':
-            break
-        if user_input:
-            handle_card_read(user_input)
-
-except Exception as e:
-    print(f"Error: {e}")
-finally:
-    print("Program exit. Close connection.")
-
-print("End of program.")
\ No newline at end of file
+def main():
+    signal.signal(signal.SIGINT, signal_handler)
+    try:
+        while running:
+            user_input = input("ID Card: ")
+            if user_input.lower() == 'quit':
+                break
+            if user_input:
+                handle_card_read(user_input)
+
+    except Exception as e:
+        print(f"Error: {e}")
+    finally:
+        print("Program exit. Close connection.")
+
+    print("End of program.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+import argparse, os, random, socket, statistics, subprocess, sys, threading, time
+
+from collections import Counter
+
+import requests
+
+from .cardreader import API_URL, handle_card_read
+
+# Headless card readers for soak tests. Each virtual reader is a thread
+# swiping cards through handle_card_read, the code path of a real reader,
+# on its own HTTP session. Swipes follow a schedule of (seconds, swipes per
+# second of one reader) phases, with random (Poisson) gaps between them.
+#
+#   python -m app.reader.simulator --readers 200 --stub-auth
+#   python -m app.reader.simulator --readers 50 --schedule 60:0.1 --api https://attendance.example.com
+#
+# --stub-auth starts a local backend with gunicorn (database settings from
+# the environment / .env) trusting a local JWKS stub, and gives every reader
+# its own token. Otherwise the readers post to --api with ADMIN_TOKEN.
+
+# Quiet time, then the whole shift badging in within minutes, twice
+SHIFT_CHANGE_SCHEDULE = [(30, 0.02), (20, 0.5), (30, 0.02), (20, 0.5)]
+
+# "30:0.02,20:0.5" -> [(30.0, 0.02), (20.0, 0.5)]
+def parse_schedule(text):
+    if text == 'shift-change':
+        return SHIFT_CHANGE_SCHEDULE
+    try:
+        schedule = [tuple(float(value) for value in phase.split(':')) for phase in text.split(',')]
+    except ValueError:
+        raise ValueError(f'Invalid schedule {text}, expected seconds:rate phases separated by commas')
+    if any(len(phase) != 2 or phase[0] <= 0 or phase[1] < 0 for phase in schedule):
+        raise ValueError(f'Invalid schedule {text}, expected seconds:rate phases separated by commas')
+    return schedule
+
+
+class ReaderSimulator:
+    def __init__(self, readers, schedule, cards, endpoint, tokens=None, read=handle_card_read):
+        self.readers = readers
+        self.schedule = schedule
+        self.cards = cards
+        self.endpoint = endpoint
+        # One token per reader, None uses the ADMIN_TOKEN of cardreader
+        self.tokens = tokens or [None] * readers
+        self.read = read
+        self._lock = threading.Lock()
+        self.latencies = [[] for _ in schedule]
+        self.statuses = [Counter() for _ in schedule]
+
+    def run(self):
+        started = time.monotonic()
+        threads = [threading.Thread(target=self._run_reader, args=(reader, started), daemon=True) for reader in range(self.readers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return self.report()
+
+    def _run_reader(self, reader, started):
+        session = requests.Session()
+        phase_start = started
+        for phase, (seconds, rate) in enumerate(self.schedule):
+            phase_end = phase_start + seconds
+            if rate > 0:
+                next_at = max(phase_start, time.monotonic()) + random.expovariate(rate)
+                while next_at < phase_end:
+                    time.sleep(max(0, next_at - time.monotonic()))
+                    self._swipe(reader, phase, session)
+                    # A reader behind schedule swipes again at once, like a queue at the door
+                    next_at += random.expovariate(rate)
+            time.sleep(max(0, phase_end - time.monotonic()))
+            phase_start = phase_end
+
+    def _swipe(self, reader, phase, session):
+        started = time.perf_counter()
+        status = self.read(random.choice(self.cards), endpoint=self.endpoint, token=self.tokens[reader], session=session, verbose=False)
+        latency = time.perf_counter() - started
+        with self._lock:
+            self.latencies[phase].append(latency)
+            self.statuses[phase][status or 'unreachable'] += 1
+
+    # One row per phase: swipes, swipes per second, accepted, statuses, latencies in seconds
+    def report(self):
+        rows = []
+        for (seconds, rate), latencies, statuses in zip(self.schedule, self.latencies, self.statuses):
+            quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else [max(latencies, default=0)] * 99
+            rows.append({
+                'seconds': seconds,
+                'target': rate * self.readers,
+                'swipes': len(latencies),
+                'throughput': len(latencies) / seconds,
+                'accepted': statuses[200] + statuses[201],
+                'statuses': dict(statuses),
+                'p50': quantiles[49],
+                'p99': quantiles[98],
+                'max': max(latencies, default=0),
+            })
+        return rows
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+# gunicorn serving the app on a free port, trusting the tokens of the JWKS stub
+def start_backend(stub, args):
+    from .stub_auth import STUB_ENV, jwks_url
+
+    port = free_port()
+    env = {
+        **os.environ,
+        **STUB_ENV,
+        'AUTH0_JWKS_URL': jwks_url(stub),
+        'GUNICORN_BIND': f'127.0.0.1:{port}',
+        'GUNICORN_WORKERS': str(args.workers),
+        'GUNICORN_THREADS': str(args.threads),
+        # The default cards are the numeric user ids
+        **({} if args.cards else {'CARD_LEGACY_USER_ID': 'true'}),
+    }
+    backend_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app.main:create_app()'],
+        cwd=backend_dir, env=env
+    )
+
+    url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            requests.get(f'{url}/api/login-callback?state=simulator', allow_redirects=False, timeout=1)
+            return process, url
+        except requests.ConnectionError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError('The backend did not start')
+
+
+def print_report(rows, readers):
+    print(f"{readers} readers")
+    for phase, row in enumerate(rows, 1):
+        print(
+            f"phase {phase}: {row['seconds']:5.0f}s  target {row['target']:7.1f}/s  swipes {row['swipes']:6}  "
+            f"{row['throughput']:7.1f}/s  accepted {row['accepted']:6}  p50 {row['p50'] * 1000:7.1f} ms  "
+            f"p99 {row['p99'] * 1000:7.1f} ms  max {row['max'] * 1000:7.1f} ms  statuses {row['statuses']}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--readers', type=int, default=100)
+    parser.add_argument('--schedule', default='shift-change', help='seconds:swipes per second of a reader, comma separated, or shift-change')
+    parser.add_argument('--cards', default='', help='comma separated card uids, the numeric uids 1..--users by default (server with CARD_LEGACY_USER_ID=true)')
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--api', default=API_URL)
+    parser.add_argument('--stub-auth', action='store_true')
+    parser.add_argument('--workers', type=int, default=int(os.getenv('GUNICORN_WORKERS', 1)))
+    parser.add_argument('--threads', type=int, default=int(os.getenv('GUNICORN_THREADS', 2)))
+    args = parser.parse_args()
+
+    schedule = parse_schedule(args.schedule)
+    cards = args.cards.split(',') if args.cards else [str(user_id) for user_id in range(1, args.users + 1)]
+
+    tokens, process, url = None, None, args.api
+    if args.stub_auth:
+        from .stub_auth import make_keys, start_jwks_stub
+
+        jwks, sign = make_keys()
+        stub = start_jwks_stub(jwks)
+        # One client per reader, like a deployed fleet, for the per-client rate limits
+        tokens = [sign(f'reader|{reader}', ['post:attendance']) for reader in range(args.readers)]
+        process, url = start_backend(stub, args)
+
+    try:
+        simulator = ReaderSimulator(args.readers, schedule, cards, url + '/api/attendance', tokens)
+        print_report(simulator.run(), args.readers)
+    finally:
+        if process:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == '__main__':
+    main()
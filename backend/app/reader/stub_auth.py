@@ -0,0 +1,67 @@
+import json, threading, time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Local stand-in for the Auth0 tenant, for the simulator and the benchmarks.
+# A backend started with STUB_ENV and AUTH0_JWKS_URL pointing at the stub
+# accepts the tokens signed here. Needs the rsa package (python-jose's backend).
+STUB_AUDIENCE = 'https://attendance.local'
+STUB_DOMAIN = 'stub.auth0.local'
+STUB_KID = 'stub-key'
+STUB_ENV = {
+    'AUTH0_APP_DOMAIN': STUB_DOMAIN,
+    'AUTH0_API_AUDIENCE': STUB_AUDIENCE,
+    'ALGORITHMS': 'RS256',
+}
+
+# -> (jwks, sign), sign(sub, permissions) returns a token valid for an hour
+def make_keys():
+    import rsa
+    from jose import jwk, jwt
+
+    public_key, private_key = rsa.newkeys(2048)
+    jwks = {'keys': [{**jwk.construct(public_key.save_pkcs1().decode(), 'RS256').to_dict(), 'kid': STUB_KID, 'use': 'sig'}]}
+    private_pem = private_key.save_pkcs1().decode()
+
+    def sign(sub, permissions=()):
+        return jwt.encode(
+            {'sub': sub, 'aud': STUB_AUDIENCE, 'iss': f'https://{STUB_DOMAIN}/', 'exp': int(time.time()) + 3600, 'permissions': list(permissions)},
+            private_pem, algorithm='RS256', headers={'kid': STUB_KID}
+        )
+
+    return jwks, sign
+
+# Serves the JWKS after latency seconds on a free port. The handler class
+# counts the calls it answers at once, the peak in RequestHandlerClass.peak.
+def start_jwks_stub(jwks, latency=0):
+    body = json.dumps(jwks).encode()
+
+    class StubJwksHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        current = 0
+        peak = 0
+        lock = threading.Lock()
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            with self.lock:
+                StubJwksHandler.current += 1
+                StubJwksHandler.peak = max(StubJwksHandler.peak, StubJwksHandler.current)
+            time.sleep(latency)
+            with self.lock:
+                StubJwksHandler.current -= 1
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubJwksHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def jwks_url(server):
+    return f'http://127.0.0.1:{server.server_address[1]}/.well-known/jwks.json'
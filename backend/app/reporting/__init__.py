@@ -0,0 +1,13 @@
+from .schedules import ShiftSchedules, shift_schedules
+from .timezones import get_zone, is_valid_timezone, user_timezone, local_midnight, local_day_bounds, local_time, local_day, as_aware, to_local_seconds
+from .archive import AttendanceArchive, attendance_archive, ATTENDANCE_RETENTION_MONTHS
+from .statistics import AttendanceStatisticsService, attendance_statistics, month_bounds, SCOPES, USER_FIELDS, DEPARTMENT_FIELDS
+
+__all__ = [
+    'AttendanceStatisticsService', 'attendance_statistics', 'month_bounds',
+    'SCOPES', 'USER_FIELDS', 'DEPARTMENT_FIELDS',
+    'ShiftSchedules', 'shift_schedules',
+    'get_zone', 'is_valid_timezone', 'user_timezone', 'local_midnight', 'local_day_bounds',
+    'local_time', 'local_day', 'as_aware', 'to_local_seconds',
+    'AttendanceArchive', 'attendance_archive', 'ATTENDANCE_RETENTION_MONTHS',
+]
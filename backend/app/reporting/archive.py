@@ -0,0 +1,213 @@
+import os, shutil, threading, time
+
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+from sqlalchemy import BigInteger, delete, func
+
+from ..models import AttendanceRecords, AttendanceArchives, db
+from .timezones import get_zone, local_midnight, local_time
+
+# Directory of the archived months, relative to the working directory
+ATTENDANCE_ARCHIVE_DIR = os.getenv('ATTENDANCE_ARCHIVE_DIR', 'archive')
+# Months kept in attendance_records, the current one included
+ATTENDANCE_RETENTION_MONTHS = int(os.getenv('ATTENDANCE_RETENTION_MONTHS', 13))
+
+COLUMN_FILES = ('users', 'offsets', 'timestamps')
+
+# Punches of an archived month in CSR layout: sorted distinct user ids, the
+# position of each user's first punch in timestamps (offsets has one more
+# entry, the total) and the punch times as UTC epoch microseconds, sorted
+# by user then time.
+ArchiveColumns = namedtuple('ArchiveColumns', COLUMN_FILES)
+
+# (user_ids, timestamps) in any order -> ArchiveColumns
+def pack_punches(user_ids, timestamps):
+    import numpy as np
+
+    user_ids = np.asarray(user_ids, dtype=np.int64)
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    order = np.lexsort((timestamps, user_ids))
+    user_ids, timestamps = user_ids[order], timestamps[order]
+
+    users, starts = np.unique(user_ids, return_index=True)
+    offsets = np.r_[starts, user_ids.size].astype(np.int64)
+    return ArchiveColumns(users, offsets, timestamps)
+
+# ArchiveColumns -> (user_ids, timestamps), one entry per punch
+def unpack_punches(columns):
+    import numpy as np
+
+    return np.repeat(columns.users, np.diff(columns.offsets)), np.asarray(columns.timestamps)
+
+# Sorted punch times of one user in [start, end), None is unbounded
+def user_slice(columns, user_id, start=None, end=None):
+    import numpy as np
+
+    row = np.searchsorted(columns.users, user_id)
+    if row == columns.users.size or columns.users[row] != user_id:
+        return np.zeros(0, dtype=np.int64)
+
+    punches = columns.timestamps[columns.offsets[row]:columns.offsets[row + 1]]
+    first = np.searchsorted(punches, start) if start is not None else 0
+    last = np.searchsorted(punches, end) if end is not None else punches.size
+    return np.array(punches[first:last])
+
+def write_columns(path, columns):
+    import numpy as np
+
+    os.makedirs(path)
+    for name in COLUMN_FILES:
+        with open(os.path.join(path, f'{name}.npy'), 'wb') as file:
+            np.save(file, getattr(columns, name))
+            file.flush()
+            os.fsync(file.fileno())
+
+# Memory-mapped, the pages are only read when a user's slice is touched
+def read_columns(path):
+    import numpy as np
+
+    return ArchiveColumns(*(np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r') for name in COLUMN_FILES))
+
+def epoch_microseconds(value):
+    return int(value.timestamp()) * 1_000_000 + value.microsecond
+
+# Cold attendance history.
+# Closed site months older than ATTENDANCE_RETENTION_MONTHS are moved out of
+# attendance_records into one directory of .npy columns per month, listed in
+# attendance_archives. Rows and manifest change in one transaction, so a
+# reader sees a punch either in the table or in the archive.
+class AttendanceArchive:
+    def __init__(self, directory=ATTENDANCE_ARCHIVE_DIR):
+        self.directory = directory
+        self._columns = {}
+        self._lock = threading.Lock()
+
+    # Months with punches left in the table before the retention window
+    def archivable_months(self, retention_months=ATTENDANCE_RETENTION_MONTHS):
+        month = func.to_char(local_time(AttendanceRecords.timestamp), 'YYYY-MM')
+        rows = db.session.query(month).filter(
+            AttendanceRecords.timestamp < self.retention_start(retention_months)
+        ).distinct().order_by(month).all()
+        return [row[0] for row in rows]
+
+    # Site midnight of the first day of the oldest month kept in the table
+    def retention_start(self, retention_months):
+        today = datetime.now(get_zone()).date()
+        month_index = today.year * 12 + today.month - max(retention_months, 1)
+        return local_midnight(date(month_index // 12, month_index % 12 + 1, 1))
+
+    # Moves the punches of a site month to the archive, merged with the ones
+    # archived before. The files are built from the rows the DELETE returns,
+    # a punch committed meanwhile is either deleted and archived or left in
+    # the table. Raises ValueError for a month inside the retention window.
+    # Returns the number of punches moved.
+    def archive_month(self, month, retention_months=ATTENDANCE_RETENTION_MONTHS):
+        import numpy as np
+
+        start, end = self.month_range(month)
+        if end > self.retention_start(retention_months):
+            raise ValueError(f'{month} is inside the retention window of {retention_months} months')
+
+        path = None
+        try:
+            rows = db.session.execute(
+                delete(AttendanceRecords)
+                .where(AttendanceRecords.timestamp >= start, AttendanceRecords.timestamp < end)
+                .returning(
+                    AttendanceRecords.user_id,
+                    (func.extract('epoch', AttendanceRecords.timestamp) * 1_000_000).cast(BigInteger)
+                )
+                .execution_options(synchronize_session=False)
+            ).all()
+            if not rows:
+                db.session.rollback()
+                return 0
+
+            punches = np.array(rows, dtype=np.int64).reshape(-1, 2)
+            user_ids, timestamps = punches[:, 0], punches[:, 1]
+
+            manifest = db.session.get(AttendanceArchives, month)
+            if manifest is not None:
+                archived_users, archived_timestamps = unpack_punches(self.columns(manifest.path))
+                user_ids = np.r_[archived_users, user_ids]
+                timestamps = np.r_[archived_timestamps, timestamps]
+
+            # A new directory per version, readers of the previous one are never cut off
+            path = os.path.join(self.directory, f'{month}.{time.time_ns()}')
+            columns = pack_punches(user_ids, timestamps)
+            write_columns(path, columns)
+
+            previous = manifest.path if manifest is not None else None
+            if manifest is None:
+                manifest = AttendanceArchives(month=month, path=path, row_count=0)
+                db.session.add(manifest)
+            manifest.path = path
+            manifest.row_count = int(columns.timestamps.size)
+            manifest.archived_at = func.now()
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            if path is not None:
+                shutil.rmtree(path, ignore_errors=True)
+            raise
+
+        if previous:
+            self.forget(previous)
+            shutil.rmtree(previous, ignore_errors=True)
+        return len(rows)
+
+    # [start, end) instants of a site month 'YYYY-MM', raises ValueError
+    def month_range(self, month):
+        first_day = datetime.strptime(month, '%Y-%m').date()
+        next_month = (first_day + timedelta(days=32)).replace(day=1)
+        return local_midnight(first_day), local_midnight(next_month)
+
+    # Manifest rows of the site months overlapping [start, end), None is unbounded
+    def manifests(self, start=None, end=None):
+        query = AttendanceArchives.query
+        if start is not None:
+            query = query.filter(AttendanceArchives.month >= start.astimezone(get_zone()).strftime('%Y-%m'))
+        if end is not None:
+            query = query.filter(AttendanceArchives.month <= (end - timedelta(microseconds=1)).astimezone(get_zone()).strftime('%Y-%m'))
+        return query.order_by(AttendanceArchives.month).all()
+
+    def columns(self, path):
+        with self._lock:
+            columns = self._columns.get(path)
+            if columns is None:
+                columns = self._columns[path] = read_columns(path)
+            return columns
+
+    def forget(self, path):
+        with self._lock:
+            self._columns.pop(path, None)
+
+    # Archived punch times of a user in [start, end) as UTC epoch seconds, sorted
+    def user_punches(self, user_id, start=None, end=None):
+        import numpy as np
+
+        start_us = epoch_microseconds(start) if start is not None else None
+        end_us = epoch_microseconds(end) if end is not None else None
+        slices = [
+            user_slice(self.columns(manifest.path), user_id, start_us, end_us)
+            for manifest in self.manifests(start, end)
+        ]
+        if not slices:
+            return np.zeros(0, dtype=np.int64)
+        return np.concatenate(slices) // 1_000_000
+
+    # Archived punches of every user in [start, end) as (user_ids, UTC epoch seconds)
+    def punches(self, start, end):
+        import numpy as np
+
+        start_us, end_us = epoch_microseconds(start), epoch_microseconds(end)
+        user_ids, timestamps = [np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.int64)]
+        for manifest in self.manifests(start, end):
+            month_users, month_timestamps = unpack_punches(self.columns(manifest.path))
+            kept = (month_timestamps >= start_us) & (month_timestamps < end_us)
+            user_ids.append(month_users[kept])
+            timestamps.append(month_timestamps[kept] // 1_000_000)
+        return np.concatenate(user_ids), np.concatenate(timestamps)
+
+
+attendance_archive = AttendanceArchive()
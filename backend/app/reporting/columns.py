@@ -0,0 +1,44 @@
+import io, struct
+
+from ..models import db
+
+# COPY binary framing: signature, flags and header extension length, then per
+# row a field count and each field as its length and big endian value
+COPY_SIGNATURE = b'PGCOPY\n\xff\r\n\x00'
+COPY_HEADER = struct.Struct('!11sII')
+COPY_TRAILER = b'\xff\xff'
+
+# Binary COPY output of bigint columns -> one int64 array per column.
+# Every row has the same size, so they are read as one structured array
+# instead of being parsed field by field. Raises ValueError on a NULL.
+def parse_binary_copy(data, column_count):
+    import numpy as np
+
+    signature, _, extension_length = COPY_HEADER.unpack_from(data)
+    if signature != COPY_SIGNATURE:
+        raise ValueError('Not a binary COPY output')
+    body = data[COPY_HEADER.size + extension_length:]
+    if not body.endswith(COPY_TRAILER):
+        raise ValueError('Truncated binary COPY output')
+
+    fields = [('count', '>i2')]
+    for position in range(column_count):
+        fields += [(f'length{position}', '>i4'), (f'value{position}', '>i8')]
+    rows = np.frombuffer(body[:-len(COPY_TRAILER)], dtype=np.dtype(fields))
+
+    if (rows['count'] != column_count).any() or any((rows[f'length{position}'] != 8).any() for position in range(column_count)):
+        raise ValueError('Only non-NULL bigint columns can be copied')
+    return tuple(rows[f'value{position}'].astype(np.int64) for position in range(column_count))
+
+# Rows of a query selecting bigint columns -> one int64 array per column.
+# Streamed with COPY ... TO STDOUT (FORMAT binary) on the session's
+# connection, no Python object is built per row.
+def copy_columns(query):
+    connection = db.session.connection()
+    compiled = query.statement.compile(dialect=connection.dialect)
+    buffer = io.BytesIO()
+    with connection.connection.cursor() as cursor:
+        sql = cursor.mogrify(str(compiled), compiled.params).decode()
+        cursor.copy_expert(f'COPY ({sql}) TO STDOUT WITH (FORMAT binary)', buffer)
+
+    return parse_binary_copy(buffer.getvalue(), len(query.column_descriptions))
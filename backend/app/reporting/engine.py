@@ -0,0 +1,31 @@
+import numpy as np
+
+from collections import namedtuple
+
+SECONDS_PER_DAY = 86400
+
+# Per user statistics of a month, every field is an array aligned on user_ids
+MonthlyStats = namedtuple('MonthlyStats', [
+    'user_ids', 'days_present', 'check_in_seconds', 'total_seconds', 'late_arrivals', 'early_departures'
+])
+# Same totals summed by group, users is the number of users of each group
+GroupStats = namedtuple('GroupStats', [
+    'users', 'days_present', 'check_in_seconds', 'total_seconds', 'late_arrivals', 'early_departures'
+])
+
+# Sums the per user statistics by group (department), group_codes gives the
+# group of each user of stats, from 0 to group_count - 1
+def aggregate_stats(stats, group_codes, group_count):
+    group_codes = np.asarray(group_codes, dtype=np.int64)
+
+    def total(values):
+        return np.bincount(group_codes, weights=values, minlength=group_count).astype(np.int64)
+
+    return GroupStats(
+        users=np.bincount(group_codes, minlength=group_count),
+        days_present=total(stats.days_present),
+        check_in_seconds=total(stats.check_in_seconds),
+        total_seconds=total(stats.total_seconds),
+        late_arrivals=total(stats.late_arrivals),
+        early_departures=total(stats.early_departures),
+    )
@@ -0,0 +1,126 @@
+from datetime import datetime, timedelta
+from sqlalchemy import or_
+
+from ..models import Shifts, ShiftAssignments, Users, db
+from .timezones import get_zone
+
+EPOCH = datetime(1970, 1, 1)
+
+# Daily attendance of the users, matched against their shifts.
+# The shifts and assignments of the period are loaded once and compiled into
+# sorted punch windows, then every punch is matched with one sorted merge.
+# Punches outside every shift are grouped by calendar day, like before.
+class ShiftSchedules:
+    # Shifts and assignments of the users between first_day and last_day (included)
+    def load(self, user_ids, first_day, last_day):
+        user_rows = {user_id: row for row, user_id in enumerate(user_ids)}
+        department_rows = {}
+        for user_id, department in db.session.query(Users.id, Users.department).filter(Users.id.in_(user_ids)).all():
+            if department:
+                department_rows.setdefault(department, []).append(user_rows[user_id])
+
+        assignments = ShiftAssignments.query.filter(
+            or_(ShiftAssignments.user_id.in_(user_ids), ShiftAssignments.department.in_(list(department_rows))),
+            ShiftAssignments.start_date <= last_day,
+            or_(ShiftAssignments.end_date == None, ShiftAssignments.end_date >= first_day)
+        # Department assignments first, the user ones override them
+        ).order_by(ShiftAssignments.user_id.isnot(None), ShiftAssignments.start_date, ShiftAssignments.id).all()
+
+        shift_ids = sorted({assignment.shift_id for assignment in assignments})
+        shifts = Shifts.query.filter(Shifts.id.in_(shift_ids)).order_by(Shifts.id).all() if shift_ids else []
+        shift_codes = {shift.id: code for code, shift in enumerate(shifts)}
+
+        day_count = (last_day - first_day).days + 1
+        grid = [
+            (
+                [user_rows[assignment.user_id]] if assignment.user_id else department_rows.get(assignment.department, []),
+                shift_codes[assignment.shift_id],
+                (assignment.start_date - first_day).days,
+                (assignment.end_date - first_day).days + 1 if assignment.end_date else day_count
+            )
+            for assignment in assignments
+        ]
+
+        return shifts, grid, day_count
+
+    # Per user monthly statistics of the punches, matched against the shifts
+    # like the daily summary. user_ids and local_seconds are the punches of
+    # the site month [first_day, end_day) with a day of margin before it and
+    # two after, a night shift starting on its last day ends after it.
+    def monthly_stats(self, user_ids, local_seconds, first_day, end_day, work_start, work_end):
+        # numpy is only loaded by the reporting paths, not at app startup
+        import numpy as np
+        from .shifts import build_day_shifts, compile_schedule, summarize_shifts, shift_monthly_stats
+
+        users, user_codes = np.unique(np.asarray(user_ids, dtype=np.int64), return_inverse=True)
+        # The day before holds the night shift ending on the first day
+        load_first = first_day - timedelta(days=1)
+        shifts, grid, day_count = self.load(users.tolist(), load_first, end_day)
+
+        table = shift_table(shifts)
+        schedule = compile_schedule(build_day_shifts(users.size, day_count, grid), epoch_day(load_first), table)
+        summary = summarize_shifts(schedule, table, user_codes.reshape(-1), local_seconds)
+        stats = shift_monthly_stats(summary, epoch_day(first_day), epoch_day(end_day), work_start, work_end)
+        return stats._replace(user_ids=users[stats.user_ids])
+
+    # One entry per shift or unscheduled day of the user, newest first.
+    # local_seconds are the user's punches, sorted, as wall clock seconds
+    # since the epoch in zone_name, converted by the database.
+    def daily_summary(self, user_id, local_seconds, zone_name=None, start_date=None, end_date=None):
+        if not local_seconds:
+            return []
+
+        # numpy is only loaded by the reporting paths, not at app startup
+        from .shifts import build_day_shifts, compile_schedule, summarize_shifts
+
+        # The day before holds the night shift ending on the first day
+        first_day = (EPOCH + timedelta(seconds=local_seconds[0])).date() - timedelta(days=1)
+        last_day = (EPOCH + timedelta(seconds=local_seconds[-1])).date()
+        shifts, grid, day_count = self.load([user_id], first_day, last_day)
+
+        table = shift_table(shifts)
+        schedule = compile_schedule(build_day_shifts(1, day_count, grid), epoch_day(first_day), table)
+        summary = summarize_shifts(schedule, table, [0] * len(local_seconds), local_seconds)
+        zone = get_zone(zone_name)
+
+        entries = []
+        for day, shift_code, check_in, check_out, worked, late, early_leave in zip(
+            summary.days.tolist(), summary.shift_codes.tolist(), summary.check_in.tolist(), summary.check_out.tolist(),
+            summary.worked_seconds.tolist(), summary.late.tolist(), summary.early_leave.tolist()
+        ):
+            date = (EPOCH + timedelta(days=day)).date()
+            if (start_date and date < start_date) or (end_date and date > end_date):
+                continue
+
+            entries.append({
+                'date': date.isoformat(),
+                'checkInTime': (EPOCH + timedelta(seconds=check_in)).replace(tzinfo=zone),
+                'checkOutTime': (EPOCH + timedelta(seconds=check_out)).replace(tzinfo=zone),
+                'workDuration': round(worked / 3600, 2),
+                'shift': shifts[shift_code].name if shift_code >= 0 else None,
+                'late': late,
+                'earlyLeave': early_leave
+            })
+
+        entries.sort(key=lambda entry: (entry['date'], entry['checkInTime']), reverse=True)
+        return entries
+
+
+# Shifts rows -> ShiftTable, the shift codes are the positions in shifts
+def shift_table(shifts):
+    from .shifts import make_shift_table
+
+    return make_shift_table([
+        (
+            shift.start_time.hour * 3600 + shift.start_time.minute * 60,
+            shift.end_time.hour * 3600 + shift.end_time.minute * 60,
+            shift.break_minutes, shift.grace_minutes, shift.weekdays
+        )
+        for shift in shifts
+    ])
+
+def epoch_day(day):
+    return (day - EPOCH.date()).days
+
+
+shift_schedules = ShiftSchedules()
@@ -0,0 +1,203 @@
+import os
+
+import numpy as np
+
+from collections import namedtuple
+
+from .engine import SECONDS_PER_DAY, MonthlyStats
+
+# Punches this long before a shift starts still count for it
+SHIFT_EARLY_WINDOW_MINUTES = int(os.getenv('SHIFT_EARLY_WINDOW_MINUTES', 180))
+# Punches this long after a shift ends still count for it
+SHIFT_LATE_WINDOW_MINUTES = int(os.getenv('SHIFT_LATE_WINDOW_MINUTES', 360))
+
+# Shift definitions as arrays indexed by shift code. start and end are
+# seconds of the day, end past 86400 when the shift crosses midnight.
+# weekdays is a (shifts x 7) bool mask, Monday first.
+ShiftTable = namedtuple('ShiftTable', ['start', 'end', 'break_seconds', 'grace_seconds', 'weekdays'])
+
+# Shift instances of the users, sorted by (user, window_start), the windows
+# of a user never overlap. day is the day the shift starts on, in days
+# since the epoch.
+Schedule = namedtuple('Schedule', [
+    'user_codes', 'days', 'shift_codes', 'window_start', 'window_end', 'shift_start', 'shift_end'
+])
+
+# One entry per shift instance or unscheduled day with punches.
+# shift_codes is -1 for the punches outside every shift window, those are
+# grouped by calendar day like before the shifts existed.
+ShiftSummary = namedtuple('ShiftSummary', [
+    'user_codes', 'days', 'shift_codes', 'check_in', 'check_out', 'punches', 'worked_seconds', 'late', 'early_leave'
+])
+
+# shifts are (start_seconds, end_seconds, break_minutes, grace_minutes, weekdays)
+# tuples, weekdays as a string of ISO weekday digits ('12345' is Monday to Friday)
+def make_shift_table(shifts):
+    start = np.array([shift[0] for shift in shifts], dtype=np.int64)
+    end = np.array([shift[1] for shift in shifts], dtype=np.int64)
+    # An end before the start is on the next day
+    end = np.where(end <= start, end + SECONDS_PER_DAY, end)
+    weekdays = np.array([[str(day) in shift[4] for day in range(1, 8)] for shift in shifts], dtype=bool).reshape(-1, 7)
+
+    return ShiftTable(
+        start=start,
+        end=end,
+        break_seconds=np.array([shift[2] * 60 for shift in shifts], dtype=np.int64),
+        grace_seconds=np.array([shift[3] * 60 for shift in shifts], dtype=np.int64),
+        weekdays=weekdays,
+    )
+
+# (users x days) grid of shift codes, -1 is a day off. assignments are
+# (user_rows, shift_code, first_day, end_day) with the days as indexes of
+# the grid, end excluded. The later assignments override the earlier ones,
+# so the department ones go first and the user ones after.
+def build_day_shifts(user_count, day_count, assignments):
+    day_shifts = np.full((user_count, day_count), -1, dtype=np.int64)
+    for user_rows, shift_code, first_day, end_day in assignments:
+        first_day, end_day = max(first_day, 0), min(end_day, day_count)
+        if first_day < end_day and len(user_rows):
+            day_shifts[np.asarray(user_rows)[:, None], np.arange(first_day, end_day)] = shift_code
+    return day_shifts
+
+# Expands the grid into the shift instances, first_day is the epoch day of column 0
+def compile_schedule(day_shifts, first_day, table):
+    user_codes, columns = np.nonzero(day_shifts >= 0)
+    shift_codes = day_shifts[user_codes, columns]
+    days = first_day + columns
+
+    # Epoch day 0 was a Thursday, Monday is weekday 0
+    weekday = (days + 3) % 7
+    working = table.weekdays[shift_codes, weekday]
+    user_codes, days, shift_codes = user_codes[working], days[working], shift_codes[working]
+
+    shift_start = days * SECONDS_PER_DAY + table.start[shift_codes]
+    shift_end = days * SECONDS_PER_DAY + table.end[shift_codes]
+    window_start = shift_start - SHIFT_EARLY_WINDOW_MINUTES * 60
+    window_end = shift_end + SHIFT_LATE_WINDOW_MINUTES * 60
+
+    # nonzero is row major, so the instances are sorted by user then day.
+    # Shifts of a user start in day order, but overlapping windows are split
+    # half way between the end of a shift and the start of the next one.
+    same_user = user_codes[1:] == user_codes[:-1]
+    overlap = same_user & (window_start[1:] < window_end[:-1])
+    middle = (shift_end[:-1] + shift_start[1:]) // 2
+    window_end[:-1] = np.where(overlap, np.maximum(middle, shift_end[:-1]), window_end[:-1])
+    window_start[1:] = np.where(overlap, window_end[:-1], window_start[1:])
+
+    return Schedule(user_codes, days, shift_codes, window_start, window_end, shift_start, shift_end)
+
+# Assigns each punch to the shift instance whose window holds it, -1 if none.
+# Punches and windows are merged in one sorted pass over (user, time) keys.
+def assign_punches(schedule, user_codes, timestamps):
+    user_codes = np.asarray(user_codes, dtype=np.int64)
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+
+    if schedule.window_start.size == 0 or timestamps.size == 0:
+        return np.full(timestamps.size, -1, dtype=np.int64)
+
+    origin = min(schedule.window_start.min(), timestamps.min())
+    span = max(schedule.window_end.max(), timestamps.max()) - origin + 1
+
+    window_keys = schedule.user_codes * span + (schedule.window_start - origin)
+    punch_keys = user_codes * span + (timestamps - origin)
+
+    instance = np.searchsorted(window_keys, punch_keys, side='right') - 1
+    found = instance >= 0
+    candidate = np.where(found, instance, 0)
+    found &= (schedule.user_codes[candidate] == user_codes) & (timestamps < schedule.window_end[candidate])
+
+    return np.where(found, instance, -1)
+
+# Start and end positions of the runs of equal sorted keys
+def group_bounds(keys):
+    if keys.size == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    ends = np.r_[starts[1:], keys.size] - 1
+    return starts, ends
+
+# Sort order by (group, time), packed in one int64 key
+def group_order(groups, timestamps):
+    if timestamps.size == 0:
+        return np.zeros(0, dtype=np.int64)
+    span = int(timestamps.max() - timestamps.min()) + 1
+    return np.argsort((groups - groups.min()) * span + (timestamps - timestamps.min()))
+
+def summarize_shifts(schedule, table, user_codes, timestamps):
+    user_codes = np.asarray(user_codes, dtype=np.int64)
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+
+    instance = assign_punches(schedule, user_codes, timestamps)
+    scheduled = instance >= 0
+
+    # Scheduled punches, grouped by shift instance
+    shift_instance, shift_times = instance[scheduled], timestamps[scheduled]
+    order = group_order(shift_instance, shift_times)
+    shift_instance, shift_times = shift_instance[order], shift_times[order]
+    starts, ends = group_bounds(shift_instance)
+    groups = shift_instance[starts]
+
+    shift_codes = schedule.shift_codes[groups]
+    check_in, check_out = shift_times[starts], shift_times[ends]
+    punches = ends - starts + 1
+    # The break is unpaid, only taken off when the presence covers it
+    worked = np.maximum(check_out - check_in - table.break_seconds[shift_codes], 0)
+    late = check_in > schedule.shift_start[groups] + table.grace_seconds[shift_codes]
+    early_leave = (punches > 1) & (check_out < schedule.shift_end[groups] - table.grace_seconds[shift_codes])
+
+    # Unscheduled punches, grouped by (user, calendar day)
+    free_users, free_times = user_codes[~scheduled], timestamps[~scheduled]
+    free_days = free_times // SECONDS_PER_DAY
+    first_free_day = free_days.min() if free_days.size else 0
+    day_span = int(free_days.max() - first_free_day) + 1 if free_days.size else 1
+    free_groups = free_users * day_span + (free_days - first_free_day)
+    order = group_order(free_groups, free_times)
+    free_groups, free_users, free_days, free_times = free_groups[order], free_users[order], free_days[order], free_times[order]
+    free_starts, free_ends = group_bounds(free_groups)
+    free_count = free_starts.size
+
+    return ShiftSummary(
+        user_codes=np.r_[schedule.user_codes[groups], free_users[free_starts]],
+        days=np.r_[schedule.days[groups], free_days[free_starts]],
+        shift_codes=np.r_[shift_codes, np.full(free_count, -1, dtype=np.int64)],
+        check_in=np.r_[check_in, free_times[free_starts]],
+        check_out=np.r_[check_out, free_times[free_ends]],
+        punches=np.r_[punches, free_ends - free_starts + 1],
+        worked_seconds=np.r_[worked, free_times[free_ends] - free_times[free_starts]],
+        late=np.r_[late, np.zeros(free_count, dtype=bool)],
+        early_leave=np.r_[early_leave, np.zeros(free_count, dtype=bool)],
+    )
+
+# Per user monthly statistics of a ShiftSummary, from its entries starting on
+# the epoch days [first_day, end_day). Each entry is a day present, like in
+# the daily summary. Shifts are late or left early against their own start,
+# end and grace, the unscheduled days against work_start and work_end.
+def shift_monthly_stats(summary, first_day, end_day, work_start, work_end):
+    kept = (summary.days >= first_day) & (summary.days < end_day)
+    user_codes, days, shift_codes = summary.user_codes[kept], summary.days[kept], summary.shift_codes[kept]
+    check_in, check_out, punches = summary.check_in[kept], summary.check_out[kept], summary.punches[kept]
+
+    # A check-in in the early window of a shift starting at midnight is on the day before
+    check_in_of_day = (check_in - days * SECONDS_PER_DAY) % SECONDS_PER_DAY
+    unscheduled = shift_codes < 0
+    late = np.where(unscheduled, check_in_of_day > work_start, summary.late[kept])
+    early = np.where(
+        unscheduled, (punches > 1) & (check_out - days * SECONDS_PER_DAY < work_end), summary.early_leave[kept]
+    )
+
+    users, user_index = np.unique(user_codes, return_inverse=True)
+    user_index = user_index.reshape(-1)
+    count = users.size
+
+    def total(values):
+        return np.bincount(user_index, weights=values, minlength=count).astype(np.int64)
+
+    return MonthlyStats(
+        user_ids=users,
+        days_present=np.bincount(user_index, minlength=count),
+        check_in_seconds=total(check_in_of_day),
+        total_seconds=total(summary.worked_seconds[kept]),
+        late_arrivals=total(late),
+        early_departures=total(early),
+    )
@@ -0,0 +1,197 @@
+import os
+
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import BigInteger, func
+from sqlalchemy.dialects.postgresql import insert
+
+from ..models import AttendanceRecords, AttendanceStatistics, Users, SITE_TIMEZONE, db
+from .archive import attendance_archive
+from .columns import copy_columns
+from .schedules import shift_schedules
+from .timezones import get_zone, local_time, to_local_seconds
+
+ATTENDANCE_WORK_START = os.getenv('ATTENDANCE_WORK_START', '09:00')
+ATTENDANCE_WORK_END = os.getenv('ATTENDANCE_WORK_END', '18:00')
+# Minutes after the work start still counted as on time
+ATTENDANCE_LATE_GRACE_MINUTES = int(os.getenv('ATTENDANCE_LATE_GRACE_MINUTES', 0))
+# Statistics of an open month are computed again once older than this
+ATTENDANCE_STATS_TTL_SECONDS = int(os.getenv('ATTENDANCE_STATS_TTL_SECONDS', 300))
+# Days after its end a month stays open, late punches can still land in it
+ATTENDANCE_STATS_CLOSE_DAYS = int(os.getenv('ATTENDANCE_STATS_CLOSE_DAYS', 2))
+
+SCOPES = ('user', 'department')
+
+USER_FIELDS = ('user_id', 'username', 'department', 'daysPresent', 'avgCheckIn', 'totalHours', 'lateArrivals', 'earlyDepartures')
+DEPARTMENT_FIELDS = ('department', 'users', 'daysPresent', 'avgCheckIn', 'totalHours', 'lateArrivals', 'earlyDepartures')
+
+# Monthly statistics per user and per department.
+# The punches of the month are loaded as two int64 columns and reduced with
+# the vectorized engine, the results are kept in attendance_statistics.
+# Closed months are served from the table as is, open ones are computed
+# again once their row is older than ATTENDANCE_STATS_TTL_SECONDS.
+class AttendanceStatisticsService:
+    def get(self, scope, month, refresh=False):
+        row = db.session.get(AttendanceStatistics, (scope, month))
+        if row is not None and not refresh and self.is_fresh(row):
+            return row.format()
+
+        results = self.compute(month)
+        return {'scope': scope, 'month': month, 'computedAt': results['computed_at'], 'data': results[scope]}
+
+    def is_fresh(self, row):
+        _, end = month_bounds(row.month)
+        closed_at = end + timedelta(days=ATTENDANCE_STATS_CLOSE_DAYS)
+        if row.computed_at >= closed_at:
+            return True
+        return (site_now() - row.computed_at).total_seconds() < ATTENDANCE_STATS_TTL_SECONDS
+
+    # (user_id, local epoch seconds) of the punches in the table between the local month bounds
+    def punch_query(self, start, end):
+        # Wall clock time of each user, the site one for the users without a timezone.
+        # Its epoch is local seconds, start and end are local month bounds.
+        local = local_time(AttendanceRecords.timestamp, func.coalesce(Users.timezone, SITE_TIMEZONE))
+        first_instant, last_instant = instant_margin(start, end)
+        return db.session.query(
+            AttendanceRecords.user_id.cast(BigInteger),
+            func.extract('epoch', local).cast(BigInteger)
+        ).join(Users, Users.id == AttendanceRecords.user_id).filter(
+            AttendanceRecords.timestamp >= first_instant,
+            AttendanceRecords.timestamp < last_instant,
+            local >= start,
+            local < end
+        )
+
+    def load_punches(self, start, end):
+        import numpy as np
+
+        # Pulled as two binary columns, a month of a large site is ~1M rows
+        user_ids, timestamps = copy_columns(self.punch_query(start, end))
+        first_instant, last_instant = instant_margin(start, end)
+
+        # Archived months are converted to local time here, per user timezone
+        archived_users, archived_seconds = attendance_archive.punches(first_instant, last_instant)
+        if archived_users.size:
+            archived_local = self.archived_local_seconds(archived_users, archived_seconds)
+            kept = (archived_local >= to_epoch_seconds(start)) & (archived_local < to_epoch_seconds(end))
+            user_ids = np.r_[user_ids, archived_users[kept]]
+            timestamps = np.r_[timestamps, archived_local[kept]]
+
+        return user_ids, timestamps
+
+    def archived_local_seconds(self, user_ids, utc_seconds):
+        import numpy as np
+
+        users, inverse = np.unique(user_ids, return_inverse=True)
+        zones = dict(db.session.query(Users.id, Users.timezone).filter(Users.id.in_(users.tolist())).all())
+        user_zones = np.array([zones.get(user_id) or SITE_TIMEZONE for user_id in users.tolist()])
+        punch_zones = user_zones[inverse.reshape(-1)]
+
+        local_seconds = np.empty_like(utc_seconds)
+        for zone_name in np.unique(user_zones).tolist():
+            in_zone = punch_zones == zone_name
+            local_seconds[in_zone] = to_local_seconds(utc_seconds[in_zone], zone_name)
+        return local_seconds
+
+    # Computes both scopes of the month and stores them.
+    # Punches are matched against the shifts like the daily summary, a shift
+    # counts in the month it starts in. The days without a shift keep the
+    # ATTENDANCE_WORK_START and ATTENDANCE_WORK_END hours.
+    def compute(self, month):
+        # numpy is only loaded by the reporting paths, not at app startup
+        from .engine import aggregate_stats
+
+        start, end = month_bounds(month)
+        # A night shift starting on the last day ends in the next month
+        user_ids, timestamps = self.load_punches(start - timedelta(days=1), end + timedelta(days=2))
+
+        work_start = parse_time_of_day(ATTENDANCE_WORK_START) + ATTENDANCE_LATE_GRACE_MINUTES * 60
+        work_end = parse_time_of_day(ATTENDANCE_WORK_END)
+        stats = shift_schedules.monthly_stats(user_ids, timestamps, start.date(), end.date(), work_start, work_end)
+
+        users = {
+            user_id: (username, department or '')
+            for user_id, username, department in db.session.query(Users.id, Users.username, Users.department).all()
+        }
+
+        stat_user_ids = stats.user_ids.tolist()
+        user_departments = [users.get(user_id, ('', ''))[1] for user_id in stat_user_ids]
+        departments = sorted(set(user_departments))
+        department_codes = {department: code for code, department in enumerate(departments)}
+        department_stats = aggregate_stats(stats, [department_codes[department] for department in user_departments], len(departments))
+
+        user_entries = [
+            {
+                'user_id': user_id,
+                'username': users.get(user_id, ('', ''))[0],
+                'department': department,
+                **format_stats(days, check_in, total, late, early)
+            }
+            for user_id, department, days, check_in, total, late, early in zip(
+                stat_user_ids, user_departments, stats.days_present.tolist(), stats.check_in_seconds.tolist(),
+                stats.total_seconds.tolist(), stats.late_arrivals.tolist(), stats.early_departures.tolist()
+            )
+        ]
+        department_entries = [
+            {
+                'department': department,
+                'users': user_count,
+                **format_stats(days, check_in, total, late, early)
+            }
+            for department, user_count, days, check_in, total, late, early in zip(
+                departments, department_stats.users.tolist(), department_stats.days_present.tolist(),
+                department_stats.check_in_seconds.tolist(), department_stats.total_seconds.tolist(),
+                department_stats.late_arrivals.tolist(), department_stats.early_departures.tolist()
+            )
+        ]
+
+        computed_at = site_now()
+        statement = insert(AttendanceStatistics).values([
+            {'scope': 'user', 'month': month, 'data': user_entries, 'computed_at': computed_at},
+            {'scope': 'department', 'month': month, 'data': department_entries, 'computed_at': computed_at},
+        ])
+        db.session.execute(statement.on_conflict_do_update(
+            index_elements=[AttendanceStatistics.scope, AttendanceStatistics.month],
+            set_={'data': statement.excluded.data, 'computed_at': statement.excluded.computed_at}
+        ))
+        db.session.commit()
+
+        return {'user': user_entries, 'department': department_entries, 'computed_at': computed_at}
+
+
+def format_stats(days, check_in_seconds, total_seconds, late, early):
+    return {
+        'daysPresent': days,
+        'avgCheckIn': format_time_of_day(check_in_seconds // days) if days else None,
+        'totalHours': round(total_seconds / 3600, 2),
+        'lateArrivals': late,
+        'earlyDepartures': early,
+    }
+
+# Instants around the local month bounds. Timezones are at most 14 hours off
+# UTC, the day of margin keeps the range on the (user_id, timestamp) index
+def instant_margin(start, end):
+    return start.replace(tzinfo=timezone.utc) - timedelta(days=1), end.replace(tzinfo=timezone.utc) + timedelta(days=1)
+
+# Naive datetime -> seconds since the epoch, as if it was UTC
+def to_epoch_seconds(value):
+    return int((value - datetime(1970, 1, 1)).total_seconds())
+
+# Naive site wall time, the clock of month_bounds() and computed_at
+def site_now():
+    return datetime.now(get_zone()).replace(tzinfo=None)
+
+# 'YYYY-MM' -> (first day, first day of the next month), raises ValueError
+def month_bounds(month):
+    start = datetime.strptime(month, '%Y-%m')
+    end = (start + timedelta(days=32)).replace(day=1)
+    return start, end
+
+def parse_time_of_day(value):
+    parsed = datetime.strptime(value, '%H:%M')
+    return parsed.hour * 3600 + parsed.minute * 60
+
+def format_time_of_day(seconds):
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}"
+
+
+attendance_statistics = AttendanceStatisticsService()
@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta
+from functools import lru_cache
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from sqlalchemy import Date, cast, func
+
+from ..models import SITE_TIMEZONE, Users, db
+
+@lru_cache(maxsize=None)
+def get_zone(name=None):
+    return ZoneInfo(name or SITE_TIMEZONE)
+
+def is_valid_timezone(name):
+    try:
+        get_zone(name)
+        return True
+    except (ZoneInfoNotFoundError, ValueError):
+        return False
+
+# Timezone name of the user, the site one when the user has none
+def user_timezone(user_id):
+    name = db.session.query(Users.timezone).filter(Users.id == user_id).scalar()
+    return name or SITE_TIMEZONE
+
+# Aware instant of the local midnight starting day
+def local_midnight(day, zone_name=None):
+    return datetime.combine(day, datetime.min.time(), tzinfo=get_zone(zone_name))
+
+# [start, end) instants of the local days first_day to last_day (included),
+# plain timestamptz bounds so the range stays on the (user_id, timestamp) index
+def local_day_bounds(first_day, last_day, zone_name=None):
+    return local_midnight(first_day, zone_name), local_midnight(last_day + timedelta(days=1), zone_name)
+
+# Naive datetimes without offset are read as site time
+def as_aware(value, zone_name=None):
+    if value.tzinfo is None:
+        return value.replace(tzinfo=get_zone(zone_name))
+    return value
+
+# SQL wall clock time of a timestamptz column in the zone, zone can be a column
+def local_time(column, zone=SITE_TIMEZONE):
+    return func.timezone(zone, column)
+
+# SQL local date of a timestamptz column. With the site timezone it matches
+# the ix_attendance_records_site_day expression index.
+def local_day(column, zone=SITE_TIMEZONE):
+    return cast(local_time(column, zone), Date)
+
+# UTC epoch seconds -> wall clock seconds since the epoch in the zone, the
+# Python side of local_time for the punches read outside the database.
+# Offsets only change on quarter hours, they are looked up once per quarter.
+def to_local_seconds(utc_seconds, zone_name=None):
+    # numpy is only loaded by the reporting paths, not at app startup
+    import numpy as np
+
+    utc_seconds = np.asarray(utc_seconds, dtype=np.int64)
+    if utc_seconds.size == 0:
+        return utc_seconds
+
+    zone = get_zone(zone_name)
+    quarters, inverse = np.unique(utc_seconds // 900, return_inverse=True)
+    offsets = np.array([
+        int(datetime.fromtimestamp(quarter * 900, zone).utcoffset().total_seconds())
+        for quarter in quarters.tolist()
+    ], dtype=np.int64)
+    return utc_seconds + offsets[inverse.reshape(-1)]
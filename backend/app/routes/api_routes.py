@@ -1,10 +1,15 @@
-import logging, os, requests
+import logging, os, queue
 
-from flask import Blueprint, request, redirect, jsonify
-from ..models import Users, AttendanceRecords, Events, db
+from flask import Blueprint, Response, request, redirect, jsonify
+from ..models import Users, AttendanceRecords, Events, EventExceptions, Cards, Shifts, ShiftAssignments, Auth0Users, Auth0Roles, Auth0UserRoles, db
 from ..services import *
+from ..serializers import wants_compact, compact_rows, pick
+from ..reporting import attendance_statistics, shift_schedules, month_bounds, SCOPES, USER_FIELDS, DEPARTMENT_FIELDS
+from ..reporting import get_zone, is_valid_timezone, user_timezone, local_midnight, local_time, as_aware, to_local_seconds, attendance_archive
 from functools import wraps
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import BigInteger, and_, delete, exc, func, or_
+from sqlalchemy.dialects.postgresql import insert
 from datetime import datetime, timedelta
 
 
@@ -13,6 +18,12 @@ from dotenv import load_dotenv
 load_dotenv()
 
 FRONTEND_URL = os.getenv('FRONTEND_URL')
+# Seconds between keep-alive comments on idle live feed streams
+STREAM_KEEPALIVE_SECONDS = int(os.getenv('STREAM_KEEPALIVE_SECONDS', 15))
+
+# Fields the frontend uses, the rest is dropped from compact=1 responses
+USER_INFO_COMPACT_KEYS = ('sub', 'permissions', 'name', 'nickname', 'username', 'email', 'picture', 'db_info')
+AUTH0_USER_COMPACT_FIELDS = ('auth0_id', 'db_user_id', 'nickname', 'email', 'department', 'position', 'roles')
 
 api = Blueprint('api', __name__)
 
@@ -85,93 +96,31 @@ def get_user_info(payload):
     try:
         auth0_id = payload.get('sub')
         
-        user = None
-        auth0_user_data = {}
+        cached = {'auth0': {}, 'db_info': None}
         
         if auth0_id:
-            user = Users.query.filter_by(auth0_id=auth0_id).first()
-
-            domain = os.getenv('AUTH0_APP_DOMAIN')
-            client_id = os.getenv('AUTH0_M2M_CLIENT_ID')
-            client_secret = os.getenv('AUTH0_M2M_CLIENT_SECRET')
-            
-            token_url = f"https://{domain}/oauth/token"
-            token_payload = {
-                "client_id": client_id,
-                "client_secret": client_secret,
-                "audience": f"https://{domain}/api/v2/",
-                "grant_type": "client_credentials",
-                "scope": "read:users"
-            }
-            
-            token_response = requests.post(token_url, json=token_payload)
-            token_data = token_response.json()
-            
-            if 'access_token' in token_data:
-                mgmt_api_token = token_data['access_token']
-                
-                headers = {
-                    'Authorization': f'Bearer {mgmt_api_token}',
-                    'Content-Type': 'application/json'
-                }
-
-                encoded_user_id = requests.utils.quote(auth0_id)
-                user_url = f"https://{domain}/api/v2/users/{encoded_user_id}"
-                
-                user_response = requests.get(user_url, headers=headers)
-                
-                if user_response.status_code == 200:
-                    auth0_user_data = user_response.json()
-                else:
-                    logging.error(f"Failed to get user from Auth0: {user_response.status_code} - {user_response.text}")
-            else:
-                logging.error(f"Failed to get management API token: {token_data}")
-            
-            if not user and auth0_id:
-                try:
-                    email = auth0_user_data.get('email') or payload.get('email')
-                    name = auth0_user_data.get('name') or payload.get('name', '')
-                    nickname = auth0_user_data.get('nickname') or payload.get('nickname', '')
-                    
-                    if not email and nickname:
-                        email = f"{nickname}@example.com"
-                    elif not email and auth0_id:
-                        email = f"{auth0_id.replace('|', '_')}@example.com"
-                    
-                    username = nickname or (name.split()[0] if name else '') or (email.split('@')[0] if email else 'user')
-                    
-                    new_user = Users(
-                        auth0_id=auth0_id,
-                        email=email,
-                        username=username,
-                        position='',
-                        department=''
-                    )
-                    
-                    db.session.add(new_user)
-                    db.session.commit()
-                    
-                    user = Users.query.filter_by(auth0_id=auth0_id).first()
-                    
-                    print(f"Created new user: {user.username} with auth0_id: {auth0_id}")
-                except Exception as user_create_error:
-                    print(f"Error creating new user: {user_create_error}")
-                    logging.error(f"Error creating new user: {user_create_error}")
-                    db.session.rollback()
-        
-        if user:
+            # Served from the cache, the loader only runs on a miss or a background refresh
+            cached = user_info_cache.get(auth0_id, lambda: load_user_info(auth0_id, payload))
+        
+        auth0_user_data = cached['auth0']
+        db_info = cached['db_info']
+        
+        if db_info:
             user_data = {
                 **payload,
                 **auth0_user_data,
-                'db_info': user.format()
+                'db_info': db_info
             }
             
-            if not user_data.get('email') and user.email:
-                user_data['email'] = user.email
-            
-            return {'success': True, 'user_info': user_data}
+            if not user_data.get('email') and db_info.get('email'):
+                user_data['email'] = db_info['email']
         else:
-            return {'success': True, 'user_info': {**payload, **auth0_user_data}}
+            user_data = {**payload, **auth0_user_data}
+
+        if wants_compact():
+            user_data = pick(user_data, USER_INFO_COMPACT_KEYS)
+
+        return {'success': True, 'user_info': user_data}
     
     except Exception as e:
         print(f"Error: {e}")
@@ -180,6 +129,63 @@ def get_user_info(payload):
     finally:
         db.session.close()
 
+# Assembles the cached part of the user info: the Auth0 profile and the db row.
+# Returns (info, cacheable), a failed Auth0 call or user creation isn't cached.
+def load_user_info(auth0_id, payload):
+    cacheable = True
+    auth0_user_data = {}
+    
+    user = Users.query.filter_by(auth0_id=auth0_id).first()
+
+    try:
+        user_response = auth0_management.get_user(auth0_id)
+        
+        if user_response.status_code == 200:
+            auth0_user_data = user_response.json()
+        else:
+            cacheable = False
+            logging.error(f"Failed to get user from Auth0: {user_response.status_code} - {user_response.text}")
+    except Auth0ManagementError as e:
+        cacheable = False
+        logging.error(f"Failed to get management API token: {e.text}")
+    
+    if not user:
+        try:
+            email = auth0_user_data.get('email') or payload.get('email')
+            name = auth0_user_data.get('name') or payload.get('name', '')
+            nickname = auth0_user_data.get('nickname') or payload.get('nickname', '')
+            
+            if not email and nickname:
+                email = f"{nickname}@example.com"
+            elif not email and auth0_id:
+                email = f"{auth0_id.replace('|', '_')}@example.com"
+            
+            username = nickname or (name.split()[0] if name else '') or (email.split('@')[0] if email else 'user')
+            
+            new_user = Users(
+                auth0_id=auth0_id,
+                email=email,
+                username=username,
+                position='',
+                department=''
+            )
+            
+            db.session.add(new_user)
+            db.session.flush()
+            active_user_cache.invalidate(db.session, [new_user.id])
+            db.session.commit()
+            
+            user = Users.query.filter_by(auth0_id=auth0_id).first()
+            
+            print(f"Created new user: {user.username} with auth0_id: {auth0_id}")
+        except Exception as user_create_error:
+            print(f"Error creating new user: {user_create_error}")
+            logging.error(f"Error creating new user: {user_create_error}")
+            db.session.rollback()
+            cacheable = False
+    
+    return {'auth0': auth0_user_data, 'db_info': user.format() if user else None}, cacheable
+
 @api.route('/user-info', methods=['POST'])
 @requires_auth('post:user-info')
 def update_user_info(payload):
@@ -189,10 +195,15 @@ def update_user_info(payload):
         if 'user_id' not in request_data:
             return jsonify({
                 'success': False,
-                'message': f'Invalid date format: {str(e)}'
+                'message': 'Missing required field: user_id'
             }), 400
 
         user_id = request_data['user_id']
+        if not isinstance(user_id, int) or isinstance(user_id, bool):
+            return jsonify({
+                'success': False,
+                'message': 'user_id must be an integer'
+            }), 400
 
         logging.info(f'user_id: {user_id}')
 
@@ -209,9 +220,19 @@ def update_user_info(payload):
         
         if 'position' in request_data:
             user.position = request_data['position']
+
+        if 'timezone' in request_data:
+            if request_data['timezone'] and not is_valid_timezone(request_data['timezone']):
+                return jsonify({
+                    'success': False,
+                    'message': f"Unknown timezone: {request_data['timezone']}"
+                }), 400
+            user.timezone = request_data['timezone'] or None
     
         logging.info(f'user: {user}')
 
+        active_user_cache.invalidate(db.session, [user.id])
+        user_info_cache.invalidate(db.session, [user.auth0_id])
         user.update()
         
         return jsonify({
@@ -228,11 +249,17 @@ def update_user_info(payload):
 
 @api.route('/users')
 @requires_auth('get:users')
+@read_replica()
 def get_users(payload):
     try:
-        users = Users.query.filter(Users.is_active == True).order_by(Users.username).all()
+        if wants_compact():
+            users = db.session.query(*Users.compact_columns()).filter(Users.is_active == True).order_by(Users.username).all()
+            return jsonify(compact_rows(Users.COMPACT_FIELDS, users)), 200
+
+        # Plain row tuples, no model objects are built for the listing
+        users = db.session.query(*Users.format_columns()).filter(Users.is_active == True).order_by(Users.username).all()
         
-        formatted_users = [user.format() for user in users]
+        formatted_users = Users.format_rows(users)
         
         return jsonify(formatted_users), 200
     except Exception as e:
@@ -241,6 +268,57 @@ def get_users(payload):
     finally:
         db.session.close()
 
+# JSON ids are integers, true and false aren't the ids 1 and 0
+def is_record_id(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+# Deactivates (leavers) or reactivates many users with one statement
+@api.route('/users/bulk', methods=['PATCH'])
+@requires_auth('post:user-info')
+def bulk_set_users_active(payload):
+    try:
+        request_data = request.get_json()
+        ids = request_data.get('ids') if isinstance(request_data, dict) else None
+        is_active = request_data.get('isActive') if isinstance(request_data, dict) else None
+
+        if not isinstance(ids, list) or not ids or not all(is_record_id(user_id) for user_id in ids):
+            return jsonify({
+                'success': False,
+                'message': 'ids must be a non-empty array of user ids'
+            }), 400
+
+        if not isinstance(is_active, bool):
+            return jsonify({
+                'success': False,
+                'message': 'isActive must be true or false'
+            }), 400
+
+        if len(ids) > USERS_BULK_MAX:
+            return jsonify({
+                'success': False,
+                'message': f'At most {USERS_BULK_MAX} users can be updated at once'
+            }), 400
+
+        result = set_users_active(db.session, ids, is_active)
+        db.session.commit()
+
+        return jsonify({
+            'success': True,
+            'updated': len(result['updated']),
+            'unchanged': len(result['unchanged']),
+            'missing': result['missing'][:USERS_BULK_MAX_ERRORS]
+        }), 200
+    except Exception as e:
+        print(f"Error updating users: {str(e)}")
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'message': 'An error occurred while updating the users',
+            'error': str(e)
+        }), 500
+    finally:
+        db.session.close()
+
 #######################
 ##### -- Auth0 -- #####
 #######################
@@ -248,71 +326,43 @@ def get_users(payload):
 @requires_auth('read:auth0-users')
 def get_auth0_user(payload):
     try:
-        domain = os.getenv('AUTH0_APP_DOMAIN')
-        app_client_id = os.getenv('AUTH0_APP_CLIENT_ID')
-        client_id = os.getenv('AUTH0_M2M_CLIENT_ID')
-        client_secret = os.getenv('AUTH0_M2M_CLIENT_SECRET')
-
-        token_url = f"https://{domain}/oauth/token"
-        token_payload = {
-            "client_id": client_id,
-            "client_secret": client_secret,
-            "audience": f"https://{domain}/api/v2/",
-            "grant_type": "client_credentials",
-            "scope": "read:users update:users read:roles"
-        }
-
-        token_response = requests.post(token_url, json=token_payload)
-        token_data = token_response.json()
+        # Served from the mirror tables, `flask sync_auth0_users` keeps them up to date
+        if not auth0_sync.has_synced(db.session):
+            return auth0_mirror_not_synced()
 
-        mgmt_api_token = token_data['access_token']
+        users = db.session.query(
+            Auth0Users, Users.id, Users.department, Users.position
+        ).outerjoin(Users, Users.auth0_id == Auth0Users.auth0_id).order_by(Auth0Users.created_at).all()
 
-        headers = {
-            'Authorization': f'Bearer {mgmt_api_token}',
-            'Content-Type': 'application/json'
-        }
-
-        users_url = f"https://{domain}/api/v2/users"
-        users_response = requests.get(users_url, headers=headers)
-        auth0_users = users_response.json()
+        roles_by_user = {}
+        role_rows = db.session.query(Auth0UserRoles.auth0_id, Auth0Roles).join(
+            Auth0Roles, Auth0Roles.id == Auth0UserRoles.role_id
+        ).all()
+        for auth0_id, role in role_rows:
+            roles_by_user.setdefault(auth0_id, []).append(role.format())
 
         formatted_users = []
         
-        for index, user in enumerate(auth0_users):
-            auth0_id = user.get('user_id')
-            
-            roles_url = f"https://{domain}/api/v2/users/{auth0_id}/roles"
-            roles_response = requests.get(roles_url, headers=headers)
-            
-            roles = []
-            if roles_response.status_code == 200:
-                roles = roles_response.json()
-            else:
-                logging.error(f"Error fetching roles for user {auth0_id}: {roles_response.text}")
-
-            db_user = Users.query.filter_by(auth0_id = auth0_id).first()
-
-            # logging.error(f"roles data: {roles}")
+        for index, (user, db_user_id, department, position) in enumerate(users):
             formatted_user = {
                 'id': index,
-                'auth0_id': auth0_id,
-                'db_user_id': db_user.id,
-                'email': user.get('email'),
-                'name': user.get('name'),
-                'nickname': user.get('nickname'),
-                'picture': user.get('picture'),
-                'created_at': user.get('created_at'),
-                'last_login': user.get('last_login'),
-                'logins_count': user.get('logins_count'),
-                'department': db_user.department,
-                'position': db_user.position,
-                'roles': roles
+                **user.format(),
+                'db_user_id': db_user_id,
+                'department': department,
+                'position': position,
+                'roles': roles_by_user.get(user.auth0_id, [])
             }
-
-            logging.info(f'formatted_user: {formatted_user}')
             formatted_users.append(formatted_user)
 
-        # logging.error(f"User data: {formatted_users}")
+        if wants_compact():
+            # Roles are reduced to their ids, all the frontend matches on
+            for formatted_user in formatted_users:
+                formatted_user['roles'] = [role.get('id') for role in formatted_user['roles']]
+            return jsonify(compact_rows(
+                AUTH0_USER_COMPACT_FIELDS,
+                [[formatted_user[field] for field in AUTH0_USER_COMPACT_FIELDS] for formatted_user in formatted_users]
+            )), 200
+
         return jsonify(formatted_users), 200
     except Exception as e:
         logging.error(f"Error fetching auth0 users: {str(e)}")
@@ -326,65 +376,20 @@ def update_auth0_user_roles(payload, auth0_id):
     try:
         data = request.get_json()
         roles = data.get('roles', [])
-            
-        domain = os.getenv('AUTH0_APP_DOMAIN')
-        client_id = os.getenv('AUTH0_M2M_CLIENT_ID')
-        client_secret = os.getenv('AUTH0_M2M_CLIENT_SECRET')
-
-        token_url = f"https://{domain}/oauth/token"
-        token_payload = {
-            "client_id": client_id,
-            "client_secret": client_secret,
-            "audience": f"https://{domain}/api/v2/",
-            "grant_type": "client_credentials",
-            "scope": "update:users read:roles"
-        }
-
-        token_response = requests.post(token_url, json=token_payload)
-        
-        if token_response.status_code != 200:
-            return jsonify({'success': False, 'message': 'Failed to obtain management API token', 'error': token_response.text}), 500
-        
-        token_data = token_response.json()
-        
-        if 'access_token' not in token_data:
-            return jsonify({'success': False, 'message': 'No access token in response', 'error': str(token_data)}), 500
-        
-        mgmt_api_token = token_data['access_token']
 
-        headers = {
-            'Authorization': f'Bearer {mgmt_api_token}',
-            'Content-Type': 'application/json'
-        }
-
-        encoded_auth0_id = requests.utils.quote(auth0_id)
-        roles_url = f"https://{domain}/api/v2/users/{encoded_auth0_id}/roles"
-        
-        current_roles_response = requests.get(roles_url, headers=headers)
-        
-        if current_roles_response.status_code == 200:
-            current_roles = current_roles_response.json()
-            
-            if current_roles:
-                current_role_ids = [role['id'] for role in current_roles]
-                remove_payload = {"roles": current_role_ids}
+        result = role_assigner.assign(auth0_id, roles)
 
-                remove_response = requests.delete(roles_url, headers=headers, json=remove_payload)
-                
-                if remove_response.status_code != 204:
-                    return jsonify({'success': False, 'message': 'Failed to remove existing roles', 'error': remove_response.text}), remove_response.status_code
-        else:
-            return jsonify({'success': False, 'message': 'Failed to get current roles', 'error': current_roles_response.text}), current_roles_response.status_code
+        # The mirror and the cached profile of the user are stale now, also
+        # when the roles were removed but the new ones could not be added
+        if result['held'] is not None:
+            auth0_sync.set_user_roles(db.session, auth0_id, result['held'])
+            user_info_cache.invalidate(db.session, [auth0_id])
+            db.session.commit()
 
-        if roles:
-            add_payload = {"roles": roles}
-            add_response = requests.post(roles_url, headers=headers, json=add_payload)
-            
-            if add_response.status_code != 204:
-                return jsonify({'success': False, 'message': 'Failed to add new roles', 'error': add_response.text}), add_response.status_code
-        
-        sessions_url = f"https://{domain}/api/v2/users/{encoded_auth0_id}/sessions"
-        terminate_response = requests.delete(sessions_url, headers=headers)
+        if not result['success']:
+            return jsonify({
+                'success': False, 'message': result['message'], 'error': result['error'], 'removed': result['removed']
+            }), result['status']
         
         if roles:
             return jsonify({'success': True, 'message': 'Roles updated successfully and user sessions terminated'}), 200
@@ -396,50 +401,65 @@ def update_auth0_user_roles(payload, auth0_id):
     finally:
         db.session.close()
 
+# Set the roles of many users at once, each user gets its own result
+@api.route('/auth0-user/roles/bulk', methods=['POST'])
+@requires_auth('assign:permission')
+def bulk_update_auth0_user_roles(payload):
+    try:
+        data = request.get_json() or {}
+        assignments = data.get('assignments')
+
+        if not isinstance(assignments, list) or not assignments:
+            return jsonify({'success': False, 'message': 'assignments must be a non-empty list'}), 400
+
+        if len(assignments) > AUTH0_ROLE_BULK_MAX:
+            return jsonify({'success': False, 'message': f'At most {AUTH0_ROLE_BULK_MAX} assignments per request'}), 400
+
+        for assignment in assignments:
+            if (
+                not isinstance(assignment, dict)
+                or not isinstance(assignment.get('auth0_id'), str)
+                or not isinstance(assignment.get('roles'), list)
+            ):
+                return jsonify({'success': False, 'message': 'Each assignment needs an auth0_id and a roles list'}), 400
+
+        auth0_ids = [assignment['auth0_id'] for assignment in assignments]
+        if len(set(auth0_ids)) != len(auth0_ids):
+            return jsonify({'success': False, 'message': 'Each auth0_id can only appear once'}), 400
+
+        results = role_assigner.assign_many([(assignment['auth0_id'], assignment['roles']) for assignment in assignments])
+
+        updated = [result for result in results if result['success']]
+        # Failed users can have lost roles already, the mirror follows what Auth0 holds
+        known = [result for result in results if result['held'] is not None]
+        for result in known:
+            auth0_sync.set_user_roles(db.session, result['auth0_id'], result['held'])
+        if known:
+            user_info_cache.invalidate(db.session, [result['auth0_id'] for result in known])
+        db.session.commit()
+
+        return jsonify({
+            'success': len(updated) == len(results),
+            'updated': len(updated),
+            'failed': len(results) - len(updated),
+            'results': results
+        }), 200
+    except Exception as e:
+        logging.error(f"Error in bulk_update_auth0_user_roles: {e}")
+        return jsonify({'success': False, 'message': 'Failed to update roles', 'error': str(e)}), 500
+    finally:
+        db.session.close()
+
 @api.route('/auth0-permission')
 @requires_auth('read:auth0-permission')
 def get_auth0_permission(payload):
     try:
-        domain = os.getenv('AUTH0_APP_DOMAIN')
-        app_client_id = os.getenv('AUTH0_APP_CLIENT_ID')
-        client_id = os.getenv('AUTH0_M2M_CLIENT_ID')
-        client_secret = os.getenv('AUTH0_M2M_CLIENT_SECRET')
-
-        token_url = f"https://{domain}/oauth/token"
-        token_payload = {
-            "client_id": client_id,
-            "client_secret": client_secret,
-            "audience": f"https://{domain}/api/v2/",
-            "grant_type": "client_credentials",
-            "scope": "read:users update:users read:roles"
-        }
-
-        token_response = requests.post(token_url, json=token_payload)
-        token_data = token_response.json()
-
-        mgmt_api_token = token_data['access_token']
-
-        headers = {
-            'Authorization': f'Bearer {mgmt_api_token}',
-            'Content-Type': 'application/json'
-        }
-
+        if not auth0_sync.has_synced(db.session):
+            return auth0_mirror_not_synced()
 
-        roles_url = f"https://{domain}/api/v2/roles"
-        roles_response = requests.get(roles_url, headers=headers)
-        roles_data = roles_response.json()
-
-        formatted_permissions = [
-            {
-                "id": role["id"],
-                "name": role["name"],
-                "description": role.get("description", "")
-            }
-            for role in roles_data
-        ]
+        roles = Auth0Roles.query.order_by(Auth0Roles.name).all()
 
-        if not formatted_permissions:
-            formatted_permissions = []
+        formatted_permissions = [role.format() for role in roles]
 
         return jsonify(formatted_permissions), 200
     except Exception as e:
@@ -448,6 +468,13 @@ def get_auth0_permission(payload):
     finally:
         db.session.close()
 
+# The mirror is only filled by `flask sync_auth0_users`, never on the request path
+def auth0_mirror_not_synced():
+    return jsonify({
+        'success': False,
+        'message': 'The Auth0 mirror has not been synced yet, run `flask sync_auth0_users`'
+    }), 503
+
 
 # @api.route('/groups')
 # @requires_auth('get:group')
@@ -469,6 +496,8 @@ def get_auth0_permission(payload):
 #######################
 @api.route('/attendance')
 @requires_auth('get:attendance')
+@read_replica()
+@coalesce_requests()
 def get_latest_attendance(payload):
     try:
         user_id = request.args.get('user_id', type=int)
@@ -479,47 +508,37 @@ def get_latest_attendance(payload):
         if not user_id:
             return jsonify({"error": "User ID is required"}), 400
 
-        query = AttendanceRecords.query.filter_by(user_id=user_id)
+        try:
+            start_day = datetime.strptime(start_date, '%Y-%m-%d').date() if start_date else None
+            end_day = datetime.strptime(end_date, '%Y-%m-%d').date() if end_date else None
+        except ValueError:
+            return jsonify({'success': False, 'message': 'Invalid date format, expected YYYY-MM-DD'}), 400
+
+        ## Days are the user's local days, converted by the database
+        zone_name = user_timezone(user_id)
+        query = db.session.query(
+            func.extract('epoch', local_time(AttendanceRecords.timestamp, zone_name)).cast(BigInteger)
+        ).filter(AttendanceRecords.user_id == user_id)
 
         ## If start_date and end_date provided, add the filter to the query
-        if start_date:
-            query = query.filter(AttendanceRecords.timestamp >= f"{start_date}T00:00:00")
-        if end_date:
-            query = query.filter(AttendanceRecords.timestamp <= f"{end_date}T23:59:59")
-
-        all_records = query.order_by(AttendanceRecords.timestamp).all()
-
-        ## Grouping by day
-        daily_records = {}
-        for record in all_records:
-            ## Convert to 'YYYY-MM-DD'
-            date_str = record.timestamp.strftime('%Y-%m-%d')
-            if date_str not in daily_records:
-                daily_records[date_str] = []
-            daily_records[date_str].append(record)
-
-        summary = []
-        for date, records in daily_records.items():
-            if records:                
-                ## sort the timestamp
-                sorted_records = sorted(records, key=lambda x: x.timestamp)
-                
-                ## get the first and last records as check-in and check-out date time
-                check_in = sorted_records[0]
-                check_out = sorted_records[-1]
-                
-                ## Cal the work duration
-                work_duration = (check_out.timestamp - check_in.timestamp).total_seconds() / 3600
-                
-                ## Try to convert the datetime to ISO format(For front-end display)
-                summary.append({
-                    'date': date,
-                    'checkInTime': check_in.timestamp.isoformat() + 'Z',
-                    'checkOutTime': check_out.timestamp.isoformat() + 'Z',
-                    'workDuration': round(work_duration, 2)
-                })
-        
-        summary.sort(key=lambda x: x['date'], reverse=True)
+        ## One more day on each side, night shifts cross midnight
+        start_bound = local_midnight(start_day - timedelta(days=1), zone_name) if start_day else None
+        end_bound = local_midnight(end_day + timedelta(days=2), zone_name) if end_day else None
+        if start_bound:
+            query = query.filter(AttendanceRecords.timestamp >= start_bound)
+        if end_bound:
+            query = query.filter(AttendanceRecords.timestamp < end_bound)
+
+        local_seconds = [row[0] for row in query.order_by(AttendanceRecords.timestamp).all()]
+
+        ## Months moved out of the table are read from the archive files
+        archived = attendance_archive.user_punches(user_id, start_bound, end_bound)
+        if archived.size:
+            local_seconds = sorted(to_local_seconds(archived, zone_name).tolist() + local_seconds)
+
+        ## Punches are matched to the user's shifts, the ones outside any shift are grouped by day.
+        ## The JSON provider encodes the datetimes as ISO 8601 with the user's offset (For front-end display)
+        summary = shift_schedules.daily_summary(user_id, local_seconds, zone_name, start_day, end_day)
         
         return jsonify(summary), 200
     except Exception as e:
@@ -528,40 +547,195 @@ def get_latest_attendance(payload):
     finally:
         db.session.close()
 
+# Raw punches for audits, one keyset page at a time, the next one starts at next_cursor
+@api.route('/attendance/records')
+@requires_auth('get:attendance')
+@read_replica()
+def get_attendance_records(payload):
+    try:
+        user_id = request.args.get('user_id', type=int)
+        department = request.args.get('department') or None
+        cursor = request.args.get('cursor') or None
+        order = request.args.get('order', 'asc')
+
+        if order not in ('asc', 'desc'):
+            return jsonify({'success': False, 'message': 'order must be asc or desc'}), 400
+
+        try:
+            limit = min(max(int(request.args.get('limit', RECORDS_PAGE_SIZE)), 1), RECORDS_MAX_PAGE_SIZE)
+        except ValueError:
+            return jsonify({'success': False, 'message': 'limit must be an integer'}), 400
+
+        try:
+            # Instants, or dates for their midnight. Naive values are site time, end is excluded
+            start, end = (
+                as_aware(datetime.fromisoformat(value.replace('Z', '+00:00'))) if value else None
+                for value in (request.args.get('start'), request.args.get('end'))
+            )
+        except ValueError:
+            return jsonify({'success': False, 'message': 'Invalid start or end, expected ISO 8601'}), 400
+
+        try:
+            rows, next_cursor = page_records(limit, cursor, user_id, department, start, end, descending=order == 'desc')
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+
+        return jsonify({
+            'success': True,
+            'records': AttendanceRecords.format_rows(rows),
+            'next_cursor': next_cursor
+        }), 200
+    except Exception as e:
+        print(e)
+        return jsonify({'success': False, 'message': 'Failed to get attendance records', 'error': str(e)}), 500
+    finally:
+        db.session.close()
+
+# Monthly statistics per user or per department, precomputed and cached per month
+@api.route('/attendance/statistics')
+@requires_auth('get:attendance-statistics')
+def get_attendance_statistics(payload):
+    try:
+        month = request.args.get('month') or datetime.now(get_zone()).strftime('%Y-%m')
+        scope = request.args.get('scope', 'user')
+        refresh = request.args.get('refresh', '').lower() in ('1', 'true')
+
+        if scope not in SCOPES:
+            return jsonify({'success': False, 'message': f'scope must be one of {", ".join(SCOPES)}'}), 400
+
+        try:
+            # Normalized, the cache is keyed by the month string
+            month = month_bounds(month)[0].strftime('%Y-%m')
+        except ValueError:
+            return jsonify({'success': False, 'message': 'Invalid month format, expected YYYY-MM'}), 400
+
+        statistics = attendance_statistics.get(scope, month, refresh=refresh)
+
+        if wants_compact():
+            fields = USER_FIELDS if scope == 'user' else DEPARTMENT_FIELDS
+            statistics['data'] = compact_rows(fields, [[entry[field] for field in fields] for entry in statistics['data']])
+
+        return jsonify(statistics), 200
+    except Exception as e:
+        print(e)
+        return jsonify({'success': False, 'message': 'Failed to get attendance statistics', 'error': str(e)}), 500
+    finally:
+        db.session.close()
+
+# First and last punch today of every user who punched in, for the presence boards.
+# Served from the worker's memory, kept current through LISTEN/NOTIFY.
+@api.route('/attendance/today')
+@requires_auth('get:attendance')
+def get_today_attendance(payload):
+    try:
+        return jsonify(today_snapshot.get()), 200
+    except Exception as e:
+        print(e)
+        return jsonify({'success': False, 'message': 'Failed to get today attendance', 'error': str(e)}), 500
+    finally:
+        db.session.close()
+
+# Live feed of punches, a snapshot of today then one event per new punch
+@api.route('/attendance/stream')
+@requires_auth('get:attendance', allow_query_token=True)
+def stream_attendance(payload):
+    try:
+        # Subscribe before the snapshot so no punch falls in between
+        client = live_feed.connect(None if cooperative_worker() else LIVE_FEED_THREAD_STREAMS)
+        if client is None:
+            return jsonify({
+                'success': False,
+                'message': 'Live feed streams need the gevent worker, set GUNICORN_WORKER_CLASS=gevent'
+            }), 503
+        try:
+            snapshot = live_feed.snapshot()
+        except Exception:
+            live_feed.disconnect(client)
+            raise
+
+        def generate():
+            try:
+                yield format_sse('snapshot', snapshot)
+                while True:
+                    try:
+                        punch = client.get(timeout=STREAM_KEEPALIVE_SECONDS)
+                    except queue.Empty:
+                        yield ': keep-alive\n\n'
+                        continue
+
+                    if punch is LAGGED:
+                        # Client fell behind, it should reconnect and reload the snapshot
+                        yield format_sse('reset', {})
+                        return
+
+                    yield format_sse('punch', punch)
+            finally:
+                live_feed.disconnect(client)
+
+        return Response(generate(), mimetype='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        })
+    except Exception as e:
+        print(e)
+        return jsonify({'success': False, 'message': 'Failed to open attendance stream', 'error': str(e)}), 500
+    finally:
+        # The stream itself never holds a db connection
+        db.session.close()
+
 @api.route('/attendance', methods=['POST'])
 @requires_auth('post:attendance')
 def add_attendance_record(payload):
     try:
         request_data = request.get_json()
         
-        if not all(key in request_data for key in ['user_id', 'timestamp']):
+        if 'timestamp' not in request_data or not any(key in request_data for key in ['user_id', 'card_id']):
             return jsonify({
-                'message': 'Missing required fields: user_id, timestamp'
+                'message': 'Missing required fields: user_id or card_id, timestamp'
             }), 400
             
         user_id = request_data.get('user_id')
+        card_id = request_data.get('card_id')
         timestamp_str = request_data.get('timestamp')
+
+        if isinstance(user_id, bool):
+            return jsonify({
+                'message': 'user_id must be an integer'
+            }), 400
         
-        # try:
-        #     timestamp = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
-        # except ValueError as e:
-        #     return jsonify({
-        #         'message': f'Invalid timestamp format: {str(e)}'
-        #     }), 400
+        try:
+            # Readers sending a time without offset are on site time
+            timestamp = as_aware(datetime.fromisoformat(timestamp_str.replace('Z', '+00:00')))
+        except (AttributeError, ValueError) as e:
+            return jsonify({
+                'message': f'Invalid timestamp format: {str(e)}'
+            }), 400
             
-        user = db.session.get(Users, user_id)
-        
-        if not user:
+        # Card readers send the card uid, resolved from the in-memory index
+        if card_id is not None:
+            # Card validity windows are naive site time
+            user_id = card_index.resolve(str(card_id).strip(), timestamp.astimezone(get_zone()).replace(tzinfo=None))
+            if user_id is None:
+                return jsonify({
+                    'message': f'Card {card_id} is not assigned to a user'
+                }), 404
+            
+        # Served from the process cache, only unknown ids hit the db
+        if not active_user_cache.is_active(user_id):
             return jsonify({
                 'message': f'User with ID {user_id} not found'
             }), 404
             
         new_record = AttendanceRecords(
             user_id=user_id,
-            timestamp=timestamp_str
+            timestamp=timestamp
         )
         
-        new_record.insert()
+        # Publish in the same transaction, dashboards only see committed punches
+        db.session.add(new_record)
+        db.session.flush()
+        live_feed.publish_punch(db.session, new_record)
+        db.session.commit()
         
         return jsonify({
             'id': new_record.id,
@@ -569,6 +743,13 @@ def add_attendance_record(payload):
             'timestamp': new_record.timestamp.isoformat()
         }), 201
         
+    except exc.IntegrityError:
+        # The user was removed after it got cached
+        db.session.rollback()
+        active_user_cache.discard([user_id])
+        return jsonify({
+            'message': f'User with ID {user_id} not found'
+        }), 404
     except Exception as e:
         print(f"Error creating attendance record: {str(e)}")
         db.session.rollback()
@@ -580,104 +761,695 @@ def add_attendance_record(payload):
         db.session.close()
 
 ###################
-## -- Events  -- ##
+## --  Cards  -- ##
 ###################
-@api.route('/events')
-@requires_auth('get:events')
-def get_events(payload):
+@api.route('/cards')
+@requires_auth('get:cards')
+def get_cards(payload):
     try:
-        start_date_str = request.args.get('start_date')
-        end_date_str = request.args.get('end_date')
-        year_month = request.args.get('year_month')
-
-        if start_date_str and end_date_str:
-            start_date = datetime.strptime(start_date_str, '%Y-%m-%d')
-            end_date = datetime.strptime(end_date_str, '%Y-%m-%d') + timedelta(days=1)
-            
-            events = Events.query.filter(
-                Events.date >= start_date,
-                Events.date < end_date
-            ).all()
-
-        elif year_month:
-            year, month = year_month.split('-')
-            year = int(year)
-            month = int(month)
+        user_id = request.args.get('user_id', type=int)
 
-            start_date = datetime(year, month, 1)
-            
-            if month == 12:
-                end_date = datetime(year + 1, 1, 1)
-            else:
-                end_date = datetime(year, month + 1, 1)
-        
-            events = Events.query.filter(
-                Events.date >= start_date,
-                Events.date < end_date
-            ).all()
+        query = Cards.query
+        if user_id:
+            query = query.filter_by(user_id=user_id)
 
-        if events:
-            formatted_events = [event.format() for event in events]
-        else:
-            formatted_events = []
+        cards = query.order_by(Cards.card_uid, Cards.valid_from).all()
 
-        return jsonify({
-            'events': formatted_events
-        }), 200
+        return jsonify([card.format() for card in cards]), 200
     except Exception as e:
         print(e)
-        return jsonify({'success': False, 'message': 'Failed to get events', 'error': str(e)}), 500
+        return jsonify({'success': False, 'message': 'Failed to get cards', 'error': str(e)}), 500
     finally:
         db.session.close()
 
-@api.route('/events', methods=['POST'])
-@requires_auth('post:events')
-def create_events(payload):
+@api.route('/cards', methods=['POST'])
+@requires_auth('post:cards')
+def create_card(payload):
     try:
         request_data = request.get_json()
-        
-        if not all(key in request_data for key in ['name', 'date']):
+
+        if not all(key in request_data for key in ['card_uid', 'user_id']):
             return jsonify({
-                'message': 'Missing required fields: name, date'
+                'message': 'Missing required fields: card_uid, user_id'
             }), 400
-        
-        name = request_data.get('name')
-        description = request_data.get('description', '')
-        event_date_str = request_data.get('date')
-        
+
         try:
-            event_date = datetime.fromisoformat(event_date_str)
-        
+            valid_from = parse_optional_datetime(request_data.get('valid_from'))
+            valid_until = parse_optional_datetime(request_data.get('valid_until'))
         except ValueError as e:
             return jsonify({
                 'message': f'Invalid date format: {str(e)}'
             }), 400
-        
-        new_event = Events(
-            name=name,
-            desc=description,
-            date=event_date
+
+        if invalid_card_validity(valid_from, valid_until):
+            return jsonify({
+                'message': 'valid_from must be before valid_until'
+            }), 400
+
+        if not isinstance(request_data['user_id'], int) or isinstance(request_data['user_id'], bool):
+            return jsonify({
+                'message': 'user_id must be an integer'
+            }), 400
+
+        if not db.session.get(Users, request_data['user_id']):
+            return jsonify({
+                'message': f"User with ID {request_data['user_id']} not found"
+            }), 404
+
+        new_card = Cards(
+            card_uid=str(request_data['card_uid']).strip(),
+            user_id=request_data['user_id'],
+            valid_from=valid_from,
+            valid_until=valid_until
         )
 
-        new_event.insert()
-        
+        db.session.add(new_card)
+        card_index.invalidate(db.session)
+        db.session.commit()
+
         return jsonify({
-            'id': new_event.id,
+            'id': new_card.id,
         }), 201
-        
     except Exception as e:
-        print(f"Error creating event: {str(e)}")
+        print(f"Error creating card: {str(e)}")
         db.session.rollback()
         return jsonify({
-            'message': 'An error occurred while creating the event',
+            'message': 'An error occurred while creating the card',
             'error': str(e)
         }), 500
     finally:
         db.session.close()
 
-@api.route('/events/<int:event_id>', methods=['DELETE'])
-@requires_auth('delete:events')
-def delete_events(payload, event_id):
+@api.route('/cards/<int:card_id>', methods=['PATCH'])
+@requires_auth('patch:cards')
+def patch_card(payload, card_id):
+    try:
+        card = db.session.get(Cards, card_id)
+
+        if not card:
+            return jsonify({
+                'success': False,
+                'message': 'Card not found'
+            }), 404
+
+        request_data = request.get_json()
+
+        try:
+            if 'valid_from' in request_data:
+                card.valid_from = parse_optional_datetime(request_data['valid_from'])
+            if 'valid_until' in request_data:
+                card.valid_until = parse_optional_datetime(request_data['valid_until'])
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'message': f'Invalid date format: {str(e)}'
+            }), 400
+
+        if invalid_card_validity(card.valid_from, card.valid_until):
+            return jsonify({
+                'success': False,
+                'message': 'valid_from must be before valid_until'
+            }), 400
+
+        if 'user_id' in request_data:
+            if not isinstance(request_data['user_id'], int) or isinstance(request_data['user_id'], bool):
+                return jsonify({
+                    'success': False,
+                    'message': 'user_id must be an integer'
+                }), 400
+            if not db.session.get(Users, request_data['user_id']):
+                return jsonify({
+                    'success': False,
+                    'message': f"User with ID {request_data['user_id']} not found"
+                }), 404
+            card.user_id = request_data['user_id']
+
+        if 'is_active' in request_data:
+            card.is_active = bool(request_data['is_active'])
+
+        card_index.invalidate(db.session)
+        card.update()
+
+        return jsonify({
+            'success': True,
+            'id': card.id,
+            'updated': True
+        }), 200
+    except Exception as e:
+        print(f"Error patching card: {str(e)}")
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'message': 'An error occurred while updating the card',
+            'error': str(e)
+        }), 500
+    finally:
+        db.session.close()
+
+# Card validity bound -> naive site time, the time cards are resolved against.
+# Values with an offset are converted to site time, naive ones are site time.
+def parse_optional_datetime(value):
+    if value is None or value == '':
+        return None
+    if not isinstance(value, str):
+        raise ValueError(f'expected an ISO 8601 string, got {value!r}')
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(get_zone()).replace(tzinfo=None)
+    return parsed
+
+def invalid_card_validity(valid_from, valid_until):
+    return valid_from is not None and valid_until is not None and valid_from >= valid_until
+
+###################
+## -- Shifts  -- ##
+###################
+@api.route('/shifts')
+@requires_auth('get:shifts')
+def get_shifts(payload):
+    try:
+        shifts = Shifts.query.order_by(Shifts.name).all()
+        assignments = ShiftAssignments.query.order_by(ShiftAssignments.start_date).all()
+
+        return jsonify({
+            'shifts': [shift.format() for shift in shifts],
+            'assignments': [assignment.format() for assignment in assignments]
+        }), 200
+    except Exception as e:
+        print(e)
+        return jsonify({'success': False, 'message': 'Failed to get shifts', 'error': str(e)}), 500
+    finally:
+        db.session.close()
+
+@api.route('/shifts', methods=['POST'])
+@requires_auth('post:shifts')
+def create_shift(payload):
+    try:
+        request_data = request.get_json()
+
+        if not all(key in request_data for key in ['name', 'start_time', 'end_time']):
+            return jsonify({
+                'message': 'Missing required fields: name, start_time, end_time'
+            }), 400
+
+        weekdays = str(request_data.get('weekdays', '12345'))
+        try:
+            start_time = datetime.strptime(request_data['start_time'], '%H:%M').time()
+            end_time = datetime.strptime(request_data['end_time'], '%H:%M').time()
+            break_minutes = int(request_data.get('break_minutes', 0))
+            grace_minutes = int(request_data.get('grace_minutes', 0))
+        except (TypeError, ValueError) as e:
+            return jsonify({
+                'message': f'Invalid shift format: {str(e)}'
+            }), 400
+
+        if not weekdays or not set(weekdays) <= set('1234567'):
+            return jsonify({
+                'message': 'weekdays must be ISO weekday digits, like 12345'
+            }), 400
+
+        new_shift = Shifts(
+            name=request_data['name'],
+            start_time=start_time,
+            end_time=end_time,
+            break_minutes=break_minutes,
+            grace_minutes=grace_minutes,
+            weekdays=''.join(sorted(set(weekdays)))
+        )
+        new_shift.insert()
+
+        return jsonify({
+            'id': new_shift.id,
+        }), 201
+    except exc.IntegrityError:
+        db.session.rollback()
+        return jsonify({
+            'message': 'A shift with this name already exists'
+        }), 409
+    except Exception as e:
+        print(f"Error creating shift: {str(e)}")
+        db.session.rollback()
+        return jsonify({
+            'message': 'An error occurred while creating the shift',
+            'error': str(e)
+        }), 500
+    finally:
+        db.session.close()
+
+@api.route('/shifts/assignments', methods=['POST'])
+@requires_auth('post:shifts')
+def create_shift_assignment(payload):
+    try:
+        request_data = request.get_json()
+
+        if not all(key in request_data for key in ['shift_id', 'start_date']):
+            return jsonify({
+                'message': 'Missing required fields: shift_id, start_date'
+            }), 400
+
+        if bool(request_data.get('user_id')) == bool(request_data.get('department')):
+            return jsonify({
+                'message': 'Either user_id or department is required'
+            }), 400
+
+        try:
+            start_date = datetime.strptime(request_data['start_date'], '%Y-%m-%d').date()
+            end_date = datetime.strptime(request_data['end_date'], '%Y-%m-%d').date() if request_data.get('end_date') else None
+        except ValueError as e:
+            return jsonify({
+                'message': f'Invalid date format: {str(e)}'
+            }), 400
+
+        if end_date and end_date < start_date:
+            return jsonify({
+                'message': 'end_date must not be before start_date'
+            }), 400
+
+        if not db.session.get(Shifts, request_data['shift_id']):
+            return jsonify({
+                'message': f"Shift with ID {request_data['shift_id']} not found"
+            }), 404
+
+        if request_data.get('user_id') and not db.session.get(Users, request_data['user_id']):
+            return jsonify({
+                'message': f"User with ID {request_data['user_id']} not found"
+            }), 404
+
+        new_assignment = ShiftAssignments(
+            shift_id=request_data['shift_id'],
+            start_date=start_date,
+            end_date=end_date,
+            user_id=request_data.get('user_id'),
+            department=request_data.get('department')
+        )
+        new_assignment.insert()
+
+        return jsonify({
+            'id': new_assignment.id,
+        }), 201
+    except Exception as e:
+        print(f"Error creating shift assignment: {str(e)}")
+        db.session.rollback()
+        return jsonify({
+            'message': 'An error occurred while creating the shift assignment',
+            'error': str(e)
+        }), 500
+    finally:
+        db.session.close()
+
+@api.route('/shifts/assignments/<int:assignment_id>', methods=['DELETE'])
+@requires_auth('delete:shifts')
+def delete_shift_assignment(payload, assignment_id):
+    try:
+        assignment = db.session.get(ShiftAssignments, assignment_id)
+
+        if not assignment:
+            return jsonify({
+                'success': False,
+                'message': 'Shift assignment not found'
+            }), 404
+
+        assignment.delete()
+
+        return jsonify({
+            'success': True,
+            'deleted': assignment_id
+        }), 200
+    except Exception as e:
+        print(f"Error deleting shift assignment: {str(e)}")
+        db.session.rollback()
+        return jsonify({
+            'message': 'An error occurred while deleting the shift assignment',
+            'error': str(e)
+        }), 500
+    finally:
+        db.session.close()
+
+###################
+## -- Metrics -- ##
+###################
+# Identical concurrent reads served by one run of the view, counted per worker
+@api.route('/metrics/coalescing')
+@requires_auth('get:admin-panel')
+def get_coalescing_metrics(payload):
+    return jsonify({'success': True, 'routes': request_coalescer.stats()}), 200
+
+# Admitted, rate limited and shed requests per priority class of this worker
+@api.route('/metrics/load')
+@requires_auth('get:admin-panel')
+def get_load_metrics(payload):
+    return jsonify({'success': True, **load_guard.stats()}), 200
+
+###################
+## -- Search  -- ##
+###################
+# Each type needs the permission of its listing, the types the caller can't list are skipped
+SEARCH_PERMISSIONS = {'events': 'get:events', 'users': 'get:users'}
+
+@api.route('/search')
+@requires_auth()
+@read_replica()
+def search(payload):
+    text = (request.args.get('q') or '').strip()
+    if not text:
+        return jsonify({'success': False, 'message': 'q is required'}), 400
+
+    requested = [name.strip() for name in request.args.get('type', ','.join(SEARCH_TYPES)).split(',') if name.strip()]
+    if any(name not in SEARCH_TYPES for name in requested):
+        return jsonify({'success': False, 'message': f'type must be one of {", ".join(SEARCH_TYPES)}'}), 400
+
+    permissions = payload.get('permissions', [])
+    types = [name for name in requested if SEARCH_PERMISSIONS[name] in permissions]
+    if not types:
+        raise AuthError({'code': 'unauthorized', 'description': 'Permission not found.'}, 403)
+
+    try:
+        page = max(int(request.args.get('page', 1)), 1)
+        per_page = min(max(int(request.args.get('per_page', SEARCH_PAGE_SIZE)), 1), SEARCH_MAX_PAGE_SIZE)
+    except ValueError:
+        return jsonify({'success': False, 'message': 'page and per_page must be integers'}), 400
+
+    try:
+        offset = (page - 1) * per_page
+        results = {'success': True, 'q': text, 'page': page, 'per_page': per_page}
+        if 'events' in types:
+            rows, has_more = search_events(text, per_page, offset)
+            results['events'] = {'items': Events.format_rows(rows), 'has_more': has_more}
+        if 'users' in types:
+            rows, has_more = search_users(text, per_page, offset)
+            results['users'] = {'items': Users.format_rows(rows), 'has_more': has_more}
+
+        return jsonify(results), 200
+    except Exception as e:
+        print(f"Error searching: {str(e)}")
+        return jsonify({'success': False, 'message': 'Failed to search', 'error': str(e)}), 500
+    finally:
+        db.session.close()
+
+###################
+## -- Events  -- ##
+###################
+@api.route('/events')
+@requires_auth('get:events')
+@read_replica()
+@coalesce_requests()
+def get_events(payload):
+    try:
+        start_date_str = request.args.get('start_date')
+        end_date_str = request.args.get('end_date')
+        year_month = request.args.get('year_month')
+
+        if start_date_str and end_date_str:
+            first_day = datetime.strptime(start_date_str, '%Y-%m-%d').date()
+            end_day = datetime.strptime(end_date_str, '%Y-%m-%d').date() + timedelta(days=1)
+
+        elif year_month:
+            year, month = year_month.split('-')
+            year = int(year)
+            month = int(month)
+
+            first_day = datetime(year, month, 1).date()
+            
+            if month == 12:
+                end_day = datetime(year + 1, 1, 1).date()
+            else:
+                end_day = datetime(year, month + 1, 1).date()
+
+        ## Days of the site
+        start_date, end_date = local_midnight(first_day), local_midnight(end_day)
+
+        events = db.session.query(*Events.format_columns()).filter(
+            Events.rrule == None,
+            Events.date >= start_date,
+            Events.date < end_date
+        ).all()
+        formatted_events = Events.format_rows(events)
+
+        ## Recurring events are expanded on the window only, with their exceptions
+        moved_in = db.session.query(EventExceptions.event_id).filter(
+            EventExceptions.date >= start_date,
+            EventExceptions.date < end_date
+        )
+        series = db.session.query(*Events.format_columns(), Events.until).filter(
+            Events.rrule != None,
+            or_(
+                and_(Events.date < end_date, or_(Events.until == None, Events.until >= start_date)),
+                Events.id.in_(moved_in)
+            )
+        ).all()
+
+        if series:
+            exceptions = db.session.query(
+                EventExceptions.event_id, EventExceptions.occurrence, EventExceptions.cancelled,
+                EventExceptions.name, EventExceptions.desc, EventExceptions.date
+            ).filter(
+                EventExceptions.event_id.in_([row[0] for row in series]),
+                or_(
+                    and_(EventExceptions.occurrence >= start_date, EventExceptions.occurrence < end_date),
+                    and_(EventExceptions.date >= start_date, EventExceptions.date < end_date)
+                )
+            ).all()
+            formatted_events += expand_events(series, exceptions, start_date, end_date, get_zone())
+            formatted_events.sort(key=lambda event: event['date'])
+
+        if wants_compact():
+            return jsonify({
+                'events': compact_rows(Events.COMPACT_FIELDS, [[event[field] for field in Events.COMPACT_FIELDS] for event in formatted_events])
+            }), 200
+
+        return jsonify({
+            'events': formatted_events
+        }), 200
+    except Exception as e:
+        print(e)
+        return jsonify({'success': False, 'message': 'Failed to get events', 'error': str(e)}), 500
+    finally:
+        db.session.close()
+
+@api.route('/events', methods=['POST'])
+@requires_auth('post:events')
+def create_events(payload):
+    try:
+        request_data = request.get_json()
+        
+        if not all(key in request_data for key in ['name', 'date']):
+            return jsonify({
+                'message': 'Missing required fields: name, date'
+            }), 400
+        
+        name = request_data.get('name')
+        description = request_data.get('description', '')
+        event_date_str = request_data.get('date')
+        
+        try:
+            event_date = as_aware(datetime.fromisoformat(event_date_str))
+        
+        except ValueError as e:
+            return jsonify({
+                'message': f'Invalid date format: {str(e)}'
+            }), 400
+
+        ## Recurring events keep one row, the occurrences are expanded on read
+        rrule = request_data.get('rrule') or None
+        try:
+            rrule, until = normalize_rrule(rrule, event_date)
+        except ValueError as e:
+            return jsonify({
+                'message': f'Invalid rrule: {str(e)}'
+            }), 400
+        
+        new_event = Events(
+            name=name,
+            desc=description,
+            date=event_date,
+            rrule=rrule,
+            until=until
+        )
+
+        new_event.insert()
+        
+        return jsonify({
+            'id': new_event.id,
+        }), 201
+        
+    except Exception as e:
+        print(f"Error creating event: {str(e)}")
+        db.session.rollback()
+        return jsonify({
+            'message': 'An error occurred while creating the event',
+            'error': str(e)
+        }), 500
+    finally:
+        db.session.close()
+
+# Imports many events at once from a JSON array or an iCalendar (.ics) file.
+# The upload is parsed as a stream and inserted with multi-row statements in
+# one transaction, an invalid event rolls the whole import back.
+@api.route('/events/bulk', methods=['POST'])
+@requires_auth('post:events')
+def bulk_create_events(payload):
+    try:
+        upload = request.files.get('file')
+        content_type = (upload.mimetype if upload else request.mimetype) or ''
+        filename = (upload.filename if upload else '') or ''
+        stream = upload.stream if upload else request.stream
+
+        if content_type == 'text/calendar' or filename.lower().endswith('.ics'):
+            items = iter_ics_events(stream)
+        else:
+            items = iter_json_events(stream)
+
+        try:
+            inserted, errors, error_count = import_events(
+                items, lambda rows: db.session.execute(insert(Events).values(rows)), get_zone()
+            )
+        except EventImportError as e:
+            db.session.rollback()
+            return jsonify({
+                'success': False,
+                'message': str(e)
+            }), 400
+
+        if error_count:
+            db.session.rollback()
+            return jsonify({
+                'success': False,
+                'message': f'{error_count} invalid events, nothing was imported',
+                'errors': [{'index': index, 'message': message} for index, message in errors]
+            }), 400
+
+        db.session.commit()
+
+        return jsonify({
+            'success': True,
+            'created': inserted
+        }), 201
+    except Exception as e:
+        print(f"Error importing events: {str(e)}")
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'message': 'An error occurred while importing the events',
+            'error': str(e)
+        }), 500
+    finally:
+        db.session.close()
+
+# Updates many events in one transaction, the body is an array of changes with the event id
+@api.route('/events/bulk', methods=['PATCH'])
+@requires_auth('patch:events')
+def bulk_patch_events(payload):
+    try:
+        changes = request.get_json()
+
+        if not isinstance(changes, list) or not changes or not all(isinstance(change, dict) and is_record_id(change.get('id')) for change in changes):
+            return jsonify({
+                'success': False,
+                'message': 'Expected a non-empty array of changes, each with an integer id'
+            }), 400
+
+        if len(changes) > EVENTS_BULK_MAX:
+            return jsonify({
+                'success': False,
+                'message': f'At most {EVENTS_BULK_MAX} events can be updated at once'
+            }), 400
+
+        ids = [change['id'] for change in changes]
+        events = {event.id: event for event in Events.query.filter(Events.id.in_(ids)).all()}
+        missing = sorted(set(ids) - set(events))
+        if missing:
+            return jsonify({
+                'success': False,
+                'message': 'Events not found',
+                'missing': missing[:EVENTS_BULK_MAX_ERRORS]
+            }), 404
+
+        errors = []
+        for index, change in enumerate(changes):
+            event = events[change['id']]
+            try:
+                if 'name' in change:
+                    if not isinstance(change['name'], str) or not change['name'].strip():
+                        raise ValueError('name must be a non-empty text')
+                    event.name = change['name'].strip()
+                if 'description' in change:
+                    event.desc = change['description']
+                if 'date' in change:
+                    event.date = as_aware(datetime.fromisoformat(change['date']))
+                if 'rrule' in change or ('date' in change and event.rrule):
+                    event.rrule, event.until = normalize_rrule(change.get('rrule', event.rrule) or None, event.date)
+            except (TypeError, ValueError) as e:
+                errors.append({'index': index, 'message': str(e)})
+
+        if errors:
+            db.session.rollback()
+            return jsonify({
+                'success': False,
+                'message': f'{len(errors)} invalid changes, nothing was updated',
+                'errors': errors[:EVENTS_BULK_MAX_ERRORS]
+            }), 400
+
+        db.session.commit()
+
+        return jsonify({
+            'success': True,
+            'updated': len(events)
+        }), 200
+    except Exception as e:
+        print(f"Error updating events: {str(e)}")
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'message': 'An error occurred while updating the events',
+            'error': str(e)
+        }), 500
+    finally:
+        db.session.close()
+
+# Deletes many events with one statement, their exceptions go with them
+@api.route('/events/bulk', methods=['DELETE'])
+@requires_auth('delete:events')
+def bulk_delete_events(payload):
+    try:
+        request_data = request.get_json()
+        ids = request_data.get('ids') if isinstance(request_data, dict) else None
+
+        if not isinstance(ids, list) or not ids or not all(is_record_id(event_id) for event_id in ids):
+            return jsonify({
+                'success': False,
+                'message': 'ids must be a non-empty array of event ids'
+            }), 400
+
+        if len(ids) > EVENTS_BULK_MAX:
+            return jsonify({
+                'success': False,
+                'message': f'At most {EVENTS_BULK_MAX} events can be deleted at once'
+            }), 400
+
+        deleted = db.session.execute(
+            delete(Events).where(Events.id.in_(ids)).returning(Events.id)
+        ).scalars().all()
+        db.session.commit()
+
+        return jsonify({
+            'success': True,
+            'deleted': len(deleted),
+            'missing': sorted(set(ids) - set(deleted))[:EVENTS_BULK_MAX_ERRORS]
+        }), 200
+    except Exception as e:
+        print(f"Error deleting events: {str(e)}")
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'message': 'An error occurred while deleting the events',
+            'error': str(e)
+        }), 500
+    finally:
+        db.session.close()
+
+@api.route('/events/<int:event_id>', methods=['DELETE'])
+@requires_auth('delete:events')
+def delete_events(payload, event_id):
     try:
         event_id = int(event_id)
         event = db.session.get(Events, event_id)
@@ -725,13 +1497,22 @@ def patch_events(payload, event_id):
         
         if 'date' in request_data:
             try:
-                event_date = datetime.fromisoformat(request_data['date'])
+                event_date = as_aware(datetime.fromisoformat(request_data['date']))
                 event.date = event_date
             except ValueError as e:
                 return jsonify({
                     'success': False,
                     'message': f'Invalid date format: {str(e)}'
                 }), 400
+
+        if 'rrule' in request_data or ('date' in request_data and event.rrule):
+            try:
+                event.rrule, event.until = normalize_rrule(request_data.get('rrule', event.rrule) or None, event.date)
+            except ValueError as e:
+                return jsonify({
+                    'success': False,
+                    'message': f'Invalid rrule: {str(e)}'
+                }), 400
         
         event.update()
         
@@ -752,6 +1533,110 @@ def patch_events(payload, event_id):
     finally:
         db.session.close()
 
+# Changes one occurrence of a recurring event, or cancels it
+@api.route('/events/<int:event_id>/exceptions', methods=['POST'])
+@requires_auth('patch:events')
+def create_event_exception(payload, event_id):
+    try:
+        event = db.session.get(Events, event_id)
+
+        if not event or not event.rrule:
+            return jsonify({
+                'success': False,
+                'message': 'Recurring event not found'
+            }), 404
+
+        request_data = request.get_json()
+
+        if 'occurrence' not in request_data:
+            return jsonify({
+                'success': False,
+                'message': 'Missing required field: occurrence'
+            }), 400
+
+        try:
+            occurrence = as_aware(datetime.fromisoformat(request_data['occurrence']))
+            date = as_aware(datetime.fromisoformat(request_data['date'])) if request_data.get('date') else None
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'message': f'Invalid date format: {str(e)}'
+            }), 400
+
+        rule = parse_rrule(event.rrule)
+        dtstart = event.date.astimezone(get_zone())
+        if next(occurrences(rule, dtstart, occurrence, occurrence + timedelta(microseconds=1), event.until), None) is None:
+            return jsonify({
+                'success': False,
+                'message': 'occurrence is not an occurrence of the event'
+            }), 400
+
+        values = {
+            'event_id': event_id,
+            'occurrence': occurrence,
+            'cancelled': bool(request_data.get('cancelled', False)),
+            'name': request_data.get('name'),
+            'desc': request_data.get('description'),
+            'date': date,
+        }
+        statement = insert(EventExceptions).values(values)
+        exception_id = db.session.execute(statement.on_conflict_do_update(
+            constraint='uq_event_exception_occurrence',
+            set_={key: statement.excluded[key] for key in ('cancelled', 'name', 'desc', 'date')}
+        ).returning(EventExceptions.id)).scalar()
+        db.session.commit()
+
+        return jsonify({
+            'success': True,
+            'id': exception_id
+        }), 201
+    except Exception as e:
+        print(f"Error creating event exception: {str(e)}")
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'message': 'An error occurred while changing the occurrence',
+            'error': str(e)
+        }), 500
+    finally:
+        db.session.close()
+
+@api.route('/events/<int:event_id>/exceptions/<int:exception_id>', methods=['DELETE'])
+@requires_auth('patch:events')
+def delete_event_exception(payload, event_id, exception_id):
+    try:
+        exception = db.session.get(EventExceptions, exception_id)
+        if not exception or exception.event_id != event_id:
+            return jsonify({
+                'success': False,
+                'message': f'Exception with ID {exception_id} not found'
+            }), 404
+
+        db.session.delete(exception)
+        db.session.commit()
+
+        return jsonify({
+            'success': True,
+            'delete': exception_id
+        }), 200
+    except Exception as e:
+        print(f"Error deleting event exception: {str(e)}")
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'message': 'An error occurred while deleting the exception',
+            'error': str(e)
+        }), 500
+    finally:
+        db.session.close()
+
+# rrule text -> (normalized rrule, last occurrence), raises ValueError
+def normalize_rrule(rrule, event_date):
+    if not rrule:
+        return None, None
+    rule = parse_rrule(rrule)
+    return format_rrule(rule), resolve_until(rule, event_date.astimezone(get_zone()))
+
 ###########################
 ##### --   Leave   -- #####
 ###########################
@@ -0,0 +1,4 @@
+from .json_provider import FastJSONProvider, dumps_bytes
+from .compact import wants_compact, compact_rows, pick
+
+__all__ = ['FastJSONProvider', 'dumps_bytes', 'wants_compact', 'compact_rows', 'pick']
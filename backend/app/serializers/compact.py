@@ -0,0 +1,18 @@
+from flask import request
+
+# compact=1 responses send list rows as arrays, with the field names only once:
+# {"fields": ["id", "username"], "rows": [[1, "ken"], [2, "amy"]]}
+def wants_compact():
+    return request.args.get('compact', '').lower() in ('1', 'true')
+
+
+def compact_rows(fields, rows):
+    return {
+        'fields': list(fields),
+        'rows': [tuple(row) for row in rows]
+    }
+
+
+# Keeps only the given keys of a dict, for the single object responses
+def pick(data, keys):
+    return {key: data[key] for key in keys if key in data}
@@ -0,0 +1,67 @@
+import dataclasses, decimal, json, uuid
+
+from datetime import date
+from flask.json.provider import DefaultJSONProvider
+
+# orjson is optional, the stdlib encoder is used when it isn't installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if orjson is not None:
+    # Naive datetimes are encoded without an offset, they aren't all UTC:
+    # card validity windows and statistics times are site wall time
+    ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def _default(o):
+    if isinstance(o, date):
+        return o.isoformat()
+    if isinstance(o, decimal.Decimal):
+        return str(o)
+    if isinstance(o, uuid.UUID):
+        return str(o)
+    if dataclasses.is_dataclass(o) and not isinstance(o, type):
+        return dataclasses.asdict(o)
+    if hasattr(o, 'tolist'):
+        # numpy arrays and scalars
+        return o.tolist()
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+# Encodes to utf-8 bytes, the shape the response body needs
+def dumps_bytes(obj):
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=ORJSON_OPTIONS)
+    return json.dumps(obj, default=_default, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+# JSON provider of the app, used by jsonify and by dicts returned from views.
+# Datetimes are encoded as ISO 8601 by both encoders, and the response is
+# built from bytes so the body is never encoded twice.
+class FastJSONProvider(DefaultJSONProvider):
+    sort_keys = False
+
+    def dumps(self, obj, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.dumps(obj, default=_default, option=ORJSON_OPTIONS).decode()
+        kwargs.setdefault('default', _default)
+        kwargs.setdefault('ensure_ascii', self.ensure_ascii)
+        kwargs.setdefault('sort_keys', self.sort_keys)
+        return json.dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            body = self.dumps(obj, indent=2).encode()
+        else:
+            body = dumps_bytes(obj)
+
+        return self._app.response_class(body, mimetype=self.mimetype)
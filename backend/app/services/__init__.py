@@ -1,3 +1,41 @@
 from .auth_service import AuthService, AuthError, requires_auth
+from .load_guard import LoadGuard, RateLimitError, load_guard, priority_of, PRIORITIES
+from .notify_service import NotifyHub, notify_hub
+from .live_feed import LiveFeed, live_feed, format_sse, cooperative_worker, LAGGED, LIVE_FEED_THREAD_STREAMS
+from .today_snapshot import TodaySnapshot, today_snapshot
+from .user_cache import ActiveUserCache, active_user_cache
+from .user_status import set_users_active, USERS_BULK_MAX, USERS_BULK_MAX_ERRORS
+from .card_index import CardIndex, card_index
+from .replica_service import ReplicaRouter, replica_router, read_replica
+from .compression import ResponseCompressor, response_compressor
+from .auth0_management import Auth0Management, Auth0ManagementError, auth0_management, rate_limit_wait
+from .user_info_cache import UserInfoCache, user_info_cache
+from .auth0_sync import Auth0DirectorySync, auth0_sync
+from .role_assignment import RoleAssigner, role_assigner, AUTH0_ROLE_BULK_MAX
+from .recurrence import RecurrenceRule, parse_rrule, format_rrule, occurrences, resolve_until, expand_events
+from .event_import import EventImportError, iter_json_events, iter_ics_events, import_events, EVENTS_BULK_MAX, EVENTS_BULK_MAX_ERRORS
+from .coalescing import RequestCoalescer, request_coalescer, coalesce_requests
+from .punch_history import page_records, encode_cursor, decode_cursor, RECORDS_PAGE_SIZE, RECORDS_MAX_PAGE_SIZE
+from .search import search_events, search_users, prefix_tsquery, SEARCH_TYPES, SEARCH_PAGE_SIZE, SEARCH_MAX_PAGE_SIZE
 
-__all__ = ['AuthService', 'AuthError', 'requires_auth']
\ No newline at end of file
+__all__ = [
+    'AuthService', 'AuthError', 'requires_auth',
+    'LoadGuard', 'RateLimitError', 'load_guard', 'priority_of', 'PRIORITIES',
+    'NotifyHub', 'notify_hub',
+    'LiveFeed', 'live_feed', 'format_sse', 'cooperative_worker', 'LAGGED', 'LIVE_FEED_THREAD_STREAMS',
+    'TodaySnapshot', 'today_snapshot',
+    'ActiveUserCache', 'active_user_cache',
+    'set_users_active', 'USERS_BULK_MAX', 'USERS_BULK_MAX_ERRORS',
+    'CardIndex', 'card_index',
+    'ReplicaRouter', 'replica_router', 'read_replica',
+    'ResponseCompressor', 'response_compressor',
+    'Auth0Management', 'Auth0ManagementError', 'auth0_management', 'rate_limit_wait',
+    'UserInfoCache', 'user_info_cache',
+    'Auth0DirectorySync', 'auth0_sync',
+    'RoleAssigner', 'role_assigner', 'AUTH0_ROLE_BULK_MAX',
+    'RecurrenceRule', 'parse_rrule', 'format_rrule', 'occurrences', 'resolve_until', 'expand_events',
+    'EventImportError', 'iter_json_events', 'iter_ics_events', 'import_events', 'EVENTS_BULK_MAX', 'EVENTS_BULK_MAX_ERRORS',
+    'RequestCoalescer', 'request_coalescer', 'coalesce_requests',
+    'page_records', 'encode_cursor', 'decode_cursor', 'RECORDS_PAGE_SIZE', 'RECORDS_MAX_PAGE_SIZE',
+    'search_events', 'search_users', 'prefix_tsquery', 'SEARCH_TYPES', 'SEARCH_PAGE_SIZE', 'SEARCH_MAX_PAGE_SIZE',
+]
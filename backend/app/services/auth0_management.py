@@ -0,0 +1,164 @@
+import logging, os, threading, time
+
+import requests
+
+# Refresh the management token this many seconds before it expires
+AUTH0_MGMT_TOKEN_MARGIN_SECONDS = int(os.getenv('AUTH0_MGMT_TOKEN_MARGIN_SECONDS', 60))
+# Retries of a call answered with 429 before giving up
+AUTH0_MGMT_MAX_RETRIES = int(os.getenv('AUTH0_MGMT_MAX_RETRIES', 5))
+# Longest wait for a rate limit reset, in seconds
+AUTH0_MGMT_MAX_BACKOFF_SECONDS = float(os.getenv('AUTH0_MGMT_MAX_BACKOFF_SECONDS', 30))
+# Keep-alive connections to Auth0 kept by the worker, raise it with a gevent
+# worker or the connections past it are opened and closed on every call
+AUTH0_HTTP_POOL_SIZE = int(os.getenv('AUTH0_HTTP_POOL_SIZE', 10))
+
+# Scope of the role assignment calls
+ROLES_SCOPE = 'update:users read:roles'
+
+# Handle Auth0 Management API Error
+class Auth0ManagementError(Exception):
+    def __init__(self, message, status_code=500, text=''):
+        self.message = message
+        self.status_code = status_code
+        self.text = text
+        super().__init__(f"{message} (status: {status_code})")
+
+# Client of the Auth0 Management API.
+# The M2M token is minted once per scope and reused until it expires,
+# connections are pooled by one requests session, and 429 answers are
+# retried after the reset time Auth0 sends back. Once the rate limit is hit
+# or used up, every thread sharing the client waits for the reset.
+class Auth0Management:
+    def __init__(self):
+        self._tokens = {}
+        self._paused_until = 0
+        self._lock = threading.Lock()
+        self._session = requests.Session()
+        self._session.mount('https://', requests.adapters.HTTPAdapter(pool_maxsize=AUTH0_HTTP_POOL_SIZE))
+        self._session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=AUTH0_HTTP_POOL_SIZE))
+
+    @property
+    def domain(self):
+        return os.getenv('AUTH0_APP_DOMAIN')
+
+    @property
+    def base_url(self):
+        # Lets tests and benchmarks point the client to a local stub
+        return os.getenv('AUTH0_MGMT_BASE_URL') or f"https://{self.domain}"
+
+    def get_token(self, scope):
+        with self._lock:
+            token, expires_at = self._tokens.get(scope, (None, 0))
+            if token and time.monotonic() < expires_at:
+                return token
+
+            token_payload = {
+                "client_id": os.getenv('AUTH0_M2M_CLIENT_ID'),
+                "client_secret": os.getenv('AUTH0_M2M_CLIENT_SECRET'),
+                "audience": f"https://{self.domain}/api/v2/",
+                "grant_type": "client_credentials",
+                "scope": scope
+            }
+            token_response = self._session.post(f"{self.base_url}/oauth/token", json=token_payload)
+
+            if token_response.status_code != 200:
+                raise Auth0ManagementError('Failed to obtain management API token', token_response.status_code, token_response.text)
+
+            token_data = token_response.json()
+            if 'access_token' not in token_data:
+                raise Auth0ManagementError('No access token in response', 500, str(token_data))
+
+            expires_in = token_data.get('expires_in', 86400)
+            self._tokens[scope] = (
+                token_data['access_token'],
+                time.monotonic() + max(expires_in - AUTH0_MGMT_TOKEN_MARGIN_SECONDS, 0)
+            )
+            return token_data['access_token']
+
+    def request(self, method, path, scope, **kwargs):
+        headers = {
+            'Authorization': f'Bearer {self.get_token(scope)}',
+            'Content-Type': 'application/json'
+        }
+
+        for attempt in range(AUTH0_MGMT_MAX_RETRIES + 1):
+            paused = self._paused_until - time.monotonic()
+            if paused > 0:
+                time.sleep(paused)
+
+            response = self._session.request(method, f"{self.base_url}/api/v2{path}", headers=headers, **kwargs)
+
+            if response.headers.get('X-RateLimit-Remaining') == '0':
+                self._pause(rate_limit_wait(response))
+
+            if response.status_code == 401:
+                # Token revoked or rotated, mint a new one once
+                with self._lock:
+                    self._tokens.pop(scope, None)
+                if attempt == 0:
+                    headers['Authorization'] = f'Bearer {self.get_token(scope)}'
+                    continue
+
+            if response.status_code != 429 or attempt == AUTH0_MGMT_MAX_RETRIES:
+                return response
+
+            wait = rate_limit_wait(response, attempt)
+            logging.warning(f"Auth0 rate limited {method} {path}, retrying in {wait:.1f}s")
+            self._pause(wait)
+
+        return response
+
+    def _pause(self, seconds):
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def get_user(self, auth0_id):
+        encoded_user_id = requests.utils.quote(auth0_id)
+        return self.request('GET', f"/users/{encoded_user_id}", 'read:users')
+
+    def search_users(self, params):
+        return self.request('GET', '/users', 'read:users', params=params)
+
+    def get_user_roles(self, auth0_id):
+        encoded_user_id = requests.utils.quote(auth0_id)
+        return self.request('GET', f"/users/{encoded_user_id}/roles", ROLES_SCOPE)
+
+    def add_user_roles(self, auth0_id, role_ids):
+        encoded_user_id = requests.utils.quote(auth0_id)
+        return self.request('POST', f"/users/{encoded_user_id}/roles", ROLES_SCOPE, json={'roles': role_ids})
+
+    def remove_user_roles(self, auth0_id, role_ids):
+        encoded_user_id = requests.utils.quote(auth0_id)
+        return self.request('DELETE', f"/users/{encoded_user_id}/roles", ROLES_SCOPE, json={'roles': role_ids})
+
+    def delete_user_sessions(self, auth0_id):
+        encoded_user_id = requests.utils.quote(auth0_id)
+        return self.request('DELETE', f"/users/{encoded_user_id}/sessions", ROLES_SCOPE)
+
+    def get_roles(self, params=None):
+        return self.request('GET', '/roles', 'read:roles', params=params)
+
+    def get_role_users(self, role_id, params=None):
+        encoded_role_id = requests.utils.quote(role_id)
+        return self.request('GET', f"/roles/{encoded_role_id}/users", 'read:users read:roles', params=params)
+
+
+# Seconds to wait before retrying a 429, from Retry-After or X-RateLimit-Reset
+def rate_limit_wait(response, attempt=0):
+    retry_after = response.headers.get('Retry-After')
+    reset = response.headers.get('X-RateLimit-Reset')
+
+    try:
+        if retry_after is not None:
+            wait = float(retry_after)
+        elif reset is not None:
+            wait = float(reset) - time.time()
+        else:
+            wait = 2 ** attempt
+    except ValueError:
+        wait = 2 ** attempt
+
+    return min(max(wait, 0.1), AUTH0_MGMT_MAX_BACKOFF_SECONDS)
+
+
+auth0_management = Auth0Management()
@@ -0,0 +1,171 @@
+import logging, os
+
+from datetime import datetime, timezone
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+
+from ..models import Auth0Users, Auth0Roles, Auth0UserRoles, Auth0SyncState
+from .auth0_management import Auth0ManagementError, auth0_management
+
+AUTH0_SYNC_PAGE_SIZE = int(os.getenv('AUTH0_SYNC_PAGE_SIZE', 100))
+# Rows written per INSERT statement
+AUTH0_SYNC_BATCH_SIZE = int(os.getenv('AUTH0_SYNC_BATCH_SIZE', 500))
+# Auth0 search returns at most this many results per query, whatever the page
+AUTH0_SEARCH_LIMIT = 1000
+
+USERS_SYNC = 'users'
+
+USER_FIELDS = ('email', 'name', 'nickname', 'picture', 'created_at', 'last_login', 'logins_count', 'updated_at')
+
+# Copies the Auth0 users and role assignments to the mirror tables.
+# Users are fetched incrementally with the search API, sorted by updated_at
+# from the last watermark. The search window is capped at 1000 results, so
+# the query restarts from the last updated_at seen whenever it's reached.
+# Role assignments don't move updated_at, they are listed per role on every run.
+class Auth0DirectorySync:
+    def __init__(self, client):
+        self._client = client
+
+    # Yields the users updated since the watermark, oldest first
+    def fetch_users(self, since=None):
+        cursor = since
+        while True:
+            last_seen = None
+            page = 0
+
+            while (page + 1) * AUTH0_SYNC_PAGE_SIZE <= AUTH0_SEARCH_LIMIT:
+                params = {
+                    'search_engine': 'v3',
+                    'sort': 'updated_at:1',
+                    'per_page': AUTH0_SYNC_PAGE_SIZE,
+                    'page': page
+                }
+                if cursor:
+                    params['q'] = f'updated_at:["{cursor}" TO *]'
+
+                response = self._client.search_users(params)
+                if response.status_code != 200:
+                    raise Auth0ManagementError('Failed to search users', response.status_code, response.text)
+
+                users = response.json()
+                yield from users
+
+                if len(users) < AUTH0_SYNC_PAGE_SIZE:
+                    return
+
+                last_seen = users[-1].get('updated_at')
+                page += 1
+
+            # Search window is full, the rest is fetched from the last updated_at
+            # (inclusive, the rows already seen are upserted again)
+            if last_seen is None or last_seen == cursor:
+                raise Auth0ManagementError(f'More than {AUTH0_SEARCH_LIMIT} users updated at {cursor}, run a full sync')
+            cursor = last_seen
+
+    def fetch_roles(self):
+        page = 0
+        while True:
+            response = self._client.get_roles({'per_page': AUTH0_SYNC_PAGE_SIZE, 'page': page})
+            if response.status_code != 200:
+                raise Auth0ManagementError('Failed to get roles', response.status_code, response.text)
+
+            roles = response.json()
+            yield from roles
+
+            if len(roles) < AUTH0_SYNC_PAGE_SIZE:
+                return
+            page += 1
+
+    # Checkpoint pagination, page based listing stops at 1000 users
+    def fetch_role_users(self, role_id):
+        params = {'take': AUTH0_SYNC_PAGE_SIZE}
+        while True:
+            response = self._client.get_role_users(role_id, params)
+            if response.status_code != 200:
+                raise Auth0ManagementError(f'Failed to get users of role {role_id}', response.status_code, response.text)
+
+            data = response.json()
+            yield from data.get('users', [])
+
+            if not data.get('next'):
+                return
+            params['from'] = data['next']
+
+    # A full sync also drops the users deleted from Auth0
+    def sync(self, session, full=False):
+        state = session.get(Auth0SyncState, USERS_SYNC)
+        if state is None:
+            state = Auth0SyncState(name=USERS_SYNC)
+            session.add(state)
+
+        since = None if full else state.watermark
+        watermark = since
+        seen = set()
+        # Keyed by user, one INSERT can't update the same row twice
+        batch = {}
+
+        for user in self.fetch_users(since):
+            seen.add(user['user_id'])
+            batch[user['user_id']] = user_row(user)
+            if user.get('updated_at') and (watermark is None or user['updated_at'] > watermark):
+                watermark = user['updated_at']
+            if len(batch) >= AUTH0_SYNC_BATCH_SIZE:
+                upsert_users(session, list(batch.values()))
+                batch = {}
+        if batch:
+            upsert_users(session, list(batch.values()))
+
+        if full:
+            session.query(Auth0Users).filter(~Auth0Users.auth0_id.in_(seen)).delete(synchronize_session=False)
+
+        roles = list(self.fetch_roles())
+        assignments = [
+            {'auth0_id': user['user_id'], 'role_id': role['id']}
+            for role in roles
+            for user in self.fetch_role_users(role['id'])
+        ]
+
+        session.query(Auth0UserRoles).delete(synchronize_session=False)
+        session.query(Auth0Roles).delete(synchronize_session=False)
+        if roles:
+            session.execute(insert(Auth0Roles), [
+                {'id': role['id'], 'name': role['name'], 'description': role.get('description', '')}
+                for role in roles
+            ])
+        for start in range(0, len(assignments), AUTH0_SYNC_BATCH_SIZE):
+            session.execute(insert(Auth0UserRoles).on_conflict_do_nothing(), assignments[start:start + AUTH0_SYNC_BATCH_SIZE])
+
+        state.watermark = watermark
+        state.synced_at = datetime.now(timezone.utc)
+        session.commit()
+
+        logging.info(f"Auth0 sync: {len(seen)} users, {len(roles)} roles, {len(assignments)} role assignments")
+        return {'users': len(seen), 'roles': len(roles), 'assignments': len(assignments)}
+
+    # Write-through of a role change made by this app
+    def set_user_roles(self, session, auth0_id, role_ids):
+        session.query(Auth0UserRoles).filter(Auth0UserRoles.auth0_id == auth0_id).delete(synchronize_session=False)
+        if role_ids:
+            session.execute(insert(Auth0UserRoles).on_conflict_do_nothing(), [
+                {'auth0_id': auth0_id, 'role_id': role_id} for role_id in role_ids
+            ])
+
+    def has_synced(self, session):
+        state = session.get(Auth0SyncState, USERS_SYNC)
+        return state is not None and state.synced_at is not None
+
+
+def user_row(user):
+    row = {field: user.get(field) for field in USER_FIELDS}
+    row['auth0_id'] = user['user_id']
+    return row
+
+def upsert_users(session, rows):
+    statement = insert(Auth0Users).values(rows)
+    session.execute(statement.on_conflict_do_update(
+        index_elements=[Auth0Users.auth0_id],
+        set_={**{field: statement.excluded[field] for field in USER_FIELDS}, 'synced_at': func.now()}
+    ))
+
+
+auth0_sync = Auth0DirectorySync(auth0_management)
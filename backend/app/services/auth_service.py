@@ -1,12 +1,15 @@
-import json, os
+import logging, os, threading, time
 
-from flask import request, abort
+import requests
+
+from flask import g, request, abort
 from functools import wraps
 from jose import jwt
-from urllib.request import urlopen
 from urllib.parse import urlencode
 from dotenv import load_dotenv
 
+from .load_guard import load_guard
+
 load_dotenv()
 
 AUTH0_APP_DOMAIN = os.getenv('AUTH0_APP_DOMAIN')
@@ -14,6 +17,10 @@ ALGORITHMS = os.getenv('ALGORITHMS')
 AUTH0_API_AUDIENCE = os.getenv('AUTH0_API_AUDIENCE')
 AUTH0_APP_CLIENT_ID = os.getenv('AUTH0_APP_CLIENT_ID')
 CALLBACK_URL = os.getenv('CALLBACK_URL')
+# Seconds the signing keys of the tenant are kept, 0 turns the cache off
+AUTH0_JWKS_TTL_SECONDS = int(os.getenv('AUTH0_JWKS_TTL_SECONDS', 3600))
+# A token signed by an unknown key refreshes them earlier, at most this often
+AUTH0_JWKS_MIN_REFRESH_SECONDS = int(os.getenv('AUTH0_JWKS_MIN_REFRESH_SECONDS', 30))
 
 # Handle Auth Error
 class AuthError(Exception):
@@ -22,6 +29,60 @@ class AuthError(Exception):
         self.status_code = status_code
         super().__init__(f"{error['description']} (code: {status_code})")
 
+# Signing keys of the tenant by kid, fetched once and shared by every request
+# of the worker instead of one JWKS download per request. Rotated keys are
+# picked up when a token names a kid the cache doesn't know. When Auth0 can't
+# be reached the keys already fetched keep being used.
+class JwksCache:
+    def __init__(self, ttl=AUTH0_JWKS_TTL_SECONDS, min_refresh=AUTH0_JWKS_MIN_REFRESH_SECONDS):
+        self._ttl = ttl
+        self._min_refresh = min_refresh
+        self._keys = {}
+        self._fetched_at = None
+        self._lock = threading.Lock()
+        self._session = requests.Session()
+
+    @property
+    def url(self):
+        # Lets tests and benchmarks point the cache to a local stub
+        return os.getenv('AUTH0_JWKS_URL') or f"https://{os.getenv('AUTH0_APP_DOMAIN')}/.well-known/jwks.json"
+
+    def get_key(self, kid):
+        if self._ttl <= 0:
+            # Cache turned off, every token downloads the keys
+            return self._fetch().get(kid)
+
+        fetched_at = self._fetched_at
+        age = time.monotonic() - fetched_at if fetched_at is not None else None
+        if age is None or age >= self._ttl or (kid not in self._keys and age >= self._min_refresh):
+            with self._lock:
+                # Refreshed by another thread while this one waited
+                if self._fetched_at == fetched_at:
+                    self._refresh()
+        return self._keys.get(kid)
+
+    def _fetch(self):
+        response = self._session.get(self.url, timeout=10)
+        response.raise_for_status()
+        return {key['kid']: key for key in response.json()['keys'] if 'kid' in key}
+
+    def _refresh(self):
+        try:
+            self._keys = self._fetch()
+        except Exception as e:
+            if not self._keys:
+                raise
+            logging.error(f"Failed to refresh the JWKS, keeping the cached keys: {e}")
+        self._fetched_at = time.monotonic()
+
+    def clear(self):
+        with self._lock:
+            self._keys = {}
+            self._fetched_at = None
+
+
+jwks_cache = JwksCache()
+
 class AuthService:
     def __init__(self):
         pass
@@ -55,9 +116,13 @@ class AuthService:
             return {'success': True, 'login_url': login_url}
 
     # JWT Part:
-    def get_token_auth_header(self):
+    def get_token_auth_header(self, allow_query_token=False):
         auth = request.headers.get('Authorization', None)
 
+        # Browser EventSource can't set headers, so streams may pass the token in the url
+        if not auth and allow_query_token and request.args.get('access_token'):
+            return request.args.get('access_token')
+
         if not auth:
             raise AuthError({
                 'code': 'authorization_header_missing',
@@ -87,8 +152,6 @@ class AuthService:
         return token
 
     def verify_decode_jwt(self, token):
-        jsonurl = urlopen(f'https://{AUTH0_APP_DOMAIN}/.well-known/jwks.json')
-        jwks = json.loads(jsonurl.read())
         unverified_header = jwt.get_unverified_header(token)
         rsa_key = {}
         if 'kid' not in unverified_header:
@@ -97,15 +160,15 @@ class AuthService:
                 'description': 'Authorization malformed.'
             }, 401)
 
-        for key in jwks['keys']:
-            if key['kid'] == unverified_header['kid']:
-                rsa_key = {
-                    'kty': key['kty'],
-                    'kid': key['kid'],
-                    'use': key['use'],
-                    'n': key['n'],
-                    'e': key['e']
-                }
+        key = jwks_cache.get_key(unverified_header['kid'])
+        if key:
+            rsa_key = {
+                'kty': key['kty'],
+                'kid': key['kid'],
+                'use': key['use'],
+                'n': key['n'],
+                'e': key['e']
+            }
         if rsa_key:
             try:
                 payload = jwt.decode(
@@ -154,17 +217,22 @@ class AuthService:
 
         return True
     
-def requires_auth(permission=''):
+def requires_auth(permission='', allow_query_token=False):
     def requires_auth_decorator(f):
         @wraps(f)
         def wrapper(*args, **kwargs):
             auth_service = AuthService()
-            token = auth_service.get_token_auth_header()
+            token = auth_service.get_token_auth_header(allow_query_token=allow_query_token)
             payload = auth_service.verify_decode_jwt(token)
             
             if permission:
                 auth_service.check_permissions(permission, payload)
-                
-            return f(payload, *args, **kwargs)
+            
+            # Kept for the request hooks, like the read-after-write tracking
+            g.jwt_payload = payload
+
+            # Per-client rate limit, and shedding of the low priority routes under load
+            with load_guard.admit(payload, permission):
+                return f(payload, *args, **kwargs)
         return wrapper
     return requires_auth_decorator
\ No newline at end of file
@@ -0,0 +1,151 @@
+import logging, os, threading, time
+
+from collections import namedtuple
+from datetime import timedelta
+
+from ..models import Cards, db
+from .notify_service import notify_hub
+
+# Seconds between incremental refreshes of the index
+CARD_INDEX_REFRESH_SECONDS = int(os.getenv('CARD_INDEX_REFRESH_SECONDS', 30))
+# Seconds between full reloads, catches rows deleted from the table
+CARD_INDEX_RELOAD_SECONDS = int(os.getenv('CARD_INDEX_RELOAD_SECONDS', 3600))
+# Unknown numeric cards are used as a user id, like badges did before the cards
+# table. Off by default, only to migrate a site whose badges still carry user ids
+CARD_LEGACY_USER_ID = os.getenv('CARD_LEGACY_USER_ID', 'false').lower() == 'true'
+
+CARD_CHANGED_CHANNEL = 'card_changed'
+
+# Rows committed late can carry an updated_at older than the watermark
+REFRESH_OVERLAP = timedelta(seconds=5)
+
+CardEntry = namedtuple('CardEntry', ['card_id', 'user_id', 'valid_from', 'valid_until', 'is_active'])
+
+# In-memory hash index of card uid -> card rows, used by the ingest path.
+# Loaded in the background once a worker starts, then refreshed from the
+# rows whose updated_at moved past the watermark. Writers publish on the
+# card_changed channel so every worker refreshes before its next lookup.
+class CardIndex:
+    def __init__(self, hub):
+        self._hub = hub
+        self._app = None
+        self._cards = {}
+        self._uid_by_id = {}
+        self._watermark = None
+        self._loaded = False
+        self._dirty = False
+        self._last_refresh = 0
+        self._last_reload = 0
+        self._lock = threading.RLock()
+
+    def init_app(self, app):
+        self._app = app
+
+    # Loads the index in the background, lookups before that load it on demand
+    def warm(self):
+        if self._app is None:
+            return
+        threading.Thread(target=self._warm, name='card-index-warm', daemon=True).start()
+
+    def _warm(self):
+        with self._app.app_context():
+            try:
+                self.load()
+            except Exception as e:
+                # Lookups load it on demand instead
+                logging.error(f"Failed to warm the card index: {e}")
+            finally:
+                db.session.remove()
+
+        self._hub.subscribe(CARD_CHANGED_CHANNEL, self._on_card_changed)
+
+    def load(self):
+        rows = db.session.query(
+            Cards.id, Cards.card_uid, Cards.user_id, Cards.valid_from,
+            Cards.valid_until, Cards.is_active, Cards.updated_at
+        ).all()
+
+        with self._lock:
+            self._cards = {}
+            self._uid_by_id = {}
+            self._watermark = None
+            self.apply_rows(rows)
+            self._loaded = True
+            self._dirty = False
+            self._last_refresh = self._last_reload = time.monotonic()
+
+    def refresh(self):
+        query = db.session.query(
+            Cards.id, Cards.card_uid, Cards.user_id, Cards.valid_from,
+            Cards.valid_until, Cards.is_active, Cards.updated_at
+        )
+        if self._watermark is not None:
+            query = query.filter(Cards.updated_at > self._watermark - REFRESH_OVERLAP)
+
+        rows = query.all()
+
+        with self._lock:
+            self.apply_rows(rows)
+            self._dirty = False
+            self._last_refresh = time.monotonic()
+
+    def apply_rows(self, rows):
+        with self._lock:
+            for card_id, card_uid, user_id, valid_from, valid_until, is_active, updated_at in rows:
+                # Drop the old entry first, the uid may have changed
+                old_uid = self._uid_by_id.pop(card_id, None)
+                if old_uid is not None:
+                    remaining = tuple(entry for entry in self._cards[old_uid] if entry.card_id != card_id)
+                    if remaining:
+                        self._cards[old_uid] = remaining
+                    else:
+                        del self._cards[old_uid]
+
+                entry = CardEntry(card_id, user_id, valid_from, valid_until, is_active is not False)
+                self._cards[card_uid] = self._cards.get(card_uid, ()) + (entry,)
+                self._uid_by_id[card_id] = card_uid
+
+                if updated_at is not None and (self._watermark is None or updated_at > self._watermark):
+                    self._watermark = updated_at
+
+    def _ensure_fresh(self):
+        now = time.monotonic()
+        if not self._loaded or now - self._last_reload > CARD_INDEX_RELOAD_SECONDS:
+            self.load()
+        elif self._dirty or now - self._last_refresh > CARD_INDEX_REFRESH_SECONDS:
+            self.refresh()
+
+    # Returns the user id the card belongs to at the given time, or None
+    def resolve(self, card_uid, at):
+        self._ensure_fresh()
+
+        entries = self._cards.get(card_uid)
+        if entries is None:
+            if CARD_LEGACY_USER_ID and card_uid.isdigit():
+                return int(card_uid)
+            return None
+
+        for entry in entries:
+            if not entry.is_active:
+                continue
+            if entry.valid_from is not None and at < entry.valid_from:
+                continue
+            if entry.valid_until is not None and at >= entry.valid_until:
+                continue
+            return entry.user_id
+
+        return None
+
+    def __len__(self):
+        return len(self._uid_by_id)
+
+    # Writers call it inside their transaction
+    def invalidate(self, session):
+        self._dirty = True
+        self._hub.publish(session, CARD_CHANGED_CHANNEL, {})
+
+    def _on_card_changed(self, payload):
+        self._dirty = True
+
+
+card_index = CardIndex(notify_hub)
@@ -0,0 +1,79 @@
+import threading
+
+from concurrent.futures import Future
+from flask import current_app, g, request
+from functools import wraps
+
+from .replica_service import replica_router
+
+# Concurrent identical reads share one run of the view (single flight).
+# The first request runs it, the ones arriving with the same key while it
+# runs wait for its response. Nothing is kept once it's answered, this is
+# not a cache: a request arriving after it sees fresh data.
+# The key is the endpoint, its path and sorted query arguments, the
+# permissions of the caller and the database it reads from.
+class RequestCoalescer:
+    def __init__(self):
+        self._inflight = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def key(self, payload):
+        return (
+            request.endpoint,
+            tuple(sorted((request.view_args or {}).items())),
+            tuple(sorted(request.args.items(multi=True))),
+            tuple(sorted(payload.get('permissions', []))),
+            bool(g.get('use_replica')),
+        )
+
+    def run(self, key, view):
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+            counters = self._stats.setdefault(key[0], {'executed': 0, 'coalesced': 0})
+            counters['executed' if leader else 'coalesced'] += 1
+
+        if not leader:
+            return self.build_response(future.result())
+
+        try:
+            response = current_app.make_response(view())
+            # Serialized once, every caller gets its own response object,
+            # the after_request hooks (compression) change it in place
+            shared = (response.status_code, list(response.headers.items()), response.get_data())
+            future.set_result(shared)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+        return self.build_response(shared)
+
+    def build_response(self, shared):
+        status, headers, body = shared
+        return current_app.response_class(body, status=status, headers=headers)
+
+    # {endpoint: {'executed': n, 'coalesced': m}} of this worker since it started
+    def stats(self):
+        with self._lock:
+            return {endpoint: dict(counters) for endpoint, counters in self._stats.items()}
+
+
+request_coalescer = RequestCoalescer()
+
+# Opts a GET route in, put it under requires_auth and read_replica.
+# A caller who wrote recently runs alone, it must read its own write.
+def coalesce_requests():
+    def coalesce_requests_decorator(f):
+        @wraps(f)
+        def wrapper(payload, *args, **kwargs):
+            if request.method != 'GET' or replica_router.wrote_recently(payload.get('sub')):
+                return f(payload, *args, **kwargs)
+            return request_coalescer.run(request_coalescer.key(payload), lambda: f(payload, *args, **kwargs))
+        return wrapper
+    return coalesce_requests_decorator
@@ -0,0 +1,62 @@
+import gzip, os
+
+from flask import request
+
+# brotli is optional, gzip is used when it isn't installed
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Smaller bodies aren't worth the cpu, they fit in a packet anyway
+COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', 1024))
+COMPRESS_GZIP_LEVEL = int(os.getenv('COMPRESS_GZIP_LEVEL', 6))
+COMPRESS_BROTLI_QUALITY = int(os.getenv('COMPRESS_BROTLI_QUALITY', 5))
+
+COMPRESS_MIMETYPES = {'application/json', 'application/x-ndjson', 'text/plain', 'text/csv', 'text/html'}
+
+# Compresses the response bodies with brotli or gzip, by the Accept-Encoding
+# of the request. Streamed responses, like the live feed, are left untouched.
+class ResponseCompressor:
+    def init_app(self, app):
+        app.after_request(self.compress)
+
+    def choose_encoding(self):
+        accepted = request.accept_encodings
+        if brotli is not None and accepted['br']:
+            return 'br'
+        if accepted['gzip']:
+            return 'gzip'
+        return None
+
+    def compress(self, response):
+        if (
+            response.direct_passthrough
+            or response.is_streamed
+            or not 200 <= response.status_code < 300
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESS_MIMETYPES
+        ):
+            return response
+
+        encoding = self.choose_encoding()
+        # The body depends on Accept-Encoding from here on
+        response.vary.add('Accept-Encoding')
+        if encoding is None:
+            return response
+
+        data = response.get_data()
+        if len(data) < COMPRESS_MIN_SIZE:
+            return response
+
+        if encoding == 'br':
+            data = brotli.compress(data, quality=COMPRESS_BROTLI_QUALITY)
+        else:
+            data = gzip.compress(data, compresslevel=COMPRESS_GZIP_LEVEL)
+
+        response.set_data(data)
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+
+response_compressor = ResponseCompressor()
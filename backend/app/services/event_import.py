@@ -0,0 +1,241 @@
+import io, json, os
+
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from .recurrence import parse_rrule, format_rrule, resolve_until
+
+# Events accepted by one bulk request
+EVENTS_BULK_MAX = int(os.getenv('EVENTS_BULK_MAX', 100000))
+# Rows validated and inserted per multi-row INSERT
+EVENTS_BULK_BATCH_SIZE = int(os.getenv('EVENTS_BULK_BATCH_SIZE', 1000))
+# Errors reported back, the rest are only counted
+EVENTS_BULK_MAX_ERRORS = 100
+
+READ_CHUNK_SIZE = 64 * 1024
+
+NAME_MAX_LENGTH = 50
+DESC_MAX_LENGTH = 250
+
+# Raised when the upload itself can't be read, not one of its events
+class EventImportError(Exception):
+    pass
+
+# Items of a JSON array read from a binary stream, one chunk at a time.
+# The whole upload is never held in memory, only the current chunk.
+def iter_json_events(stream, chunk_size=READ_CHUNK_SIZE):
+    decoder = json.JSONDecoder()
+    # Decodes the multi-byte characters split across chunks
+    chunks = _text_chunks(stream, chunk_size)
+    buffer, position, started = '', 0, False
+
+    while True:
+        # Whitespace, then the opening bracket or the separator before the next item
+        while position < len(buffer) and (buffer[position] in ' \t\r\n' or (started and buffer[position] == ',')):
+            position += 1
+
+        if position < len(buffer):
+            if not started:
+                if buffer[position] != '[':
+                    raise EventImportError('Expected a JSON array of events')
+                started, position = True, position + 1
+                continue
+            if buffer[position] == ']':
+                return
+
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                end = None
+
+            # A number at the end of the buffer may go on in the next chunk
+            if end is not None and (end < len(buffer) or isinstance(item, (dict, list, str))):
+                yield item
+                position = end
+                continue
+
+        chunk = next(chunks, None)
+        if chunk is None:
+            raise EventImportError('Unexpected end of the JSON array')
+        buffer, position = buffer[position:] + chunk, 0
+
+def _text_chunks(stream, chunk_size):
+    import codecs
+    decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            tail = decoder.decode(b'', final=True)
+            if tail:
+                yield tail
+            return
+        yield decoder.decode(chunk)
+
+# VEVENTs of an iCalendar stream as event dicts, the shape of the JSON items.
+# Folded lines are joined, only the properties the events use are kept.
+def iter_ics_events(stream):
+    event = None
+    for name, params, value in _ics_properties(stream):
+        if name == 'BEGIN' and value.upper() == 'VEVENT':
+            event = {}
+        elif name == 'END' and value.upper() == 'VEVENT':
+            if event is not None:
+                yield event
+            event = None
+        elif event is None:
+            continue
+        elif name == 'SUMMARY':
+            event['name'] = _ics_text(value)
+        elif name == 'DESCRIPTION':
+            event['description'] = _ics_text(value)
+        elif name == 'DTSTART':
+            event['date'] = _ics_date(value, params)
+        elif name == 'RRULE':
+            event['rrule'] = value
+
+def _ics_properties(stream):
+    current = None
+    # Decoded by the C reader, not line by line
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    try:
+        for line in text:
+            line = line.rstrip('\r\n')
+            # A line starting with a space or a tab continues the previous one
+            if line[:1] in (' ', '\t') and current is not None:
+                current += line[1:]
+                continue
+            if current:
+                yield _ics_split(current)
+            current = line
+        if current:
+            yield _ics_split(current)
+    finally:
+        # The upload stream stays open for its owner
+        text.detach()
+
+def _ics_split(line):
+    head, _, value = line.partition(':')
+    if ';' not in head:
+        return head.upper(), {}, value
+    name, *params = head.split(';')
+    return name.upper(), dict(param.partition('=')[::2] for param in params), value
+
+def _ics_text(value):
+    return value.replace('\\n', '\n').replace('\\N', '\n').replace('\\,', ',').replace('\\;', ';').replace('\\\\', '\\')
+
+# DTSTART value -> ISO 8601, as the JSON items carry it
+def _ics_date(value, params):
+    try:
+        if params.get('VALUE') == 'DATE' or len(value) == 8:
+            return datetime(int(value[0:4]), int(value[4:6]), int(value[6:8])).isoformat()
+        if value[8:9] != 'T' or len(value) not in (15, 16):
+            raise ValueError
+        # Sliced, strptime is the slowest part of a large import
+        parsed = datetime(
+            int(value[0:4]), int(value[4:6]), int(value[6:8]),
+            int(value[9:11]), int(value[11:13]), int(value[13:15])
+        )
+    except ValueError:
+        # Left to the date validation of the batch
+        return value
+
+    if value.endswith('Z'):
+        return parsed.replace(tzinfo=timezone.utc).isoformat()
+    if 'TZID' in params:
+        try:
+            parsed = parsed.replace(tzinfo=ZoneInfo(params['TZID'].strip('"')))
+        except (ZoneInfoNotFoundError, ValueError):
+            pass
+    return parsed.isoformat()
+
+# Checks a batch column by column, returns (rows, errors). rows are the
+# insert values of the valid items, errors (index, message) pairs with the
+# index of the item in the upload. zone is applied to dates without offset.
+def validate_batch(items, first_index, zone):
+    errors = []
+    invalid = set()
+
+    def reject(offset, message):
+        if offset not in invalid:
+            invalid.add(offset)
+            errors.append((first_index + offset, message))
+
+    for offset, item in enumerate(items):
+        if not isinstance(item, dict):
+            reject(offset, 'Each event must be an object')
+
+    names = [item.get('name') if isinstance(item, dict) else None for item in items]
+    for offset, name in enumerate(names):
+        if not isinstance(name, str) or not name.strip():
+            reject(offset, 'Missing name')
+        elif len(name) > NAME_MAX_LENGTH:
+            reject(offset, f'name is longer than {NAME_MAX_LENGTH} characters')
+
+    descriptions = [(item.get('description') or '') if isinstance(item, dict) else '' for item in items]
+    for offset, desc in enumerate(descriptions):
+        if not isinstance(desc, str) or len(desc) > DESC_MAX_LENGTH:
+            reject(offset, f'description must be text of at most {DESC_MAX_LENGTH} characters')
+
+    dates = []
+    for offset, item in enumerate(items):
+        try:
+            date = datetime.fromisoformat(item['date'])
+            dates.append(date if date.tzinfo else date.replace(tzinfo=zone))
+        except (KeyError, TypeError, ValueError, AttributeError):
+            dates.append(None)
+            reject(offset, 'Missing or invalid date')
+
+    rrules, untils = [], []
+    for offset, item in enumerate(items):
+        rrule = item.get('rrule') if isinstance(item, dict) else None
+        if not rrule or dates[offset] is None:
+            rrules.append(None)
+            untils.append(None)
+            continue
+        try:
+            rule = parse_rrule(rrule)
+            rrules.append(format_rrule(rule))
+            untils.append(resolve_until(rule, dates[offset].astimezone(zone)))
+        except (ValueError, TypeError, AttributeError) as e:
+            rrules.append(None)
+            untils.append(None)
+            reject(offset, f'Invalid rrule: {e}')
+
+    errors.sort()
+    rows = [
+        {'name': names[offset].strip(), 'desc': descriptions[offset], 'date': dates[offset], 'rrule': rrules[offset], 'until': untils[offset]}
+        for offset in range(len(items)) if offset not in invalid
+    ]
+    return rows, errors
+
+# Validates and inserts the events of items, insert_batch(rows) runs one
+# multi-row INSERT. The caller rolls back when errors come back, so an
+# upload is imported entirely or not at all. Returns (inserted, errors, error_count).
+def import_events(items, insert_batch, zone, batch_size=EVENTS_BULK_BATCH_SIZE, max_events=EVENTS_BULK_MAX):
+    inserted, errors, error_count = 0, [], 0
+    batch, first_index = [], 0
+
+    def flush():
+        nonlocal inserted, error_count
+        rows, batch_errors = validate_batch(batch, first_index, zone)
+        error_count += len(batch_errors)
+        errors.extend(batch_errors[:EVENTS_BULK_MAX_ERRORS - len(errors)])
+        # Once an error is found nothing will be kept, only validate the rest
+        if rows and not error_count:
+            insert_batch(rows)
+            inserted += len(rows)
+
+    for index, item in enumerate(items):
+        if index >= max_events:
+            raise EventImportError(f'At most {max_events} events can be imported at once')
+        if not batch:
+            first_index = index
+        batch.append(item)
+        if len(batch) >= batch_size:
+            flush()
+            batch = []
+
+    if batch:
+        flush()
+
+    return inserted, errors, error_count
@@ -0,0 +1,112 @@
+import json, os, queue, sys, threading
+
+from datetime import datetime
+from sqlalchemy import func
+
+from ..models import AttendanceRecords, db
+from ..reporting.timezones import get_zone, local_day
+from .notify_service import notify_hub
+
+PUNCH_CHANNEL = 'attendance_punch'
+
+# Max deltas buffered for one slow client before it is asked to re-snapshot
+CLIENT_QUEUE_SIZE = 500
+
+# Marker put in a client queue once it has fallen behind
+LAGGED = object()
+
+# Streams a worker without gevent serves at once. Each one holds a thread for
+# its whole life, so the default keeps the threads for the other requests.
+LIVE_FEED_THREAD_STREAMS = int(os.getenv('LIVE_FEED_THREAD_STREAMS', 0))
+
+# Whether the worker runs on greenlets, a waiting stream then costs no thread
+def cooperative_worker():
+    monkey = sys.modules.get('gevent.monkey')
+    return monkey is not None and monkey.is_module_patched('threading')
+
+# Live feed of attendance punches for dashboards.
+# The ingest path publishes every punch through NOTIFY, each worker receives
+# it from the NotifyHub and pushes it to the queues of its connected clients.
+class LiveFeed:
+    def __init__(self, hub):
+        self._hub = hub
+        self._clients = set()
+        self._lock = threading.Lock()
+        self._subscribed = False
+
+    def publish_punch(self, session, record):
+        self._hub.publish(session, PUNCH_CHANNEL, self.format_punch(record))
+
+    # Punches inserted together, records are rows with id, user_id and timestamp
+    def publish_punches(self, session, records):
+        self._hub.publish_many(session, PUNCH_CHANNEL, [self.format_punch(record) for record in records])
+
+    def format_punch(self, record):
+        return {
+            'id': record.id,
+            'user_id': record.user_id,
+            'timestamp': record.timestamp.isoformat(),
+        }
+
+    # A new client queue, None when max_clients are already connected
+    def connect(self, max_clients=None):
+        client = queue.Queue(maxsize=CLIENT_QUEUE_SIZE)
+        with self._lock:
+            if max_clients is not None and len(self._clients) >= max_clients:
+                return None
+            self._clients.add(client)
+            if not self._subscribed:
+                self._hub.subscribe(PUNCH_CHANNEL, self._broadcast)
+                self._subscribed = True
+        return client
+
+    def disconnect(self, client):
+        with self._lock:
+            self._clients.discard(client)
+
+    def _broadcast(self, punch):
+        with self._lock:
+            clients = list(self._clients)
+
+        for client in clients:
+            try:
+                client.put_nowait(punch)
+            except queue.Full:
+                # Drop the backlog, the client will reload the snapshot
+                with client.mutex:
+                    client.queue.clear()
+                client.put_nowait(LAGGED)
+
+    # Today's first/last punch per user, the starting point of every stream.
+    # The day is the site day, served by the site day expression index.
+    def snapshot(self, day=None):
+        day = day or datetime.now(get_zone()).date()
+
+        rows = db.session.query(
+            AttendanceRecords.user_id,
+            func.min(AttendanceRecords.timestamp),
+            func.max(AttendanceRecords.timestamp),
+            func.count(AttendanceRecords.id)
+        ).filter(
+            local_day(AttendanceRecords.timestamp) == day
+        ).group_by(AttendanceRecords.user_id).all()
+
+        return {
+            'date': day.isoformat(),
+            'users': [
+                {
+                    'user_id': user_id,
+                    'firstPunch': first.isoformat(),
+                    'lastPunch': last.isoformat(),
+                    'punches': count
+                }
+                for user_id, first, last, count in rows
+            ]
+        }
+
+
+def format_sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+live_feed = LiveFeed(notify_hub)
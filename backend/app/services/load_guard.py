@@ -0,0 +1,167 @@
+import math, os, threading, time
+
+from contextlib import contextmanager
+
+from ..models import db
+
+# Priority classes, lowest sheds first. Ingest is the badge punches, it is
+# rate limited per client but never shed. Reporting is every read.
+PRIORITY_INGEST = 'ingest'
+PRIORITY_WRITE = 'write'
+PRIORITY_REPORTING = 'reporting'
+PRIORITIES = (PRIORITY_INGEST, PRIORITY_WRITE, PRIORITY_REPORTING)
+
+INGEST_PERMISSIONS = {'post:attendance'}
+
+RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+# Requests per second and burst of one client, per worker and class. A rate of 0 disables the class limit
+RATE_LIMITS = {
+    PRIORITY_INGEST: (float(os.getenv('RATE_LIMIT_INGEST_RATE', 50)), int(os.getenv('RATE_LIMIT_INGEST_BURST', 100))),
+    PRIORITY_WRITE: (float(os.getenv('RATE_LIMIT_WRITE_RATE', 10)), int(os.getenv('RATE_LIMIT_WRITE_BURST', 20))),
+    PRIORITY_REPORTING: (float(os.getenv('RATE_LIMIT_REPORTING_RATE', 5)), int(os.getenv('RATE_LIMIT_REPORTING_BURST', 20))),
+}
+# Buckets kept per worker, the idle ones are dropped past it
+RATE_LIMIT_MAX_CLIENTS = int(os.getenv('RATE_LIMIT_MAX_CLIENTS', 10000))
+
+# Requests in a view of a worker over which the reporting is shed. A gthread
+# worker runs one request per thread, the reporting gets all but one of them
+# so a thread stays free for the punches. A cooperative worker has no such limit.
+def default_reporting_inflight(worker_class, threads):
+    if worker_class in ('gthread', 'sync'):
+        return max(threads - 1, 1)
+    return 16
+
+# Load over which a class is shed: requests in a view of this worker, and
+# the share of the database pool checked out. The reporting in-flight
+# default follows the gunicorn settings of gunicorn.conf.py.
+LOAD_SHED_LIMITS = {
+    PRIORITY_WRITE: (int(os.getenv('LOAD_SHED_WRITE_INFLIGHT', 32)), float(os.getenv('LOAD_SHED_WRITE_POOL_USAGE', 0.95))),
+    PRIORITY_REPORTING: (
+        int(os.getenv('LOAD_SHED_REPORTING_INFLIGHT') or default_reporting_inflight(
+            os.getenv('GUNICORN_WORKER_CLASS', 'gthread'), int(os.getenv('GUNICORN_THREADS', 2))
+        )),
+        float(os.getenv('LOAD_SHED_REPORTING_POOL_USAGE', 0.75))
+    ),
+}
+LOAD_SHED_RETRY_AFTER_SECONDS = int(os.getenv('LOAD_SHED_RETRY_AFTER_SECONDS', 2))
+
+# 429 over the rate limit, 503 when shed, retry_after in seconds
+class RateLimitError(Exception):
+    def __init__(self, error, status_code, retry_after):
+        self.error = error
+        self.status_code = status_code
+        self.retry_after = retry_after
+        super().__init__(f"{error['description']} (code: {status_code})")
+
+def priority_of(permission):
+    if permission in INGEST_PERMISSIONS:
+        return PRIORITY_INGEST
+    if not permission or permission.startswith(('get:', 'read:')):
+        return PRIORITY_REPORTING
+    return PRIORITY_WRITE
+
+# Admission of the authenticated requests, run by requires_auth.
+# A token bucket per (client, class) limits each client, the sub of the
+# token (client_id@clients for machine tokens). Under load the reporting
+# class is refused first, then the writes, the ingest never.
+class LoadGuard:
+    def __init__(self, rate_limits=RATE_LIMITS, shed_limits=LOAD_SHED_LIMITS, clock=time.monotonic):
+        self._rate_limits = rate_limits
+        self._shed_limits = shed_limits
+        self._clock = clock
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self.inflight = 0
+        self._stats = {priority: {'admitted': 0, 'limited': 0, 'shed': 0} for priority in PRIORITIES}
+
+    @contextmanager
+    def admit(self, payload, permission):
+        priority = priority_of(permission)
+        self.check_load(priority)
+        self.take_token(payload.get('sub') or payload.get('azp'), priority)
+
+        with self._lock:
+            self.inflight += 1
+            self._stats[priority]['admitted'] += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.inflight -= 1
+
+    def check_load(self, priority):
+        limits = self._shed_limits.get(priority)
+        if limits is None:
+            return
+
+        max_inflight, max_pool_usage = limits
+        if self.inflight >= max_inflight or self.pool_usage() >= max_pool_usage:
+            with self._lock:
+                self._stats[priority]['shed'] += 1
+            raise RateLimitError({
+                'code': 'overloaded',
+                'description': 'The server is busy, retry later.'
+            }, 503, LOAD_SHED_RETRY_AFTER_SECONDS)
+
+    def take_token(self, client, priority):
+        rate, burst = self._rate_limits[priority]
+        if not RATE_LIMIT_ENABLED or rate <= 0:
+            return
+
+        now = self._clock()
+        key = (client, priority)
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated_at) * rate)
+            if tokens < 1:
+                self._buckets[key] = (tokens, now)
+                self._stats[priority]['limited'] += 1
+                retry_after = math.ceil((1 - tokens) / rate)
+            else:
+                self._buckets[key] = (tokens - 1, now)
+                retry_after = None
+                if len(self._buckets) > RATE_LIMIT_MAX_CLIENTS:
+                    self._drop_full_buckets(now)
+
+        if retry_after is not None:
+            raise RateLimitError({
+                'code': 'rate_limited',
+                'description': 'Too many requests, retry later.'
+            }, 429, retry_after)
+
+    # Buckets refilled to their burst behave like new ones, they can go
+    def _drop_full_buckets(self, now):
+        self._buckets = {
+            (client, priority): (tokens, updated_at)
+            for (client, priority), (tokens, updated_at) in self._buckets.items()
+            if tokens + (now - updated_at) * self._rate_limits[priority][0] < self._rate_limits[priority][1]
+        }
+
+    # Highest share of a database pool checked out, 1 when callers wait for a connection
+    def pool_usage(self):
+        usage = 0.0
+        for engine in db.engines.values():
+            pool = engine.pool
+            if not hasattr(pool, 'checkedout'):
+                continue
+            # QueuePool keeps the overflow limit private, -1 is unlimited
+            max_overflow = getattr(pool, '_max_overflow', 0)
+            if max_overflow < 0:
+                continue
+            capacity = pool.size() + max_overflow
+            if capacity > 0:
+                usage = max(usage, pool.checkedout() / capacity)
+        return usage
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+            self._stats = {priority: {'admitted': 0, 'limited': 0, 'shed': 0} for priority in PRIORITIES}
+
+    # {class: {'admitted', 'limited', 'shed'}} of this worker, and its in-flight requests
+    def stats(self):
+        with self._lock:
+            return {'inflight': self.inflight, 'classes': {priority: dict(counts) for priority, counts in self._stats.items()}}
+
+
+load_guard = LoadGuard()
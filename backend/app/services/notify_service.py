@@ -0,0 +1,124 @@
+import json, logging, select, threading, time
+
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+
+# Seconds the listener waits on the socket before checking for new channels
+LISTEN_POLL_INTERVAL = 1.0
+# Seconds to wait before reconnecting after the listen connection drops
+RECONNECT_DELAY = 3.0
+
+# Process-local fan-out of Postgres LISTEN/NOTIFY channels.
+# Every worker process keeps one dedicated connection that LISTENs on the
+# subscribed channels, and calls the local callbacks once a notification
+# arrives. Publishing goes through pg_notify inside the caller's transaction,
+# so the message is only delivered to the other workers once it is committed.
+class NotifyHub:
+    def __init__(self):
+        self._database_uri = None
+        self._callbacks = {}
+        self._listening = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def init_app(self, app):
+        self._database_uri = app.config.get('SQLALCHEMY_DATABASE_URI')
+
+    def subscribe(self, channel, callback):
+        with self._lock:
+            self._callbacks.setdefault(channel, []).append(callback)
+        self._ensure_listener()
+
+    def unsubscribe(self, channel, callback):
+        with self._lock:
+            callbacks = self._callbacks.get(channel, [])
+            if callback in callbacks:
+                callbacks.remove(callback)
+
+    def publish(self, session, channel, payload):
+        # Delivered by Postgres on commit of the session's transaction
+        session.execute(
+            text("SELECT pg_notify(:channel, :payload)"),
+            {'channel': channel, 'payload': json.dumps(payload, default=str)}
+        )
+
+    # One round trip for many messages, each one is still delivered on its own
+    def publish_many(self, session, channel, payloads):
+        if not payloads:
+            return
+        session.execute(
+            text("SELECT pg_notify(:channel, payload) FROM unnest(CAST(:payloads AS text[])) AS payload"),
+            {'channel': channel, 'payloads': [json.dumps(payload, default=str) for payload in payloads]}
+        )
+
+    def dispatch(self, channel, payload):
+        with self._lock:
+            callbacks = list(self._callbacks.get(channel, []))
+
+        for callback in callbacks:
+            try:
+                callback(payload)
+            except Exception as e:
+                logging.error(f"Error in notify callback for {channel}: {e}")
+
+    # Listener thread
+    def _ensure_listener(self):
+        with self._lock:
+            if self._thread is not None or self._database_uri is None:
+                return
+            self._thread = threading.Thread(target=self._run, name='notify-hub', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        import psycopg2
+
+        # psycopg2 only understands the plain libpq url
+        dsn = make_url(self._database_uri).set(drivername='postgresql').render_as_string(hide_password=False)
+
+        while True:
+            conn = None
+            try:
+                conn = psycopg2.connect(dsn)
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                self._listening = set()
+
+                while True:
+                    self._listen_new_channels(conn)
+
+                    # select() is cooperative under gevent, so this also works on the async worker
+                    if select.select([conn], [], [], LISTEN_POLL_INTERVAL) == ([], [], []):
+                        continue
+
+                    conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        try:
+                            payload = json.loads(notify.payload)
+                        except ValueError:
+                            payload = notify.payload
+                        self.dispatch(notify.channel, payload)
+            except Exception as e:
+                logging.error(f"Notify listener disconnected: {e}")
+            finally:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+
+            time.sleep(RECONNECT_DELAY)
+
+    def _listen_new_channels(self, conn):
+        with self._lock:
+            channels = set(self._callbacks) - self._listening
+
+        if not channels:
+            return
+
+        with conn.cursor() as cursor:
+            for channel in channels:
+                cursor.execute(f'LISTEN "{channel}"')
+        self._listening |= channels
+
+
+notify_hub = NotifyHub()
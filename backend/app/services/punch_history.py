@@ -0,0 +1,147 @@
+import base64, os
+
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, tuple_
+
+from ..models import AttendanceRecords, Users, db
+from ..reporting.archive import attendance_archive, epoch_microseconds, unpack_punches, user_slice
+
+# Punches per page when the caller doesn't ask, and at most
+RECORDS_PAGE_SIZE = int(os.getenv('RECORDS_PAGE_SIZE', 100))
+RECORDS_MAX_PAGE_SIZE = 1000
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# (timestamp, id) of the last punch of a page -> opaque cursor of the next page
+def encode_cursor(timestamp, record_id):
+    microseconds = (timestamp - EPOCH) // timedelta(microseconds=1)
+    return base64.urlsafe_b64encode(f'{microseconds}.{record_id}'.encode()).decode().rstrip('=')
+
+# Cursor -> (timestamp, id), ValueError when it wasn't made by encode_cursor
+def decode_cursor(cursor):
+    try:
+        microseconds, record_id = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode().split('.')
+        return EPOCH + timedelta(microseconds=int(microseconds)), int(record_id)
+    except (ValueError, OverflowError):
+        raise ValueError('Invalid cursor')
+
+# Archived punches have no id. At the same instant they sort before the
+# table rows, by -user_id, which is the id their cursor carries.
+ArchivedRecord = namedtuple('ArchivedRecord', ['id', 'user_id', 'timestamp'])
+
+def record_key(row):
+    return row.timestamp, row.id if row.id is not None else -row.user_id
+
+# Positions of the next limit punches of one archived month in (time, -user)
+# order after the (after_us, after_id) key, newest first when descending.
+# users and times are aligned arrays, times in UTC epoch microseconds.
+def archived_page(users, times, limit, after=None, descending=False):
+    import numpy as np
+
+    users, times = np.asarray(users, dtype=np.int64), np.asarray(times, dtype=np.int64)
+    # Descending is ascending on the negated key
+    sign = -1 if descending else 1
+    first, second = sign * times, sign * -users
+    positions = np.arange(times.size)
+    if after is not None:
+        after_first, after_second = sign * after[0], sign * after[1]
+        kept = (first > after_first) | ((first == after_first) & (second > after_second))
+        positions, first, second = positions[kept], first[kept], second[kept]
+
+    # Only the limit smallest instants are sorted, with their ties
+    if positions.size > limit:
+        threshold = np.partition(first, limit - 1)[limit - 1]
+        kept = first <= threshold
+        positions, first, second = positions[kept], first[kept], second[kept]
+    order = np.lexsort((second, first))[:limit]
+    return positions[order]
+
+# Up to limit archived punches after the cursor key, month by month
+def archived_records(limit, after, user_id, department, start, end, descending):
+    import numpy as np
+
+    low, high = start, end
+    if after is not None:
+        if descending:
+            bound = after[0] + timedelta(microseconds=1)
+            high = min(high, bound) if high is not None else bound
+        else:
+            low = max(low, after[0]) if low is not None else after[0]
+    manifests = attendance_archive.manifests(low, high)
+    if not manifests:
+        return []
+
+    department_users = None
+    if department is not None:
+        department_users = np.array(
+            db.session.execute(select(Users.id).where(Users.department == department)).scalars().all(), dtype=np.int64
+        )
+    start_us = epoch_microseconds(start) if start is not None else None
+    end_us = epoch_microseconds(end) if end is not None else None
+    after_key = (epoch_microseconds(after[0]), after[1]) if after is not None else None
+
+    records = []
+    for manifest in reversed(manifests) if descending else manifests:
+        columns = attendance_archive.columns(manifest.path)
+        if user_id is not None:
+            times = user_slice(columns, user_id, start_us, end_us)
+            users = np.full(times.size, user_id, dtype=np.int64)
+        else:
+            users, times = unpack_punches(columns)
+            kept = np.ones(times.size, dtype=bool)
+            if start_us is not None:
+                kept &= times >= start_us
+            if end_us is not None:
+                kept &= times < end_us
+            if department_users is not None:
+                kept &= np.isin(users, department_users)
+            users, times = users[kept], times[kept]
+
+        positions = archived_page(users, times, limit - len(records), after_key, descending)
+        records += [
+            ArchivedRecord(None, user, EPOCH + timedelta(microseconds=timestamp))
+            for user, timestamp in zip(users[positions].tolist(), times[positions].tolist())
+        ]
+        # Months don't overlap, the next ones only hold later (or earlier) punches
+        if len(records) >= limit:
+            break
+    return records
+
+# One page of raw punches in (timestamp, id) order, newest first when descending.
+# A page starts right after the cursor with a row comparison on the
+# (timestamp, id) index instead of an OFFSET, so a deep page costs the same
+# as the first one. The months moved to the archive are merged in, their
+# punches have no id.
+# Returns (rows of AttendanceRecords.FORMAT_FIELDS, cursor of the next page or None).
+def page_records(limit, cursor=None, user_id=None, department=None, start=None, end=None, descending=False):
+    query = db.session.query(*AttendanceRecords.format_columns())
+
+    if user_id is not None:
+        query = query.filter(AttendanceRecords.user_id == user_id)
+    if department is not None:
+        query = query.filter(AttendanceRecords.user_id.in_(select(Users.id).where(Users.department == department)))
+    if start is not None:
+        query = query.filter(AttendanceRecords.timestamp >= start)
+    if end is not None:
+        query = query.filter(AttendanceRecords.timestamp < end)
+
+    after = decode_cursor(cursor) if cursor is not None else None
+    key = tuple_(AttendanceRecords.timestamp, AttendanceRecords.id)
+    if after is not None:
+        query = query.filter(key < tuple_(*after) if descending else key > tuple_(*after))
+
+    if descending:
+        query = query.order_by(AttendanceRecords.timestamp.desc(), AttendanceRecords.id.desc())
+    else:
+        query = query.order_by(AttendanceRecords.timestamp, AttendanceRecords.id)
+
+    rows = query.limit(limit + 1).all()
+    archived = archived_records(limit + 1, after, user_id, department, start, end, descending)
+    if archived:
+        rows = sorted(rows + archived, key=record_key, reverse=descending)[:limit + 1]
+
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(*record_key(rows[-1]))
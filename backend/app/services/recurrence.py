@@ -0,0 +1,240 @@
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+
+# Periods walked at most when a COUNT is resolved, against rules that never match
+RECURRENCE_MAX_PERIODS = 100000
+
+FREQUENCIES = ('DAILY', 'WEEKLY', 'MONTHLY', 'YEARLY')
+WEEKDAYS = ('MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU')
+
+# Subset of the RFC 5545 RRULE: FREQ, INTERVAL, BYDAY, BYMONTHDAY, COUNT, UNTIL.
+# YEARLY repeats the month and day of the event.
+# by_day holds (ordinal, weekday) pairs, weekday 0 is Monday and ordinal 0
+# every such weekday of the period ('2TU' is (2, 1), '-1FR' (-1, 4)).
+RecurrenceRule = namedtuple('RecurrenceRule', ['freq', 'interval', 'by_day', 'by_month_day', 'count', 'until'])
+
+# 'FREQ=WEEKLY;BYDAY=MO,WE' -> RecurrenceRule, raises ValueError
+def parse_rrule(text):
+    if text.upper().startswith('RRULE:'):
+        text = text[6:]
+
+    parts = {}
+    for part in text.split(';'):
+        if not part:
+            continue
+        key, separator, value = part.partition('=')
+        if not separator or not value:
+            raise ValueError(f'Invalid rule part: {part}')
+        parts[key.strip().upper()] = value.strip().upper()
+
+    freq = parts.pop('FREQ', None)
+    if freq not in FREQUENCIES:
+        raise ValueError(f'FREQ must be one of {", ".join(FREQUENCIES)}')
+
+    interval = int(parts.pop('INTERVAL', 1))
+    if interval < 1:
+        raise ValueError('INTERVAL must be positive')
+
+    by_day = tuple(parse_by_day(value) for value in parts.pop('BYDAY').split(',')) if 'BYDAY' in parts else ()
+    if any(ordinal for ordinal, _ in by_day) and freq != 'MONTHLY':
+        raise ValueError('BYDAY ordinals are only allowed with a MONTHLY FREQ')
+
+    by_month_day = tuple(int(value) for value in parts.pop('BYMONTHDAY').split(',')) if 'BYMONTHDAY' in parts else ()
+    if any(day == 0 or abs(day) > 31 for day in by_month_day):
+        raise ValueError('BYMONTHDAY must be within 1..31 or -31..-1')
+    if by_month_day and freq != 'MONTHLY':
+        raise ValueError('BYMONTHDAY is only allowed with a MONTHLY FREQ')
+    if by_month_day and by_day and freq == 'MONTHLY':
+        raise ValueError('BYDAY and BYMONTHDAY together are not supported')
+    if by_day and freq == 'YEARLY':
+        raise ValueError('A YEARLY rule repeats the date of the event, BYDAY is not supported')
+
+    count = int(parts.pop('COUNT')) if 'COUNT' in parts else None
+    if count is not None and count < 1:
+        raise ValueError('COUNT must be positive')
+
+    until = parse_until(parts.pop('UNTIL')) if 'UNTIL' in parts else None
+    if count is not None and until is not None:
+        raise ValueError('COUNT and UNTIL are exclusive')
+
+    if parts:
+        raise ValueError(f'Unsupported rule parts: {", ".join(sorted(parts))}')
+
+    return RecurrenceRule(freq, interval, by_day, by_month_day, count, until)
+
+def parse_by_day(value):
+    weekday = value[-2:]
+    if weekday not in WEEKDAYS:
+        raise ValueError(f'Invalid BYDAY: {value}')
+    ordinal = int(value[:-2]) if value[:-2] else 0
+    if abs(ordinal) > 53:
+        raise ValueError(f'Invalid BYDAY: {value}')
+    return ordinal, WEEKDAYS.index(weekday)
+
+# UNTIL as a UTC date-time (20250331T235959Z) or a date (20250331, the whole day)
+def parse_until(value):
+    if 'T' in value:
+        return datetime.strptime(value.rstrip('Z'), '%Y%m%dT%H%M%S').replace(tzinfo=timezone.utc)
+    return datetime.strptime(value, '%Y%m%d').replace(hour=23, minute=59, second=59, tzinfo=timezone.utc)
+
+def format_rrule(rule):
+    parts = [f'FREQ={rule.freq}']
+    if rule.interval != 1:
+        parts.append(f'INTERVAL={rule.interval}')
+    if rule.by_day:
+        parts.append('BYDAY=' + ','.join(f'{ordinal or ""}{WEEKDAYS[weekday]}' for ordinal, weekday in rule.by_day))
+    if rule.by_month_day:
+        parts.append('BYMONTHDAY=' + ','.join(str(day) for day in rule.by_month_day))
+    if rule.count is not None:
+        parts.append(f'COUNT={rule.count}')
+    if rule.until is not None:
+        parts.append('UNTIL=' + rule.until.astimezone(timezone.utc).strftime('%Y%m%dT%H%M%SZ'))
+    return ';'.join(parts)
+
+# Occurrences of the rule in [start, end), sorted, as aware datetimes.
+# dtstart is the first occurrence, in the timezone whose wall clock the
+# series follows: a weekly 10:00 meeting stays at 10:00 across DST.
+# The walk starts at the period holding start, so the cost is the number of
+# occurrences in the window and not the length of the series. until caps
+# the series, pass the one resolved by resolve_until for COUNT rules.
+def occurrences(rule, dtstart, start, end, until=None):
+    until = min(value for value in (rule.until, until) if value is not None) if rule.until or until else None
+    if until is not None:
+        end = min(end, until + timedelta(microseconds=1))
+    start = max(start, dtstart)
+    if start >= end:
+        return
+
+    period = first_period(rule, dtstart, start)
+    while True:
+        period_start = period_date(rule, dtstart, period)
+        if datetime.combine(period_start, dtstart.timetz()) >= end:
+            return
+        for day in period_days(rule, dtstart, period_start):
+            occurrence = datetime.combine(day, dtstart.timetz())
+            if occurrence >= end:
+                return
+            if occurrence >= start:
+                yield occurrence
+        period += 1
+
+# Last occurrence of a COUNT rule, stored so the expansion never counts from dtstart
+def resolve_until(rule, dtstart):
+    if rule.count is None:
+        return rule.until
+
+    seen, period = 0, 0
+    while period < RECURRENCE_MAX_PERIODS:
+        for day in period_days(rule, dtstart, period_date(rule, dtstart, period)):
+            occurrence = datetime.combine(day, dtstart.timetz())
+            if occurrence < dtstart:
+                continue
+            seen += 1
+            if seen == rule.count:
+                return occurrence
+        period += 1
+    raise ValueError('The rule has too few occurrences for its COUNT')
+
+# Index of the period holding day, one period is interval days, weeks, months or years
+def first_period(rule, dtstart, start):
+    day, first = start.astimezone(dtstart.tzinfo).date(), dtstart.date()
+    if rule.freq == 'DAILY':
+        elapsed = (day - first).days
+    elif rule.freq == 'WEEKLY':
+        elapsed = ((day - first).days + first.weekday()) // 7
+    elif rule.freq == 'MONTHLY':
+        elapsed = (day.year - first.year) * 12 + day.month - first.month
+    else:
+        elapsed = day.year - first.year
+    # One period back, the walk skips the occurrences before start anyway
+    return max(elapsed // rule.interval - 1, 0)
+
+# First day of a period
+def period_date(rule, dtstart, period):
+    first = dtstart.date()
+    if rule.freq == 'DAILY':
+        return first + timedelta(days=period * rule.interval)
+    if rule.freq == 'WEEKLY':
+        return first - timedelta(days=first.weekday()) + timedelta(weeks=period * rule.interval)
+    if rule.freq == 'MONTHLY':
+        month_index = first.year * 12 + first.month - 1 + period * rule.interval
+        return first.replace(year=month_index // 12, month=month_index % 12 + 1, day=1)
+    return first.replace(year=first.year + period * rule.interval, month=1, day=1)
+
+# Sorted days of the occurrences in the period starting on period_start
+def period_days(rule, dtstart, period_start):
+    if rule.freq == 'DAILY':
+        if rule.by_day and period_start.weekday() not in {weekday for _, weekday in rule.by_day}:
+            return []
+        return [period_start]
+
+    if rule.freq == 'WEEKLY':
+        weekdays = {weekday for _, weekday in rule.by_day} or {dtstart.weekday()}
+        return [period_start + timedelta(days=weekday) for weekday in sorted(weekdays)]
+
+    if rule.freq == 'MONTHLY':
+        return month_days(rule, period_start.year, period_start.month, dtstart.day)
+
+    # YEARLY, on the month and day of dtstart
+    return month_days(rule, period_start.year, dtstart.month, dtstart.day)
+
+def month_days(rule, year, month, default_day):
+    first = datetime(year, month, 1).date()
+    length = ((first + timedelta(days=32)).replace(day=1) - first).days
+
+    days = set()
+    for day in rule.by_month_day or (() if rule.by_day else (default_day,)):
+        day = day if day > 0 else length + day + 1
+        # Months without that day are skipped, like RFC 5545
+        if 1 <= day <= length:
+            days.add(day)
+
+    for ordinal, weekday in rule.by_day:
+        matching = [day for day in range(1, length + 1) if (first.weekday() + day - 1) % 7 == weekday]
+        if ordinal == 0:
+            days.update(matching)
+        elif ordinal <= len(matching) and -ordinal <= len(matching):
+            days.add(matching[ordinal - 1] if ordinal > 0 else matching[ordinal])
+
+    return [first.replace(day=day) for day in sorted(days)]
+
+# Occurrences of recurring events in [start, end) as event dicts, the shape
+# of Events.format_rows. series are (id, name, desc, date, rrule, until)
+# rows, exceptions (event_id, occurrence, cancelled, name, desc, date) rows
+# of those events. The series follow the wall clock of zone.
+def expand_events(series, exceptions, start, end, zone):
+    changes = {(event_id, occurrence): (cancelled, name, desc, date) for event_id, occurrence, cancelled, name, desc, date in exceptions}
+
+    events = []
+    for event_id, name, desc, dtstart, rrule, until in series:
+        rule = parse_rrule(rrule)
+        for occurrence in occurrences(rule, dtstart.astimezone(zone), start, end, until):
+            change = changes.pop((event_id, occurrence), None)
+            if change is None:
+                events.append({'id': event_id, 'name': name, 'desc': desc, 'date': occurrence, 'rrule': rrule})
+                continue
+
+            cancelled, changed_name, changed_desc, date = change
+            # Moved out of the window, a moved occurrence is listed on its new date
+            if cancelled or (date is not None and not start <= date < end):
+                continue
+            events.append({
+                'id': event_id, 'name': changed_name or name, 'desc': changed_desc if changed_desc is not None else desc,
+                'date': date or occurrence, 'rrule': rrule
+            })
+
+    # Occurrences moved into the window from outside of it
+    rows = {row[0]: row for row in series}
+    for (event_id, occurrence), (cancelled, changed_name, changed_desc, date) in changes.items():
+        if cancelled or date is None or not start <= date < end or event_id not in rows:
+            continue
+        _, name, desc, dtstart, rrule, until = rows[event_id]
+        # Stale exceptions, of an occurrence the rule no longer has, are ignored
+        if next(occurrences(parse_rrule(rrule), dtstart.astimezone(zone), occurrence, occurrence + timedelta(microseconds=1), until), None) is None:
+            continue
+        events.append({
+            'id': event_id, 'name': changed_name or name, 'desc': changed_desc if changed_desc is not None else desc,
+            'date': date, 'rrule': rrule
+        })
+
+    return events
@@ -0,0 +1,98 @@
+import logging, os, threading, time
+
+from flask import g, request
+from functools import wraps
+from sqlalchemy import text
+
+from ..models import db
+
+# Replica reads are skipped while the replica is further behind than this
+DB_REPLICA_MAX_LAG_SECONDS = float(os.getenv('DB_REPLICA_MAX_LAG_SECONDS', 5))
+# Seconds a user keeps reading from the primary after one of its writes
+DB_READ_AFTER_WRITE_SECONDS = float(os.getenv('DB_READ_AFTER_WRITE_SECONDS', 10))
+# Seconds between two replica lag checks
+DB_REPLICA_LAG_CHECK_SECONDS = float(os.getenv('DB_REPLICA_LAG_CHECK_SECONDS', 5))
+
+LAG_QUERY = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+# Decides if a read-only request may run on the replica.
+# Falls back to the primary when no replica is configured, when it lags
+# behind more than the accepted lag, or when the caller wrote recently.
+class ReplicaRouter:
+    def __init__(self):
+        self._recent_writes = {}
+        self._lag = None
+        self._lag_checked_at = 0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        app.after_request(self._track_writes)
+
+    def use_replica(self, payload, max_lag=DB_REPLICA_MAX_LAG_SECONDS):
+        if 'replica' not in db.engines:
+            return False
+
+        if self.wrote_recently(payload.get('sub')):
+            return False
+
+        return self.current_lag() <= max_lag
+
+    def wrote_recently(self, sub):
+        written_at = self._recent_writes.get(sub)
+        return written_at is not None and time.monotonic() - written_at < DB_READ_AFTER_WRITE_SECONDS
+
+    def current_lag(self):
+        now = time.monotonic()
+        if self._lag is not None and now - self._lag_checked_at < DB_REPLICA_LAG_CHECK_SECONDS:
+            return self._lag
+
+        try:
+            with db.engines['replica'].connect() as conn:
+                lag = float(conn.execute(LAG_QUERY).scalar())
+        except Exception as e:
+            # Replica unreachable, stay on the primary until the next check
+            logging.error(f"Failed to check replica lag: {e}")
+            lag = float('inf')
+
+        self._lag = lag
+        self._lag_checked_at = now
+        return lag
+
+    def mark_write(self, sub):
+        now = time.monotonic()
+        with self._lock:
+            self._recent_writes[sub] = now
+            # Forget the writers whose window is over
+            if len(self._recent_writes) > 10000:
+                self._recent_writes = {
+                    key: written_at for key, written_at in self._recent_writes.items()
+                    if now - written_at < DB_READ_AFTER_WRITE_SECONDS
+                }
+
+    def _track_writes(self, response):
+        payload = g.get('jwt_payload')
+        if payload and request.method not in ('GET', 'HEAD', 'OPTIONS') and response.status_code < 400:
+            self.mark_write(payload.get('sub'))
+        return response
+
+
+replica_router = ReplicaRouter()
+
+# Marks a read-only route, put it under requires_auth so it gets the payload
+def read_replica(max_lag=DB_REPLICA_MAX_LAG_SECONDS):
+    def read_replica_decorator(f):
+        @wraps(f)
+        def wrapper(payload, *args, **kwargs):
+            g.use_replica = replica_router.use_replica(payload, max_lag=max_lag)
+            try:
+                return f(payload, *args, **kwargs)
+            finally:
+                g.use_replica = False
+        return wrapper
+    return read_replica_decorator
@@ -0,0 +1,83 @@
+import logging, os
+
+from concurrent.futures import ThreadPoolExecutor
+
+from .auth0_management import auth0_management
+
+# Users updated at the same time by a bulk assignment
+AUTH0_ROLE_WORKERS = int(os.getenv('AUTH0_ROLE_WORKERS', 8))
+# Most assignments accepted by one bulk request
+AUTH0_ROLE_BULK_MAX = int(os.getenv('AUTH0_ROLE_BULK_MAX', 500))
+
+# Sets the roles of Auth0 users.
+# The current roles are diffed with the wanted ones, so only the removed and
+# the added roles are sent, and the sessions are only terminated when something
+# changed. Bulk assignments run on a bounded pool, the client shares the rate
+# limit between the workers.
+# A result's 'held' is the roles the user has in Auth0 once done, also when
+# it failed half way (removed but not added), None when they're unknown.
+# Callers write it to the mirror so it never drifts from Auth0.
+class RoleAssigner:
+    def __init__(self, client):
+        self._client = client
+
+    def assign(self, auth0_id, role_ids):
+        result = {'auth0_id': auth0_id, 'success': False, 'roles': role_ids, 'added': [], 'removed': [], 'held': None}
+
+        try:
+            current_response = self._client.get_user_roles(auth0_id)
+            if current_response.status_code != 200:
+                return fail(result, current_response, 'Failed to get current roles')
+
+            current_role_ids = [role['id'] for role in current_response.json()]
+            removed = [role_id for role_id in current_role_ids if role_id not in role_ids]
+            added = [role_id for role_id in role_ids if role_id not in current_role_ids]
+
+            if removed:
+                remove_response = self._client.remove_user_roles(auth0_id, removed)
+                if remove_response.status_code != 204:
+                    result['held'] = current_role_ids
+                    return fail(result, remove_response, 'Failed to remove existing roles')
+                result['removed'] = removed
+            kept = [role_id for role_id in current_role_ids if role_id not in removed]
+            result['held'] = kept
+
+            if added:
+                result['held'] = None
+                add_response = self._client.add_user_roles(auth0_id, added)
+                if add_response.status_code != 204:
+                    result['held'] = kept
+                    if removed:
+                        # The sessions still carry the removed roles
+                        self._client.delete_user_sessions(auth0_id)
+                    return fail(result, add_response, 'Failed to add new roles')
+                result['added'] = added
+            result['held'] = role_ids
+
+            if removed or added:
+                self._client.delete_user_sessions(auth0_id)
+
+            result['success'] = True
+            result['status'] = 200
+            return result
+        except Exception as e:
+            logging.error(f"Failed to update roles for user {auth0_id}: {e}")
+            result.update({'status': 500, 'message': f'Failed to update roles for user {auth0_id}', 'error': str(e)})
+            return result
+
+    # Results come back in the order of the assignments
+    def assign_many(self, assignments):
+        if not assignments:
+            return []
+
+        workers = min(AUTH0_ROLE_WORKERS, len(assignments))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='auth0-roles') as executor:
+            return list(executor.map(lambda assignment: self.assign(*assignment), assignments))
+
+
+def fail(result, response, message):
+    result.update({'status': response.status_code, 'message': message, 'error': response.text})
+    return result
+
+
+role_assigner = RoleAssigner(auth0_management)
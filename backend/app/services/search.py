@@ -0,0 +1,62 @@
+import os, re
+
+from sqlalchemy import case, func, literal, or_
+from sqlalchemy.dialects.postgresql import REGCONFIG
+
+from ..models import Users, Events, SEARCH_TEXT_CONFIG, db
+
+# Results per page when the caller doesn't ask, and at most
+SEARCH_PAGE_SIZE = int(os.getenv('SEARCH_PAGE_SIZE', 20))
+SEARCH_MAX_PAGE_SIZE = 100
+# Shorter queries only match prefixes, a trigram needs 3 characters
+SEARCH_FUZZY_MIN_LENGTH = 3
+
+SEARCH_TYPES = ('events', 'users')
+
+WORD_PATTERN = re.compile(r'\w+')
+
+# 'team meet' -> 'team:* & meet:*', every word matched as a prefix.
+# Only word characters are kept, the tsquery operators never come from the caller.
+def prefix_tsquery(text):
+    return ' & '.join(f'{word}:*' for word in WORD_PATTERN.findall(text.lower()))
+
+# Backslash is the default LIKE escape of Postgres
+def escape_like(text):
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+# Events whose name or description holds every word of text, as prefixes.
+# Served by the GIN index on events.search_vector, the name ranks above the
+# description. Returns (rows of Events.FORMAT_FIELDS, has_more).
+def search_events(text, limit, offset=0):
+    tsquery = prefix_tsquery(text)
+    if not tsquery:
+        return [], False
+
+    query = func.to_tsquery(literal(SEARCH_TEXT_CONFIG).cast(REGCONFIG), tsquery)
+    rank = func.ts_rank_cd(Events.search_vector, query)
+    rows = db.session.query(*Events.format_columns()).filter(
+        Events.search_vector.op('@@')(query)
+    ).order_by(rank.desc(), Events.date.desc(), Events.id).offset(offset).limit(limit + 1).all()
+    return rows[:limit], len(rows) > limit
+
+# Active users whose username, email or department starts with text, or is
+# close to it (pg_trgm similarity). Both are served by the trigram indexes.
+# Prefix matches come first, then the closest ones.
+# Returns (rows of Users.FORMAT_FIELDS, has_more).
+def search_users(text, limit, offset=0):
+    text = text.strip()
+    if not text:
+        return [], False
+
+    columns = (Users.username, Users.email, Users.department)
+    prefix = f'{escape_like(text)}%'
+    matches = [column.ilike(prefix) for column in columns]
+    if len(text) >= SEARCH_FUZZY_MIN_LENGTH:
+        matches += [column.op('%')(text) for column in columns]
+
+    is_prefix = case((or_(*matches[:len(columns)]), 1), else_=0)
+    similarity = func.greatest(*(func.coalesce(func.similarity(column, text), 0) for column in columns))
+    rows = db.session.query(*Users.format_columns()).filter(
+        Users.is_active == True, or_(*matches)
+    ).order_by(is_prefix.desc(), similarity.desc(), Users.username).offset(offset).limit(limit + 1).all()
+    return rows[:limit], len(rows) > limit
@@ -0,0 +1,151 @@
+import logging, os, threading, time
+
+from datetime import datetime
+from sqlalchemy import func
+
+from ..models import AttendanceRecords, db
+from ..reporting.timezones import get_zone, local_day
+from .live_feed import PUNCH_CHANNEL
+from .notify_service import notify_hub
+
+# Seconds between full reloads, catches the punches a dropped listener missed
+TODAY_SNAPSHOT_RELOAD_SECONDS = int(os.getenv('TODAY_SNAPSHOT_RELOAD_SECONDS', 300))
+
+# First and last punch of one user today
+class Presence:
+    __slots__ = ('first', 'last')
+
+    def __init__(self, first, last):
+        self.first = first
+        self.last = last
+
+# Who punched in today, kept in memory per worker for the presence boards.
+# Loaded once a worker starts through the site day expression index, then
+# every punch published on the attendance_punch channel (HTTP and ingest
+# server) updates it, so workers stay in step through LISTEN/NOTIFY.
+# Only first and last punch are kept: a punch delivered twice, or both
+# loaded and notified, changes nothing.
+class TodaySnapshot:
+    def __init__(self, hub):
+        self._hub = hub
+        self._app = None
+        self._day = None
+        self._users = {}
+        self._loaded = False
+        self._last_reload = 0
+        self._subscribed = False
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self._app = app
+
+    # Loads today in the background, a request before that loads it on demand
+    def warm(self):
+        if self._app is None:
+            return
+        threading.Thread(target=self._warm, name='today-snapshot-warm', daemon=True).start()
+
+    def _warm(self):
+        # Subscribed first, no punch is lost between the load and the listener
+        self._subscribe()
+        with self._app.app_context():
+            try:
+                self.load()
+            except Exception as e:
+                logging.error(f"Failed to warm the today snapshot: {e}")
+            finally:
+                db.session.remove()
+
+    def _subscribe(self):
+        with self._lock:
+            if self._subscribed:
+                return
+            self._subscribed = True
+        self._hub.subscribe(PUNCH_CHANNEL, self._on_punch)
+
+    def load(self, day=None):
+        day = day or self.today()
+        rows = db.session.query(
+            AttendanceRecords.user_id,
+            func.min(AttendanceRecords.timestamp),
+            func.max(AttendanceRecords.timestamp)
+        ).filter(
+            local_day(AttendanceRecords.timestamp) == day
+        ).group_by(AttendanceRecords.user_id).all()
+
+        with self._lock:
+            if self._day != day:
+                self._day = day
+                self._users = {}
+            for user_id, first, last in rows:
+                self._apply(user_id, first, last)
+            self._loaded = True
+            self._last_reload = time.monotonic()
+
+    def today(self):
+        return datetime.now(get_zone()).date()
+
+    def _on_punch(self, punch):
+        try:
+            self.apply_punch(punch['user_id'], datetime.fromisoformat(punch['timestamp']))
+        except (KeyError, TypeError, ValueError) as e:
+            logging.error(f"Invalid punch notification {punch}: {e}")
+
+    def apply_punch(self, user_id, timestamp):
+        day = timestamp.astimezone(get_zone()).date()
+        with self._lock:
+            if self._day is None or day > self._day:
+                # The first punch of a new day, yesterday's entries go
+                self._day = day
+                self._users = {}
+            elif day < self._day:
+                # Late punch of a past day
+                return
+            self._apply(user_id, timestamp, timestamp)
+
+    def _apply(self, user_id, first, last):
+        presence = self._users.get(user_id)
+        if presence is None:
+            self._users[user_id] = Presence(first, last)
+            return
+        if first < presence.first:
+            presence.first = first
+        if last > presence.last:
+            presence.last = last
+
+    def _ensure_fresh(self):
+        self._subscribe()
+        if not self._loaded or time.monotonic() - self._last_reload > TODAY_SNAPSHOT_RELOAD_SECONDS:
+            self.load()
+
+    # {'date', 'users': [{'user_id', 'firstPunch', 'lastPunch'}]} of the site day, by user id
+    def get(self):
+        self._ensure_fresh()
+        day = self.today()
+        with self._lock:
+            users = sorted(self._users.items()) if self._day == day else []
+
+        return {
+            'date': day.isoformat(),
+            'users': [
+                {
+                    'user_id': user_id,
+                    'firstPunch': presence.first.isoformat(),
+                    'lastPunch': presence.last.isoformat()
+                }
+                for user_id, presence in users
+            ]
+        }
+
+    def __len__(self):
+        return len(self._users)
+
+    # Forgets the day, the next request loads it again
+    def clear(self):
+        with self._lock:
+            self._day = None
+            self._users = {}
+            self._loaded = False
+
+
+today_snapshot = TodaySnapshot(notify_hub)
@@ -0,0 +1,93 @@
+import os, threading, time
+
+from collections import OrderedDict
+
+from ..models import Users, db
+from .notify_service import notify_hub
+
+USER_CACHE_MAX_SIZE = int(os.getenv('USER_CACHE_MAX_SIZE', 50000))
+USER_CACHE_TTL_SECONDS = int(os.getenv('USER_CACHE_TTL_SECONDS', 300))
+
+USER_CHANGED_CHANNEL = 'user_changed'
+
+# Process-local cache of whether a user id exists and is active.
+# Used by the ingest path so a punch normally needs no lookup query, also
+# for the deactivated and unknown ids: a leaver's badge keeps being refused
+# from memory. Entries are bounded by size (LRU) and TTL. Writers call
+# invalidate() inside their transaction, the change is then broadcast to
+# every worker through NOTIFY.
+class ActiveUserCache:
+    def __init__(self, hub, max_size=USER_CACHE_MAX_SIZE, ttl=USER_CACHE_TTL_SECONDS):
+        self._hub = hub
+        self._max_size = max_size
+        self._ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._subscribed = False
+        self.hits = 0
+        self.misses = 0
+
+    def is_active(self, user_id):
+        # JSON true isn't user 1
+        if isinstance(user_id, bool):
+            return False
+        try:
+            user_id = int(user_id)
+        except (TypeError, ValueError):
+            return False
+
+        self._ensure_subscribed()
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[0]
+
+        self.misses += 1
+        row = db.session.query(Users.is_active).filter(Users.id == user_id).first()
+        # Legacy rows without a flag are treated as active
+        active = row is not None and row[0] is not False
+
+        self.add(user_id, now, active)
+        return active
+
+    def add(self, user_id, now=None, active=True):
+        now = now if now is not None else time.monotonic()
+        with self._lock:
+            self._entries[int(user_id)] = (active, now + self._ttl)
+            self._entries.move_to_end(int(user_id))
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+    def discard(self, user_ids):
+        with self._lock:
+            for user_id in user_ids:
+                self._entries.pop(int(user_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    # Drop the ids here, and in the other workers once the session commits
+    def invalidate(self, session, user_ids):
+        user_ids = [int(user_id) for user_id in user_ids]
+        self.discard(user_ids)
+        self._hub.publish(session, USER_CHANGED_CHANNEL, {'user_ids': user_ids})
+
+    def _on_user_changed(self, payload):
+        self.discard(payload.get('user_ids', []))
+
+    def _ensure_subscribed(self):
+        if self._subscribed:
+            return
+        with self._lock:
+            if self._subscribed:
+                return
+            self._subscribed = True
+        self._hub.subscribe(USER_CHANGED_CHANNEL, self._on_user_changed)
+
+
+active_user_cache = ActiveUserCache(notify_hub)
@@ -0,0 +1,105 @@
+import logging, os, threading, time
+
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+
+from ..models import db
+from .notify_service import notify_hub
+
+# Entries younger than this are served without any refresh
+USER_INFO_TTL_SECONDS = int(os.getenv('USER_INFO_TTL_SECONDS', 60))
+# Older entries are still served up to this age, while a refresh runs in the background
+USER_INFO_STALE_SECONDS = int(os.getenv('USER_INFO_STALE_SECONDS', 900))
+USER_INFO_CACHE_MAX_SIZE = int(os.getenv('USER_INFO_CACHE_MAX_SIZE', 10000))
+USER_INFO_REFRESH_WORKERS = int(os.getenv('USER_INFO_REFRESH_WORKERS', 4))
+
+USER_INFO_CHANGED_CHANNEL = 'user_info_changed'
+
+# Cache of the assembled user info (db row + Auth0 profile) per auth0_id.
+# Fresh entries are served directly, stale ones are served while one
+# background refresh runs, and concurrent misses for the same user wait on
+# a single upstream fetch. The loader returns (value, cacheable), so a
+# failed Auth0 call is answered but never replaces a good entry.
+class UserInfoCache:
+    def __init__(self, hub):
+        self._hub = hub
+        self._entries = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=USER_INFO_REFRESH_WORKERS, thread_name_prefix='user-info')
+        self._subscribed = False
+
+    def get(self, auth0_id, loader):
+        self._ensure_subscribed()
+        now = time.monotonic()
+        entry = self._entries.get(auth0_id)
+
+        if entry is not None:
+            value, fetched_at = entry
+            age = now - fetched_at
+            if age < USER_INFO_TTL_SECONDS:
+                return value
+            if age < USER_INFO_STALE_SECONDS:
+                self._submit(auth0_id, loader)
+                return value
+
+        return self._submit(auth0_id, loader).result()
+
+    # One fetch per user at a time, callers of the same user share its future
+    def _submit(self, auth0_id, loader):
+        app = current_app._get_current_object()
+        with self._lock:
+            future = self._inflight.get(auth0_id)
+            if future is None:
+                future = self._executor.submit(self._load, app, auth0_id, loader)
+                self._inflight[auth0_id] = future
+            return future
+
+    def _load(self, app, auth0_id, loader):
+        try:
+            with app.app_context():
+                try:
+                    value, cacheable = loader()
+                finally:
+                    db.session.remove()
+
+            if cacheable:
+                with self._lock:
+                    if len(self._entries) >= USER_INFO_CACHE_MAX_SIZE:
+                        # Drop the oldest entry
+                        oldest = min(self._entries, key=lambda key: self._entries[key][1])
+                        self._entries.pop(oldest, None)
+                    self._entries[auth0_id] = (value, time.monotonic())
+            return value
+        except Exception as e:
+            logging.error(f"Failed to load user info of {auth0_id}: {e}")
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(auth0_id, None)
+
+    def discard(self, auth0_ids):
+        with self._lock:
+            for auth0_id in auth0_ids:
+                self._entries.pop(auth0_id, None)
+
+    # Drop the entries here, and in the other workers once the session commits
+    def invalidate(self, session, auth0_ids):
+        auth0_ids = [auth0_id for auth0_id in auth0_ids if auth0_id]
+        self.discard(auth0_ids)
+        self._hub.publish(session, USER_INFO_CHANGED_CHANNEL, {'auth0_ids': auth0_ids})
+
+    def _on_user_info_changed(self, payload):
+        self.discard(payload.get('auth0_ids', []))
+
+    def _ensure_subscribed(self):
+        if self._subscribed:
+            return
+        with self._lock:
+            if self._subscribed:
+                return
+            self._subscribed = True
+        self._hub.subscribe(USER_INFO_CHANGED_CHANNEL, self._on_user_info_changed)
+
+
+user_info_cache = UserInfoCache(notify_hub)
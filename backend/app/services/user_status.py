@@ -0,0 +1,47 @@
+import os
+
+from sqlalchemy import Integer, any_, bindparam, select, update
+from sqlalchemy.dialects.postgresql import ARRAY
+
+from ..models import Users
+from .user_cache import active_user_cache
+from .user_info_cache import user_info_cache
+
+# Most users one bulk (de)activation accepts
+USERS_BULK_MAX = int(os.getenv('USERS_BULK_MAX', 10000))
+# Unknown ids listed in a response
+USERS_BULK_MAX_ERRORS = 100
+
+# The ids go as one array parameter, the statement is the same whatever their number
+def _ids_param(user_ids):
+    return any_(bindparam('ids', list(user_ids), type_=ARRAY(Integer)))
+
+# Deactivates (leavers) or reactivates users with one UPDATE ... WHERE id = ANY(:ids),
+# in the caller's transaction. Only the rows whose flag changes are written.
+# Their cache entries are dropped here, and in the other workers on commit.
+# Returns {'updated': ids changed, 'unchanged': ids already so, 'missing': unknown ids}
+def set_users_active(session, user_ids, active):
+    user_ids = sorted(set(int(user_id) for user_id in user_ids))
+    rows = session.execute(
+        update(Users)
+        .where(Users.id == _ids_param(user_ids), Users.is_active.is_distinct_from(active))
+        .values(is_active=active)
+        .returning(Users.id, Users.auth0_id)
+        .execution_options(synchronize_session=False)
+    ).all()
+
+    updated = sorted(row[0] for row in rows)
+    missing = []
+    if len(updated) < len(user_ids):
+        existing = set(session.execute(select(Users.id).where(Users.id == _ids_param(user_ids))).scalars())
+        missing = [user_id for user_id in user_ids if user_id not in existing]
+
+    if updated:
+        active_user_cache.invalidate(session, updated)
+        user_info_cache.invalidate(session, [row[1] for row in rows])
+
+    return {
+        'updated': updated,
+        'unchanged': sorted(set(user_ids) - set(updated) - set(missing)),
+        'missing': missing,
+    }
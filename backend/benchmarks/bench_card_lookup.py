@@ -0,0 +1,92 @@
+# Card lookup at ingest: in-memory CardIndex vs a db round trip.
+#
+#   python -m benchmarks.bench_card_lookup --cards 100000
+#
+# The db part runs only when DB_* env variables point to a database
+# holding the cards table, otherwise only the index is measured.
+import argparse, os, random, time
+
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, text
+
+from app.services.card_index import CardIndex
+
+
+class NullHub:
+    def subscribe(self, channel, callback):
+        pass
+
+    def publish(self, session, channel, payload):
+        pass
+
+
+def build_index(count):
+    index = CardIndex(NullHub())
+    now = datetime.now()
+    rows = [
+        (card_id, f"{card_id:010d}", card_id % 10000 + 1, now - timedelta(days=365), None, True, now)
+        for card_id in range(1, count + 1)
+    ]
+    index.apply_rows(rows)
+    # Loaded and fresh, no db access during the benchmark
+    index._loaded = True
+    index._last_refresh = index._last_reload = time.monotonic()
+    return index
+
+
+def bench_index(index, count, lookups):
+    uids = [f"{random.randint(1, count):010d}" for _ in range(lookups)]
+    now = datetime.now()
+
+    start = time.perf_counter()
+    for uid in uids:
+        index.resolve(uid, now)
+    elapsed = time.perf_counter() - start
+
+    return elapsed / lookups
+
+
+def bench_db(count, lookups):
+    url = 'postgresql://{}:{}@{}:{}/{}'.format(
+        os.getenv('DB_USER'),
+        os.getenv('DB_PASSWORD'),
+        os.getenv('DB_HOST'),
+        os.getenv('DB_PORT'),
+        os.getenv('DB_NAME')
+    )
+    engine = create_engine(url)
+    query = text("SELECT user_id FROM cards WHERE card_uid = :uid AND is_active LIMIT 1")
+
+    with engine.connect() as conn:
+        start = time.perf_counter()
+        for _ in range(lookups):
+            conn.execute(query, {'uid': f"{random.randint(1, count):010d}"}).first()
+        elapsed = time.perf_counter() - start
+
+    return elapsed / lookups
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--cards', type=int, default=100000)
+    parser.add_argument('--lookups', type=int, default=200000)
+    parser.add_argument('--db-lookups', type=int, default=2000)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    index = build_index(args.cards)
+    print(f"Built index of {len(index)} cards in {time.perf_counter() - start:.3f}s")
+
+    per_lookup = bench_index(index, args.cards, args.lookups)
+    print(f"Index lookup: {per_lookup * 1e6:.2f} us/lookup ({args.lookups} lookups)")
+
+    if os.getenv('DB_HOST'):
+        per_query = bench_db(args.cards, args.db_lookups)
+        print(f"DB lookup:    {per_query * 1e6:.2f} us/lookup ({args.db_lookups} lookups)")
+        print(f"Index is {per_query / per_lookup:.0f}x faster")
+    else:
+        print("DB_HOST not set, skipping the db round trip comparison")
+
+
+if __name__ == '__main__':
+    main()
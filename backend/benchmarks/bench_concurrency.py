@@ -0,0 +1,173 @@
+# Concurrency and memory of one gunicorn worker on Auth0-bound requests,
+# gthread against gevent (cooperative, psycopg2 patched by psycogreen).
+#
+#   python -m benchmarks.bench_concurrency --clients 200 --latency-ms 200
+#
+# A local stub stands in for the tenant's JWKS endpoint and answers after
+# --latency-ms. The load is /api/check-auth, which only verifies the token:
+# with AUTH0_JWKS_TTL_SECONDS=0 every request downloads the keys, like every
+# request did before the JWKS cache and like the routes calling the
+# Management API still do. The default TTL shows the cached path.
+#
+# For each run it prints the throughput, the latencies, the most Auth0 calls
+# the worker had waiting at once (the concurrency it achieves) and its memory
+# growth per call in flight. Needs gunicorn, and gevent for the gevent runs.
+import argparse, importlib.util, os, socket, statistics, subprocess, sys, threading, time
+
+import requests
+
+from app.reader.stub_auth import STUB_ENV, make_keys, start_jwks_stub, jwks_url
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_gunicorn(worker_class, threads, stub, jwks_ttl, port):
+    env = {
+        **os.environ,
+        'DB_USER': os.getenv('DB_USER', 'postgres'),
+        'DB_PASSWORD': os.getenv('DB_PASSWORD', 'postgres'),
+        'DB_HOST': os.getenv('DB_HOST', 'localhost'),
+        'DB_PORT': os.getenv('DB_PORT', '5432'),
+        'DB_NAME': os.getenv('DB_NAME', 'attendance-system'),
+        **STUB_ENV,
+        'AUTH0_JWKS_URL': jwks_url(stub),
+        'AUTH0_JWKS_TTL_SECONDS': str(jwks_ttl),
+        # Measures the server, not the admission control
+        'RATE_LIMIT_ENABLED': 'false',
+        'LOAD_SHED_REPORTING_INFLIGHT': '1000000',
+        'GUNICORN_BIND': f'127.0.0.1:{port}',
+        'GUNICORN_WORKERS': '1',
+        'GUNICORN_THREADS': str(threads),
+        'GUNICORN_WORKER_CLASS': worker_class,
+        'GUNICORN_WORKER_CONNECTIONS': '10000',
+    }
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app.main:create_app()'],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            requests.get(f'http://127.0.0.1:{port}/api/login-callback?state=bench', allow_redirects=False, timeout=1)
+            return process
+        except requests.ConnectionError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f'gunicorn ({worker_class}) did not start')
+
+
+def worker_pid(master_pid):
+    with open(f'/proc/{master_pid}/task/{master_pid}/children') as file:
+        children = file.read().split()
+    return int(children[0])
+
+
+def rss_kb(pid):
+    with open(f'/proc/{pid}/status') as file:
+        for line in file:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    return 0
+
+
+def run_load(port, token, clients, seconds, pid):
+    url = f'http://127.0.0.1:{port}/api/check-auth'
+    headers = {'Authorization': f'Bearer {token}'}
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    stop_at = time.monotonic() + seconds
+    peak_rss = [rss_kb(pid)]
+
+    def client():
+        session = requests.Session()
+        local = []
+        while time.monotonic() < stop_at:
+            started = time.perf_counter()
+            try:
+                ok = session.get(url, headers=headers, timeout=60).status_code == 200
+            except requests.RequestException:
+                ok = False
+            if ok:
+                local.append(time.perf_counter() - started)
+            else:
+                with lock:
+                    errors[0] += 1
+        with lock:
+            latencies.extend(local)
+
+    def sample_memory():
+        while time.monotonic() < stop_at:
+            peak_rss[0] = max(peak_rss[0], rss_kb(pid))
+            time.sleep(0.1)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)] + [threading.Thread(target=sample_memory)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    return latencies, errors[0], elapsed, peak_rss[0]
+
+
+def bench(worker_class, threads, jwks_ttl, args, stub, token):
+    port = free_port()
+    process = start_gunicorn(worker_class, threads, stub, jwks_ttl, port)
+    try:
+        pid = worker_pid(process.pid)
+        # One request warms the app and the cache before the idle reading
+        requests.get(f'http://127.0.0.1:{port}/api/check-auth', headers={'Authorization': f'Bearer {token}'}, timeout=60)
+        idle = rss_kb(pid)
+        stub.RequestHandlerClass.peak = 0
+        latencies, errors, elapsed, peak = run_load(port, token, args.clients, args.seconds, pid)
+    finally:
+        process.terminate()
+        process.wait()
+
+    throughput = len(latencies) / elapsed
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else [0] * 99
+    concurrent = stub.RequestHandlerClass.peak
+    per_call = f"{(peak - idle) / concurrent:6.1f} KB/call" if concurrent else '      - KB/call'
+    label = f"{worker_class}{f' x{threads}' if worker_class == 'gthread' else ''}, jwks ttl {jwks_ttl}s"
+    print(
+        f"{label:28} {throughput:8.1f} req/s  p50 {quantiles[49] * 1000:7.1f} ms  p99 {quantiles[98] * 1000:7.1f} ms  "
+        f"Auth0 calls at once {concurrent:5}  rss {idle / 1024:6.1f} -> {peak / 1024:6.1f} MB  {per_call}  errors {errors}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clients', type=int, default=200)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--latency-ms', type=float, default=200)
+    parser.add_argument('--threads', type=int, default=int(os.getenv('GUNICORN_THREADS', 2)))
+    args = parser.parse_args()
+
+    jwks, sign = make_keys()
+    token = sign('auth0|bench')
+    stub = start_jwks_stub(jwks, args.latency_ms / 1000)
+    print(f"{args.clients} clients, {args.seconds:.0f}s per run, Auth0 answers in {args.latency_ms:.0f} ms")
+
+    # The gevent runs start gunicorn workers that need it installed
+    worker_classes = ['gthread']
+    if importlib.util.find_spec('gevent') is not None:
+        worker_classes.append('gevent')
+    else:
+        print("gevent is not installed (pip install -r requirements.txt), skipping the gevent runs")
+
+    try:
+        for jwks_ttl in (0, 3600):
+            for worker_class in worker_classes:
+                bench(worker_class, args.threads, jwks_ttl, args, stub, token)
+    finally:
+        stub.shutdown()
+
+
+if __name__ == '__main__':
+    main()
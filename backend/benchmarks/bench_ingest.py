@@ -0,0 +1,125 @@
+# Load generator for the punch ingest channel, a fleet of card readers
+# each holding one connection and punching at a steady rate.
+#
+#   python -m benchmarks.bench_ingest --readers 1000 --rate 2 --seconds 20 --tls --token "$READER_TOKEN"
+#   python -m benchmarks.bench_ingest --local --readers 1000 --rate 2
+#
+# Against a running `python run_seed.py ingest_server` it needs a token
+# with post:attendance and card uids known to the site (--cards, default
+# the numeric uids 1..--users, for a server with CARD_LEGACY_USER_ID=true), and --tls (--ca-file for a private
+# CA) unless the server runs --insecure. --local starts the server in this
+# process with a writer that sleeps --write-ms per batch instead of the
+# database, to measure the channel and the batching alone.
+#
+# Prints the acknowledged punches per second, the end-to-end latency (sent
+# until acknowledged, so it includes the commit) and the ack statuses.
+import argparse, asyncio, os, random, ssl, statistics, time
+
+from collections import Counter
+
+from app.ingest.protocol import FrameDecoder, ACK, ERROR, encode_hello, encode_punch, decode_ack, STATUS_OK
+
+
+def start_local_server(args):
+    from flask import Flask
+    from app.ingest.server import IngestServer
+
+    def write_batch(punches):
+        time.sleep(args.write_ms / 1000)
+        return [STATUS_OK] * len(punches)
+
+    return IngestServer(Flask(__name__), authenticate=lambda token: {}, write_batch=write_batch)
+
+
+async def run_reader(reader_id, args, cards, stop_at, latencies, statuses):
+    reader, writer = await asyncio.open_connection(args.host, args.port, ssl=args.ssl_context)
+    writer.write(encode_hello(args.token))
+    decoder = FrameDecoder()
+    sent = {}
+
+    async def receive():
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                return
+            for kind, payload in decoder.feed(data):
+                if kind == ERROR:
+                    raise RuntimeError(payload.decode())
+                if kind == ACK:
+                    _, seq, status = decode_ack(payload)
+                    latencies.append(time.perf_counter() - sent.pop(seq))
+                    statuses[status] += 1
+
+    receiver = asyncio.create_task(receive())
+    # Readers start spread over one interval, not all at once
+    await asyncio.sleep(random.random() / args.rate)
+    seq = 0
+    while time.monotonic() < stop_at and not receiver.done():
+        seq += 1
+        sent[seq] = time.perf_counter()
+        writer.write(encode_punch(reader_id, seq, time.time_ns() // 1000, random.choice(cards)))
+        await writer.drain()
+        await asyncio.sleep(1 / args.rate)
+
+    # The acks still on their way
+    deadline = time.monotonic() + 30
+    while sent and not receiver.done() and time.monotonic() < deadline:
+        await asyncio.sleep(0.01)
+    writer.close()
+    if receiver.done():
+        receiver.result()
+    else:
+        receiver.cancel()
+    if sent:
+        raise TimeoutError(f'{len(sent)} punches not acknowledged')
+
+
+async def bench(args):
+    if args.local:
+        server = await start_local_server(args).start(args.host, 0)
+        args.port = server.sockets[0].getsockname()[1]
+
+    args.ssl_context = ssl.create_default_context(cafile=args.ca_file) if args.tls and not args.local else None
+    cards = args.cards.split(',') if args.cards else [str(user_id) for user_id in range(1, args.users + 1)]
+    latencies, statuses = [], Counter()
+    stop_at = time.monotonic() + args.seconds
+
+    started = time.monotonic()
+    results = await asyncio.gather(
+        *(run_reader(reader_id, args, cards, stop_at, latencies, statuses) for reader_id in range(1, args.readers + 1)),
+        return_exceptions=True
+    )
+    elapsed = time.monotonic() - started
+
+    failures = [result for result in results if isinstance(result, Exception)]
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else [0] * 99
+    print(f"{args.readers} readers at {args.rate:g} punches/s each, {args.seconds:.0f}s{' (local server)' if args.local else ''}")
+    print(
+        f"{len(latencies) / elapsed:10.1f} punches/s acknowledged  p50 {quantiles[49] * 1000:7.1f} ms  "
+        f"p99 {quantiles[98] * 1000:7.1f} ms  statuses {dict(statuses)}  failed readers {len(failures)}"
+    )
+    if failures:
+        print(f"first failure: {failures[0]!r}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--readers', type=int, default=1000)
+    parser.add_argument('--rate', type=float, default=1, help='punches per second of each reader')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=int(os.getenv('INGEST_PORT', 9100)))
+    parser.add_argument('--token', default=os.getenv('READER_TOKEN', ''))
+    parser.add_argument('--tls', action='store_true', help='connect over TLS')
+    parser.add_argument('--ca-file', default=None, help='CA of the server certificate with --tls')
+    parser.add_argument('--cards', default='', help='comma separated card uids')
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--local', action='store_true')
+    parser.add_argument('--write-ms', type=float, default=5, help='time of one batch write with --local')
+    args = parser.parse_args()
+
+    asyncio.run(bench(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+# Bytes on the wire and end-to-end latency of the bulk endpoints, with and
+# without compression and compact=1.
+#
+#   python -m benchmarks.bench_payloads --bandwidth-kbit 2000 --rtt-ms 60
+#   python -m benchmarks.bench_payloads --url http://localhost:8080 --token <jwt>
+#
+# Without --url the payloads are built in memory with the same shapes the
+# routes return, and the latency is estimated for the given link. With --url
+# the live endpoints are called and the measured numbers are printed.
+import argparse, gzip, time
+
+from datetime import datetime, timedelta, timezone
+
+from app.serializers import compact_rows, dumps_bytes, pick
+from app.services.compression import brotli, COMPRESS_BROTLI_QUALITY, COMPRESS_GZIP_LEVEL
+from app.routes.api_routes import AUTH0_USER_COMPACT_FIELDS, USER_INFO_COMPACT_KEYS
+from app.models import Users, Events
+
+ROLES = [
+    {'id': 'rol_admin0001', 'name': 'Admin', 'description': 'Employer, full access'},
+    {'id': 'rol_staff0001', 'name': 'Staff', 'description': 'Employee access'},
+]
+
+ENDPOINTS = {
+    'users': '/api/users',
+    'auth0-user': '/api/auth0-user',
+    'events': '/api/events?year_month={month}',
+    'user-info': '/api/user-info',
+}
+
+
+def auth0_profile(i):
+    return {
+        'user_id': f"auth0|{i:024d}",
+        'email': f"user{i}@example.com",
+        'email_verified': True,
+        'name': f"User Number {i}",
+        'nickname': f"user{i}",
+        'picture': f"https://s.gravatar.com/avatar/{i:032x}?s=480&r=pg&d=https%3A%2F%2Fcdn.auth0.com%2Favatars%2Fus.png",
+        'created_at': '2024-11-02T08:12:44.123Z',
+        'updated_at': '2025-03-14T09:00:01.456Z',
+        'last_login': '2025-03-14T09:00:01.456Z',
+        'last_ip': '203.0.113.10',
+        'logins_count': 120 + i,
+        'identities': [{'provider': 'auth0', 'user_id': f"{i:024d}", 'connection': 'Username-Password-Authentication', 'isSocial': False}],
+    }
+
+
+def build_payloads(users):
+    user_rows = [(i, f"auth0|{i:024d}", f"user{i}", f"user{i}@example.com", 'Engineer', 'IT', True) for i in range(1, users + 1)]
+    start = datetime(2025, 3, 1, tzinfo=timezone.utc)
+    event_rows = [(i, f"Event {i}", 'Location: Conference Room A\nDuration: 1 hours', start + timedelta(hours=3 * i)) for i in range(1, 241)]
+
+    auth0_users = []
+    for i in range(1, users + 1):
+        profile = auth0_profile(i)
+        auth0_users.append({
+            'id': i - 1,
+            'auth0_id': profile['user_id'],
+            'db_user_id': i,
+            'email': profile['email'],
+            'name': profile['name'],
+            'nickname': profile['nickname'],
+            'picture': profile['picture'],
+            'created_at': profile['created_at'],
+            'last_login': profile['last_login'],
+            'logins_count': profile['logins_count'],
+            'department': 'IT',
+            'position': 'Engineer',
+            'roles': ROLES[i % 2:],
+        })
+
+    jwt_payload = {
+        'iss': 'https://example.auth0.com/', 'sub': 'auth0|000000000000000000000001',
+        'aud': ['https://api.example.com', 'https://example.auth0.com/userinfo'],
+        'iat': 1741942800, 'exp': 1742029200, 'scope': 'openid profile email', 'azp': 'abcdefghijklmnopqrstuvwxyz012345',
+        'permissions': ['get:users', 'get:attendance', 'get:events', 'post:events', 'patch:events', 'delete:events', 'post:attendance'],
+    }
+    user_info = {**jwt_payload, **auth0_profile(1), 'db_info': Users.format_rows(user_rows[:1])[0]}
+
+    compact_auth0_users = [
+        [user[field] if field != 'roles' else [role['id'] for role in user['roles']] for field in AUTH0_USER_COMPACT_FIELDS]
+        for user in auth0_users
+    ]
+
+    return {
+        'users': (Users.format_rows(user_rows), compact_rows(Users.COMPACT_FIELDS, [row[:1] + row[2:3] + row[5:6] + row[4:5] for row in user_rows])),
+        'auth0-user': (auth0_users, compact_rows(AUTH0_USER_COMPACT_FIELDS, compact_auth0_users)),
+        'events': ({'events': Events.format_rows(event_rows)}, {'events': compact_rows(Events.COMPACT_FIELDS, event_rows)}),
+        'user-info': ({'success': True, 'user_info': user_info}, {'success': True, 'user_info': pick(user_info, USER_INFO_COMPACT_KEYS)}),
+    }
+
+
+def encodings(body):
+    start = time.perf_counter()
+    gzipped = gzip.compress(body, compresslevel=COMPRESS_GZIP_LEVEL)
+    results = [('identity', body, 0.0), ('gzip', gzipped, time.perf_counter() - start)]
+    if brotli is not None:
+        start = time.perf_counter()
+        compressed = brotli.compress(body, quality=COMPRESS_BROTLI_QUALITY)
+        results.append(('br', compressed, time.perf_counter() - start))
+    return results
+
+
+def offline(args):
+    link_bytes_per_second = args.bandwidth_kbit * 1000 / 8
+    print(f"Link: {args.bandwidth_kbit} kbit/s, {args.rtt_ms} ms rtt ({args.users} users)")
+
+    for name, (full, compact) in build_payloads(args.users).items():
+        print(f"{name}:")
+        for mode, obj in (('full', full), ('compact', compact)):
+            for encoding, data, cpu in encodings(dumps_bytes(obj)):
+                latency = args.rtt_ms / 1000 + len(data) / link_bytes_per_second + cpu
+                print(f"  {mode:<8} {encoding:<9} {len(data):>9} bytes  ~{latency * 1000:8.1f} ms")
+
+
+def live(args):
+    import requests
+
+    month = datetime.now().strftime('%Y-%m')
+    headers = {'Authorization': f'Bearer {args.token}'}
+
+    for name, path in ENDPOINTS.items():
+        print(f"{name}:")
+        for mode in ('full', 'compact'):
+            url = args.url + path.format(month=month)
+            if mode == 'compact':
+                url += ('&' if '?' in url else '?') + 'compact=1'
+            for encoding in ('identity', 'gzip', 'br'):
+                start = time.perf_counter()
+                response = requests.get(url, headers={**headers, 'Accept-Encoding': encoding}, stream=True)
+                wire = len(response.raw.read(decode_content=False))
+                elapsed = time.perf_counter() - start
+                served = response.headers.get('Content-Encoding', 'identity')
+                print(f"  {mode:<8} {served:<9} {wire:>9} bytes  {elapsed * 1000:8.1f} ms  ({response.status_code})")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--bandwidth-kbit', type=int, default=2000)
+    parser.add_argument('--rtt-ms', type=int, default=60)
+    parser.add_argument('--url')
+    parser.add_argument('--token')
+    args = parser.parse_args()
+
+    if args.url:
+        live(args)
+    else:
+        offline(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+# Deep pages of the raw punch history, OFFSET against the keyset cursor of
+# /api/attendance/records.
+#
+#   python -m benchmarks.bench_records --punches 5000000 --seed --cleanup
+#
+# Needs DB_* env variables pointing to a database created with `flask init_db`.
+# --seed adds a user (auth0 id 'bench|records') and its punches first,
+# --cleanup deletes them at the end. For each depth it prints the time of one
+# page read with OFFSET and with the cursor of the punch before the page.
+import argparse, os, time
+
+from sqlalchemy import text
+
+BENCH_AUTH0_ID = 'bench|records'
+
+
+def seed(session, punches):
+    print(f"Seeding {punches} punches...")
+    started = time.perf_counter()
+    user_id = session.execute(text("""
+        INSERT INTO users (auth0_id, username, email, position, department, is_active)
+        VALUES (:auth0_id, 'bench_records', 'bench_records@example.com', 'Engineer', 'Bench', true)
+        RETURNING id
+    """), {'auth0_id': BENCH_AUTH0_ID}).scalar()
+    # A punch every 30 seconds from 2020, the index stays realistic
+    session.execute(text("""
+        INSERT INTO attendance_records (user_id, timestamp)
+        SELECT :user_id, timestamptz '2020-01-01 00:00:00+00' + n * interval '30 seconds'
+        FROM generate_series(1, :punches) AS n
+    """), {'user_id': user_id, 'punches': punches})
+    session.commit()
+    session.execute(text("ANALYZE attendance_records"))
+    session.commit()
+    print(f"Seeded in {time.perf_counter() - started:.1f}s")
+
+
+def cleanup(session):
+    session.execute(text(
+        "DELETE FROM attendance_records WHERE user_id IN (SELECT id FROM users WHERE auth0_id = :auth0_id)"
+    ), {'auth0_id': BENCH_AUTH0_ID})
+    session.execute(text("DELETE FROM users WHERE auth0_id = :auth0_id"), {'auth0_id': BENCH_AUTH0_ID})
+    session.commit()
+
+
+def timed(callback, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = callback()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def bench_db(args):
+    from app.main import create_app
+    from app.models import db
+    from app.services.punch_history import page_records, encode_cursor
+
+    app = create_app()
+    with app.app_context():
+        if args.seed:
+            seed(db.session, args.punches)
+
+        try:
+            total = db.session.execute(text("SELECT count(*) FROM attendance_records")).scalar()
+            print(f"{total} punches, pages of {args.limit}")
+            offset_page = text("SELECT id, user_id, timestamp FROM attendance_records ORDER BY timestamp, id OFFSET :offset LIMIT :limit")
+            depth = 0
+            while depth < total:
+                # The punch just before the page, as the previous page would have returned it
+                cursor = None
+                if depth:
+                    before = db.session.execute(offset_page, {'offset': depth - 1, 'limit': 1}).one()
+                    cursor = encode_cursor(before.timestamp, before.id)
+
+                _, offset_time = timed(lambda: db.session.execute(offset_page, {'offset': depth, 'limit': args.limit}).all(), args.repeat)
+                (rows, _), keyset_time = timed(lambda: page_records(args.limit, cursor), args.repeat)
+                print(f"  row {depth:10}  OFFSET {offset_time * 1000:9.1f} ms   cursor {keyset_time * 1000:7.1f} ms ({len(rows)} rows)")
+                depth = depth * 10 if depth else 1000
+        finally:
+            if args.cleanup:
+                cleanup(db.session)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--punches', type=int, default=5000000)
+    parser.add_argument('--limit', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', action='store_true')
+    parser.add_argument('--cleanup', action='store_true')
+    args = parser.parse_args()
+
+    if os.getenv('DB_HOST'):
+        bench_db(args)
+    else:
+        print("DB_HOST not set, nothing to compare without a database")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+# /api/search against the client-side filtering it replaces.
+#
+#   python -m benchmarks.bench_search --events 1000000
+#   python -m benchmarks.bench_search --events 1000000 --seed --cleanup
+#
+# The baseline always runs: the event list is built in memory the way
+# get_events returns it, serialized, then filtered like the frontend did.
+# The db part runs only when DB_* env variables point to a database created
+# with `flask init_db`. --seed adds the events (named 'bench ...') and users
+# (auth0 id 'bench|...') first, --cleanup deletes them at the end.
+import argparse, os, random, time
+
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import text
+
+WORDS = (
+    'quarterly budget review team meeting planning sprint retro onboarding training safety drill '
+    'inventory audit client visit workshop offsite holiday party launch demo hiring interview '
+    'maintenance window release deploy migration backup security briefing lunch town hall '
+    'marketing sales finance legal support operations warehouse delivery kickoff roadmap'
+).split()
+DEPARTMENTS = ('IT', 'Sales', 'Finance', 'Operations', 'Marketing', 'Legal', 'Support', 'Warehouse')
+QUERIES = ('budget', 'team meet', 'onboard', 'securi brief', 'warehouse delivery kickoff')
+
+
+def event_name(index):
+    rng = random.Random(index)
+    return f"{' '.join(rng.sample(WORDS, 3)).capitalize()} {index}"
+
+
+def event_desc(index):
+    rng = random.Random(-index)
+    return f"Location: Room {index % 40}. {' '.join(rng.sample(WORDS, 8))}"
+
+
+def bench_client_side(count, queries):
+    from app.serializers import dumps_bytes
+
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    events = [
+        {'id': index, 'name': event_name(index), 'desc': event_desc(index), 'date': start + timedelta(minutes=index), 'rrule': None}
+        for index in range(1, count + 1)
+    ]
+
+    started = time.perf_counter()
+    body = dumps_bytes(events)
+    encode = time.perf_counter() - started
+    print(f"Client side: {len(body) / 1e6:.1f} MB to download, {encode:.3f}s to encode")
+
+    for query in queries:
+        words = query.lower().split()
+        started = time.perf_counter()
+        matches = [
+            event for event in events
+            if all(word in event['name'].lower() or word in event['desc'].lower() for word in words)
+        ]
+        print(f"  filter {query!r:30} {len(matches):8} matches {(time.perf_counter() - started) * 1000:9.1f} ms")
+
+
+def seed(session, events, users):
+    print(f"Seeding {events} events and {users} users...")
+    started = time.perf_counter()
+    batch = 10000
+    for first in range(1, events + 1, batch):
+        session.execute(text("INSERT INTO events (name, \"desc\", date) VALUES (:name, :desc, :date)"), [
+            {
+                'name': f"bench {event_name(index)}"[:50],
+                'desc': event_desc(index),
+                'date': datetime(2020, 1, 1, tzinfo=timezone.utc) + timedelta(minutes=index),
+            }
+            for index in range(first, min(first + batch, events + 1))
+        ])
+    session.execute(text("""
+        INSERT INTO users (auth0_id, username, email, position, department, is_active)
+        SELECT 'bench|' || n, 'bench_' || md5(n::text), 'bench' || n || '@example.com', 'Engineer',
+               (ARRAY['IT', 'Sales', 'Finance', 'Operations', 'Marketing', 'Legal', 'Support', 'Warehouse'])[n % 8 + 1], true
+        FROM generate_series(1, :users) AS n
+    """), {'users': users})
+    session.commit()
+    session.execute(text("ANALYZE events"))
+    session.execute(text("ANALYZE users"))
+    session.commit()
+    print(f"Seeded in {time.perf_counter() - started:.1f}s")
+
+
+def cleanup(session):
+    session.execute(text("DELETE FROM events WHERE name LIKE 'bench %'"))
+    session.execute(text("DELETE FROM users WHERE auth0_id LIKE 'bench|%'"))
+    session.commit()
+
+
+def timed(callback, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = callback()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def bench_db(args):
+    from app.main import create_app
+    from app.models import db
+    from app.services.search import search_events, search_users, escape_like
+
+    app = create_app()
+    with app.app_context():
+        if args.seed:
+            seed(db.session, args.events, args.users)
+
+        try:
+            print("Database:")
+            for query in QUERIES:
+                like = f"%{escape_like(query.split()[0])}%"
+                # What a server-side filter without the index would run
+                scan = text("SELECT id FROM events WHERE name ILIKE :like OR \"desc\" ILIKE :like ORDER BY date DESC LIMIT 20")
+                _, scan_time = timed(lambda: db.session.execute(scan, {'like': like}).all(), args.repeat)
+                (rows, _), search_time = timed(lambda: search_events(query, 20), args.repeat)
+                print(f"  events {query!r:30} ILIKE scan {scan_time * 1000:8.1f} ms   tsvector {search_time * 1000:8.1f} ms ({len(rows)} rows)")
+
+            for query in ('bench_3f', 'bench_3fa2', 'bench35@', 'warehose'):
+                (rows, _), search_time = timed(lambda: search_users(query, 20), args.repeat)
+                print(f"  users  {query!r:30} trigram {search_time * 1000:8.1f} ms ({len(rows)} rows)")
+        finally:
+            if args.cleanup:
+                cleanup(db.session)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--events', type=int, default=1000000)
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', action='store_true')
+    parser.add_argument('--cleanup', action='store_true')
+    args = parser.parse_args()
+
+    bench_client_side(args.events, QUERIES)
+
+    if os.getenv('DB_HOST'):
+        bench_db(args)
+    else:
+        print("DB_HOST not set, skipping the database search")
+
+
+if __name__ == '__main__':
+    main()
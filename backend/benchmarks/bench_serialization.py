@@ -0,0 +1,108 @@
+# JSON serialization of the list endpoints.
+#
+#   python -m benchmarks.bench_serialization --users 10000 --events 100000
+#
+# Compares the old path (model objects -> format() -> Flask's default
+# provider) with row tuples -> format_rows() -> FastJSONProvider, with
+# orjson and with the stdlib fallback. No database is needed, rows are
+# built in memory the way the session returns them.
+import argparse, time
+
+from datetime import datetime, timedelta, timezone
+from flask import Flask
+
+from app.models import Users, Events
+from app.serializers import FastJSONProvider, json_provider
+
+
+def make_rows(users, events):
+    user_rows = [
+        (i, f"auth0|{i:08d}", f"user{i}", f"user{i}@example.com", "Engineer", "IT", True)
+        for i in range(1, users + 1)
+    ]
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    event_rows = [
+        (i, f"Event {i}", "Location: Conference Room A\nDuration: 1 hours", start + timedelta(minutes=15 * i))
+        for i in range(1, events + 1)
+    ]
+    return user_rows, event_rows
+
+
+def users_from_rows(rows):
+    users = []
+    for id, auth0_id, username, email, position, department, is_active in rows:
+        user = Users(auth0_id=auth0_id, username=username, email=email, position=position, department=department, id=id)
+        user.is_active = is_active
+        users.append(user)
+    return users
+
+
+def events_from_rows(rows):
+    events = []
+    for id, name, desc, date in rows:
+        event = Events(name=name, desc=desc, date=date)
+        event.id = id
+        events.append(event)
+    return events
+
+
+def timed(fn, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        size = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, size
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--events', type=int, default=100000)
+    args = parser.parse_args()
+
+    user_rows, event_rows = make_rows(args.users, args.events)
+    users, events = users_from_rows(user_rows), events_from_rows(event_rows)
+
+    default_app = Flask('default')
+    fast_app = Flask('fast')
+    fast_app.json = FastJSONProvider(fast_app)
+
+    def old_path(objects):
+        def run():
+            with default_app.app_context():
+                return len(default_app.json.response([obj.format() for obj in objects]).get_data())
+        return run
+
+    def new_path(model, rows):
+        def run():
+            with fast_app.app_context():
+                return len(fast_app.json.response(model.format_rows(rows)).get_data())
+        return run
+
+    orjson = json_provider.orjson
+    cases = [
+        (f"{args.users} users", old_path(users), new_path(Users, user_rows)),
+        (f"{args.events} events", old_path(events), new_path(Events, event_rows)),
+    ]
+
+    for name, old, new in cases:
+        old_time, old_size = timed(old)
+        new_time, new_size = timed(new)
+
+        json_provider.orjson = None
+        stdlib_time, _ = timed(new)
+        json_provider.orjson = orjson
+
+        print(f"{name}:")
+        print(f"  format() + default provider  {old_time * 1000:8.1f} ms  {old_size} bytes")
+        print(f"  format_rows() + stdlib       {stdlib_time * 1000:8.1f} ms")
+        if orjson is not None:
+            print(f"  format_rows() + orjson       {new_time * 1000:8.1f} ms  {new_size} bytes")
+        else:
+            print("  orjson is not installed")
+
+
+if __name__ == '__main__':
+    main()
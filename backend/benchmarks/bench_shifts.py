@@ -0,0 +1,102 @@
+# Shift matching: compiled schedule + sorted merge vs per-day dict grouping.
+#
+#   python -m benchmarks.bench_shifts --users 10000 --days 30
+#
+# Users rotate weekly between a morning, an evening and a night shift, the
+# night one crossing midnight. Punches are generated in memory, no database
+# is needed. The dict grouping is the calendar-day loop get_latest_attendance
+# used before the shifts, it splits every night shift in two.
+import argparse, time
+
+import numpy as np
+
+from app.reporting.engine import SECONDS_PER_DAY
+from app.reporting.shifts import make_shift_table, build_day_shifts, compile_schedule, summarize_shifts
+
+SHIFTS = [
+    (6 * 3600, 14 * 3600, 30, 5, '123456'),
+    (14 * 3600, 22 * 3600, 30, 5, '123456'),
+    (22 * 3600, 6 * 3600, 30, 5, '123456'),
+]
+FIRST_DAY = int(np.datetime64('2025-03-03', 'D').astype(np.int64))
+
+
+# Weekly rotation: each third of the users starts on another shift
+def rotation(users, days):
+    user_rows = np.arange(users)
+    return [
+        (user_rows[user_rows % 3 == group], (group + week) % 3, week * 7, week * 7 + 7)
+        for week in range((days + 6) // 7)
+        for group in range(3)
+    ]
+
+
+def generate_punches(schedule, table, seed=0):
+    rng = np.random.default_rng(seed)
+    # About 5% of the shifts are missed
+    worked = rng.random(schedule.user_codes.size) > 0.05
+    users = schedule.user_codes[worked]
+    starts = schedule.shift_start[worked] + rng.normal(0, 10 * 60, users.size).astype(np.int64)
+    ends = schedule.shift_end[worked] + rng.normal(0, 15 * 60, users.size).astype(np.int64)
+
+    user_codes = np.concatenate([users, users])
+    timestamps = np.concatenate([starts, ends])
+    order = rng.permutation(user_codes.size)
+    return user_codes[order], timestamps[order]
+
+
+def loop_days(user_codes, timestamps):
+    daily = {}
+    for user, timestamp in zip(user_codes.tolist(), timestamps.tolist()):
+        key = (user, timestamp // SECONDS_PER_DAY)
+        record = daily.get(key)
+        if record is None:
+            daily[key] = [timestamp, timestamp]
+        elif timestamp < record[0]:
+            record[0] = timestamp
+        elif timestamp > record[1]:
+            record[1] = timestamp
+    return daily
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    table = make_shift_table(SHIFTS)
+    grid = rotation(args.users, args.days)
+
+    timings = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        schedule = compile_schedule(build_day_shifts(args.users, args.days, grid), FIRST_DAY, table)
+        timings.append(time.perf_counter() - start)
+    compile_time = min(timings)
+    print(f"Compiled {schedule.user_codes.size} shift instances in {compile_time * 1000:.1f} ms")
+
+    user_codes, timestamps = generate_punches(schedule, table)
+    print(f"{user_codes.size} punches, {args.users} users x {args.days} days")
+
+    timings = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        summary = summarize_shifts(schedule, table, user_codes, timestamps)
+        timings.append(time.perf_counter() - start)
+    merge_time = min(timings)
+    scheduled = int((summary.shift_codes >= 0).sum())
+    print(f"Sorted merge:  {merge_time * 1000:.1f} ms, {scheduled} shifts, {summary.shift_codes.size - scheduled} unscheduled days")
+
+    start = time.perf_counter()
+    daily = loop_days(user_codes, timestamps)
+    loop_time = time.perf_counter() - start
+    print(f"Dict grouping: {loop_time * 1000:.1f} ms, {len(daily)} calendar days (night shifts split in two)")
+
+    assert summary.shift_codes.size == scheduled, 'every punch should fall in a shift window'
+    print(f"Merge is {loop_time / merge_time:.1f}x faster than the dict grouping")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+# App startup time: cold `import app.main` and time to the first request.
+#
+#   python -m benchmarks.bench_startup --runs 10
+#
+# Each run is a fresh interpreter, so nothing is shared between runs. The
+# first request goes to /api/login-callback, which touches neither the db
+# nor Auth0, so the numbers don't depend on a database being reachable.
+import argparse, os, statistics, subprocess, sys
+
+# The url only has to parse, create_app must not connect
+BENCH_ENV = {
+    'DB_USER': 'postgres',
+    'DB_PASSWORD': 'postgres',
+    'DB_HOST': 'localhost',
+    'DB_PORT': '5432',
+    'DB_NAME': 'attendance-system',
+}
+
+IMPORT_SNIPPET = """
+import time
+start = time.perf_counter()
+import app.main
+print(time.perf_counter() - start)
+"""
+
+FIRST_REQUEST_SNIPPET = """
+import time
+start = time.perf_counter()
+from app.main import create_app
+app = create_app()
+response = app.test_client().get('/api/login-callback?state=bench')
+assert response.status_code == 302, response.status_code
+print(time.perf_counter() - start)
+"""
+
+
+def measure(snippet, runs):
+    env = {**BENCH_ENV, **os.environ}
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, '-c', snippet],
+            check=True, capture_output=True, text=True, env=env
+        ).stdout
+        samples.append(float(output.strip().splitlines()[-1]))
+    return samples
+
+
+def report(name, samples):
+    print(
+        f"{name:<22} median {statistics.median(samples) * 1000:7.1f} ms"
+        f"  min {min(samples) * 1000:7.1f} ms  max {max(samples) * 1000:7.1f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+
+    report('import app.main', measure(IMPORT_SNIPPET, args.runs))
+    report('time to first request', measure(FIRST_REQUEST_SNIPPET, args.runs))
+
+
+if __name__ == '__main__':
+    main()
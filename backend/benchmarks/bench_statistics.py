@@ -0,0 +1,219 @@
+# Monthly attendance statistics: the vectorized shift path of compute() vs a
+# per-day python loop, then the whole compute() of a month against a database.
+#
+#   python -m benchmarks.bench_statistics --users 10000 --days 30
+#   python -m benchmarks.bench_statistics --users 10000 --days 30 --seed --cleanup
+#
+# Punches are generated in memory (2 to 4 per working day) and summarized with
+# compile_schedule, summarize_shifts and shift_monthly_stats, the steps of
+# ShiftSchedules.monthly_stats. No shift is assigned, every day is matched to
+# the fixed hours like in the loop, so both give the same statistics.
+# With DB_* env variables pointing to a database created with `flask init_db`,
+# --seed inserts the same punches for --month (users 'bench|stats|<n>') and
+# the load is timed as ORM rows and as binary COPY columns, then compute()
+# end to end. --cleanup deletes them and the statistics of the month.
+# A month of 10k users x 30 days must be computed in under a second.
+import argparse, io, os, time
+
+import numpy as np
+
+from app.reporting.engine import SECONDS_PER_DAY
+from app.reporting.shifts import make_shift_table, build_day_shifts, compile_schedule, summarize_shifts, shift_monthly_stats
+
+WORK_START = 9 * 3600
+WORK_END = 18 * 3600
+
+
+def generate_punches(users, days, seed=0, month='2025-01'):
+    rng = np.random.default_rng(seed)
+    month_start = int(np.datetime64(f'{month}-01T00:00:00', 's').astype(np.int64))
+
+    day_users = np.repeat(np.arange(1, users + 1), days)
+    day_starts = month_start + np.tile(np.arange(days), users) * SECONDS_PER_DAY
+    # About 10% of the days are absences
+    present = rng.random(day_users.size) > 0.1
+    day_users, day_starts = day_users[present], day_starts[present]
+
+    check_in = day_starts + rng.normal(WORK_START, 20 * 60, day_users.size).astype(np.int64)
+    check_out = day_starts + rng.normal(WORK_END, 30 * 60, day_users.size).astype(np.int64)
+    # Some days have a lunch break out and in
+    lunch = rng.random(day_users.size) < 0.5
+    lunch_out = day_starts[lunch] + 12 * 3600 + rng.integers(0, 1800, lunch.sum())
+
+    user_ids = np.concatenate([day_users, day_users, day_users[lunch], day_users[lunch]])
+    timestamps = np.concatenate([check_in, check_out, lunch_out, lunch_out + 3600])
+
+    # Rows come back from the db in no particular order
+    order = rng.permutation(user_ids.size)
+    return user_ids[order], timestamps[order]
+
+
+# What ShiftSchedules.monthly_stats runs once the shifts are loaded, none here.
+# first_day and end_day are the epoch days of the month.
+def shift_stats(user_ids, timestamps, first_day, end_day):
+    users, user_codes = np.unique(user_ids, return_inverse=True)
+    table = make_shift_table([])
+    # The day before holds the night shift ending on the first day
+    grid = build_day_shifts(users.size, end_day - first_day + 1, [])
+    schedule = compile_schedule(grid, first_day - 1, table)
+    summary = summarize_shifts(schedule, table, user_codes.reshape(-1), timestamps)
+    stats = shift_monthly_stats(summary, first_day, end_day, WORK_START, WORK_END)
+    return stats._replace(user_ids=users[stats.user_ids])
+
+
+# Same statistics the way get_latest_attendance groups days, one dict entry per day
+def loop_stats(user_ids, timestamps):
+    daily = {}
+    for user_id, timestamp in zip(user_ids.tolist(), timestamps.tolist()):
+        key = (user_id, timestamp // SECONDS_PER_DAY)
+        record = daily.get(key)
+        if record is None:
+            daily[key] = [timestamp, timestamp]
+        elif timestamp < record[0]:
+            record[0] = timestamp
+        elif timestamp > record[1]:
+            record[1] = timestamp
+
+    stats = {}
+    for (user_id, day), (check_in, check_out) in daily.items():
+        entry = stats.setdefault(user_id, [0, 0, 0, 0, 0])
+        entry[0] += 1
+        entry[1] += check_in - day * SECONDS_PER_DAY
+        entry[2] += check_out - check_in
+        entry[3] += check_in - day * SECONDS_PER_DAY > WORK_START
+        entry[4] += check_out > check_in and check_out - day * SECONDS_PER_DAY < WORK_END
+    return stats
+
+
+def seed(session, args):
+    from sqlalchemy import text
+
+    print(f"Seeding {args.users} users...")
+    started = time.perf_counter()
+    user_ids = session.execute(text("""
+        INSERT INTO users (auth0_id, username, email, position, department, is_active)
+        SELECT 'bench|stats|' || n, 'bench_stats_' || n, 'bench_stats_' || n || '@example.com',
+               'Engineer', 'Bench ' || n % 20, true
+        FROM generate_series(1, :users) AS n
+        ORDER BY n
+        RETURNING id
+    """), {'users': args.users}).scalars().all()
+    # Serial ids, in the order of n
+    user_ids = sorted(user_ids)
+
+    # Punches of user n go to the n-th seeded id, as UTC instants
+    punch_users, timestamps = generate_punches(args.users, args.days, month=args.month)
+    rows = io.StringIO()
+    np.savetxt(rows, np.c_[np.array(user_ids)[punch_users - 1], timestamps], fmt='%d', delimiter='\t')
+    rows.seek(0)
+    cursor = session.connection().connection.cursor()
+    cursor.execute("CREATE TEMP TABLE bench_punches (user_id integer, epoch bigint) ON COMMIT DROP")
+    cursor.copy_expert("COPY bench_punches FROM STDIN", rows)
+    cursor.execute("INSERT INTO attendance_records (user_id, timestamp) SELECT user_id, to_timestamp(epoch) FROM bench_punches")
+    session.commit()
+    session.execute(text("ANALYZE attendance_records"))
+    session.commit()
+    print(f"Seeded {timestamps.size} punches in {time.perf_counter() - started:.1f}s")
+
+
+def cleanup(session, month):
+    from sqlalchemy import text
+
+    session.execute(text(
+        "DELETE FROM attendance_records WHERE user_id IN (SELECT id FROM users WHERE auth0_id LIKE 'bench|stats|%')"
+    ))
+    session.execute(text("DELETE FROM users WHERE auth0_id LIKE 'bench|stats|%'"))
+    # Computed with the bench users, the next read computes them again
+    session.execute(text("DELETE FROM attendance_statistics WHERE month = :month"), {'month': month})
+    session.commit()
+
+
+def bench_db(args):
+    from app.main import create_app
+    from app.models import db
+    from app.reporting import attendance_statistics, month_bounds
+    from app.reporting.columns import copy_columns
+
+    app = create_app()
+    with app.app_context():
+        if args.seed:
+            seed(db.session, args)
+
+        try:
+            query = attendance_statistics.punch_query(*month_bounds(args.month))
+
+            started = time.perf_counter()
+            rows = np.array(query.all(), dtype=np.int64).reshape(-1, 2)
+            rows_time = time.perf_counter() - started
+            db.session.rollback()
+
+            started = time.perf_counter()
+            user_ids, _ = copy_columns(query)
+            copy_time = time.perf_counter() - started
+            db.session.rollback()
+            assert user_ids.size == len(rows)
+
+            timings = []
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                results = attendance_statistics.compute(args.month)
+                timings.append(time.perf_counter() - started)
+            compute_time = min(timings)
+
+            print(f"{len(rows)} punches in the table for {args.month}")
+            print(f"Load as ORM rows:      {rows_time * 1000:.1f} ms")
+            print(f"Load as COPY columns:  {copy_time * 1000:.1f} ms")
+            print(
+                f"compute() end to end:  {compute_time * 1000:.1f} ms (best of {args.repeat}, {len(results['user'])} users), "
+                f"{'under' if compute_time < 1 else 'OVER'} the 1s budget"
+            )
+        finally:
+            if args.cleanup:
+                cleanup(db.session, args.month)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--month', default='2025-01', help='site month of the seeded punches')
+    parser.add_argument('--seed', action='store_true')
+    parser.add_argument('--cleanup', action='store_true')
+    args = parser.parse_args()
+
+    user_ids, timestamps = generate_punches(args.users, args.days, month=args.month)
+    print(f"{user_ids.size} punches, {args.users} users x {args.days} days")
+
+    first_day = int(np.datetime64(f'{args.month}-01', 'D').astype(np.int64))
+    end_day = first_day + args.days
+    timings = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        stats = shift_stats(user_ids, timestamps, first_day, end_day)
+        timings.append(time.perf_counter() - start)
+    shift_time = min(timings)
+    print(f"Vectorized shifts: {shift_time * 1000:.1f} ms (best of {args.repeat})")
+
+    start = time.perf_counter()
+    expected = loop_stats(user_ids, timestamps)
+    loop_time = time.perf_counter() - start
+    print(f"Python loop:       {loop_time * 1000:.1f} ms")
+
+    # Both must agree
+    for position, user_id in enumerate(stats.user_ids.tolist()):
+        assert expected[user_id] == [
+            stats.days_present[position], stats.check_in_seconds[position], stats.total_seconds[position],
+            stats.late_arrivals[position], stats.early_departures[position]
+        ], user_id
+
+    print(f"Shift path is {loop_time / shift_time:.1f}x faster")
+
+    if os.getenv('DB_HOST'):
+        bench_db(args)
+    else:
+        print("DB_HOST not set, compute() against the database skipped")
+
+
+if __name__ == '__main__':
+    main()
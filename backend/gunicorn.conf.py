@@ -0,0 +1,26 @@
+import os
+
+# Gunicorn settings, override with env variables.
+# Use GUNICORN_WORKER_CLASS=gevent to hold many idle live feed streams per worker,
+# and to keep serving while requests wait on Auth0: a waiting request then costs
+# a greenlet instead of a thread. Raise DB_POOL_SIZE and AUTH0_HTTP_POOL_SIZE with it.
+bind = os.getenv('GUNICORN_BIND', ':8080')
+workers = int(os.getenv('GUNICORN_WORKERS', 1))
+threads = int(os.getenv('GUNICORN_THREADS', 2))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 2000))
+
+
+def post_fork(server, worker):
+    # psycopg2 blocks the whole gevent hub unless its wait callback is patched
+    if worker_class == 'gevent':
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
+
+
+def post_worker_init(worker):
+    # Warm the per-worker caches off the request path, once the app is loaded
+    from app.services import card_index, today_snapshot
+    card_index.warm()
+    today_snapshot.warm()
@@ -1,7 +1,7 @@
-from app.main import APP
+from app.main import create_app
 from flask.cli import FlaskGroup
 
-cli = FlaskGroup(create_app=lambda: APP)
+cli = FlaskGroup(create_app=create_app)
 
 if __name__ == '__main__':
     cli()
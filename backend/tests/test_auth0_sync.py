@@ -0,0 +1,169 @@
+import unittest
+import json
+import os
+import re
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from app.services.auth0_management import Auth0Management
+from app.services.auth0_sync import Auth0DirectorySync, AUTH0_SEARCH_LIMIT
+
+USER_COUNT = 3500
+# Every Nth management call is answered with a 429
+RATE_LIMIT_EVERY = 9
+
+ROLES = [
+    {'id': 'rol_admin', 'name': 'Admin', 'description': 'Administrator'},
+    {'id': 'rol_staff', 'name': 'Staff', 'description': 'Staff member'},
+]
+
+def make_users(count):
+    base = datetime(2024, 1, 1)
+    return [
+        {
+            'user_id': f'auth0|{index:05d}',
+            'email': f'user{index}@example.com',
+            'nickname': f'user{index}',
+            # Three users share each updated_at, like a bulk import
+            'updated_at': (base + timedelta(seconds=index // 3)).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+        }
+        for index in range(count)
+    ]
+
+# Local stand-in of the Auth0 Management API, with its search window
+# limit, checkpoint pagination and rate limiting
+class StubAuth0Handler(BaseHTTPRequestHandler):
+    users = []
+    requests = 0
+    rate_limited = 0
+    tokens = 0
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        with self.lock:
+            StubAuth0Handler.tokens += 1
+        self.send_json(200, {'access_token': 'stub-token', 'expires_in': 86400})
+
+    def do_GET(self):
+        if self.headers.get('Authorization') != 'Bearer stub-token':
+            return self.send_json(401, {'message': 'Invalid token'})
+
+        with self.lock:
+            StubAuth0Handler.requests += 1
+            if StubAuth0Handler.requests % RATE_LIMIT_EVERY == 0:
+                StubAuth0Handler.rate_limited += 1
+                return self.send_json(429, {'message': 'Too Many Requests'}, {'Retry-After': '0'})
+
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+
+        if url.path == '/api/v2/users':
+            return self.search_users(params)
+        if url.path == '/api/v2/roles':
+            page, per_page = int(params.get('page', 0)), int(params.get('per_page', 50))
+            return self.send_json(200, ROLES[page * per_page:(page + 1) * per_page])
+
+        match = re.fullmatch(r'/api/v2/roles/([^/]+)/users', url.path)
+        if match:
+            return self.role_users(match.group(1), params)
+
+        self.send_json(404, {'message': 'Not found'})
+
+    def search_users(self, params):
+        page, per_page = int(params.get('page', 0)), int(params.get('per_page', 50))
+        if (page + 1) * per_page > AUTH0_SEARCH_LIMIT:
+            return self.send_json(400, {'message': 'You can only page through the first 1000 records'})
+
+        users = self.users
+        match = re.fullmatch(r'updated_at:\["(.+)" TO \*\]', params.get('q', ''))
+        if match:
+            users = [user for user in users if user['updated_at'] >= match.group(1)]
+
+        self.send_json(200, users[page * per_page:(page + 1) * per_page])
+
+    def role_users(self, role_id, params):
+        index = [role['id'] for role in ROLES].index(role_id)
+        members = [user for position, user in enumerate(self.users) if position % len(ROLES) == index]
+
+        start, take = int(params.get('from', 0)), int(params.get('take', 50))
+        body = {'users': [{'user_id': user['user_id']} for user in members[start:start + take]]}
+        if start + take < len(members):
+            body['next'] = str(start + take)
+        self.send_json(200, body)
+
+
+class Auth0SyncTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StubAuth0Handler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.old_base_url = os.environ.get('AUTH0_MGMT_BASE_URL')
+        os.environ['AUTH0_MGMT_BASE_URL'] = f'http://127.0.0.1:{cls.server.server_address[1]}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        if cls.old_base_url is None:
+            os.environ.pop('AUTH0_MGMT_BASE_URL', None)
+        else:
+            os.environ['AUTH0_MGMT_BASE_URL'] = cls.old_base_url
+
+    def setUp(self):
+        """Set up"""
+        StubAuth0Handler.users = make_users(USER_COUNT)
+        StubAuth0Handler.requests = 0
+        StubAuth0Handler.rate_limited = 0
+        StubAuth0Handler.tokens = 0
+        self.sync = Auth0DirectorySync(Auth0Management())
+
+    def test_fetch_users_past_search_window(self):
+        """Test fetch users returns every user beyond the 1000 results window"""
+        users = list(self.sync.fetch_users())
+        user_ids = {user['user_id'] for user in users}
+
+        self.assertEqual(len(user_ids), USER_COUNT)
+        self.assertEqual(users[-1]['user_id'], StubAuth0Handler.users[-1]['user_id'])
+        self.assertTrue(StubAuth0Handler.rate_limited > 0)
+
+    def test_fetch_users_since_watermark(self):
+        """Test fetch users only returns the users updated since the watermark"""
+        watermark = StubAuth0Handler.users[-30]['updated_at']
+        users = list(self.sync.fetch_users(watermark))
+
+        self.assertTrue(all(user['updated_at'] >= watermark for user in users))
+        self.assertTrue(len(users) >= 30)
+        self.assertTrue(len(users) < 40)
+
+    def test_fetch_role_users(self):
+        """Test fetch role users follows the checkpoints"""
+        roles = list(self.sync.fetch_roles())
+        members = [user for role in roles for user in self.sync.fetch_role_users(role['id'])]
+
+        self.assertEqual(len(roles), len(ROLES))
+        self.assertEqual(len({user['user_id'] for user in members}), USER_COUNT)
+
+    def test_token_reused(self):
+        """Test the management token is minted once per scope"""
+        list(self.sync.fetch_users())
+        list(self.sync.fetch_roles())
+
+        self.assertEqual(StubAuth0Handler.tokens, 2)
+
+if __name__ == '__main__':
+    unittest.main()
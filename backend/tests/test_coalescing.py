@@ -0,0 +1,77 @@
+import threading
+import time
+import unittest
+from flask import Flask, jsonify, request
+from app.services.coalescing import RequestCoalescer, coalesce_requests
+import app.services.coalescing as coalescing
+
+PAYLOAD = {'sub': 'auth0|reader', 'permissions': ['get:events']}
+
+class CoalescingTestCase(unittest.TestCase):
+    def setUp(self):
+        """Set up"""
+        self.coalescer = coalescing.request_coalescer = RequestCoalescer()
+        self.calls = 0
+        self.release = threading.Event()
+        self.app = Flask(__name__)
+
+        @self.app.route('/events')
+        def events():
+            return self.view(PAYLOAD)
+
+        @coalesce_requests()
+        def view(payload):
+            self.calls += 1
+            self.release.wait(5)
+            return jsonify({'month': request.args.get('year_month'), 'call': self.calls}), 200
+
+        self.view = view
+
+    def get_concurrently(self, urls):
+        responses = [None] * len(urls)
+
+        def get(index, url):
+            responses[index] = self.app.test_client().get(url)
+
+        threads = [threading.Thread(target=get, args=(index, url)) for index, url in enumerate(urls)]
+        for thread in threads:
+            thread.start()
+        # Every request is waiting before the first one answers
+        time.sleep(0.3)
+        self.release.set()
+        for thread in threads:
+            thread.join()
+        return responses
+
+    def test_identical_requests_share_one_run(self):
+        """Test concurrent identical requests run the view once"""
+        responses = self.get_concurrently(['/events?year_month=2025-03'] * 8)
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual({response.get_data() for response in responses}, {responses[0].get_data()})
+        self.assertEqual(self.coalescer.stats(), {'events': {'executed': 1, 'coalesced': 7}})
+
+    def test_query_order_is_normalized(self):
+        """Test the order of the query arguments doesn't matter"""
+        self.get_concurrently(['/events?year_month=2025-03&compact=1', '/events?compact=1&year_month=2025-03'])
+
+        self.assertEqual(self.calls, 1)
+
+    def test_different_requests_run_separately(self):
+        """Test requests with other arguments are not coalesced"""
+        responses = self.get_concurrently(['/events?year_month=2025-03', '/events?year_month=2025-04'])
+
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(sorted(response.get_json()['month'] for response in responses), ['2025-03', '2025-04'])
+
+    def test_sequential_requests_are_not_cached(self):
+        """Test a request after the first one answered runs the view again"""
+        self.release.set()
+        client = self.app.test_client()
+        client.get('/events?year_month=2025-03')
+        client.get('/events?year_month=2025-03')
+
+        self.assertEqual(self.calls, 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+import io
+import json
+import time
+import tracemalloc
+import unittest
+from datetime import datetime, timedelta, timezone
+from app.services.event_import import iter_json_events, iter_ics_events, import_events, validate_batch, EventImportError
+
+EVENT_COUNT = 50000
+
+def json_upload(count):
+    start = datetime(2025, 1, 1, 9, 0)
+    return io.BytesIO(json.dumps([
+        {'name': f'Training {index}', 'description': 'Room A', 'date': (start + timedelta(hours=index)).isoformat()}
+        for index in range(count)
+    ]).encode())
+
+def ics_upload(count):
+    lines = ['BEGIN:VCALENDAR', 'VERSION:2.0']
+    start = datetime(2025, 1, 1, 9, 0)
+    for index in range(count):
+        lines += [
+            'BEGIN:VEVENT',
+            f'SUMMARY:Holiday {index}',
+            'DESCRIPTION:Closed\\, all',
+            ' day',
+            f"DTSTART:{(start + timedelta(days=index)).strftime('%Y%m%dT%H%M%SZ')}",
+            'END:VEVENT',
+        ]
+    lines.append('END:VCALENDAR')
+    return io.BytesIO('\r\n'.join(lines).encode())
+
+class EventImportTestCase(unittest.TestCase):
+    def run_import(self, items):
+        batches = []
+        inserted, errors, error_count = import_events(items, lambda rows: batches.append(len(rows)), timezone.utc, batch_size=1000)
+        return inserted, errors, error_count, batches
+
+    def test_import_50k_json_events(self):
+        """Test 50k events are imported in bounded memory and time"""
+        upload = json_upload(EVENT_COUNT)
+        size = len(upload.getvalue())
+
+        tracemalloc.start()
+        started = time.perf_counter()
+        inserted, errors, error_count, batches = self.run_import(iter_json_events(upload))
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        self.assertEqual(inserted, EVENT_COUNT)
+        self.assertEqual(error_count, 0)
+        self.assertEqual(len(batches), EVENT_COUNT // 1000)
+        # Streamed, the peak stays well below the upload size
+        self.assertLess(peak, size / 2)
+        self.assertLess(elapsed, 30)
+
+    def test_import_50k_ics_events(self):
+        """Test 50k events of an iCalendar file are imported in bounded memory"""
+        upload = ics_upload(EVENT_COUNT)
+        size = len(upload.getvalue())
+
+        tracemalloc.start()
+        inserted, errors, error_count, batches = self.run_import(iter_ics_events(upload))
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        self.assertEqual(inserted, EVENT_COUNT)
+        self.assertLess(peak, size / 2)
+
+    def test_ics_properties(self):
+        """Test folded lines, escapes and timezones of an iCalendar file"""
+        events = list(iter_ics_events(io.BytesIO(
+            b'BEGIN:VCALENDAR\r\nBEGIN:VEVENT\r\nSUMMARY:Team\\, weekly\r\nDESCRIPTION:Line one\\nline\r\n  two\r\n'
+            b'DTSTART;TZID=Europe/Paris:20250303T100000\r\nRRULE:FREQ=WEEKLY\r\nEND:VEVENT\r\nEND:VCALENDAR\r\n'
+        )))
+
+        self.assertEqual(events, [{
+            'name': 'Team, weekly',
+            'description': 'Line one\nline two',
+            'date': '2025-03-03T10:00:00+01:00',
+            'rrule': 'FREQ=WEEKLY'
+        }])
+
+    def test_json_split_across_chunks(self):
+        """Test items and characters split across reads"""
+        upload = io.BytesIO(json.dumps([{'name': 'Réunion', 'date': '2025-03-03'}, 12345]).encode())
+
+        self.assertEqual(list(iter_json_events(upload, chunk_size=3)), [{'name': 'Réunion', 'date': '2025-03-03'}, 12345])
+
+    def test_json_not_an_array(self):
+        """Test an upload that is not a JSON array"""
+        for body in (b'{"name": "x"}', b'[{"name": "x"}'):
+            with self.assertRaises(EventImportError):
+                list(iter_json_events(io.BytesIO(body)))
+
+    def test_invalid_events_stop_the_inserts(self):
+        """Test nothing is inserted after an invalid event"""
+        items = [{'name': 'Valid', 'date': '2025-03-03'}] * 5 + [{'name': '', 'date': 'tomorrow'}] + [{'name': 'Valid', 'date': '2025-03-03'}] * 5
+        inserted, errors, error_count, batches = self.run_import(iter(items))
+
+        self.assertEqual(error_count, 1)
+        self.assertEqual(errors, [(5, 'Missing name')])
+
+    def test_validate_batch(self):
+        """Test each invalid event is reported once with its index"""
+        rows, errors = validate_batch([
+            {'name': 'Ok', 'date': '2025-03-03T10:00:00', 'rrule': 'FREQ=WEEKLY;COUNT=2'},
+            {'name': 'x' * 51, 'date': '2025-03-03'},
+            {'name': 'Bad rule', 'date': '2025-03-03', 'rrule': 'FREQ=HOURLY'},
+            'not an event',
+        ], 10, timezone.utc)
+
+        self.assertEqual([index for index, _ in errors], [11, 12, 13])
+        self.assertEqual(rows[0]['until'], datetime(2025, 3, 10, 10, 0, tzinfo=timezone.utc))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+import asyncio
+import os
+import shutil
+import ssl
+import subprocess
+import tempfile
+import unittest
+from datetime import datetime, timezone
+from flask import Flask
+from app.ingest.protocol import (
+    FrameDecoder, ProtocolError, ACK, ERROR, WELCOME, PUNCH,
+    encode_hello, encode_punch, decode_punch, decode_ack, STATUS_OK, STATUS_UNKNOWN_CARD, STATUS_INVALID,
+)
+from app.ingest.server import IngestServer, make_ssl_context
+
+TIMESTAMP_US = 1767225600000000
+
+class IngestProtocolTestCase(unittest.TestCase):
+    def test_punch_round_trip(self):
+        """Test a punch survives encoding and decoding"""
+        frames = FrameDecoder().feed(encode_punch(7, 42, TIMESTAMP_US, '04A1B2C3'))
+
+        self.assertEqual(len(frames), 1)
+        self.assertEqual(frames[0][0], PUNCH)
+        self.assertEqual(decode_punch(frames[0][1]), (7, 42, TIMESTAMP_US, '04A1B2C3'))
+
+    def test_frames_split_across_chunks(self):
+        """Test frames are rebuilt whatever the chunks they arrive in"""
+        stream = encode_hello('token') + b''.join(encode_punch(1, seq, TIMESTAMP_US, f'CARD{seq}') for seq in range(3))
+        decoder = FrameDecoder()
+
+        frames = []
+        for position in range(0, len(stream), 5):
+            frames += decoder.feed(stream[position:position + 5])
+
+        self.assertEqual([payload for kind, payload in frames[:1]], [b'token'])
+        self.assertEqual([decode_punch(payload)[3] for kind, payload in frames[1:]], ['CARD0', 'CARD1', 'CARD2'])
+
+    def test_invalid_frames(self):
+        """Test malformed punches and card uids are refused"""
+        with self.assertRaises(ProtocolError):
+            decode_punch(b'\x00\x01')
+        with self.assertRaises(ProtocolError):
+            decode_punch(encode_punch(1, 1, TIMESTAMP_US, 'ABCD')[3:-1])
+        with self.assertRaises(ProtocolError):
+            encode_punch(1, 1, TIMESTAMP_US, 'A' * 256)
+
+
+class IngestServerTestCase(unittest.TestCase):
+    def setUp(self):
+        """Set up"""
+        self.batches = []
+
+        def authenticate(token):
+            if token != 'valid':
+                raise Exception('Invalid token')
+            return {'sub': 'reader'}
+
+        def write_batch(punches):
+            self.batches.append(punches)
+            return [STATUS_OK if card_uid.startswith('KNOWN') else STATUS_UNKNOWN_CARD for reader_id, seq, timestamp, card_uid in punches]
+
+        self.server = IngestServer(Flask(__name__), authenticate=authenticate, write_batch=write_batch, batch_size=50, batch_ms=20)
+
+    def exchange(self, token, punches, client_ssl=None):
+        async def run():
+            server = await self.server.start('127.0.0.1', 0)
+            port = server.sockets[0].getsockname()[1]
+            reader, writer = await asyncio.open_connection('127.0.0.1', port, ssl=client_ssl)
+            writer.write(encode_hello(token) + b''.join(punches))
+
+            decoder = FrameDecoder()
+            frames = []
+            # The welcome (or error) and one ack per punch
+            while len(frames) < len(punches) + 1:
+                data = await asyncio.wait_for(reader.read(65536), 5)
+                if not data:
+                    break
+                frames += decoder.feed(data)
+
+            writer.close()
+            server.close()
+            await server.wait_closed()
+            return frames
+
+        return asyncio.run(run())
+
+    def test_punches_are_batched_and_acknowledged(self):
+        """Test punches of one connection are written together and acknowledged"""
+        punches = [encode_punch(3, seq, TIMESTAMP_US, 'KNOWN' if seq % 2 else 'LOST') for seq in range(10)]
+
+        frames = self.exchange('valid', punches)
+
+        self.assertEqual(frames[0][0], WELCOME)
+        acks = {decode_ack(payload)[1]: decode_ack(payload)[2] for kind, payload in frames[1:] if kind == ACK}
+        self.assertEqual(acks, {seq: STATUS_OK if seq % 2 else STATUS_UNKNOWN_CARD for seq in range(10)})
+        self.assertEqual(sum(len(batch) for batch in self.batches), 10)
+        self.assertLess(len(self.batches), 10)
+        self.assertEqual(self.batches[0][0][:3], (3, 0, datetime(2026, 1, 1, tzinfo=timezone.utc)))
+
+    def test_invalid_timestamp(self):
+        """Test a punch with an impossible timestamp is refused without being written"""
+        frames = self.exchange('valid', [encode_punch(3, 1, 2 ** 62, 'KNOWN')])
+
+        self.assertEqual(decode_ack(frames[1][1]), (3, 1, STATUS_INVALID))
+        self.assertEqual(self.batches, [])
+
+    def test_invalid_token(self):
+        """Test a reader with an invalid token is refused"""
+        frames = self.exchange('expired', [encode_punch(3, 1, TIMESTAMP_US, 'KNOWN')])
+
+        self.assertEqual(frames[0][0], ERROR)
+        self.assertEqual(len(frames), 1)
+        self.assertEqual(self.batches, [])
+
+    def test_plain_tcp_needs_insecure(self):
+        """Test the server refuses to run without a certificate unless insecure"""
+        with self.assertRaises(RuntimeError):
+            make_ssl_context(cert=None, key=None, insecure=False)
+
+        self.assertIsNone(make_ssl_context(cert=None, key=None, insecure=True))
+
+    @unittest.skipUnless(shutil.which('openssl'), 'openssl is needed to make a certificate')
+    def test_tls(self):
+        """Test punches are acknowledged over TLS"""
+        with tempfile.TemporaryDirectory() as directory:
+            cert, key = os.path.join(directory, 'cert.pem'), os.path.join(directory, 'key.pem')
+            subprocess.run([
+                'openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1', '-subj', '/CN=localhost',
+                '-addext', 'subjectAltName=IP:127.0.0.1', '-keyout', key, '-out', cert
+            ], check=True, capture_output=True)
+            self.server = IngestServer(
+                Flask(__name__), authenticate=lambda token: {}, write_batch=lambda punches: [STATUS_OK] * len(punches),
+                ssl_context=make_ssl_context(cert=cert, key=key)
+            )
+
+            frames = self.exchange('valid', [encode_punch(3, 1, TIMESTAMP_US, 'KNOWN')], ssl.create_default_context(cafile=cert))
+
+        self.assertEqual(frames[0][0], WELCOME)
+        self.assertEqual(decode_ack(frames[1][1]), (3, 1, STATUS_OK))
+
+
+if __name__ == "__main__":
+    unittest.main()
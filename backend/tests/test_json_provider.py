@@ -0,0 +1,27 @@
+import json, unittest
+from datetime import datetime, timezone
+from unittest.mock import patch
+from app.serializers import json_provider
+from app.serializers.json_provider import dumps_bytes
+
+class JSONProviderTestCase(unittest.TestCase):
+    def setUp(self):
+        """Set up"""
+        self.value = {
+            'naive': datetime(2025, 3, 14, 9, 30),
+            'aware': datetime(2025, 3, 14, 9, 30, tzinfo=timezone.utc),
+        }
+        self.expected = {'naive': '2025-03-14T09:30:00', 'aware': '2025-03-14T09:30:00+00:00'}
+
+    def test_datetimes(self):
+        """Test naive datetimes are encoded without an offset and aware ones with theirs"""
+        self.assertEqual(json.loads(dumps_bytes(self.value)), self.expected)
+
+    def test_datetimes_without_orjson(self):
+        """Test the stdlib fallback encodes datetimes like orjson"""
+        with patch.object(json_provider, 'orjson', None):
+            self.assertEqual(json.loads(dumps_bytes(self.value)), self.expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
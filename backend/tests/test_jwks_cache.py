@@ -0,0 +1,98 @@
+import unittest
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from app.services.auth_service import JwksCache
+
+# Local stand-in of the tenant's /.well-known/jwks.json
+class StubJwksHandler(BaseHTTPRequestHandler):
+    kids = ['key-1']
+    fetches = 0
+    down = False
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        StubJwksHandler.fetches += 1
+        if self.down:
+            self.send_response(503)
+            self.end_headers()
+            return
+        data = json.dumps({'keys': [{'kid': kid, 'kty': 'RSA', 'use': 'sig', 'n': 'n', 'e': 'AQAB'} for kid in self.kids]}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class JwksCacheTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StubJwksHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.old_url = os.environ.get('AUTH0_JWKS_URL')
+        os.environ['AUTH0_JWKS_URL'] = f'http://127.0.0.1:{cls.server.server_address[1]}/.well-known/jwks.json'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        if cls.old_url is None:
+            os.environ.pop('AUTH0_JWKS_URL', None)
+        else:
+            os.environ['AUTH0_JWKS_URL'] = cls.old_url
+
+    def setUp(self):
+        """Set up"""
+        StubJwksHandler.kids = ['key-1']
+        StubJwksHandler.fetches = 0
+        StubJwksHandler.down = False
+
+    def test_keys_fetched_once(self):
+        """Test concurrent requests share one JWKS download"""
+        cache = JwksCache(ttl=3600, min_refresh=30)
+        threads = [threading.Thread(target=cache.get_key, args=('key-1',)) for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(cache.get_key('key-1')['kid'], 'key-1')
+        self.assertEqual(StubJwksHandler.fetches, 1)
+
+    def test_unknown_kid_refreshes_at_most_once_per_interval(self):
+        """Test a rotated key is picked up, and unknown kids don't hammer Auth0"""
+        cache = JwksCache(ttl=3600, min_refresh=0.2)
+        cache.get_key('key-1')
+        StubJwksHandler.kids = ['key-1', 'key-2']
+
+        self.assertIsNone(cache.get_key('key-2'))
+        self.assertIsNone(cache.get_key('forged'))
+        time.sleep(0.25)
+
+        self.assertEqual(cache.get_key('key-2')['kid'], 'key-2')
+        self.assertEqual(StubJwksHandler.fetches, 2)
+
+    def test_keeps_keys_when_auth0_is_down(self):
+        """Test the cached keys are used while the JWKS can't be fetched"""
+        cache = JwksCache(ttl=0.1, min_refresh=0)
+        cache.get_key('key-1')
+        StubJwksHandler.down = True
+        time.sleep(0.15)
+
+        self.assertEqual(cache.get_key('key-1')['kid'], 'key-1')
+        self.assertEqual(StubJwksHandler.fetches, 2)
+
+    def test_first_fetch_failure_raises(self):
+        """Test a request fails when no key was ever fetched"""
+        StubJwksHandler.down = True
+
+        with self.assertRaises(Exception):
+            JwksCache().get_key('key-1')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import queue, unittest
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from app.services.live_feed import LiveFeed, LAGGED, CLIENT_QUEUE_SIZE, PUNCH_CHANNEL, cooperative_worker
+
+class FakeHub:
+    def __init__(self):
+        self.callbacks = {}
+
+    def subscribe(self, channel, callback):
+        self.callbacks.setdefault(channel, []).append(callback)
+
+    def notify(self, channel, payload):
+        for callback in self.callbacks.get(channel, []):
+            callback(payload)
+
+
+class LiveFeedTestCase(unittest.TestCase):
+    def setUp(self):
+        """Set up"""
+        self.hub = FakeHub()
+        self.feed = LiveFeed(self.hub)
+
+    def punch(self, record_id):
+        return {'id': record_id, 'user_id': 1, 'timestamp': datetime(2025, 3, 14, 8, 0, tzinfo=timezone.utc).isoformat()}
+
+    def drain(self, client):
+        items = []
+        while True:
+            try:
+                items.append(client.get_nowait())
+            except queue.Empty:
+                return items
+
+    def test_fan_out(self):
+        """Test a notified punch reaches every connected client once"""
+        first, second = self.feed.connect(), self.feed.connect()
+
+        self.hub.notify(PUNCH_CHANNEL, self.punch(1))
+        self.hub.notify(PUNCH_CHANNEL, self.punch(2))
+
+        self.assertEqual(len(self.hub.callbacks[PUNCH_CHANNEL]), 1)
+        self.assertEqual(self.drain(first), [self.punch(1), self.punch(2)])
+        self.assertEqual(self.drain(second), [self.punch(1), self.punch(2)])
+
+    def test_disconnected_client(self):
+        """Test a disconnected client gets no more punches"""
+        first, second = self.feed.connect(), self.feed.connect()
+        self.feed.disconnect(first)
+
+        self.hub.notify(PUNCH_CHANNEL, self.punch(1))
+
+        self.assertEqual(self.drain(first), [])
+        self.assertEqual(self.drain(second), [self.punch(1)])
+
+    def test_lagged_reset(self):
+        """Test a client whose queue is full is told to reset, the others keep their punches"""
+        slow, fast = self.feed.connect(), self.feed.connect()
+        for record_id in range(CLIENT_QUEUE_SIZE):
+            self.hub.notify(PUNCH_CHANNEL, self.punch(record_id))
+        self.drain(fast)
+
+        self.hub.notify(PUNCH_CHANNEL, self.punch(CLIENT_QUEUE_SIZE))
+
+        self.assertEqual(self.drain(slow), [LAGGED])
+        self.assertEqual(self.drain(fast), [self.punch(CLIENT_QUEUE_SIZE)])
+
+    def test_max_clients(self):
+        """Test no client connects past max_clients"""
+        client = self.feed.connect(max_clients=1)
+
+        self.assertIsNotNone(client)
+        self.assertIsNone(self.feed.connect(max_clients=1))
+        self.assertIsNone(self.feed.connect(max_clients=0))
+
+        self.feed.disconnect(client)
+        self.assertIsNotNone(self.feed.connect(max_clients=1))
+
+    def test_format_punch(self):
+        """Test a record is sent as its id, user and ISO timestamp"""
+        record = SimpleNamespace(id=7, user_id=3, timestamp=datetime(2025, 3, 14, 8, 0, tzinfo=timezone.utc))
+
+        self.assertEqual(self.feed.format_punch(record), {'id': 7, 'user_id': 3, 'timestamp': '2025-03-14T08:00:00+00:00'})
+
+    def test_threaded_worker(self):
+        """Test the test runner isn't seen as a cooperative worker"""
+        self.assertFalse(cooperative_worker())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+import unittest
+from app.services.load_guard import (
+    LoadGuard, RateLimitError, priority_of, default_reporting_inflight, LOAD_SHED_LIMITS,
+    PRIORITY_INGEST, PRIORITY_WRITE, PRIORITY_REPORTING,
+)
+
+RATE_LIMITS = {PRIORITY_INGEST: (10, 5), PRIORITY_WRITE: (2, 2), PRIORITY_REPORTING: (1, 3)}
+SHED_LIMITS = {PRIORITY_WRITE: (4, 0.95), PRIORITY_REPORTING: (2, 0.75)}
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+class FixedLoadGuard(LoadGuard):
+    usage = 0.0
+
+    def pool_usage(self):
+        return self.usage
+
+class LoadGuardTestCase(unittest.TestCase):
+    def setUp(self):
+        """Set up"""
+        self.clock = FakeClock()
+        self.guard = FixedLoadGuard(RATE_LIMITS, SHED_LIMITS, clock=self.clock)
+
+    def request(self, sub, permission):
+        with self.guard.admit({'sub': sub}, permission):
+            pass
+
+    def test_priority_of(self):
+        """Test the class of each permission"""
+        self.assertEqual(priority_of('post:attendance'), PRIORITY_INGEST)
+        self.assertEqual(priority_of('patch:events'), PRIORITY_WRITE)
+        self.assertEqual(priority_of('get:attendance-statistics'), PRIORITY_REPORTING)
+        self.assertEqual(priority_of(''), PRIORITY_REPORTING)
+
+    def test_token_bucket(self):
+        """Test the burst, the refill and Retry-After"""
+        for _ in range(3):
+            self.request('dashboard', 'get:events')
+        with self.assertRaises(RateLimitError) as raised:
+            self.request('dashboard', 'get:events')
+        self.assertEqual((raised.exception.status_code, raised.exception.retry_after), (429, 1))
+
+        self.clock.now += 1
+        self.request('dashboard', 'get:events')
+
+    def test_buckets_per_client_and_class(self):
+        """Test a client over its limit doesn't limit the others, nor its punches"""
+        for _ in range(3):
+            self.request('dashboard', 'get:events')
+
+        self.request('other', 'get:events')
+        self.request('dashboard', 'post:attendance')
+
+    def test_shed_reporting_before_writes(self):
+        """Test the reporting is shed first and the ingest never"""
+        self.guard.inflight = 2
+        with self.assertRaises(RateLimitError) as raised:
+            self.request('dashboard', 'get:events')
+        self.assertEqual((raised.exception.status_code, raised.exception.retry_after), (503, 2))
+        self.request('admin', 'patch:events')
+
+        self.guard.usage = 1.0
+        with self.assertRaises(RateLimitError):
+            self.request('admin', 'patch:events')
+        self.request('kiosk', 'post:attendance')
+
+        self.assertEqual(self.guard.stats()['classes'][PRIORITY_REPORTING]['shed'], 1)
+
+    def test_shed_requests_keep_their_tokens(self):
+        """Test a shed request doesn't use a token"""
+        self.guard.inflight = 2
+        for _ in range(5):
+            with self.assertRaises(RateLimitError):
+                self.request('dashboard', 'get:events')
+        self.guard.inflight = 0
+
+        for _ in range(3):
+            self.request('dashboard', 'get:events')
+
+    def test_shed_with_default_config(self):
+        """Test the shipped 2 thread worker keeps a thread free for the punches"""
+        guard = FixedLoadGuard(RATE_LIMITS, LOAD_SHED_LIMITS, clock=self.clock)
+
+        with guard.admit({'sub': 'dashboard'}, 'get:attendance-statistics'):
+            with self.assertRaises(RateLimitError) as raised:
+                with guard.admit({'sub': 'dashboard'}, 'get:attendance-statistics'):
+                    pass
+            self.assertEqual(raised.exception.status_code, 503)
+
+            with guard.admit({'sub': 'kiosk'}, 'post:attendance'):
+                pass
+
+    def test_default_reporting_inflight(self):
+        """Test the reporting limit follows the worker class and threads"""
+        self.assertEqual(default_reporting_inflight('gthread', 2), 1)
+        self.assertEqual(default_reporting_inflight('gthread', 8), 7)
+        self.assertEqual(default_reporting_inflight('sync', 1), 1)
+        self.assertEqual(default_reporting_inflight('gevent', 2), 16)
+
+    def test_inflight(self):
+        """Test the requests in a view are counted"""
+        with self.guard.admit({'sub': 'kiosk'}, 'post:attendance'):
+            self.assertEqual(self.guard.inflight, 1)
+        self.assertEqual(self.guard.inflight, 0)
+
+if __name__ == '__main__':
+    unittest.main()
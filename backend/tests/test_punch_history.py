@@ -0,0 +1,59 @@
+import unittest
+from datetime import datetime, timezone
+from app.services.punch_history import encode_cursor, decode_cursor, archived_page
+
+class PunchHistoryCursorTestCase(unittest.TestCase):
+    def test_cursor_round_trip(self):
+        """Test a cursor gives back the timestamp and id it was made from"""
+        timestamp = datetime(2025, 3, 14, 8, 31, 12, 345678, tzinfo=timezone.utc)
+
+        cursor = encode_cursor(timestamp, 123456)
+
+        self.assertEqual(decode_cursor(cursor), (timestamp, 123456))
+        self.assertNotIn('=', cursor)
+
+    def test_cursor_keeps_the_instant(self):
+        """Test cursors of the same instant in other offsets are equal"""
+        utc = datetime(2025, 3, 14, 8, 0, tzinfo=timezone.utc)
+
+        self.assertEqual(encode_cursor(utc.astimezone(), 1), encode_cursor(utc, 1))
+
+    def test_invalid_cursor(self):
+        """Test cursors not made by the server are refused"""
+        for cursor in ('', 'not-a-cursor', encode_cursor(datetime(2025, 1, 1, tzinfo=timezone.utc), 1)[:-3] + '!!!', 'OTk5OTk5OTk5OTk5OTk5OTk5OS4x'):
+            with self.assertRaises(ValueError):
+                decode_cursor(cursor)
+
+
+class ArchivedPageTestCase(unittest.TestCase):
+    def setUp(self):
+        """Set up"""
+        # Columns sorted by user then time, like an archived month
+        self.users = [1, 1, 1, 2, 2, 3]
+        self.times = [10, 20, 30, 10, 25, 20]
+
+    def keys(self, positions):
+        return [(self.times[position], self.users[position]) for position in positions]
+
+    def test_time_order(self):
+        """Test an archived month is paged by time, then by user at the same instant"""
+        self.assertEqual(self.keys(archived_page(self.users, self.times, 4)), [(10, 2), (10, 1), (20, 3), (20, 1)])
+
+    def test_after_cursor(self):
+        """Test a page starts right after the key of the cursor"""
+        # The cursor of an archived punch carries -user_id
+        positions = archived_page(self.users, self.times, 10, after=(20, -3))
+
+        self.assertEqual(self.keys(positions), [(20, 1), (25, 2), (30, 1)])
+
+    def test_descending(self):
+        """Test newest first pages continue below the cursor"""
+        self.assertEqual(self.keys(archived_page(self.users, self.times, 3, descending=True)), [(30, 1), (25, 2), (20, 1)])
+        self.assertEqual(
+            self.keys(archived_page(self.users, self.times, 3, after=(20, -1), descending=True)),
+            [(20, 3), (10, 1), (10, 2)]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
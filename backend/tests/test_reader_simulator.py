@@ -0,0 +1,78 @@
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from app.reader.simulator import ReaderSimulator, parse_schedule, SHIFT_CHANGE_SCHEDULE
+
+class StubBackendHandler(BaseHTTPRequestHandler):
+    received = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        StubBackendHandler.received.append((body, self.headers['Authorization']))
+        known = body['card_id'] != 'LOST'
+        payload = json.dumps({'success': known}).encode()
+        self.send_response(201 if known else 404)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+class ReaderSimulatorTestCase(unittest.TestCase):
+    def setUp(self):
+        """Set up"""
+        StubBackendHandler.received = []
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubBackendHandler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.endpoint = f'http://127.0.0.1:{self.server.server_address[1]}/api/attendance'
+
+    def tearDown(self):
+        """Tear down"""
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_parse_schedule(self):
+        """Test schedules are read as (seconds, rate) phases"""
+        self.assertEqual(parse_schedule('30:0.1,10:2'), [(30.0, 0.1), (10.0, 2.0)])
+        self.assertEqual(parse_schedule('shift-change'), SHIFT_CHANGE_SCHEDULE)
+        with self.assertRaises(ValueError):
+            parse_schedule('30')
+        with self.assertRaises(ValueError):
+            parse_schedule('0:1')
+
+    def test_readers_follow_the_schedule(self):
+        """Test the virtual readers swipe through handle_card_read and record every answer"""
+        simulator = ReaderSimulator(4, [(0.5, 0), (1, 20)], ['1', 'LOST'], self.endpoint, tokens=[f'token-{n}' for n in range(4)])
+
+        rows = simulator.run()
+
+        self.assertEqual(rows[0]['swipes'], 0)
+        burst = rows[1]
+        self.assertGreater(burst['swipes'], 20)
+        self.assertEqual(burst['swipes'], len(StubBackendHandler.received))
+        self.assertEqual(burst['accepted'], burst['statuses'].get(201, 0))
+        self.assertEqual(sum(burst['statuses'].values()), burst['swipes'])
+        self.assertEqual(set(burst['statuses']), {201, 404})
+        self.assertEqual({authorization for body, authorization in StubBackendHandler.received}, {f'Bearer token-{n}' for n in range(4)})
+        self.assertGreater(burst['p99'], 0)
+
+    def test_unreachable_backend(self):
+        """Test swipes that can't reach the backend are counted, not raised"""
+        self.server.shutdown()
+        self.server.server_close()
+        simulator = ReaderSimulator(2, [(0.3, 20)], ['1'], self.endpoint)
+
+        rows = simulator.run()
+
+        self.assertGreater(rows[0]['swipes'], 0)
+        self.assertEqual(rows[0]['statuses'], {'unreachable': rows[0]['swipes']})
+        self.assertEqual(rows[0]['accepted'], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+import time
+import unittest
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+from app.services.recurrence import parse_rrule, format_rrule, occurrences, resolve_until, expand_events
+
+PARIS = ZoneInfo('Europe/Paris')
+
+def paris(*args):
+    return datetime(*args, tzinfo=PARIS)
+
+def expand(rule, dtstart, start, end, until=None):
+    return [occurrence.strftime('%Y-%m-%d %H:%M') for occurrence in occurrences(parse_rrule(rule), dtstart, start, end, until)]
+
+class RecurrenceTestCase(unittest.TestCase):
+    def test_parse_rrule(self):
+        """Test a rule is parsed and formatted back"""
+        rule = parse_rrule('RRULE:FREQ=MONTHLY;INTERVAL=2;BYDAY=2TU,-1FR;COUNT=6')
+
+        self.assertEqual(rule.freq, 'MONTHLY')
+        self.assertEqual(rule.by_day, ((2, 1), (-1, 4)))
+        self.assertEqual(format_rrule(rule), 'FREQ=MONTHLY;INTERVAL=2;BYDAY=2TU,-1FR;COUNT=6')
+
+    def test_parse_rrule_invalid(self):
+        """Test the invalid or unsupported rules are rejected"""
+        for text in ('FREQ=HOURLY', 'FREQ=WEEKLY;BYDAY=2MO', 'FREQ=DAILY;COUNT=2;UNTIL=20250101', 'FREQ=DAILY;BYSETPOS=1', 'FREQ=WEEKLY;BYDAY=XX'):
+            with self.assertRaises(ValueError):
+                parse_rrule(text)
+
+    def test_weekly_window(self):
+        """Test only the occurrences of the window are returned"""
+        result = expand('FREQ=WEEKLY;BYDAY=MO,WE', paris(2025, 1, 6, 10, 0), paris(2025, 3, 1), paris(2025, 3, 10))
+
+        self.assertEqual(result, ['2025-03-03 10:00', '2025-03-05 10:00'])
+
+    def test_weekly_keeps_wall_clock_across_dst(self):
+        """Test a weekly meeting stays at 10:00 after the clock change"""
+        result = list(occurrences(parse_rrule('FREQ=WEEKLY'), paris(2025, 3, 24, 10, 0), paris(2025, 3, 24), paris(2025, 4, 1)))
+
+        self.assertEqual([occurrence.hour for occurrence in result], [10, 10])
+        self.assertEqual([occurrence.utcoffset().total_seconds() / 3600 for occurrence in result], [1, 2])
+
+    def test_monthly_by_day_and_month_day(self):
+        """Test the ordinal weekdays and the months without the day"""
+        self.assertEqual(
+            expand('FREQ=MONTHLY;BYDAY=-1FR', paris(2025, 1, 31, 9, 0), paris(2025, 1, 1), paris(2025, 4, 1)),
+            ['2025-01-31 09:00', '2025-02-28 09:00', '2025-03-28 09:00']
+        )
+        self.assertEqual(
+            expand('FREQ=MONTHLY', paris(2025, 1, 31, 9, 0), paris(2025, 1, 1), paris(2025, 6, 1)),
+            ['2025-01-31 09:00', '2025-03-31 09:00', '2025-05-31 09:00']
+        )
+
+    def test_count_resolved_to_until(self):
+        """Test a COUNT rule ends after its last occurrence"""
+        rule = parse_rrule('FREQ=DAILY;INTERVAL=2;COUNT=3')
+        dtstart = paris(2025, 3, 1, 8, 0)
+        until = resolve_until(rule, dtstart)
+
+        self.assertEqual(until, paris(2025, 3, 5, 8, 0))
+        self.assertEqual(
+            expand('FREQ=DAILY;INTERVAL=2;COUNT=3', dtstart, paris(2025, 3, 1), paris(2025, 4, 1), until),
+            ['2025-03-01 08:00', '2025-03-03 08:00', '2025-03-05 08:00']
+        )
+
+    def test_until(self):
+        """Test UNTIL is included"""
+        result = expand('FREQ=DAILY;UNTIL=20250303T070000Z', paris(2025, 3, 1, 8, 0), paris(2025, 3, 1), paris(2025, 4, 1))
+
+        self.assertEqual(result, ['2025-03-01 08:00', '2025-03-02 08:00', '2025-03-03 08:00'])
+
+    def test_window_cost_independent_of_series_length(self):
+        """Test expanding a month far into a daily series stays fast"""
+        dtstart = datetime(1900, 1, 1, 9, 0, tzinfo=timezone.utc)
+        started = time.perf_counter()
+        result = list(occurrences(parse_rrule('FREQ=DAILY'), dtstart, datetime(2500, 1, 1, tzinfo=timezone.utc), datetime(2500, 2, 1, tzinfo=timezone.utc)))
+
+        self.assertEqual(len(result), 31)
+        self.assertLess(time.perf_counter() - started, 0.05)
+
+    def test_expand_events_with_exceptions(self):
+        """Test the cancelled and moved occurrences"""
+        series = [(1, 'Standup', '', paris(2025, 1, 6, 10, 0), 'FREQ=WEEKLY;BYDAY=MO', None)]
+        exceptions = [
+            # Cancelled
+            (1, paris(2025, 3, 3, 10, 0), True, None, None, None),
+            # Moved within the window
+            (1, paris(2025, 3, 10, 10, 0), False, 'Standup (moved)', None, paris(2025, 3, 11, 9, 0)),
+            # Moved into the window from February
+            (1, paris(2025, 2, 24, 10, 0), False, None, None, paris(2025, 3, 4, 9, 0)),
+            # Moved out of the window
+            (1, paris(2025, 3, 31, 10, 0), False, None, None, paris(2025, 4, 1, 10, 0)),
+        ]
+        events = expand_events(series, exceptions, paris(2025, 3, 1), paris(2025, 4, 1), PARIS)
+        dates = sorted((event['date'].strftime('%m-%d %H:%M'), event['name']) for event in events)
+
+        self.assertEqual(dates, [
+            ('03-04 09:00', 'Standup'), ('03-11 09:00', 'Standup (moved)'),
+            ('03-17 10:00', 'Standup'), ('03-24 10:00', 'Standup'),
+        ])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,253 @@
+import os
+import struct
+import tempfile
+import unittest
+import numpy as np
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import patch
+from app.models import database
+from app.reporting.engine import aggregate_stats
+from app.reporting import timezones
+from app.reporting.statistics import AttendanceStatisticsService, month_bounds, format_stats, site_now, ATTENDANCE_STATS_TTL_SECONDS
+from app.reporting.columns import parse_binary_copy
+from app.reporting.shifts import make_shift_table, build_day_shifts, compile_schedule, summarize_shifts, shift_monthly_stats
+from app.reporting.archive import AttendanceArchive, pack_punches, unpack_punches, user_slice, write_columns, read_columns
+from app.reporting.timezones import get_zone, to_local_seconds
+
+WORK_START = 9 * 3600
+WORK_END = 18 * 3600
+
+def local_seconds(value):
+    return int((datetime.fromisoformat(value) - datetime(1970, 1, 1)).total_seconds())
+
+def epoch_day(value):
+    return (datetime.fromisoformat(value) - datetime(1970, 1, 1)).days
+
+# Day shift 09:00-18:00 with a 60 minutes break, night shift 22:00-06:00, every day
+SHIFTS = make_shift_table([
+    (9 * 3600, 18 * 3600, 60, 10, '1234567'),
+    (22 * 3600, 6 * 3600, 0, 0, '1234567'),
+])
+
+# Statistics of the punches with no shift assigned, every day against the fixed hours
+def unscheduled_stats(user_ids, timestamps, first_day, end_day):
+    users, user_codes = np.unique(np.asarray(user_ids, dtype=np.int64), return_inverse=True)
+    table = make_shift_table([])
+    schedule = compile_schedule(build_day_shifts(users.size, end_day - first_day, []), first_day, table)
+    summary = summarize_shifts(schedule, table, user_codes.reshape(-1), timestamps)
+    stats = shift_monthly_stats(summary, first_day, end_day, WORK_START, WORK_END)
+    return stats._replace(user_ids=users[stats.user_ids])
+
+class ReportingTestCase(unittest.TestCase):
+    def setUp(self):
+        """Set up"""
+        punches = [
+            # User 1: on time, lunch break, leaves on time
+            (1, '2025-03-03T08:50:00'), (1, '2025-03-03T12:00:00'), (1, '2025-03-03T13:00:00'), (1, '2025-03-03T18:10:00'),
+            # User 1: late and leaves early
+            (1, '2025-03-04T09:30:00'), (1, '2025-03-04T17:00:00'),
+            # User 2: one punch only, late but no check-out
+            (2, '2025-03-03T10:00:00'),
+            # User 3: rows out of order
+            (3, '2025-03-05T18:30:00'), (3, '2025-03-05T08:00:00'),
+        ]
+        self.user_ids = [user_id for user_id, _ in punches]
+        self.timestamps = [local_seconds(timestamp) for _, timestamp in punches]
+        self.month = (epoch_day('2025-03-01'), epoch_day('2025-04-01'))
+
+    def test_unscheduled_monthly_stats(self):
+        """Test the statistics of each user without shifts"""
+        stats = unscheduled_stats(self.user_ids, self.timestamps, *self.month)
+
+        self.assertEqual(stats.user_ids.tolist(), [1, 2, 3])
+        self.assertEqual(stats.days_present.tolist(), [2, 1, 1])
+        self.assertEqual(stats.late_arrivals.tolist(), [1, 1, 0])
+        self.assertEqual(stats.early_departures.tolist(), [1, 0, 0])
+        self.assertEqual(stats.total_seconds.tolist(), [(9 * 60 + 20) * 60 + 450 * 60, 0, 630 * 60])
+        self.assertEqual(format_stats(2, stats.check_in_seconds[0].item(), 0, 0, 0)['avgCheckIn'], '09:10')
+
+    def test_aggregate_stats(self):
+        """Test the statistics are summed by group"""
+        stats = unscheduled_stats(self.user_ids, self.timestamps, *self.month)
+        department_stats = aggregate_stats(stats, [0, 1, 0], 2)
+
+        self.assertEqual(department_stats.users.tolist(), [2, 1])
+        self.assertEqual(department_stats.days_present.tolist(), [3, 1])
+        self.assertEqual(department_stats.late_arrivals.tolist(), [1, 1])
+
+    def test_unscheduled_monthly_stats_empty(self):
+        """Test a month without punches"""
+        stats = unscheduled_stats([], [], *self.month)
+
+        self.assertEqual(stats.user_ids.size, 0)
+
+    def test_parse_binary_copy(self):
+        """Test bigint columns are read back from a binary COPY output"""
+        rows = [(7, 1735722000), (3, -5)]
+        data = b'PGCOPY\n\xff\r\n\x00' + struct.pack('!II', 0, 0)
+        data += b''.join(struct.pack('!hiqiq', 2, 8, user_id, 8, timestamp) for user_id, timestamp in rows)
+        data += struct.pack('!h', -1)
+
+        user_ids, timestamps = parse_binary_copy(data, 2)
+
+        self.assertEqual(user_ids.tolist(), [7, 3])
+        self.assertEqual(timestamps.tolist(), [1735722000, -5])
+        with self.assertRaises(ValueError):
+            parse_binary_copy(data[:-2], 2)
+
+    def test_month_bounds(self):
+        """Test month bounds, including the year end"""
+        self.assertEqual(month_bounds('2024-12'), (datetime(2024, 12, 1), datetime(2025, 1, 1)))
+        with self.assertRaises(ValueError):
+            month_bounds('2024-13')
+
+    def test_statistics_freshness_in_site_time(self):
+        """Test an open month is computed again after the TTL of the site clock"""
+        # Far from the container clock, an offset mixup shows as hours
+        with patch.object(timezones, 'SITE_TIMEZONE', 'Pacific/Kiritimati'):
+            timezones.get_zone.cache_clear()
+            try:
+                now = site_now()
+                month = now.strftime('%Y-%m')
+                service = AttendanceStatisticsService()
+
+                self.assertTrue(service.is_fresh(SimpleNamespace(month=month, computed_at=now)))
+                stale = now - timedelta(seconds=ATTENDANCE_STATS_TTL_SECONDS + 1)
+                self.assertFalse(service.is_fresh(SimpleNamespace(month=month, computed_at=stale)))
+            finally:
+                timezones.get_zone.cache_clear()
+
+    def test_invalid_site_timezone(self):
+        """Test the schema isn't created with a site timezone that isn't an IANA name"""
+        for name in ("UTC'; DROP TABLE users; --", 'Mars/Olympus', ''):
+            with patch.object(database, 'SITE_TIMEZONE', name), self.assertRaises(ValueError):
+                database.db_create_all(None)
+
+class ShiftsTestCase(unittest.TestCase):
+    def summarize(self, grid, punches, first_day='2025-03-03', user_count=1):
+        # A week from first_day
+        day_shifts = build_day_shifts(user_count, 7, grid)
+        schedule = compile_schedule(day_shifts, epoch_day(first_day), SHIFTS)
+        return summarize_shifts(
+            schedule, SHIFTS,
+            [user for user, _ in punches], [local_seconds(timestamp) for _, timestamp in punches]
+        )
+
+    def test_night_shift_crosses_midnight(self):
+        """Test a night shift is one entry on the day it starts"""
+        summary = self.summarize([([0], 1, 0, 7)], [(0, '2025-03-03T21:55:00'), (0, '2025-03-04T06:05:00')])
+
+        self.assertEqual(summary.days.tolist(), [epoch_day('2025-03-03')])
+        self.assertEqual(summary.shift_codes.tolist(), [1])
+        self.assertEqual(summary.worked_seconds.tolist(), [8 * 3600 + 600])
+        self.assertEqual(summary.late.tolist(), [False])
+
+    def test_break_and_grace(self):
+        """Test the break is unpaid and a check-in within the grace is on time"""
+        summary = self.summarize([([0], 0, 0, 7)], [
+            (0, '2025-03-03T09:05:00'), (0, '2025-03-03T17:55:00'),
+            (0, '2025-03-04T09:15:00'), (0, '2025-03-04T17:00:00'),
+        ])
+
+        self.assertEqual(summary.worked_seconds.tolist(), [(8 * 60 - 10) * 60, (6 * 60 + 45) * 60])
+        self.assertEqual(summary.late.tolist(), [False, True])
+        self.assertEqual(summary.early_leave.tolist(), [False, True])
+
+    def test_user_assignment_overrides_department(self):
+        """Test a later user assignment replaces the department shift"""
+        grid = [([0, 1], 0, 0, 7), ([1], 1, 0, 7)]
+        summary = self.summarize(grid, [(0, '2025-03-03T09:00:00'), (1, '2025-03-03T22:00:00')], user_count=2)
+
+        self.assertEqual(summary.user_codes.tolist(), [0, 1])
+        self.assertEqual(summary.shift_codes.tolist(), [0, 1])
+
+    def test_unscheduled_punches_by_day(self):
+        """Test the punches outside every shift are grouped by calendar day"""
+        summary = self.summarize([], [(0, '2025-03-05T10:00:00'), (0, '2025-03-05T16:00:00')])
+
+        self.assertEqual(summary.shift_codes.tolist(), [-1])
+        self.assertEqual(summary.worked_seconds.tolist(), [6 * 3600])
+
+    def test_monthly_stats_follow_shifts(self):
+        """Test a night shift on the last day of the month counts in it, against its own hours"""
+        summary = self.summarize([([0], 1, 3, 4)], [
+            (0, '2025-03-28T08:00:00'), (0, '2025-03-28T17:00:00'),
+            (0, '2025-03-31T22:10:00'), (0, '2025-04-01T06:00:00'),
+            (0, '2025-04-01T14:00:00'),
+        ], first_day='2025-03-28')
+
+        stats = shift_monthly_stats(summary, epoch_day('2025-03-01'), epoch_day('2025-04-01'), WORK_START, WORK_END)
+
+        self.assertEqual(stats.user_ids.tolist(), [0])
+        self.assertEqual(stats.days_present.tolist(), [2])
+        self.assertEqual(stats.check_in_seconds.tolist(), [8 * 3600 + 22 * 3600 + 600])
+        self.assertEqual(stats.total_seconds.tolist(), [9 * 3600 + 7 * 3600 + 50 * 60])
+        # Late for the night shift, early against the fixed hours on the unscheduled day
+        self.assertEqual(stats.late_arrivals.tolist(), [1])
+        self.assertEqual(stats.early_departures.tolist(), [1])
+
+    def test_overlapping_windows_split(self):
+        """Test a night shift followed by a day shift keeps the late check-out apart"""
+        grid = [([0], 1, 0, 1), ([0], 0, 1, 2)]
+        summary = self.summarize(grid, [
+            (0, '2025-03-03T22:00:00'), (0, '2025-03-04T06:40:00'),
+            (0, '2025-03-04T08:00:00'), (0, '2025-03-04T18:00:00'),
+        ])
+
+        self.assertEqual(summary.shift_codes.tolist(), [1, 0])
+        self.assertEqual(summary.punches.tolist(), [2, 2])
+
+class ArchiveTestCase(unittest.TestCase):
+    def setUp(self):
+        """Set up"""
+        self.user_ids = [7, 3, 7, 3, 9, 7]
+        self.timestamps = [600, 100, 200, 300, 50, 400]
+
+    def test_pack_punches(self):
+        """Test the punches are packed by user then time"""
+        columns = pack_punches(self.user_ids, self.timestamps)
+
+        self.assertEqual(columns.users.tolist(), [3, 7, 9])
+        self.assertEqual(columns.offsets.tolist(), [0, 2, 5, 6])
+        self.assertEqual(columns.timestamps.tolist(), [100, 300, 200, 400, 600, 50])
+
+        user_ids, timestamps = unpack_punches(columns)
+        self.assertEqual(user_ids.tolist(), [3, 3, 7, 7, 7, 9])
+
+    def test_user_slice(self):
+        """Test the punches of one user within a range"""
+        columns = pack_punches(self.user_ids, self.timestamps)
+
+        self.assertEqual(user_slice(columns, 7).tolist(), [200, 400, 600])
+        self.assertEqual(user_slice(columns, 7, 300, 600).tolist(), [400])
+        self.assertEqual(user_slice(columns, 5).tolist(), [])
+        self.assertEqual(user_slice(columns, 10).tolist(), [])
+
+    def test_columns_round_trip(self):
+        """Test the columns read back memory-mapped"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, '2024-01.1')
+            write_columns(path, pack_punches(self.user_ids, self.timestamps))
+            columns = read_columns(path)
+
+            self.assertEqual(user_slice(columns, 3).tolist(), [100, 300])
+            self.assertEqual(unpack_punches(columns)[1].tolist(), [100, 300, 200, 400, 600, 50])
+
+    def test_archive_month_inside_retention(self):
+        """Test a month inside the retention window is not archived"""
+        month = datetime.now(get_zone()).strftime('%Y-%m')
+
+        with self.assertRaises(ValueError):
+            AttendanceArchive().archive_month(month, retention_months=1)
+
+    def test_to_local_seconds_dst(self):
+        """Test the offset follows the daylight saving change"""
+        # 2025-03-30 00:30 and 01:30 UTC, Paris moves from +1 to +2 at 01:00 UTC
+        utc = [local_seconds('2025-03-30T00:30:00'), local_seconds('2025-03-30T01:30:00')]
+        local = to_local_seconds(utc, 'Europe/Paris')
+
+        self.assertEqual(local.tolist(), [local_seconds('2025-03-30T01:30:00'), local_seconds('2025-03-30T03:30:00')])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+import unittest
+import json
+import os
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from app.services.auth0_management import Auth0Management
+from app.services.role_assignment import RoleAssigner
+
+USER_COUNT = 100
+# Every Nth management call is answered with a 429
+RATE_LIMIT_EVERY = 25
+
+# Local stand-in of the Auth0 user roles and sessions endpoints
+class StubRolesHandler(BaseHTTPRequestHandler):
+    roles = {}
+    calls = []
+    # (method, path) answered with a 500
+    failing = set()
+    rate_limited = 0
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def send_json(self, status, body=None, headers=None):
+        data = json.dumps(body).encode() if body is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def read_json(self):
+        length = int(self.headers.get('Content-Length', 0))
+        return json.loads(self.rfile.read(length)) if length else {}
+
+    def handle_call(self, method):
+        body = self.read_json()
+        if self.path == '/oauth/token':
+            return self.send_json(200, {'access_token': 'stub-token', 'expires_in': 86400})
+
+        with self.lock:
+            self.calls.append((method, self.path))
+            if (method, self.path) in self.failing:
+                return self.send_json(500, {'message': 'Internal error'})
+            if len(self.calls) % RATE_LIMIT_EVERY == 0:
+                StubRolesHandler.rate_limited += 1
+                return self.send_json(429, {'message': 'Too Many Requests'}, {'Retry-After': '0'})
+
+        match = re.fullmatch(r'/api/v2/users/([^/]+)/(roles|sessions)', self.path)
+        if not match:
+            return self.send_json(404, {'message': 'Not found'})
+
+        auth0_id = match.group(1).replace('%7C', '|')
+        if auth0_id not in self.roles:
+            return self.send_json(404, {'message': 'The user does not exist.'})
+
+        if match.group(2) == 'sessions':
+            return self.send_json(202)
+
+        with self.lock:
+            if method == 'GET':
+                return self.send_json(200, [{'id': role_id, 'name': role_id} for role_id in self.roles[auth0_id]])
+            if method == 'POST':
+                self.roles[auth0_id] = self.roles[auth0_id] + [role_id for role_id in body['roles'] if role_id not in self.roles[auth0_id]]
+            if method == 'DELETE':
+                self.roles[auth0_id] = [role_id for role_id in self.roles[auth0_id] if role_id not in body['roles']]
+        self.send_json(204)
+
+    def do_GET(self):
+        self.handle_call('GET')
+
+    def do_POST(self):
+        self.handle_call('POST')
+
+    def do_DELETE(self):
+        self.handle_call('DELETE')
+
+
+class RoleAssignmentTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StubRolesHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.old_base_url = os.environ.get('AUTH0_MGMT_BASE_URL')
+        os.environ['AUTH0_MGMT_BASE_URL'] = f'http://127.0.0.1:{cls.server.server_address[1]}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        if cls.old_base_url is None:
+            os.environ.pop('AUTH0_MGMT_BASE_URL', None)
+        else:
+            os.environ['AUTH0_MGMT_BASE_URL'] = cls.old_base_url
+
+    def setUp(self):
+        """Set up"""
+        StubRolesHandler.roles = {f'auth0|{index}': ['rol_staff'] for index in range(USER_COUNT)}
+        StubRolesHandler.calls = []
+        StubRolesHandler.failing = set()
+        StubRolesHandler.rate_limited = 0
+        self.assigner = RoleAssigner(Auth0Management())
+
+    def test_assign_only_sends_diff(self):
+        """Test assign only removes and adds the roles that changed"""
+        StubRolesHandler.roles['auth0|0'] = ['rol_staff', 'rol_guest']
+        result = self.assigner.assign('auth0|0', ['rol_staff', 'rol_admin'])
+
+        self.assertTrue(result['success'])
+        self.assertEqual(result['removed'], ['rol_guest'])
+        self.assertEqual(result['added'], ['rol_admin'])
+        self.assertEqual(result['held'], ['rol_staff', 'rol_admin'])
+        self.assertEqual(StubRolesHandler.roles['auth0|0'], ['rol_staff', 'rol_admin'])
+
+    def test_assign_add_fails_after_removal(self):
+        """Test a failed add reports the removed roles and what the user holds"""
+        StubRolesHandler.roles['auth0|0'] = ['rol_staff', 'rol_guest']
+        StubRolesHandler.failing = {('POST', '/api/v2/users/auth0%7C0/roles')}
+        result = self.assigner.assign('auth0|0', ['rol_staff', 'rol_admin'])
+
+        self.assertFalse(result['success'])
+        self.assertEqual(result['removed'], ['rol_guest'])
+        self.assertEqual(result['held'], ['rol_staff'])
+        self.assertEqual(StubRolesHandler.roles['auth0|0'], ['rol_staff'])
+        self.assertIn(('DELETE', '/api/v2/users/auth0%7C0/sessions'), StubRolesHandler.calls)
+
+    def test_assign_unchanged(self):
+        """Test assign makes no write call when the roles didn't change"""
+        result = self.assigner.assign('auth0|0', ['rol_staff'])
+
+        self.assertTrue(result['success'])
+        self.assertEqual(StubRolesHandler.calls, [('GET', '/api/v2/users/auth0%7C0/roles')])
+
+    def test_assign_user_not_found(self):
+        """Test assign reports a missing user"""
+        result = self.assigner.assign('auth0|missing', ['rol_admin'])
+
+        self.assertFalse(result['success'])
+        self.assertEqual(result['status'], 404)
+
+    def test_assign_many(self):
+        """Test assign many updates every user through the rate limit"""
+        assignments = [(f'auth0|{index}', ['rol_admin']) for index in range(USER_COUNT)]
+        assignments.append(('auth0|missing', ['rol_admin']))
+        results = self.assigner.assign_many(assignments)
+
+        self.assertEqual([result['auth0_id'] for result in results], [auth0_id for auth0_id, _ in assignments])
+        self.assertTrue(all(result['success'] for result in results[:-1]))
+        self.assertFalse(results[-1]['success'])
+        self.assertTrue(all(roles == ['rol_admin'] for roles in StubRolesHandler.roles.values()))
+        self.assertTrue(StubRolesHandler.rate_limited > 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,10 +1,18 @@
 import unittest
+import gzip
+import io
 import json
-from flask import Flask
+from flask import Flask, g
 from app.main import create_app
-from app.models import db, Users, AttendanceRecords, Events
-from datetime import datetime, timedelta
+from app.models import db, Users, AttendanceRecords, AttendanceArchives, Events, Cards
+from app.reporting import attendance_archive, get_zone
+from app.ingest import write_punches, STATUS_OK
+from app.services import load_guard, today_snapshot, active_user_cache
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import text
 import os
+import tempfile
+from unittest.mock import patch
 from os import getenv
 from dotenv import load_dotenv
 
@@ -25,6 +33,11 @@ class APITestCase(unittest.TestCase):
             )
         }
 
+        self.test_config = test_config
+        # Every test starts with full rate limit buckets
+        load_guard.reset()
+        # User ids are reused from one test database to the next
+        active_user_cache.clear()
         self.app = create_app(test_config)
         self.client = self.app.test_client
         
@@ -40,6 +53,9 @@ class APITestCase(unittest.TestCase):
         }
         
         with self.app.app_context():
+            # The user search needs the trigram functions
+            db.session.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+            db.session.commit()
             db.create_all()
             self.setup_test_data()
     
@@ -114,7 +130,24 @@ class APITestCase(unittest.TestCase):
         self.assertEqual(res.status_code, 200)
         self.assertTrue(data['success'])
         self.assertTrue('user_info' in data)
-    
+
+    def test_get_user_info_invalidated_on_update(self):
+        """Test get user info shows an update made after it was cached"""
+        res = self.client().get('/api/user-info', headers=self.admin_auth_header)
+        user_id = json.loads(res.data)['user_info']['db_info']['id']
+
+        res = self.client().post('/api/user-info', headers=self.admin_auth_header, json={
+            'user_id': user_id,
+            'department': 'Cache Test Department'
+        })
+        self.assertEqual(res.status_code, 200)
+
+        res = self.client().get('/api/user-info', headers=self.admin_auth_header)
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['user_info']['db_info']['department'], 'Cache Test Department')
+
     def test_get_user_info_failure(self):
         """Test get user info without auth token"""
         res = self.client().get('/api/user-info')
@@ -129,6 +162,53 @@ class APITestCase(unittest.TestCase):
         self.assertEqual(res.status_code, 200)
         self.assertTrue(any(user['username'] == 'testuser' for user in json.loads(res.data)))
     
+    def test_test_config_binds_no_replica(self):
+        """Test a test app without a replica uri never reads from the env replica"""
+        self.assertNotIn('replica', self.app.config.get('SQLALCHEMY_BINDS') or {})
+
+    def test_get_users_from_replica(self):
+        """Test get users with the test db standing in as read replica"""
+        replica_app = create_app({
+            **self.test_config,
+            'SQLALCHEMY_REPLICA_URI': self.test_config['SQLALCHEMY_DATABASE_URI']
+        })
+        
+        with replica_app.app_context():
+            g.use_replica = True
+            self.assertIs(db.session.get_bind(), db.engines['replica'])
+            g.use_replica = False
+        
+        res = replica_app.test_client().get('/api/users', headers=self.admin_auth_header)
+        
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(any(user['username'] == 'testuser' for user in json.loads(res.data)))
+    
+    def test_get_users_compact(self):
+        """Test get users in compact mode"""
+        res = self.client().get('/api/users?compact=1', headers=self.admin_auth_header)
+        data = json.loads(res.data)
+        
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['fields'], ['id', 'username', 'department', 'position'])
+        self.assertTrue(any(row[1] == 'testuser' for row in data['rows']))
+    
+    def test_get_users_gzip(self):
+        """Test get users is gzip encoded once it is over the size threshold"""
+        with self.app.app_context():
+            for i in range(50):
+                Users(
+                    username=f"bulkuser{i}",
+                    email=f"bulk{i}@example.com",
+                    auth0_id=f"auth0|bulk{i}",
+                    position="Test Position",
+                ).insert()
+        
+        res = self.client().get('/api/users', headers={**self.admin_auth_header, 'Accept-Encoding': 'gzip'})
+        
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.headers.get('Content-Encoding'), 'gzip')
+        self.assertTrue(len(json.loads(gzip.decompress(res.data))) > 50)
+    
     def test_get_users_unauthorized(self):
         """Test user is unauthorized"""
         res = self.client().get('/api/users')  # No JWT header
@@ -142,6 +222,109 @@ class APITestCase(unittest.TestCase):
         
         self.assertEqual(res.status_code, 403)
     
+    def test_bulk_deactivate_users(self):
+        """Test deactivating users in bulk hides them and refuses their punches"""
+        # Cached as active before the change
+        res = self.client().post('/api/attendance', headers=self.admin_auth_header, json={
+            'user_id': self.test_user_id, 'timestamp': datetime.now().isoformat()
+        })
+        self.assertEqual(res.status_code, 201)
+
+        res = self.client().patch('/api/users/bulk', headers=self.admin_auth_header, json={
+            'ids': [self.test_user_id, 99999], 'isActive': False
+        })
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['updated'], 1)
+        self.assertEqual(data['missing'], [99999])
+
+        res = self.client().get('/api/users', headers=self.admin_auth_header)
+        self.assertFalse(any(user['username'] == 'testuser' for user in json.loads(res.data)))
+
+        res = self.client().post('/api/attendance', headers=self.admin_auth_header, json={
+            'user_id': self.test_user_id, 'timestamp': datetime.now().isoformat()
+        })
+        self.assertEqual(res.status_code, 404)
+
+    def test_bulk_reactivate_users(self):
+        """Test reactivating users in bulk, the active ones are left unchanged"""
+        self.client().patch('/api/users/bulk', headers=self.admin_auth_header, json={
+            'ids': [self.test_user_id], 'isActive': False
+        })
+
+        res = self.client().patch('/api/users/bulk', headers=self.admin_auth_header, json={
+            'ids': [self.test_user_id], 'isActive': True
+        })
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['updated'], 1)
+
+        res = self.client().patch('/api/users/bulk', headers=self.admin_auth_header, json={
+            'ids': [self.test_user_id], 'isActive': True
+        })
+        self.assertEqual(json.loads(res.data)['unchanged'], 1)
+
+        res = self.client().post('/api/attendance', headers=self.admin_auth_header, json={
+            'user_id': self.test_user_id, 'timestamp': datetime.now().isoformat()
+        })
+        self.assertEqual(res.status_code, 201)
+
+    def test_bulk_set_users_active_invalid(self):
+        """Test bulk user status change without ids or flag"""
+        res = self.client().patch('/api/users/bulk', headers=self.admin_auth_header, json={'ids': [], 'isActive': False})
+        self.assertEqual(res.status_code, 400)
+
+        res = self.client().patch('/api/users/bulk', headers=self.admin_auth_header, json={'ids': [self.test_user_id]})
+        self.assertEqual(res.status_code, 400)
+
+        res = self.client().patch('/api/users/bulk', headers=self.admin_auth_header, json={'ids': [True, False], 'isActive': False})
+        self.assertEqual(res.status_code, 400)
+
+    def test_bulk_set_users_active_unauthorized(self):
+        """Test bulk user status change without auth"""
+        res = self.client().patch('/api/users/bulk', json={'ids': [self.test_user_id], 'isActive': False})
+
+        self.assertEqual(res.status_code, 401)
+
+    def test_get_auth0_user_mirror_not_synced(self):
+        """Test the Auth0 user list before the mirror was synced"""
+        res = self.client().get('/api/auth0-user', headers=self.admin_auth_header)
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 503)
+        self.assertFalse(data['success'])
+
+    def test_bulk_update_roles_invalid(self):
+        """Test bulk role update with an invalid assignment"""
+        res = self.client().post('/api/auth0-user/roles/bulk', headers=self.admin_auth_header, json={
+            'assignments': [{'auth0_id': 'auth0|test123'}]
+        })
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 400)
+        self.assertFalse(data['success'])
+
+    def test_bulk_update_roles_duplicate_user(self):
+        """Test bulk role update with the same user twice"""
+        res = self.client().post('/api/auth0-user/roles/bulk', headers=self.admin_auth_header, json={
+            'assignments': [
+                {'auth0_id': 'auth0|test123', 'roles': []},
+                {'auth0_id': 'auth0|test123', 'roles': []}
+            ]
+        })
+
+        self.assertEqual(res.status_code, 400)
+
+    def test_bulk_update_roles_forbidden(self):
+        """Test bulk role update with insufficient permissions"""
+        res = self.client().post('/api/auth0-user/roles/bulk', headers=self.user_auth_header, json={
+            'assignments': [{'auth0_id': 'auth0|test123', 'roles': []}]
+        })
+
+        self.assertEqual(res.status_code, 403)
+
     # Attendance Tests
     def test_add_attendance_success(self):
         """Test add attendance records success"""
@@ -190,6 +373,32 @@ class APITestCase(unittest.TestCase):
         
         self.assertEqual(res.status_code, 404)
     
+    def test_add_attendance_inactive_user(self):
+        """Test adding attendance for an inactive user"""
+        with self.app.app_context():
+            inactive_user = Users(
+                username="inactiveuser",
+                email="inactive@example.com",
+                auth0_id="auth0|inactive123",
+                position="Test Position",
+            )
+            inactive_user.is_active = False
+            inactive_user.insert()
+            inactive_user_id = inactive_user.id
+        
+        attendance_data = {
+            'user_id': inactive_user_id,
+            'timestamp': datetime.now().isoformat()
+        }
+        
+        res = self.client().post(
+            '/api/attendance',
+            json=attendance_data,
+            headers=self.admin_auth_header
+        )
+        
+        self.assertEqual(res.status_code, 404)
+    
     def test_add_attendance_unauthorized(self):
         """Test adding attendance without proper auth"""
         attendance_data = {
@@ -204,6 +413,142 @@ class APITestCase(unittest.TestCase):
         
         self.assertEqual(res.status_code, 401)
     
+    def test_add_attendance_with_card(self):
+        """Test add attendance records with a card uid"""
+        with self.app.app_context():
+            card = Cards(card_uid='CARD-0001', user_id=self.test_user_id)
+            card.insert()
+        
+        res = self.client().post(
+            '/api/attendance',
+            json={'card_id': 'CARD-0001', 'timestamp': datetime.now().isoformat()},
+            headers=self.admin_auth_header
+        )
+        
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(data['user_id'], self.test_user_id)
+    
+    def test_add_attendance_expired_card(self):
+        """Test add attendance records with a card outside its validity window"""
+        with self.app.app_context():
+            card = Cards(
+                card_uid='CARD-0002',
+                user_id=self.test_user_id,
+                valid_until=datetime.now() - timedelta(days=1)
+            )
+            card.insert()
+        
+        res = self.client().post(
+            '/api/attendance',
+            json={'card_id': 'CARD-0002', 'timestamp': datetime.now().isoformat()},
+            headers=self.admin_auth_header
+        )
+        
+        self.assertEqual(res.status_code, 404)
+    
+    def test_ingest_resent_punch(self):
+        """Test a punch resent by a reader after a lost ack is stored once"""
+        timestamp = datetime.now(timezone.utc)
+        with self.app.app_context():
+            Cards(card_uid='CARD-0003', user_id=self.test_user_id).insert()
+            first = write_punches([(5, 1, timestamp, 'CARD-0003')])
+            resent = write_punches([(5, 1, timestamp, 'CARD-0003'), (5, 2, timestamp, 'CARD-0003')])
+            count = AttendanceRecords.query.filter_by(user_id=self.test_user_id).count()
+
+        self.assertEqual(first, [STATUS_OK])
+        self.assertEqual(resent, [STATUS_OK, STATUS_OK])
+        self.assertEqual(count, 2)
+
+    def test_add_attendance_unknown_numeric_card(self):
+        """Test an unregistered numeric card is not booked as the user with that id"""
+        res = self.client().post(
+            '/api/attendance',
+            json={'card_id': str(self.test_user_id), 'timestamp': datetime.now().isoformat()},
+            headers=self.admin_auth_header
+        )
+
+        self.assertEqual(res.status_code, 404)
+
+    def test_patch_card_unknown_user(self):
+        """Test moving a card to an unknown user"""
+        with self.app.app_context():
+            card = Cards(card_uid='CARD-0004', user_id=self.test_user_id)
+            card.insert()
+            card_id = card.id
+
+        res = self.client().patch(f'/api/cards/{card_id}', json={'user_id': 999999}, headers=self.admin_auth_header)
+        self.assertEqual(res.status_code, 404)
+
+        res = self.client().patch(f'/api/cards/{card_id}', json={'user_id': 'abc'}, headers=self.admin_auth_header)
+        self.assertEqual(res.status_code, 400)
+
+    def test_create_card_offset_validity(self):
+        """Test card validity bounds with an offset are stored in site time"""
+        res = self.client().post('/api/cards', json={
+            'card_uid': 'CARD-0005',
+            'user_id': self.test_user_id,
+            'valid_from': '2025-01-01T00:00:00Z',
+            'valid_until': '2025-06-30T18:00:00+09:00'
+        }, headers=self.admin_auth_header)
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 201)
+        with self.app.app_context():
+            card = db.session.get(Cards, data['id'])
+            valid_from, valid_until = card.valid_from, card.valid_until
+
+        zone = get_zone()
+        self.assertEqual(valid_from, datetime(2025, 1, 1, tzinfo=timezone.utc).astimezone(zone).replace(tzinfo=None))
+        self.assertEqual(valid_until, datetime(2025, 6, 30, 9, 0, tzinfo=timezone.utc).astimezone(zone).replace(tzinfo=None))
+
+    def test_card_invalid_validity(self):
+        """Test card validity bounds that aren't strings or are out of order"""
+        res = self.client().post('/api/cards', json={
+            'card_uid': 'CARD-0006',
+            'user_id': self.test_user_id,
+            'valid_from': 123
+        }, headers=self.admin_auth_header)
+        self.assertEqual(res.status_code, 400)
+
+        res = self.client().post('/api/cards', json={
+            'card_uid': 'CARD-0006',
+            'user_id': self.test_user_id,
+            'valid_from': '2025-02-01',
+            'valid_until': '2025-01-01'
+        }, headers=self.admin_auth_header)
+        self.assertEqual(res.status_code, 400)
+
+        with self.app.app_context():
+            card = Cards(card_uid='CARD-0006', user_id=self.test_user_id, valid_until=datetime(2025, 1, 1))
+            card.insert()
+            card_id = card.id
+
+        res = self.client().patch(f'/api/cards/{card_id}', json={'valid_from': ['2025-01-01']}, headers=self.admin_auth_header)
+        self.assertEqual(res.status_code, 400)
+
+        res = self.client().patch(f'/api/cards/{card_id}', json={'valid_from': '2025-02-01'}, headers=self.admin_auth_header)
+        self.assertEqual(res.status_code, 400)
+
+    def test_create_card_missing_fields(self):
+        """Test missing fields when creating a card"""
+        res = self.client().post(
+            '/api/cards',
+            json={'card_uid': 'CARD-0003'},
+            headers=self.admin_auth_header
+        )
+        
+        self.assertEqual(res.status_code, 400)
+    
+    def test_create_card_unauthorized(self):
+        """Test creating a card without auth"""
+        res = self.client().post(
+            '/api/cards',
+            json={'card_uid': 'CARD-0003', 'user_id': self.test_user_id}
+        )
+        
+        self.assertEqual(res.status_code, 401)
+    
     def test_get_attendance_success(self):
         """Test get the attendance success"""
         # Add a testing record
@@ -252,6 +597,136 @@ class APITestCase(unittest.TestCase):
         
         self.assertEqual(res.status_code, 200)
     
+    def test_get_attendance_night_shift(self):
+        """Test a night shift is summarized as one day"""
+        res = self.client().post('/api/shifts', headers=self.admin_auth_header, json={
+            'name': 'Test Night',
+            'start_time': '22:00',
+            'end_time': '06:00',
+            'break_minutes': 30,
+            'weekdays': '1234567'
+        })
+        self.assertEqual(res.status_code, 201)
+        shift_id = json.loads(res.data)['id']
+
+        res = self.client().post('/api/shifts/assignments', headers=self.admin_auth_header, json={
+            'shift_id': shift_id,
+            'user_id': self.test_user_id,
+            'start_date': '2025-03-01',
+            'end_date': '2025-03-31'
+        })
+        self.assertEqual(res.status_code, 201)
+
+        with self.app.app_context():
+            AttendanceRecords(user_id=self.test_user_id, timestamp=datetime(2025, 3, 3, 21, 55, tzinfo=timezone.utc)).insert()
+            AttendanceRecords(user_id=self.test_user_id, timestamp=datetime(2025, 3, 4, 6, 5, tzinfo=timezone.utc)).insert()
+
+        res = self.client().get(
+            f'/api/attendance?user_id={self.test_user_id}&start_date=2025-03-03&end_date=2025-03-04',
+            headers=self.admin_auth_header
+        )
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(data), 1)
+        self.assertEqual(data[0]['date'], '2025-03-03')
+        self.assertEqual(data[0]['shift'], 'Test Night')
+        self.assertEqual(data[0]['workDuration'], 7.67)
+
+    def test_get_attendance_user_timezone(self):
+        """Test the punches are bucketed in the user's local day"""
+        res = self.client().post('/api/user-info', headers=self.admin_auth_header, json={
+            'user_id': self.test_user_id,
+            'timezone': 'Asia/Tokyo'
+        })
+        self.assertEqual(res.status_code, 200)
+
+        with self.app.app_context():
+            # 08:30 on the 4th in Tokyo
+            AttendanceRecords(user_id=self.test_user_id, timestamp=datetime(2025, 2, 3, 23, 30, tzinfo=timezone.utc)).insert()
+
+        res = self.client().get(
+            f'/api/attendance?user_id={self.test_user_id}&start_date=2025-02-04&end_date=2025-02-04',
+            headers=self.admin_auth_header
+        )
+        data = json.loads(res.data)
+
+        self.client().post('/api/user-info', headers=self.admin_auth_header, json={
+            'user_id': self.test_user_id,
+            'timezone': None
+        })
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(data), 1)
+        self.assertEqual(data[0]['date'], '2025-02-04')
+        self.assertEqual(data[0]['checkInTime'], '2025-02-04T08:30:00+09:00')
+
+    def test_get_attendance_archived_month(self):
+        """Test an archived month is still returned"""
+        with self.app.app_context():
+            AttendanceRecords(user_id=self.test_user_id, timestamp=datetime(2019, 1, 7, 9, 0, tzinfo=timezone.utc)).insert()
+            AttendanceRecords(user_id=self.test_user_id, timestamp=datetime(2019, 1, 7, 17, 30, tzinfo=timezone.utc)).insert()
+
+            with tempfile.TemporaryDirectory() as directory, patch.object(attendance_archive, 'directory', directory):
+                moved = attendance_archive.archive_month('2019-01')
+                remaining = AttendanceRecords.query.filter(AttendanceRecords.timestamp < datetime(2019, 2, 1, tzinfo=timezone.utc)).count()
+
+                res = self.client().get(
+                    f'/api/attendance?user_id={self.test_user_id}&start_date=2019-01-07&end_date=2019-01-07',
+                    headers=self.admin_auth_header
+                )
+                data = json.loads(res.data)
+
+                db.session.query(AttendanceArchives).filter_by(month='2019-01').delete()
+                db.session.commit()
+
+        self.assertEqual(moved, 2)
+        self.assertEqual(remaining, 0)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(data), 1)
+        self.assertEqual(data[0]['workDuration'], 8.5)
+
+    def test_boolean_user_id(self):
+        """Test a JSON true user_id is not taken as user 1"""
+        res = self.client().post('/api/user-info', headers=self.admin_auth_header, json={
+            'user_id': True,
+            'department': 'Sales'
+        })
+        self.assertEqual(res.status_code, 400)
+
+        res = self.client().post('/api/attendance', headers=self.admin_auth_header, json={
+            'user_id': True,
+            'timestamp': datetime.now().isoformat()
+        })
+        self.assertEqual(res.status_code, 400)
+
+    def test_update_user_info_invalid_timezone(self):
+        """Test update user info with an unknown timezone"""
+        res = self.client().post('/api/user-info', headers=self.admin_auth_header, json={
+            'user_id': self.test_user_id,
+            'timezone': 'Mars/Olympus'
+        })
+
+        self.assertEqual(res.status_code, 400)
+
+    def test_get_attendance_invalid_date(self):
+        """Test get attendance with an invalid date"""
+        res = self.client().get(
+            f'/api/attendance?user_id={self.test_user_id}&start_date=03-03-2025',
+            headers=self.admin_auth_header
+        )
+
+        self.assertEqual(res.status_code, 400)
+
+    def test_create_shift_assignment_without_target(self):
+        """Test assign shift without user or department"""
+        res = self.client().post('/api/shifts/assignments', headers=self.admin_auth_header, json={
+            'shift_id': 1,
+            'start_date': '2025-03-01'
+        })
+
+        self.assertEqual(res.status_code, 400)
+
     def test_get_attendance_unauthorized(self):
         """Test get attendance without auth"""
         res = self.client().get(
@@ -259,6 +734,177 @@ class APITestCase(unittest.TestCase):
         )
         
         self.assertEqual(res.status_code, 401)
+
+    def test_get_attendance_statistics(self):
+        """Test get monthly statistics of the users"""
+        with self.app.app_context():
+            AttendanceRecords(user_id=self.test_user_id, timestamp=datetime(2025, 3, 3, 9, 30)).insert()
+            AttendanceRecords(user_id=self.test_user_id, timestamp=datetime(2025, 3, 3, 17, 30)).insert()
+
+        res = self.client().get('/api/attendance/statistics?month=2025-03', headers=self.admin_auth_header)
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        entry = next(entry for entry in data['data'] if entry['user_id'] == self.test_user_id)
+        self.assertEqual(entry['daysPresent'], 1)
+        self.assertEqual(entry['totalHours'], 8.0)
+        self.assertEqual(entry['lateArrivals'], 1)
+        self.assertEqual(entry['earlyDepartures'], 1)
+
+    def test_get_attendance_statistics_invalid_month(self):
+        """Test get monthly statistics with an invalid month"""
+        res = self.client().get('/api/attendance/statistics?month=2025-3x', headers=self.admin_auth_header)
+
+        self.assertEqual(res.status_code, 400)
+
+    def test_get_attendance_statistics_unauthorized(self):
+        """Test get monthly statistics without auth"""
+        res = self.client().get('/api/attendance/statistics?month=2025-03')
+
+        self.assertEqual(res.status_code, 401)
+    
+    def test_get_attendance_records_pages(self):
+        """Test the raw punches are listed page by page with the cursor"""
+        start = datetime(2025, 3, 3, 8, 0, tzinfo=timezone.utc)
+        with self.app.app_context():
+            # Two punches on the same instant, ordered by id
+            for minutes in (0, 5, 5, 10, 20):
+                AttendanceRecords(user_id=self.test_user_id, timestamp=start + timedelta(minutes=minutes)).insert()
+
+        records, cursor = [], None
+        for _ in range(5):
+            query = f'user_id={self.test_user_id}&limit=2' + (f'&cursor={cursor}' if cursor else '')
+            res = self.client().get(f'/api/attendance/records?{query}', headers=self.admin_auth_header)
+            data = json.loads(res.data)
+            self.assertEqual(res.status_code, 200)
+            self.assertLessEqual(len(data['records']), 2)
+            records += data['records']
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+
+        self.assertEqual(len(records), 5)
+        self.assertEqual(len({record['id'] for record in records}), 5)
+        keys = [(datetime.fromisoformat(record['timestamp']), record['id']) for record in records]
+        self.assertEqual(keys, sorted(keys))
+
+    def test_get_attendance_records_filters(self):
+        """Test the raw punches filtered by department, range and newest first"""
+        start = datetime(2025, 3, 3, 8, 0, tzinfo=timezone.utc)
+        with self.app.app_context():
+            other_user = Users(
+                username="otheruser",
+                email="other@example.com",
+                auth0_id="auth0|other123",
+                position="Test Position",
+                department="Sales",
+            )
+            other_user.insert()
+            other_user_id = other_user.id
+            for minutes in (0, 30, 60):
+                AttendanceRecords(user_id=self.test_user_id, timestamp=start + timedelta(minutes=minutes)).insert()
+                AttendanceRecords(user_id=other_user_id, timestamp=start + timedelta(minutes=minutes)).insert()
+
+        res = self.client().get(
+            '/api/attendance/records?department=Sales&start=2025-03-03T08:10:00Z&end=2025-03-04&order=desc',
+            headers=self.admin_auth_header
+        )
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([record['user_id'] for record in data['records']], [other_user_id, other_user_id])
+        self.assertEqual(
+            [datetime.fromisoformat(record['timestamp']) for record in data['records']],
+            [start + timedelta(minutes=60), start + timedelta(minutes=30)]
+        )
+        self.assertIsNone(data['next_cursor'])
+
+    def test_get_attendance_records_archived_month(self):
+        """Test the punches of an archived month are listed with the ones in the table"""
+        with self.app.app_context():
+            AttendanceRecords(user_id=self.test_user_id, timestamp=datetime(2019, 1, 7, 9, 0, tzinfo=timezone.utc)).insert()
+            AttendanceRecords(user_id=self.test_user_id, timestamp=datetime(2019, 1, 7, 17, 30, tzinfo=timezone.utc)).insert()
+            AttendanceRecords(user_id=self.test_user_id, timestamp=datetime(2025, 3, 3, 9, 0, tzinfo=timezone.utc)).insert()
+
+            with tempfile.TemporaryDirectory() as directory, patch.object(attendance_archive, 'directory', directory):
+                attendance_archive.archive_month('2019-01')
+
+                records, cursor = [], None
+                for _ in range(3):
+                    query = f'user_id={self.test_user_id}&limit=2' + (f'&cursor={cursor}' if cursor else '')
+                    res = self.client().get(f'/api/attendance/records?{query}', headers=self.admin_auth_header)
+                    data = json.loads(res.data)
+                    self.assertEqual(res.status_code, 200)
+                    records += data['records']
+                    cursor = data['next_cursor']
+                    if not cursor:
+                        break
+
+                db.session.query(AttendanceArchives).filter_by(month='2019-01').delete()
+                db.session.commit()
+
+        self.assertEqual(
+            [datetime.fromisoformat(record['timestamp']) for record in records],
+            [
+                datetime(2019, 1, 7, 9, 0, tzinfo=timezone.utc),
+                datetime(2019, 1, 7, 17, 30, tzinfo=timezone.utc),
+                datetime(2025, 3, 3, 9, 0, tzinfo=timezone.utc),
+            ]
+        )
+        self.assertEqual([record['id'] is None for record in records], [True, True, False])
+
+    def test_get_attendance_records_invalid_cursor(self):
+        """Test the raw punches with a cursor not made by the server"""
+        res = self.client().get('/api/attendance/records?cursor=not-a-cursor', headers=self.admin_auth_header)
+
+        self.assertEqual(res.status_code, 400)
+
+    def test_get_attendance_records_unauthorized(self):
+        """Test the raw punches without auth"""
+        res = self.client().get('/api/attendance/records')
+
+        self.assertEqual(res.status_code, 401)
+
+    def test_get_today_attendance(self):
+        """Test who punched in today"""
+        # Loaded again from this test's database
+        today_snapshot.clear()
+        now = datetime.now(timezone.utc)
+        with self.app.app_context():
+            AttendanceRecords(user_id=self.test_user_id, timestamp=now - timedelta(seconds=5)).insert()
+            AttendanceRecords(user_id=self.test_user_id, timestamp=now).insert()
+
+        res = self.client().get('/api/attendance/today', headers=self.admin_auth_header)
+
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 200)
+        user = next(user for user in data['users'] if user['user_id'] == self.test_user_id)
+        self.assertEqual(datetime.fromisoformat(user['firstPunch']), now - timedelta(seconds=5))
+        self.assertEqual(datetime.fromisoformat(user['lastPunch']), now)
+
+    def test_get_today_attendance_unauthorized(self):
+        """Test who punched in today without auth"""
+        res = self.client().get('/api/attendance/today')
+
+        self.assertEqual(res.status_code, 401)
+
+    def test_attendance_stream_unauthorized(self):
+        """Test attendance live feed without auth"""
+        res = self.client().get('/api/attendance/stream')
+        
+        self.assertEqual(res.status_code, 401)
+    
+    def test_attendance_stream_invalid_query_token(self):
+        """Test attendance live feed with invalid token in the url"""
+        res = self.client().get('/api/attendance/stream?access_token=invalid_token')
+        
+        self.assertEqual(res.status_code, 401)
+
+    def test_attendance_stream_threaded_worker(self):
+        """Test attendance live feed is refused by a worker without gevent"""
+        res = self.client().get('/api/attendance/stream', headers=self.admin_auth_header)
+
+        self.assertEqual(res.status_code, 503)
     
     # Events Tests
     def test_get_events_success(self):
@@ -288,6 +934,195 @@ class APITestCase(unittest.TestCase):
         self.assertEqual(res.status_code, 200)
         self.assertTrue('events' in data)
     
+    def test_get_events_recurring(self):
+        """Test a recurring event is expanded on the requested month"""
+        res = self.client().post('/api/events', headers=self.admin_auth_header, json={
+            'name': 'Weekly Meeting',
+            'description': 'Every Monday',
+            'date': '2024-01-01T10:00:00+00:00',
+            'rrule': 'FREQ=WEEKLY;BYDAY=MO'
+        })
+        self.assertEqual(res.status_code, 201)
+        event_id = json.loads(res.data)['id']
+
+        res = self.client().post(f'/api/events/{event_id}/exceptions', headers=self.admin_auth_header, json={
+            'occurrence': '2025-03-10T10:00:00+00:00',
+            'cancelled': True
+        })
+        self.assertEqual(res.status_code, 201)
+
+        res = self.client().get('/api/events?year_month=2025-03', headers=self.admin_auth_header)
+        data = json.loads(res.data)
+        meetings = [event['date'] for event in data['events'] if event['id'] == event_id]
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(meetings), 4)
+        self.assertFalse(any(date.startswith('2025-03-10') for date in meetings))
+
+    def test_create_event_invalid_rrule(self):
+        """Test create event with an unsupported rrule"""
+        res = self.client().post('/api/events', headers=self.admin_auth_header, json={
+            'name': 'Hourly',
+            'date': '2025-03-01T10:00:00+00:00',
+            'rrule': 'FREQ=HOURLY'
+        })
+
+        self.assertEqual(res.status_code, 400)
+
+    def test_create_event_exception_not_an_occurrence(self):
+        """Test an exception on a date the event does not occur"""
+        res = self.client().post('/api/events', headers=self.admin_auth_header, json={
+            'name': 'Weekly Meeting',
+            'date': '2025-03-03T10:00:00+00:00',
+            'rrule': 'FREQ=WEEKLY'
+        })
+        event_id = json.loads(res.data)['id']
+
+        res = self.client().post(f'/api/events/{event_id}/exceptions', headers=self.admin_auth_header, json={
+            'occurrence': '2025-03-04T10:00:00+00:00',
+            'cancelled': True
+        })
+
+        self.assertEqual(res.status_code, 400)
+
+    def test_bulk_create_events_json(self):
+        """Test import events from a JSON array"""
+        res = self.client().post('/api/events/bulk', headers=self.admin_auth_header, json=[
+            {'name': 'Holiday', 'date': '2025-12-25'},
+            {'name': 'Training', 'description': 'Room A', 'date': '2025-12-26T09:00:00+00:00'}
+        ])
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(data['created'], 2)
+
+    def test_bulk_create_events_ics(self):
+        """Test import events from an iCalendar file"""
+        calendar = (
+            b'BEGIN:VCALENDAR\r\nBEGIN:VEVENT\r\nSUMMARY:New Year\r\nDTSTART;VALUE=DATE:20260101\r\nEND:VEVENT\r\n'
+            b'BEGIN:VEVENT\r\nSUMMARY:Review\r\nDTSTART:20260105T090000Z\r\nRRULE:FREQ=WEEKLY;COUNT=4\r\nEND:VEVENT\r\nEND:VCALENDAR\r\n'
+        )
+        res = self.client().post(
+            '/api/events/bulk',
+            headers=self.admin_auth_header,
+            data={'file': (io.BytesIO(calendar), 'holidays.ics')},
+            content_type='multipart/form-data'
+        )
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(data['created'], 2)
+
+    def test_bulk_create_events_invalid(self):
+        """Test an invalid event rolls back the whole import"""
+        res = self.client().post('/api/events/bulk', headers=self.admin_auth_header, json=[
+            {'name': 'Bulk Rollback', 'date': '2025-12-25'},
+            {'name': 'Bulk Rollback', 'date': 'not a date'}
+        ])
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(data['errors'][0]['index'], 1)
+        with self.app.app_context():
+            self.assertEqual(Events.query.filter_by(name='Bulk Rollback').count(), 0)
+
+    def test_bulk_patch_and_delete_events(self):
+        """Test update then delete events in batch"""
+        res = self.client().patch('/api/events/bulk', headers=self.admin_auth_header, json=[
+            {'id': self.test_event_id, 'name': 'Renamed In Batch'}
+        ])
+        self.assertEqual(res.status_code, 200)
+
+        res = self.client().delete('/api/events/bulk', headers=self.admin_auth_header, json={
+            'ids': [self.test_event_id, 999999]
+        })
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['deleted'], 1)
+        self.assertEqual(data['missing'], [999999])
+
+    def test_bulk_events_boolean_ids(self):
+        """Test batch update and delete refuse true and false as event ids"""
+        res = self.client().patch('/api/events/bulk', headers=self.admin_auth_header, json=[
+            {'id': True, 'name': 'Nothing'}
+        ])
+        self.assertEqual(res.status_code, 400)
+
+        res = self.client().delete('/api/events/bulk', headers=self.admin_auth_header, json={'ids': [True, False]})
+        self.assertEqual(res.status_code, 400)
+
+    def test_bulk_patch_events_not_found(self):
+        """Test batch update with an unknown event"""
+        res = self.client().patch('/api/events/bulk', headers=self.admin_auth_header, json=[
+            {'id': 999999, 'name': 'Nothing'}
+        ])
+
+        self.assertEqual(res.status_code, 404)
+
+    def test_coalescing_metrics(self):
+        """Test the coalescing counts of the events route"""
+        self.client().get('/api/events', headers=self.admin_auth_header)
+        res = self.client().get('/api/metrics/coalescing', headers=self.admin_auth_header)
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertGreaterEqual(data['routes']['api.get_events']['executed'], 1)
+
+    def test_load_metrics(self):
+        """Test the admission counts per priority class"""
+        res = self.client().get('/api/metrics/load', headers=self.admin_auth_header)
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['classes']['reporting']['admitted'], 1)
+
+    def test_rate_limited(self):
+        """Test a client polling in a loop gets 429 with Retry-After"""
+        statuses = [self.client().get('/api/events', headers=self.user_auth_header).status_code for _ in range(40)]
+        res = self.client().get('/api/events', headers=self.user_auth_header)
+
+        self.assertIn(429, statuses)
+        self.assertEqual(res.status_code, 429)
+        self.assertIn('Retry-After', res.headers)
+
+    def test_search_events(self):
+        """Test search events by a prefix of their name"""
+        res = self.client().get('/api/search?q=test eve&type=events', headers=self.admin_auth_header)
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['events']['items'][0]['id'], self.test_event_id)
+        self.assertFalse(data['events']['has_more'])
+        self.assertNotIn('users', data)
+
+    def test_search_users_fuzzy(self):
+        """Test search users by prefix and with a typo"""
+        for query in ('testu', 'tesstuser'):
+            res = self.client().get(f'/api/search?q={query}&type=users', headers=self.admin_auth_header)
+            data = json.loads(res.data)
+
+            self.assertEqual(res.status_code, 200)
+            self.assertEqual(data['users']['items'][0]['id'], self.test_user_id)
+
+    def test_search_pagination(self):
+        """Test search results are paged"""
+        self.client().post('/api/events/bulk', headers=self.admin_auth_header, json=[
+            {'name': f'Paged Event {index}', 'date': '2025-12-25'} for index in range(3)
+        ])
+        res = self.client().get('/api/search?q=paged&type=events&per_page=2&page=2', headers=self.admin_auth_header)
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(data['events']['items']), 1)
+        self.assertFalse(data['events']['has_more'])
+
+    def test_search_without_query(self):
+        """Test search without q"""
+        res = self.client().get('/api/search', headers=self.admin_auth_header)
+
+        self.assertEqual(res.status_code, 400)
+
     def test_get_events_unauthorized(self):
         """Test get events without auth"""
         res = self.client().get('/api/events')
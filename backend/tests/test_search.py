@@ -0,0 +1,20 @@
+import unittest
+from app.services.search import prefix_tsquery, escape_like
+
+class SearchTestCase(unittest.TestCase):
+    def test_prefix_tsquery(self):
+        """Test every word is matched as a prefix"""
+        self.assertEqual(prefix_tsquery('Team Meet'), 'team:* & meet:*')
+        self.assertEqual(prefix_tsquery('Réunion'), 'réunion:*')
+
+    def test_prefix_tsquery_drops_operators(self):
+        """Test the tsquery operators of the caller are not kept"""
+        self.assertEqual(prefix_tsquery("a&b | !c:* (d) 'e'"), 'a:* & b:* & c:* & d:* & e:*')
+        self.assertEqual(prefix_tsquery('&|!'), '')
+
+    def test_escape_like(self):
+        """Test the LIKE wildcards are escaped"""
+        self.assertEqual(escape_like('50%_off\\'), '50\\%\\_off\\\\')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import unittest
+from datetime import datetime, timedelta, timezone
+from app.services.today_snapshot import TodaySnapshot
+from app.services.live_feed import PUNCH_CHANNEL
+
+class FakeHub:
+    def __init__(self):
+        self.callbacks = {}
+
+    def subscribe(self, channel, callback):
+        self.callbacks.setdefault(channel, []).append(callback)
+
+    def notify(self, channel, payload):
+        for callback in self.callbacks.get(channel, []):
+            callback(payload)
+
+
+class LoadedSnapshot(TodaySnapshot):
+    # Loads nothing from the database
+    def load(self, day=None):
+        self._loaded = True
+        self._last_reload = float('inf')
+
+
+class TodaySnapshotTestCase(unittest.TestCase):
+    def setUp(self):
+        """Set up"""
+        self.hub = FakeHub()
+        self.snapshot = LoadedSnapshot(self.hub)
+        self.now = datetime.now(timezone.utc)
+        # Subscribes to the punch channel
+        self.snapshot.get()
+
+    def punch(self, user_id, timestamp):
+        self.hub.notify(PUNCH_CHANNEL, {'id': 1, 'user_id': user_id, 'timestamp': timestamp.isoformat()})
+
+    def test_first_and_last_punch(self):
+        """Test notified punches keep the first and last punch of each user"""
+        self.punch(2, self.now)
+        self.punch(1, self.now)
+        self.punch(2, self.now - timedelta(seconds=30))
+        self.punch(2, self.now - timedelta(seconds=10))
+
+        today = self.snapshot.get()
+
+        self.assertEqual(today['date'], self.snapshot.today().isoformat())
+        self.assertEqual([user['user_id'] for user in today['users']], [1, 2])
+        self.assertEqual(today['users'][1]['firstPunch'], (self.now - timedelta(seconds=30)).isoformat())
+        self.assertEqual(today['users'][1]['lastPunch'], self.now.isoformat())
+
+    def test_duplicate_delivery(self):
+        """Test a punch delivered twice changes nothing"""
+        self.punch(1, self.now)
+        before = self.snapshot.get()
+        self.punch(1, self.now)
+
+        self.assertEqual(self.snapshot.get(), before)
+        self.assertEqual(len(self.snapshot), 1)
+
+    def test_past_days_are_ignored(self):
+        """Test a late punch of a past day is not shown today"""
+        self.punch(1, self.now)
+        self.punch(2, self.now - timedelta(days=2))
+
+        self.assertEqual([user['user_id'] for user in self.snapshot.get()['users']], [1])
+
+    def test_new_day_starts_empty(self):
+        """Test yesterday's punches are dropped once the day changes"""
+        self.snapshot.apply_punch(1, self.now - timedelta(days=1))
+
+        self.assertEqual(self.snapshot.get()['users'], [])
+
+        self.punch(2, self.now)
+        self.assertEqual([user['user_id'] for user in self.snapshot.get()['users']], [2])
+
+    def test_invalid_notification(self):
+        """Test a malformed notification is skipped"""
+        self.hub.notify(PUNCH_CHANNEL, {'user_id': 1, 'timestamp': 'yesterday'})
+        self.hub.notify(PUNCH_CHANNEL, 'not a punch')
+
+        self.assertEqual(self.snapshot.get()['users'], [])
+
+
+if __name__ == "__main__":
+    unittest.main()